@@ -0,0 +1,114 @@
+# async_broker.py
+# KIS 조회 동시 실행 (asyncio.gather + 서버/앱 키별 호출 제한)
+# ──────────────────────────────────────────────────────────
+# 서로 독립인 조회(전일 시세 · 보유 수량 · 매수 평균가 · 현재가)를 하나씩 기다리지 않고
+# 한꺼번에 보내 가장 느린 요청 하나만큼만 기다립니다.
+#
+#   kis = AsyncKISClient(broker.KISClient(APP_KEY, APP_SECRET, URL_REAL, ACC_NO, "REAL", token))
+#   ohlc, qty, avg = run(kis.get_yesterday_ohlc(code), kis.get_holding_quantity(code), kis.get_stock_balance(code))
+#
+# HTTP는 broker.KISClient를 그대로 씁니다. (공용 커넥션 풀 · 재시도 · 토큰 캐시를 공유하고
+# 새 의존성 없이 스레드 풀에서 실행) KIS 호출 제한은 앱 키 단위이므로 (서버, 앱 키)마다
+# 호출 제한기(1초 슬라이딩 윈도) 하나를 두고 모든 AsyncKISClient가 함께 씁니다.
+# ──────────────────────────────────────────────────────────
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import broker
+
+RATE_LIMITS = {"REAL": 20, "MOCK": 2}  # 초당 호출 수 (KIS 실전 20건/초, 모의 2건/초)
+RATE_WINDOW = 1.05  # 1초 + 여유 (예약 시각보다 실제 전송이 늦어도 서버 기준 1초 구간을 넘지 않게)
+API_METHODS = (
+    "get_current_price", "get_today_open", "get_yesterday_ohlc",
+    "get_balance", "get_stock_balance", "get_holding_quantity",
+    "post_order", "post_sell_order", "get_order",
+)
+
+
+class RateLimiter:
+    """
+    슬라이딩 윈도: 어떤 window초 구간에도 호출이 rate건을 넘지 않게 합니다. (한도 안에서는 대기 없이 통과)
+    acquire()는 자기 차례 시각을 먼저 예약하고 그때까지 asyncio.sleep — 이벤트 루프/스레드가 달라도 공유 가능
+    """
+
+    def __init__(self, rate, window=RATE_WINDOW, clock=time.monotonic):
+        self.rate = rate
+        self.window = window
+        self.clock = clock
+        self._slots = deque(maxlen=rate)  # 최근 rate건의 (예약된) 호출 시각
+        self._lock = threading.Lock()
+        self.waits = 0
+
+    def reserve(self):
+        """호출 1건 예약 → 기다려야 할 초"""
+        with self._lock:
+            now = self.clock()
+            at = now
+            if len(self._slots) == self.rate:
+                at = max(now, self._slots[0] + self.window)
+            self._slots.append(at)
+        if at > now:
+            self.waits += 1
+        return at - now
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_executor = None
+
+
+def limiter_for(url_base, app_key):
+    """(서버, 앱 키)별 공용 RateLimiter (모의투자 서버 주소는 'openapivts')"""
+    key = (url_base, app_key)
+    with _limiters_lock:
+        if key not in _limiters:
+            mode = "MOCK" if "vts" in str(url_base) else "REAL"
+            _limiters[key] = RateLimiter(RATE_LIMITS[mode])
+        return _limiters[key]
+
+
+def _default_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=broker.POOL_SIZE, thread_name_prefix="kis")
+    return _executor
+
+
+class AsyncKISClient:
+    """KISClient와 같은 메서드를 코루틴으로 제공 (호출 제한 통과 후 스레드 풀에서 실행)"""
+
+    def __init__(self, client, limiter=None, executor=None):
+        self.client = client
+        self.limiter = limiter or limiter_for(client.url_base, client.app_key)
+        self.executor = executor or _default_executor()
+
+    def __getattr__(self, name):
+        if name not in API_METHODS:
+            raise AttributeError(name)
+        method = getattr(self.client, name)
+
+        async def call(*args, **kwargs):
+            await self.limiter.acquire()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+
+async def _gather(coros):
+    return await asyncio.gather(*coros)
+
+
+def run(*coros):
+    """동기 코드(봇 루프)에서 코루틴 여러 개를 동시에 실행 → 결과 리스트 (인자 순서대로)"""
+    return asyncio.run(_gather(coros))
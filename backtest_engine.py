@@ -0,0 +1,206 @@
+# backtest_engine.py
+# 전략 인터페이스 + 공통 체결/정산 엔진
+# ──────────────────────────────────────────────────────────
+# 전략은 "언제 사고 팔고 싶은지"(진입/청산 신호 배열)만 만들고,
+# 수수료/포지션 비중/익절·손절/트레일링 스탑/마지막 청산은 execute() 하나가 처리합니다.
+#
+#   class MyStrategy(Strategy):
+#       name = "내 전략"
+#       stop_loss = -0.03
+#       def signals(self, df):
+#           price = df['종가'].to_numpy()
+#           return price, price > ..., price < ...
+#
+#   result = run_strategy(MyStrategy(), df, buy_fee, sell_fee)
+# ──────────────────────────────────────────────────────────
+from collections import namedtuple
+
+import numpy as np
+
+INITIAL_BALANCE = 10000000
+
+
+class Strategy:
+    """
+    전략 인터페이스: signals()만 구현하고 청산 규칙은 클래스 속성으로 지정합니다.
+
+    position_ratio      매수 시 잔고 대비 투입 비중
+    take_profit         수익률 ≥ 값이면 매도 (None=사용 안 함)
+    stop_loss           수익률 ≤ 값이면 매도 (None=사용 안 함)
+    trail_activate      수익률이 한 번이라도 이 값 이상이면 트레일링 스탑 활성화
+    trail_stop          활성화 후 고점 대비 하락률이 이 값 이상이면 매도
+    exit_in_profit_only 청산 신호는 수익 중일 때만 따름 (AI 반전 매도)
+    full_history        True면 학습 구간까지 포함한 전체 데이터를 받아 스스로 분할 (AI 전략)
+    """
+    name = "전략"
+    position_ratio = 0.95
+    take_profit = None
+    stop_loss = None
+    trail_activate = None
+    trail_stop = None
+    exit_in_profit_only = False
+    full_history = False
+
+    def signals(self, df):
+        """Returns: (prices, entries, exits) — 같은 길이의 가격 배열과 bool 배열 2개"""
+        raise NotImplementedError
+
+    def rules(self):
+        """execute()에 넘길 청산 규칙"""
+        return dict(
+            position_ratio=self.position_ratio,
+            take_profit=self.take_profit,
+            stop_loss=self.stop_loss,
+            trail_activate=self.trail_activate,
+            trail_stop=self.trail_stop,
+            exit_in_profit_only=self.exit_in_profit_only,
+        )
+
+
+class BacktestResult(namedtuple('BacktestResult', 'name balance trades wins')):
+    __slots__ = ()
+
+    @property
+    def return_pct(self):
+        return (self.balance / INITIAL_BALANCE - 1) * 100
+
+    @property
+    def win_rate(self):
+        return self.wins / self.trades * 100 if self.trades > 0 else None
+
+
+# ══════════════════════════════════════════════════════════
+# 체결 엔진
+# ══════════════════════════════════════════════════════════
+
+def _scan_exit(price_list, exit_list, start, stop, bought_price, highest, active, take_profit, stop_loss,
+               trail_activate, trail_stop, exit_in_profit_only):
+    """
+    [start, stop) 캔들을 하나씩 검사합니다. (보유 직후 몇 캔들용 — 짧은 보유가 많을 때 넘파이 호출보다 빠름)
+    판단 순서: 익절 → 손절 → (트레일링 활성 시) 고점 대비 하락 → (비활성 시) 청산 신호
+    Returns: (매도 위치 또는 None, 고점, 트레일링 활성 여부)
+    """
+    trailing = trail_activate is not None and trail_stop is not None
+    for t in range(start, stop):
+        price = price_list[t]
+        profit_rate = (price - bought_price) / bought_price
+        if take_profit is not None and profit_rate >= take_profit:
+            return t, highest, active
+        if stop_loss is not None and profit_rate <= stop_loss:
+            return t, highest, active
+        if active:
+            if (price - highest) / highest <= -trail_stop:
+                return t, highest, active
+        elif exit_list[t] and (not exit_in_profit_only or profit_rate > 0):
+            return t, highest, active
+        # 고점 갱신/트레일링 활성화는 판단 뒤에 반영
+        if price > highest:
+            highest = price
+        if trailing and not active and profit_rate >= trail_activate:
+            active = True
+    return None, highest, active
+
+
+def _find_exit(prices, exits, price_list, exit_list, entry, bought_price, take_profit, stop_loss,
+               trail_activate, trail_stop, exit_in_profit_only, scalar_span=16, window=64):
+    """
+    entry 캔들에서 산 포지션이 팔리는 캔들 위치 (없으면 len(prices))
+
+    처음 scalar_span개 캔들은 _scan_exit로 하나씩, 그 뒤는 구간을 window부터 두 배씩 늘려가며
+    같은 규칙을 벡터로 검사합니다. t 캔들은 t-1까지의 고점/수익률로 정해진 트레일링 상태를 봅니다.
+    """
+    n = len(prices)
+    start = entry + 1
+    stop = min(n, start + scalar_span)
+    j, highest, active = _scan_exit(price_list, exit_list, start, stop, bought_price, bought_price, False,
+                                    take_profit, stop_loss, trail_activate, trail_stop, exit_in_profit_only)
+    if j is not None:
+        return j
+
+    trailing = trail_activate is not None and trail_stop is not None
+    start = stop
+    while start < n:
+        stop = min(n, start + window)
+        seg = prices[start:stop]
+        profit = (seg - bought_price) / bought_price
+
+        hit = exits[start:stop]
+        if exit_in_profit_only:
+            hit = hit & (profit > 0)
+        if trailing:
+            activated = profit >= trail_activate
+            if active:
+                active_at = np.ones(len(seg), dtype=bool)
+            else:
+                active_at = np.concatenate([[False], np.logical_or.accumulate(activated[:-1])])
+            highs = np.maximum.accumulate(np.concatenate([[highest], seg[:-1]]))
+            drop = (seg - highs) / highs
+            hit = np.where(active_at, drop <= -trail_stop, hit)
+            active = active or bool(activated.any())
+            highest = max(highest, seg.max())
+        if take_profit is not None:
+            hit = hit | (profit >= take_profit)
+        if stop_loss is not None:
+            hit = hit | (profit <= stop_loss)
+
+        found = np.flatnonzero(hit)
+        if len(found) > 0:
+            return start + int(found[0])
+        start = stop
+        window *= 2
+    return n
+
+
+def execute(prices, entries, exits, buy_fee, sell_fee, position_ratio=0.95,
+            take_profit=None, stop_loss=None, trail_activate=None, trail_stop=None,
+            exit_in_profit_only=False, initial_balance=INITIAL_BALANCE):
+    """
+    진입/청산 신호 배열로 1종목 매매를 시뮬레이션합니다. (모든 전략 공통)
+
+    - 미보유 & entries[i] → 잔고 × position_ratio 만큼 매수 (수수료 포함 정수 수량)
+    - 보유 중 → 익절/손절/트레일링/청산 신호 중 하나라도 걸리면 전량 매도 (매수 다음 캔들부터)
+    - 끝까지 보유 중이면 마지막 가격으로 청산
+
+    매수 신호 사이와 보유 구간을 통째로 건너뛰므로 비용이 캔들 수가 아닌 거래 횟수에 비례합니다.
+    Returns: (balance, trade_count, win_count)
+    """
+    prices = np.asarray(prices, dtype=float)
+    exits = np.asarray(exits, dtype=bool)
+    n = len(prices)
+    entry_idx = np.append(np.flatnonzero(entries), n)
+    next_entry = entry_idx[np.searchsorted(entry_idx, np.arange(n + 1))].tolist()  # i 이후 첫 매수 신호 (없으면 n)
+    price_list = prices.tolist()
+    exit_list = exits.tolist()
+
+    balance = initial_balance
+    trade_count = 0
+    win_count = 0
+    i = next_entry[0]
+    while i < n:
+        price = price_list[i]
+        holdings = int(balance * position_ratio / (price * (1 + buy_fee)))
+        if holdings <= 0:
+            i = next_entry[i + 1]
+            continue
+        balance -= holdings * price * (1 + buy_fee)
+        bought_price = price
+
+        j = _find_exit(prices, exits, price_list, exit_list, i, bought_price, take_profit, stop_loss,
+                       trail_activate, trail_stop, exit_in_profit_only)
+        sell_price = price_list[j] if j < n else price_list[-1]  # 청산 안 됨 → 마지막 가격
+        balance += holdings * sell_price * (1 - sell_fee)
+        trade_count += 1
+        if sell_price > bought_price:
+            win_count += 1
+        if j >= n:
+            break
+        i = next_entry[j + 1]
+
+    return balance, trade_count, win_count
+
+
+def run_strategy(strategy, df, buy_fee, sell_fee):
+    """전략 신호를 만들고 execute()로 정산합니다. Returns: BacktestResult"""
+    prices, entries, exits = strategy.signals(df)
+    balance, trades, wins = execute(prices, entries, exits, buy_fee, sell_fee, **strategy.rules())
+    return BacktestResult(strategy.name, balance, trades, wins)
@@ -1,32 +1,35 @@
 # backtester.py
 # 5가지 전략 비교 백테스팅 (기존 3개 + AI 일봉 + AI 5분봉 단타)
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 import pandas as pd
 import numpy as np
 import pandas_ta as ta
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score
 
+from backtest_engine import Strategy, run_strategy
+from bar_store import load_bars
+from data_manager import BB_DDOF, label_forward_target
+from model import predict_proba_batch, to_feature_matrix
+
 
 # ══════════════════════════════════════════════════════════
 # 데이터 준비
 # ══════════════════════════════════════════════════════════
 
-def prepare_daily_data(ticker):
+def prepare_daily_data(ticker, days=365):
     """일봉 데이터 + 지표 준비 (전략 1~3, AI 일봉용)"""
-    import yfinance as yf
-    df = yf.download(ticker, period='1y', interval='1d')
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    df = df.reset_index().rename(columns={
-        'Date': '날짜', 'Close': '종가', 'High': '고가',
-        'Low': '저가', 'Open': '시가', 'Volume': '거래량'
-    })
+    df = load_bars(ticker, '1d', days)
 
     df['MA5'] = ta.sma(df['종가'], length=5)
     df['MA20'] = ta.sma(df['종가'], length=20)
     df['RSI'] = ta.rsi(df['종가'], length=14)
 
-    bb = ta.bbands(df['종가'], length=20, std=2)
+    bb = ta.bbands(df['종가'], length=20, std=2, ddof=BB_DDOF, talib=False)
     if bb is not None:
         df['BB_Lower'] = bb.iloc[:, 0]
         df['BB_Upper'] = bb.iloc[:, 2]
@@ -46,21 +49,14 @@ def prepare_daily_data(ticker):
 
 def prepare_5min_data(ticker):
     """5분봉 데이터 + 고급 지표 준비 (AI 5분봉 단타용)"""
-    import yfinance as yf
     print("  📥 60일 5분봉 데이터 수집 중...")
-    df = yf.download(ticker, period='60d', interval='5m')
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    df = df.reset_index().rename(columns={
-        'Datetime': '시간', 'Close': '종가', 'High': '고가',
-        'Low': '저가', 'Open': '시가', 'Volume': '거래량'
-    })
+    df = load_bars(ticker, '5m', 60)
 
     if len(df) < 100:
         return None
 
     # 기술 지표
-    bb = ta.bbands(df['종가'], length=20, std=2)
+    bb = ta.bbands(df['종가'], length=20, std=2, ddof=BB_DDOF, talib=False)
     if bb is not None:
         df['BB_Lower'] = bb.iloc[:, 0]
         df['BB_Upper'] = bb.iloc[:, 2]
@@ -105,15 +101,7 @@ def prepare_5min_data(ticker):
     # 타겟: 6캔들(30분) 이내 1.5% 수익
     lookahead = 6
     profit_target = 0.015
-    target = pd.Series(0, index=df.index)
-    for i in range(len(df) - lookahead):
-        current_price = df['종가'].iloc[i]
-        future_highs = df['고가'].iloc[i + 1:i + 1 + lookahead]
-        if len(future_highs) > 0:
-            max_profit = (future_highs / current_price - 1).max()
-            if max_profit >= profit_target:
-                target.iloc[i] = 1
-    df['target'] = target
+    df['target'] = label_forward_target(df['종가'], df['고가'], lookahead, profit_target)
 
     df.dropna(inplace=True)
     return df
@@ -123,214 +111,278 @@ def prepare_5min_data(ticker):
 # 기존 전략들
 # ══════════════════════════════════════════════════════════
 
-def strategy_ma_crossover(df, buy_fee, sell_fee):
+def _prev(values):
+    """한 칸 뒤로 민 배열 (첫 값은 NaN → 비교 결과 False)"""
+    return np.concatenate([[np.nan], values[:-1]])
+
+
+class MACrossover(Strategy):
     """전략 1: MA 골든/데드크로스"""
-    balance = 10000000
-    holdings = 0
-    bought_price = 0
-    trade_count = 0
-    win_count = 0
-
-    for i in range(1, len(df)):
-        price = df['종가'].iloc[i]
-        ma5 = df['MA5'].iloc[i]
-        ma20 = df['MA20'].iloc[i]
-        ma5_prev = df['MA5'].iloc[i - 1]
-        ma20_prev = df['MA20'].iloc[i - 1]
-
-        if holdings == 0:
-            if ma5_prev <= ma20_prev and ma5 > ma20:
-                holdings = int(balance * 0.95 / (price * (1 + buy_fee)))
-                if holdings > 0:
-                    balance -= holdings * price * (1 + buy_fee)
-                    bought_price = price
-        elif holdings > 0:
-            if ma5_prev >= ma20_prev and ma5 < ma20:
-                balance += holdings * price * (1 - sell_fee)
-                trade_count += 1
-                if price > bought_price:
-                    win_count += 1
-                holdings = 0
-                bought_price = 0
-
-    if holdings > 0:
-        balance += holdings * df['종가'].iloc[-1] * (1 - sell_fee)
-        trade_count += 1
-        if df['종가'].iloc[-1] > bought_price:
-            win_count += 1
-
-    return balance, trade_count, win_count
+    name = "MA 크로스오버"
+
+    def signals(self, df):
+        ma5 = df['MA5'].to_numpy(dtype=float)
+        ma20 = df['MA20'].to_numpy(dtype=float)
+        ma5_prev, ma20_prev = _prev(ma5), _prev(ma20)
+        entries = (ma5_prev <= ma20_prev) & (ma5 > ma20)
+        exits = (ma5_prev >= ma20_prev) & (ma5 < ma20)
+        return df['종가'].to_numpy(dtype=float), entries, exits
+
+
+class RSISwing(Strategy):
+    """전략 2: RSI 과매도 매수 / 과매수 매도 (-3% 손절)"""
+    name = "RSI 스윙"
+    stop_loss = -0.03
+
+    def signals(self, df):
+        rsi = df['RSI'].to_numpy(dtype=float)
+        entries = (rsi < 35) & (df['MA5'].to_numpy(dtype=float) > df['MA20'].to_numpy(dtype=float))
+        return df['종가'].to_numpy(dtype=float), entries, rsi > 70
+
+
+class TrendFollow(Strategy):
+    """전략 3: 트렌드 추종 (MA20 위=보유, 아래=매도)"""
+    name = "트렌드 추종(기존)"
+
+    def signals(self, df):
+        price = df['종가'].to_numpy(dtype=float)
+        ma20 = df['MA20'].to_numpy(dtype=float)
+        entries = (price > ma20) & (df['RSI'].to_numpy(dtype=float) > 50)
+        return price, entries, price < ma20
+
+
+def strategy_ma_crossover(df, buy_fee, sell_fee):
+    """Returns: (balance, trade_count, win_count)"""
+    return tuple(run_strategy(MACrossover(), df, buy_fee, sell_fee)[1:])
 
 
 def strategy_rsi_swing(df, buy_fee, sell_fee):
-    """전략 2: RSI 과매도 매수 / 과매수 매도"""
-    balance = 10000000
-    holdings = 0
-    bought_price = 0
-    trade_count = 0
-    win_count = 0
-
-    for i in range(len(df)):
-        price = df['종가'].iloc[i]
-        rsi = df['RSI'].iloc[i]
-        ma5 = df['MA5'].iloc[i]
-        ma20 = df['MA20'].iloc[i]
-
-        if holdings == 0:
-            if rsi < 35 and ma5 > ma20:
-                holdings = int(balance * 0.95 / (price * (1 + buy_fee)))
-                if holdings > 0:
-                    balance -= holdings * price * (1 + buy_fee)
-                    bought_price = price
-        elif holdings > 0:
-            profit_rate = (price - bought_price) / bought_price
-            if rsi > 70 or profit_rate <= -0.03:
-                balance += holdings * price * (1 - sell_fee)
-                trade_count += 1
-                if price > bought_price:
-                    win_count += 1
-                holdings = 0
-                bought_price = 0
-
-    if holdings > 0:
-        balance += holdings * df['종가'].iloc[-1] * (1 - sell_fee)
-        trade_count += 1
-        if df['종가'].iloc[-1] > bought_price:
-            win_count += 1
-
-    return balance, trade_count, win_count
+    """Returns: (balance, trade_count, win_count)"""
+    return tuple(run_strategy(RSISwing(), df, buy_fee, sell_fee)[1:])
 
 
 def strategy_trend_follow(df, buy_fee, sell_fee):
-    """전략 3: 트렌드 추종 (MA20 위=보유, 아래=매도)"""
-    balance = 10000000
-    holdings = 0
-    bought_price = 0
-    trade_count = 0
-    win_count = 0
-
-    for i in range(len(df)):
-        price = df['종가'].iloc[i]
-        ma20 = df['MA20'].iloc[i]
-        rsi = df['RSI'].iloc[i]
-
-        if holdings == 0:
-            if price > ma20 and rsi > 50:
-                holdings = int(balance * 0.95 / (price * (1 + buy_fee)))
-                if holdings > 0:
-                    balance -= holdings * price * (1 + buy_fee)
-                    bought_price = price
-        elif holdings > 0:
-            if price < ma20:
-                balance += holdings * price * (1 - sell_fee)
-                trade_count += 1
-                if price > bought_price:
-                    win_count += 1
-                holdings = 0
-                bought_price = 0
-
-    if holdings > 0:
-        balance += holdings * df['종가'].iloc[-1] * (1 - sell_fee)
-        trade_count += 1
-        if df['종가'].iloc[-1] > bought_price:
-            win_count += 1
-
-    return balance, trade_count, win_count
+    """Returns: (balance, trade_count, win_count)"""
+    return tuple(run_strategy(TrendFollow(), df, buy_fee, sell_fee)[1:])
+
+
+# ══════════════════════════════════════════════════════════
+# Walk-Forward 학습 엔진
+# ══════════════════════════════════════════════════════════
+
+# 5분봉 AI 하이퍼파라미터 (main.py와 동일)
+SCALP_XGB_PARAMS = dict(
+    n_estimators=300, learning_rate=0.05,
+    max_depth=6, min_child_weight=5,
+    subsample=0.8, colsample_bytree=0.8,
+    reg_alpha=0.1, reg_lambda=1.0,
+    eval_metric='logloss', random_state=42,
+)
+
+# AI 일봉 하이퍼파라미터 (main.py와 동일)
+DAILY_XGB_PARAMS = dict(
+    n_estimators=100, learning_rate=0.1, max_depth=5,
+    eval_metric='logloss', random_state=42,
+)
+
+RETRAIN_MODES = ('full', 'warm', 'window')
+
+
+def _fit_fold(X, y, train_start, train_end, model_params, base_model=None, n_estimators=None):
+    """X[train_start:train_end]로 모델 1개를 학습합니다. base_model이 있으면 그 부스터에 이어서 학습"""
+    y_train = y[train_start:train_end]
+    pos = y_train.sum()
+    neg = len(y_train) - pos
+    params = dict(model_params, n_jobs=model_params.get('n_jobs', -1),
+                  scale_pos_weight=neg / pos if pos > 0 else 1.0)
+    if n_estimators is not None:
+        params['n_estimators'] = n_estimators
+    ai = XGBClassifier(**params)
+    ai.fit(X[train_start:train_end], y_train, verbose=False,
+           xgb_model=base_model.get_booster() if base_model is not None else None)
+    return ai
+
+
+_wf_shared = {}  # 워커 프로세스: 공유 메모리 핸들과 X, y 뷰
+
+
+def _attach_walk_forward(x_name, x_shape, y_name, y_len):
+    """워커 초기화: 부모가 만든 공유 메모리를 복사 없이 X(float32), y(int64)로 연결합니다."""
+    x_shm = shared_memory.SharedMemory(name=x_name)
+    y_shm = shared_memory.SharedMemory(name=y_name)
+    _wf_shared.update(
+        shm=(x_shm, y_shm),
+        X=np.ndarray(x_shape, dtype=np.float32, buffer=x_shm.buf),
+        y=np.ndarray((y_len,), dtype=np.int64, buffer=y_shm.buf),
+    )
+
+
+def _fit_and_predict(train_start, train_end, pred_start, pred_end, model_params):
+    """워커 작업: fold 모델 1개 학습 → 다음 재학습 전까지의 구간 예측"""
+    X, y = _wf_shared['X'], _wf_shared['y']
+    ai = _fit_fold(X, y, train_start, train_end, model_params)
+    return pred_start, predict_proba_batch(ai, X[pred_start:pred_end])
+
+
+def _parallel_walk_forward(X, y, jobs, model_params, workers):
+    """독립적인 fold 학습들을 프로세스 풀에서 실행합니다.
+    jobs: [(train_start, train_end, pred_start, pred_end)] (전체 구간 기준 위치)
+    Returns: {pred_start: 예측 확률 배열}
+    """
+    # 워커마다 XGBoost 스레드를 나눠 CPU 과다 할당 방지
+    params = dict(model_params, n_jobs=max(1, (os.cpu_count() or 1) // workers))
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.int64)
+    x_shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+    y_shm = shared_memory.SharedMemory(create=True, size=max(y.nbytes, 1))
+    try:
+        np.ndarray(X.shape, dtype=np.float32, buffer=x_shm.buf)[:] = X
+        np.ndarray(y.shape, dtype=np.int64, buffer=y_shm.buf)[:] = y
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_walk_forward,
+                                 initargs=(x_shm.name, X.shape, y_shm.name, len(y))) as pool:
+            # 학습 구간이 긴 fold부터 제출 (마지막에 큰 작업 하나가 남는 것 방지)
+            futures = [pool.submit(_fit_and_predict, *job, params)
+                       for job in sorted(jobs, key=lambda j: j[1] - j[0], reverse=True)]
+            for done, future in enumerate(as_completed(futures), 1):
+                pred_start, probs = future.result()
+                results[pred_start] = probs
+                if done % 20 == 0 or done == len(futures):
+                    print(f"    ... {done}/{len(futures)} fold 학습 완료")
+        return results
+    finally:
+        x_shm.close()
+        x_shm.unlink()
+        y_shm.close()
+        y_shm.unlink()
+
+
+def walk_forward_probs(X, y, split_idx, fold_starts, model_params,
+                       retrain='full', retrain_every=1, window=None, warm_trees=30, workers=1):
+    """
+    테스트 구간(X[split_idx:]) 각 행의 상승 확률을 Walk-Forward로 계산합니다.
+
+    Args:
+        X, y: 전체 구간 피처 행렬(float32)과 타겟
+        fold_starts: 테스트 구간 기준 재학습 후보 위치 (예: 각 날짜의 첫 캔들), 오름차순
+        retrain:
+            'full'   — 매번 누적 전체 데이터로 새로 학습 (기존 방식, 학습 비용이 날짜 수에 비례해 증가)
+            'warm'   — 첫 학습 후에는 이전 부스터에 warm_trees개 트리만 이어서 학습 (최근 window개 행 사용)
+            'window' — 최근 window개 행으로만 새로 학습 (학습 비용 일정)
+        retrain_every: 몇 개 fold마다 재학습할지 (그 사이는 직전 모델 재사용)
+        window: 'warm'/'window' 학습 행 수 (기본: 학습 구간 길이 split_idx)
+        workers: 'full'/'window'는 fold끼리 독립이므로 workers개 프로세스로 병렬 학습
+                 (None이면 CPU 수, 'warm'은 이전 모델이 필요하므로 항상 순차)
+    Returns:
+        (probs, 학습 횟수)
+    """
+    if retrain not in RETRAIN_MODES:
+        raise ValueError(f"retrain은 {RETRAIN_MODES} 중 하나여야 합니다: {retrain}")
+    window = window or split_idx
+    test_len = len(X) - split_idx
+    bounds = list(fold_starts) + [test_len]
+    probs = np.empty(test_len)
+
+    workers = workers or os.cpu_count() or 1
+    fit_folds = [k for k in range(len(fold_starts)) if k % retrain_every == 0]
+    if retrain != 'warm' and workers > 1 and len(fit_folds) > 1:
+        jobs = []
+        for n, k in enumerate(fit_folds):
+            train_end = split_idx + fold_starts[k]
+            train_start = 0 if retrain == 'full' else max(0, train_end - window)
+            pred_end = split_idx + (fold_starts[fit_folds[n + 1]] if n + 1 < len(fit_folds) else test_len)
+            jobs.append((train_start, train_end, train_end, pred_end))
+        for pred_start, fold_probs in _parallel_walk_forward(X, y, jobs, model_params, workers).items():
+            probs[pred_start - split_idx:pred_start - split_idx + len(fold_probs)] = fold_probs
+        return probs, len(jobs)
+
+    ai = None
+    fits = 0
+    for k, start in enumerate(fold_starts):
+        if ai is None or k % retrain_every == 0:
+            train_end = split_idx + start
+            if retrain == 'full':
+                ai = _fit_fold(X, y, 0, train_end, model_params)
+            elif retrain == 'window':
+                ai = _fit_fold(X, y, max(0, train_end - window), train_end, model_params)
+            elif ai is None:
+                ai = _fit_fold(X, y, 0, train_end, model_params)
+            else:
+                ai = _fit_fold(X, y, max(0, train_end - window), train_end, model_params,
+                               base_model=ai, n_estimators=warm_trees)
+            fits += 1
+        # 해당 fold 구간을 한 번에 예측 (같은 모델이 다음 재학습 전까지 사용됨)
+        probs[start:bounds[k + 1]] = predict_proba_batch(ai, X[split_idx + start:split_idx + bounds[k + 1]])
+    return probs, fits
+
+
+def day_starts(dates):
+    """날짜 배열에서 각 날짜의 첫 행 위치를 반환합니다."""
+    dates = np.asarray(dates)
+    if len(dates) == 0:
+        return np.empty(0, dtype=int)
+    return np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
 
 
 # ══════════════════════════════════════════════════════════
 # AI 전략들
 # ══════════════════════════════════════════════════════════
 
-def strategy_ai_daily(df, buy_fee, sell_fee):
-    """전략 4: AI (XGBoost) 일봉 기반 — Walking Forward (매일 재학습)"""
-    features = ['종가', 'MA5', 'MA20', 'RSI', 'VOL', '거래량',
+class AIDaily(Strategy):
+    """전략 4: AI (XGBoost) 일봉 기반 — Walking Forward (매일 재학습, workers개 프로세스 병렬 학습)"""
+    name = "AI 일봉"
+    full_history = True
+    take_profit = 0.03
+    stop_loss = -0.02
+
+    FEATURES = ['종가', 'MA5', 'MA20', 'RSI', 'VOL', '거래량',
                 'BB_Upper', 'BB_Lower', 'Vol_Ratio', 'MACD', 'MACD_Sig']
+    BUY_THRESH = 0.60
+    SELL_THRESH = 0.40
 
-    lookahead = 5
-    profit_target = 0.03
-    target = pd.Series(0, index=df.index)
-    for i in range(len(df) - lookahead):
-        current_price = df['종가'].iloc[i]
-        future_highs = df['고가'].iloc[i + 1:i + 1 + lookahead]
-        max_profit = (future_highs / current_price - 1).max()
-        if max_profit >= profit_target:
-            target.iloc[i] = 1
-    df['target'] = target
-
-    split_idx = int(len(df) * 0.75)
-    test = df.iloc[split_idx:].copy()
-    test_len = len(test)
-
-    balance = 10000000
-    holdings = 0
-    bought_price = 0
-    trade_count = 0
-    win_count = 0
-    all_preds = []
-    all_targets = []
-
-    print(f"  AI 일봉 Walking Forward 시작 ({test_len}일, 매일 재학습)...")
-
-    for i in range(test_len):
-        # 매일 누적 데이터로 재학습 (main.py와 동일)
-        train_end = split_idx + i
-        train = df.iloc[:train_end]
-
-        pos = train['target'].sum()
-        neg = len(train) - pos
-        scale_w = neg / pos if pos > 0 else 1.0
-
-        ai = XGBClassifier(
-            n_jobs=-1, n_estimators=100, learning_rate=0.1, max_depth=5,
-            scale_pos_weight=scale_w, eval_metric='logloss', random_state=42,
-        )
-        ai.fit(train[features], train['target'], verbose=False)
-
-        # 당일 예측
-        row = test.iloc[i]
-        price = row['종가']
-        input_data = pd.DataFrame([row[features]], columns=features)
-        up_prob = ai.predict_proba(input_data)[0][1]
-        pred = 1 if up_prob >= 0.5 else 0
-        all_preds.append(pred)
-        all_targets.append(int(row['target']))
-
-        # 매매 로직
-        if holdings == 0:
-            if up_prob >= 0.60:
-                holdings = int(balance * 0.95 / (price * (1 + buy_fee)))
-                if holdings > 0:
-                    balance -= holdings * price * (1 + buy_fee)
-                    bought_price = price
-        elif holdings > 0:
-            profit_rate = (price - bought_price) / bought_price
-            if profit_rate >= 0.03 or profit_rate <= -0.02 or up_prob < 0.4:
-                balance += holdings * price * (1 - sell_fee)
-                trade_count += 1
-                if price > bought_price:
-                    win_count += 1
-                holdings = 0
-                bought_price = 0
-
-    if holdings > 0:
-        balance += holdings * test.iloc[-1]['종가'] * (1 - sell_fee)
-        trade_count += 1
-        if test.iloc[-1]['종가'] > bought_price:
-            win_count += 1
-
-    acc = accuracy_score(all_targets, all_preds)
-    print(f"  AI 일봉 정확도 (Walking Forward): {acc:.2%}")
-
-    return balance, trade_count, win_count, acc, test_len
-
-
-def strategy_ai_5min_scalp(df, buy_fee, sell_fee):
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.accuracy = None
+        self.test_len = 0
+
+    def signals(self, df):
+        lookahead = 5
+        profit_target = 0.03
+        target = np.asarray(label_forward_target(df['종가'], df['고가'], lookahead, profit_target))
+
+        split_idx = int(len(df) * 0.75)
+        self.test_len = len(df) - split_idx
+
+        print(f"  AI 일봉 Walking Forward 시작 ({self.test_len}일, 매일 재학습)...")
+
+        # 매일 누적 데이터로 재학습 (main.py와 동일) — 날짜별 학습은 서로 독립이므로 병렬 실행
+        probs, _ = walk_forward_probs(
+            to_feature_matrix(df, self.FEATURES), target, split_idx, np.arange(self.test_len),
+            DAILY_XGB_PARAMS, workers=self.workers)
+
+        self.accuracy = accuracy_score(target[split_idx:].astype(int), (probs >= 0.5).astype(int))
+        print(f"  AI 일봉 정확도 (Walking Forward): {self.accuracy:.2%}")
+
+        prices = df['종가'].to_numpy(dtype=float)[split_idx:]
+        return prices, probs >= self.BUY_THRESH, probs < self.SELL_THRESH
+
+
+class AIScalp(Strategy):
     """
     전략 5: AI (XGBoost) 5분봉 단타 + 트레일링 스탑
-    Walking Forward: 날짜가 바뀔 때마다 누적 데이터로 재학습
+    Walking Forward: 날짜가 바뀔 때마다 재학습 (retrain/retrain_every/window/workers는 walk_forward_probs 참고)
     """
-    features = [
+    name = "AI 5분봉 단타⚡"
+    full_history = True
+    # 전략 파라미터 (main.py와 동일)
+    position_ratio = 0.80
+    take_profit = 0.015
+    stop_loss = -0.012
+    trail_activate = 0.01
+    trail_stop = 0.005
+    exit_in_profit_only = True   # AI 반전 매도는 수익 중일 때만
+
+    FEATURES = [
         '종가', 'MA5', 'MA20', 'RSI',
         'BB_Pct', 'MACD', 'MACD_Hist',
         'StochRSI_K', 'StochRSI_D', 'ATR',
@@ -339,128 +391,371 @@ def strategy_ai_5min_scalp(df, buy_fee, sell_fee):
         'MA5_Dist', 'MA20_Dist', 'Intraday_Pos',
         'VOL', 'Vol_6', '거래량',
     ]
-    features = [f for f in features if f in df.columns]
+    BUY_THRESH = 0.65
+    SELL_THRESH = 0.40
 
-    # 시계열 분할 (75% 학습 / 25% 테스트)
-    split_idx = int(len(df) * 0.75)
-    test = df.iloc[split_idx:].copy()
-    test_len = len(test)
+    def __init__(self, retrain='full', retrain_every=1, window=None, workers=None):
+        self.retrain = retrain
+        self.retrain_every = retrain_every
+        self.window = window
+        self.workers = workers
+        self.accuracy = None
+        self.test_len = 0
 
-    # 날짜 컬럼 추출 (5분봉의 시간 컬럼에서 날짜만)
-    time_col = '시간' if '시간' in test.columns else test.columns[0]
-    test_dates = pd.to_datetime(test[time_col]).dt.date
+    def signals(self, df):
+        features = [f for f in self.FEATURES if f in df.columns]
+
+        # 시계열 분할 (75% 학습 / 25% 테스트)
+        split_idx = int(len(df) * 0.75)
+        test = df.iloc[split_idx:]
+        self.test_len = len(test)
+
+        # 날짜 컬럼 추출 (5분봉의 시간 컬럼에서 날짜만)
+        time_col = '시간' if '시간' in test.columns else test.columns[0]
+        test_dates = pd.to_datetime(test[time_col]).dt.date
+
+        starts = day_starts(test_dates.to_numpy())
+        mode_label = {'full': '누적 전체 재학습', 'warm': '이어서 학습',
+                      'window': f'최근 {self.window or split_idx}개 재학습'}[self.retrain]
+        print(f"  AI 5분봉 Walking Forward 시작 ({self.test_len}캔들, {len(starts)}일, "
+              f"{mode_label}, {self.retrain_every}일마다)...")
+
+        probs, _ = walk_forward_probs(
+            to_feature_matrix(df, features), df['target'].to_numpy(), split_idx, starts,
+            SCALP_XGB_PARAMS, retrain=self.retrain, retrain_every=self.retrain_every,
+            window=self.window, workers=self.workers)
+
+        self.accuracy = accuracy_score(test['target'].to_numpy().astype(int), (probs >= 0.5).astype(int))
+        print(f"  AI 5분봉 정확도 (Walking Forward): {self.accuracy:.2%}")
+
+        return test['종가'].to_numpy(dtype=float), probs >= self.BUY_THRESH, probs < self.SELL_THRESH
 
-    # 전략 파라미터 (main.py와 동일)
-    BUY_THRESH = 0.65
-    SELL_THRESH = 0.40
-    TAKE_PROFIT = 0.015
-    STOP_LOSS = -0.012
-    TRAIL_ACTIVATE = 0.01
-    TRAIL_STOP = 0.005
-
-    balance = 10000000
-    holdings = 0
-    bought_price = 0
-    highest_price = 0
-    trailing_active = False
-    trade_count = 0
-    win_count = 0
-    all_preds = []
-    all_targets = []
-
-    current_date = None
-    ai = None
-    unique_dates = test_dates.unique()
-    print(f"  AI 5분봉 Walking Forward 시작 ({test_len}캔들, {len(unique_dates)}일, 매일 재학습)...")
-
-    for i in range(test_len):
-        row_date = test_dates.iloc[i]
-
-        # 날짜가 바뀌면 재학습
-        if row_date != current_date:
-            train_end = split_idx + i
-            train = df.iloc[:train_end]
-
-            pos = train['target'].sum()
-            neg = len(train) - pos
-            scale_w = neg / pos if pos > 0 else 1.0
-
-            ai = XGBClassifier(
-                n_jobs=-1, n_estimators=300, learning_rate=0.05,
-                max_depth=6, min_child_weight=5,
-                subsample=0.8, colsample_bytree=0.8,
-                reg_alpha=0.1, reg_lambda=1.0,
-                scale_pos_weight=scale_w,
-                eval_metric='logloss', random_state=42,
-            )
-            ai.fit(train[features], train['target'], verbose=False)
-            current_date = row_date
-
-        # 당일 예측
-        row = test.iloc[i]
-        price = row['종가']
-        input_data = pd.DataFrame([row[features].values], columns=features)
-        up_prob = ai.predict_proba(input_data)[0][1]
-        pred = 1 if up_prob >= 0.5 else 0
-        all_preds.append(pred)
-        all_targets.append(int(row['target']))
-
-        if holdings == 0:
-            # 매수
-            if up_prob >= BUY_THRESH:
-                holdings = int(balance * 0.80 / (price * (1 + buy_fee)))
-                if holdings > 0:
-                    balance -= holdings * price * (1 + buy_fee)
-                    bought_price = price
-                    highest_price = price
-                    trailing_active = False
-
-        elif holdings > 0:
-            profit_rate = (price - bought_price) / bought_price
-            sell = False
-
-            # 익절
-            if profit_rate >= TAKE_PROFIT:
-                sell = True
-            # 손절
-            elif profit_rate <= STOP_LOSS:
-                sell = True
-            # 트레일링 스탑
-            elif trailing_active:
-                drop = (price - highest_price) / highest_price
-                if drop <= -TRAIL_STOP:
-                    sell = True
-            # AI 반전
-            elif up_prob < SELL_THRESH and profit_rate > 0:
-                sell = True
-
-            # 고점 갱신
-            if price > highest_price:
-                highest_price = price
-            if not trailing_active and profit_rate >= TRAIL_ACTIVATE:
-                trailing_active = True
-
-            if sell:
-                balance += holdings * price * (1 - sell_fee)
-                trade_count += 1
-                if price > bought_price:
-                    win_count += 1
-                holdings = 0
-                bought_price = 0
-                highest_price = 0
-                trailing_active = False
-
-    # 잔여 포지션 청산
-    if holdings > 0:
-        balance += holdings * test.iloc[-1]['종가'] * (1 - sell_fee)
-        trade_count += 1
-        if test.iloc[-1]['종가'] > bought_price:
-            win_count += 1
-
-    acc = accuracy_score(all_targets, all_preds)
-    print(f"  AI 5분봉 정확도 (Walking Forward): {acc:.2%}")
-
-    return balance, trade_count, win_count, acc, test_len
+
+def strategy_ai_daily(df, buy_fee, sell_fee, workers=None):
+    """Returns: (balance, trade_count, win_count, accuracy, test_len)"""
+    strategy = AIDaily(workers=workers)
+    _, balance, trades, wins = run_strategy(strategy, df, buy_fee, sell_fee)
+    return balance, trades, wins, strategy.accuracy, strategy.test_len
+
+
+def strategy_ai_5min_scalp(df, buy_fee, sell_fee, retrain='full', retrain_every=1, window=None,
+                           workers=None):
+    """Returns: (balance, trade_count, win_count, accuracy, test_len)"""
+    strategy = AIScalp(retrain=retrain, retrain_every=retrain_every, window=window, workers=workers)
+    _, balance, trades, wins = run_strategy(strategy, df, buy_fee, sell_fee)
+    return balance, trades, wins, strategy.accuracy, strategy.test_len
+
+
+def compare_retrain_modes(df, buy_fee, sell_fee, configs=None):
+    """
+    5분봉 AI의 재학습 방식별 실행 시간/정확도/수익률을 전체 재학습(full)과 비교합니다.
+    configs: [(이름, strategy_ai_5min_scalp 추가 인자 dict)]
+    """
+    configs = configs or [
+        ("full (매일 전체 재학습)", dict(retrain='full')),
+        ("warm (이어서 학습)", dict(retrain='warm')),
+        ("window (최근 구간)", dict(retrain='window')),
+        ("full, 3일마다", dict(retrain='full', retrain_every=3)),
+    ]
+    rows = []
+    for name, kwargs in configs:
+        t0 = time.time()
+        bal, tc, wc, acc, _ = strategy_ai_5min_scalp(df.copy(), buy_fee, sell_fee, **kwargs)
+        rows.append((name, time.time() - t0, acc, (bal / 10000000 - 1) * 100, tc))
+
+    base_time = rows[0][1]
+    print("\n" + "=" * 80)
+    print("⏱️ 재학습 방식 비교 (AI 5분봉)")
+    print("=" * 80)
+    print(f"{'방식':<24} {'시간':>8} {'속도':>6} {'정확도':>8} {'수익률':>9} {'거래':>5}")
+    print("-" * 80)
+    for name, elapsed, acc, ret, tc in rows:
+        print(f"{name:<24} {elapsed:7.1f}s {base_time / elapsed:5.1f}x {acc:8.2%} {ret:+8.2f}% {tc:>5}")
+    return rows
+
+
+# ══════════════════════════════════════════════════════════
+# 변동성 돌파 (main.py 실전 전략) — 1분봉 체결
+# ══════════════════════════════════════════════════════════
+
+# 실전 파라미터 (main.py와 동일)
+BREAKOUT_TICKER = "229200.KS"
+BREAKOUT_K_MIN = 0.3
+BREAKOUT_K_MAX = 0.6
+BREAKOUT_MAX_SLIPPAGE = 0.01
+BREAKOUT_POSITION_RATIO = 0.70
+BREAKOUT_FEE = 0.00004
+SESSION_MINUTES = 391               # 09:00 ~ 15:30 (1분 단위 칸)
+EXIT_MINUTE = 6 * 60 + 15           # 15:15 (09:00 기준 분) → 무조건 청산
+
+
+def dynamic_k(noise_ratio, k_min, k_max):
+    """main.calculate_dynamic_k의 벡터 버전 (노이즈 0.4~0.7 구간을 k_min~k_max로 선형 보간)"""
+    k = np.where(noise_ratio <= 0.4, k_min,
+                 np.where(noise_ratio >= 0.7, k_max,
+                          k_min + (noise_ratio - 0.4) / (0.7 - 0.4) * (k_max - k_min)))
+    return np.round(k, 2)
+
+
+def build_sessions(minute_df, daily_df):
+    """
+    1분봉을 [거래일 × 391분] 행렬로 펼치고 각 거래일의 전일 OHLC를 붙입니다.
+    빈 분은 NaN. 전일 일봉이 없거나 전일 변동폭이 0인 날(main.py는 매매 중단)은 제외합니다.
+
+    Returns: dict
+        dates, open/high/close (D×391), prev_open/prev_high/prev_low/prev_close (D)
+    """
+    times = pd.to_datetime(minute_df['시간'])
+    minute = (times.dt.hour * 60 + times.dt.minute - 9 * 60).to_numpy()
+    in_session = (minute >= 0) & (minute < SESSION_MINUTES)
+    times, minute = times[in_session], minute[in_session]
+    day_keys = times.dt.normalize().to_numpy()
+    dates, row = np.unique(day_keys, return_inverse=True)
+
+    shape = (len(dates), SESSION_MINUTES)
+    mats = {}
+    for key, col in (('open', '시가'), ('high', '고가'), ('close', '종가')):
+        mat = np.full(shape, np.nan)
+        mat[row, minute] = minute_df[col].to_numpy(dtype=float)[in_session]
+        mats[key] = mat
+
+    daily_dates = pd.to_datetime(daily_df['날짜']).dt.normalize().to_numpy()
+    prev = np.searchsorted(daily_dates, dates) - 1   # 각 거래일보다 앞선 마지막 일봉
+    valid = prev >= 0
+    prev = np.where(valid, prev, 0)
+    sessions = {'dates': dates, **mats}
+    for key, col in (('prev_open', '시가'), ('prev_high', '고가'), ('prev_low', '저가'), ('prev_close', '종가')):
+        sessions[key] = daily_df[col].to_numpy(dtype=float)[prev]
+    valid &= sessions['prev_high'] > sessions['prev_low']
+    valid &= np.isfinite(mats['open']).any(axis=1)
+    return {k: v[valid] for k, v in sessions.items()}
+
+
+def prepare_breakout_sessions(ticker=BREAKOUT_TICKER, days=365):
+    """로컬 시세 저장소의 1분봉/일봉으로 build_sessions (1분봉은 yfinance가 최근 7일만 주므로 저장소에 누적된 만큼)"""
+    minute_df = load_bars(ticker, '1m', days)
+    daily_df = load_bars(ticker, '1d', days + 30)
+    if len(minute_df) == 0 or len(daily_df) == 0:
+        return None
+    return build_sessions(minute_df, daily_df)
+
+
+def simulate_breakout_grid(sessions, k_min, k_max, buy_fee=BREAKOUT_FEE, sell_fee=BREAKOUT_FEE,
+                           position_ratio=BREAKOUT_POSITION_RATIO, max_slippage=BREAKOUT_MAX_SLIPPAGE,
+                           exit_minute=EXIT_MINUTE, initial_balance=10000000):
+    """
+    K_MIN/K_MAX 조합(같은 길이 배열)별 변동성 돌파 매매를 한 번에 시뮬레이션합니다.
+
+    하루 흐름 (main.run_bot과 동일):
+      목표가 = 당일 시가 + 전일 변동폭 × 동적 K
+      15:15 전 첫 번째로 고가 ≥ 목표가인 1분봉에서 체결 (갭 상승이면 그 분봉 시가, 아니면 목표가)
+      체결가가 목표가 대비 max_slippage 초과 → 당일 매매 포기
+      15:15 첫 분봉 시가로 청산 (15:15 이후 분봉이 없으면 당일 마지막 종가)
+
+    첫 돌파 위치는 분봉 고가의 누적 최대값에 searchsorted → 날짜 루프 안에서 모든 조합을 동시에 처리합니다.
+    Returns: dict (Return %, Trades, WinRate %, Skipped=슬리피지 포기 일수)
+    """
+    k_min = np.asarray(k_min, dtype=float)
+    k_max = np.asarray(k_max, dtype=float)
+    n_combo = len(k_min)
+
+    opens, highs, closes = sessions['open'], sessions['high'], sessions['close']
+    day_range = sessions['prev_high'] - sessions['prev_low']
+    noise = 1 - np.abs(sessions['prev_open'] - sessions['prev_close']) / day_range
+    k = dynamic_k(noise[:, None], k_min[None, :], k_max[None, :])       # D × C
+
+    # 당일 시가 = 첫 분봉 시가
+    first = np.argmax(np.isfinite(opens), axis=1)
+    day_open = opens[np.arange(len(opens)), first]
+    targets = day_open[:, None] + day_range[:, None] * k                  # D × C
+
+    # 청산가: 15:15 이후 첫 분봉 시가, 없으면 당일 마지막 종가
+    after = np.isfinite(opens[:, exit_minute:])
+    last_close = closes[np.arange(len(closes)), SESSION_MINUTES - 1 - np.argmax(np.isfinite(closes[:, ::-1]), axis=1)]
+    exit_open = opens[np.arange(len(opens)), exit_minute + np.argmax(after, axis=1)]
+    exit_prices = np.where(after.any(axis=1), exit_open, last_close)
+
+    # 15:15 전 고가 누적 최대값 (빈 분은 -inf)
+    cum_high = np.fmax.accumulate(np.where(np.isfinite(highs[:, :exit_minute]), highs[:, :exit_minute], -np.inf), axis=1)
+
+    balance = np.full(n_combo, float(initial_balance))
+    trades = np.zeros(n_combo, dtype=np.int64)
+    wins = np.zeros(n_combo, dtype=np.int64)
+    skipped = np.zeros(n_combo, dtype=np.int64)
+    for d in range(len(opens)):
+        target = targets[d]
+        hit = np.searchsorted(cum_high[d], target, side='left')          # 첫 돌파 분 (없으면 exit_minute)
+        crossed = hit < exit_minute
+        minute = np.minimum(hit, exit_minute - 1)
+        fill = np.maximum(opens[d, minute], target)
+        slip = crossed & ((fill - target) / target > max_slippage)
+        skipped += slip
+        qty = np.floor(balance * position_ratio / fill)
+        buy = crossed & ~slip & (qty > 0)
+        qty = np.where(buy, qty, 0)
+        pnl = qty * exit_prices[d] * (1 - sell_fee) - qty * fill * (1 + buy_fee)
+        balance += pnl
+        trades += buy
+        wins += buy & (pnl > 0)
+
+    return {
+        'Return': (balance / initial_balance - 1) * 100,
+        'Trades': trades,
+        'WinRate': np.where(trades > 0, wins / np.maximum(trades, 1) * 100, 0.0),
+        'Skipped': skipped,
+    }
+
+
+def run_breakout_backtest(ticker=BREAKOUT_TICKER, days=365, k_mins=None, k_maxs=None, top=15):
+    """K_MIN × K_MAX 그리드로 변동성 돌파 전략을 검증하고 상위 조합을 출력합니다."""
+    k_mins = k_mins if k_mins is not None else np.round(np.arange(0.1, 0.61, 0.05), 2)
+    k_maxs = k_maxs if k_maxs is not None else np.round(np.arange(0.3, 1.01, 0.05), 2)
+    grid = [(lo, hi) for lo in k_mins for hi in k_maxs if lo <= hi]
+    if (BREAKOUT_K_MIN, BREAKOUT_K_MAX) not in grid:
+        grid.append((BREAKOUT_K_MIN, BREAKOUT_K_MAX))
+
+    print(f"📥 {ticker} 1분봉/일봉 로드 중...")
+    sessions = prepare_breakout_sessions(ticker, days)
+    if sessions is None or len(sessions['dates']) == 0:
+        print("   ⚠️ 1분봉 데이터 없음 — 저장소에 1분봉이 쌓인 뒤 다시 실행하세요.")
+        return None
+    dates = sessions['dates']
+    print(f"   {len(dates)}거래일 ({pd.Timestamp(dates[0]).date()} ~ {pd.Timestamp(dates[-1]).date()}), "
+          f"{len(grid)}개 K 조합")
+
+    t0 = time.time()
+    metrics = simulate_breakout_grid(sessions, [g[0] for g in grid], [g[1] for g in grid])
+    elapsed = time.time() - t0
+
+    result = pd.DataFrame({'K_MIN': [g[0] for g in grid], 'K_MAX': [g[1] for g in grid], **metrics})
+    result = result.sort_values('Return', ascending=False).reset_index(drop=True)
+    live = result[(result['K_MIN'] == BREAKOUT_K_MIN) & (result['K_MAX'] == BREAKOUT_K_MAX)].iloc[0]
+
+    print("\n" + "=" * 80)
+    print(f"📋 변동성 돌파 K 그리드 (상위 {top}개, {elapsed:.2f}초)")
+    print("=" * 80)
+    print(result.head(top).to_string(float_format=lambda v: f"{v:.2f}"))
+    print(f"\n  실전 설정 K={BREAKOUT_K_MIN}~{BREAKOUT_K_MAX}: {live['Return']:+.2f}% "
+          f"({int(live['Trades'])}회, 승률 {live['WinRate']:.0f}%, 슬리피지 포기 {int(live['Skipped'])}일)")
+    return result
+
+
+# ══════════════════════════════════════════════════════════
+# 멀티 종목 포트폴리오 백테스트
+# ══════════════════════════════════════════════════════════
+
+# 비교용 KRX ETF 기본 목록 (--portfolio 뒤에 종목을 직접 넘기면 대체)
+PORTFOLIO_TICKERS = [
+    "229200.KS",  # KODEX 코스닥150 (실전 봇 종목)
+    "233740.KS",  # KODEX 코스닥150레버리지
+    "251340.KS",  # KODEX 코스닥150선물인버스
+    "069500.KS",  # KODEX 200
+    "122630.KS",  # KODEX 레버리지
+    "114800.KS",  # KODEX 인버스
+    "252670.KS",  # KODEX 200선물인버스2X
+    "102110.KS",  # TIGER 200
+    "091160.KS",  # KODEX 반도체
+    "305720.KS",  # KODEX 2차전지산업
+]
+
+
+def default_portfolio_strategies(include_ai=False):
+    """포트폴리오 모드 기본 전략 (AI 일봉은 종목마다 매일 재학습하므로 선택)"""
+    strategies = [MACrossover(), RSISwing(), TrendFollow()]
+    if include_ai:
+        strategies.append(AIDaily(workers=1))  # 종목 단위로 이미 병렬이므로 내부 학습은 순차
+    return strategies
+
+
+def _backtest_ticker(ticker, strategies, buy_fee, sell_fee, days):
+    """
+    한 종목의 일봉을 로컬 시세 저장소에서 읽어 모든 전략을 실행합니다. (워커 1개가 한 번에 한 종목만 적재)
+    Returns: (ticker, [결과 dict] 또는 None, 오류 메시지 또는 None)
+    """
+    try:
+        df = prepare_daily_data(ticker, days)
+    except Exception as e:
+        return ticker, None, str(e)
+    if len(df) < 40:
+        return ticker, None, f"일봉 {len(df)}개 (데이터 부족)"
+
+    test = df.iloc[int(len(df) * 0.75):]
+    buy_hold = (test['종가'].iloc[-1] / test['종가'].iloc[0] - 1) * 100
+    rows = []
+    for strategy in strategies:
+        r = run_strategy(strategy, df if strategy.full_history else test, buy_fee, sell_fee)
+        rows.append({'Ticker': ticker, 'Strategy': r.name, 'Return': r.return_pct,
+                     'Trades': r.trades, 'Wins': r.wins, 'BuyHold': buy_hold})
+    return ticker, rows, None
+
+
+def run_portfolio_backtest(tickers=None, strategies=None, buy_fee=0.000146, sell_fee=0.000146,
+                           days=365, workers=None):
+    """
+    여러 종목 × 여러 전략 백테스트. 종목 단위로 workers개 프로세스에 나눠 실행합니다.
+
+    Returns:
+        (per_ticker, portfolio)
+        per_ticker: 종목×전략별 Return/Trades/Wins/BuyHold
+        portfolio : 전략별 동일 비중 평균/중앙 수익률, 총 거래, 승률, Buy&Hold 초과 종목 비율
+    """
+    tickers = tickers or PORTFOLIO_TICKERS
+    strategies = strategies or default_portfolio_strategies()
+    workers = min(workers or os.cpu_count() or 1, len(tickers))
+
+    rows = []
+    failed = []
+
+    def _collect(ticker, ticker_rows, error):
+        if ticker_rows is None:
+            failed.append(ticker)
+            print(f"  ⚠️ {ticker}: {error}")
+        else:
+            rows.extend(ticker_rows)
+            print(f"  ✅ {ticker} 완료 ({len(rows) // len(strategies)}/{len(tickers)})")
+
+    print(f"📊 포트폴리오 백테스트: {len(tickers)}종목 × {len(strategies)}전략 ({workers}개 프로세스)")
+    if workers == 1:
+        for ticker in tickers:
+            _collect(*_backtest_ticker(ticker, strategies, buy_fee, sell_fee, days))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_backtest_ticker, t, strategies, buy_fee, sell_fee, days) for t in tickers]
+            for future in as_completed(futures):
+                _collect(*future.result())
+
+    per_ticker = pd.DataFrame(rows, columns=['Ticker', 'Strategy', 'Return', 'Trades', 'Wins', 'BuyHold'])
+    if per_ticker.empty:
+        return per_ticker, pd.DataFrame()
+    per_ticker = per_ticker.sort_values(['Ticker', 'Strategy']).reset_index(drop=True)
+
+    order = [s.name for s in strategies]
+    per_ticker['Excess'] = per_ticker['Return'] - per_ticker['BuyHold']
+    grouped = per_ticker.groupby('Strategy', sort=False)
+    portfolio = pd.DataFrame({
+        'Tickers': grouped['Ticker'].count(),
+        'MeanReturn': grouped['Return'].mean(),
+        'MedianReturn': grouped['Return'].median(),
+        'Trades': grouped['Trades'].sum(),
+        'WinRate': grouped['Wins'].sum() / grouped['Trades'].sum().replace(0, np.nan) * 100,
+        'BeatBuyHold': grouped['Excess'].apply(lambda x: (x > 0).mean() * 100),
+    }).reindex(order)
+    buy_hold = per_ticker.drop_duplicates('Ticker')['BuyHold']
+    portfolio.loc['Buy&Hold'] = [len(buy_hold), buy_hold.mean(), buy_hold.median(), 0, np.nan, np.nan]
+    portfolio = portfolio.astype({'Tickers': int, 'Trades': int}).sort_values('MeanReturn', ascending=False)
+
+    print("\n" + "=" * 80)
+    print(f"📋 종목별 결과 (수익률 %, 실패 {len(failed)}종목)")
+    print("=" * 80)
+    table = per_ticker.pivot(index='Ticker', columns='Strategy', values='Return')[order]
+    table['Buy&Hold'] = per_ticker.drop_duplicates('Ticker').set_index('Ticker')['BuyHold']
+    print(table.to_string(float_format=lambda v: f"{v:+.2f}"))
+
+    print("\n" + "=" * 80)
+    print("🏆 포트폴리오 결과 (종목 동일 비중)")
+    print("=" * 80)
+    print(portfolio.to_string(float_format=lambda v: f"{v:.2f}"))
+    return per_ticker, portfolio
 
 
 # ══════════════════════════════════════════════════════════
@@ -515,24 +810,15 @@ def run_backtest():
     print("🏁 전략 실행 중 (ETF 수수료: 매수 0.0146% + 매도 0.0146%)...")
     print("=" * 80)
 
-    bal1, tc1, wc1 = strategy_ma_crossover(test_daily.copy(), buy_fee, sell_fee)
-    ret1 = (bal1 / 10000000 - 1) * 100
-
-    bal2, tc2, wc2 = strategy_rsi_swing(test_daily.copy(), buy_fee, sell_fee)
-    ret2 = (bal2 / 10000000 - 1) * 100
-
-    bal3, tc3, wc3 = strategy_trend_follow(test_daily.copy(), buy_fee, sell_fee)
-    ret3 = (bal3 / 10000000 - 1) * 100
+    results = [run_strategy(strategy, test_daily, buy_fee, sell_fee)
+               for strategy in (MACrossover(), RSISwing(), TrendFollow())]
 
     print(f"  AI 일봉 학습 중...")
-    bal4, tc4, wc4, _, _ = strategy_ai_daily(df_daily.copy(), buy_fee, sell_fee)
-    ret4 = (bal4 / 10000000 - 1) * 100
+    results.append(run_strategy(AIDaily(), df_daily, buy_fee, sell_fee))
 
-    ret5, tc5, wc5 = 0, 0, 0
     if has_5min:
         print(f"  AI 5분봉 학습 중...")
-        bal5, tc5, wc5, _, _ = strategy_ai_5min_scalp(df_5min.copy(), buy_fee, sell_fee)
-        ret5 = (bal5 / 10000000 - 1) * 100
+        results.append(run_strategy(AIScalp(), df_5min, buy_fee, sell_fee))
 
     # ══════════════════════════════════════════════════════════
     # 결과 출력
@@ -541,21 +827,12 @@ def run_backtest():
     print("📋 전략별 결과 (ETF 수수료: 왕복 0.0292%)")
     print("=" * 80)
 
-    strategies = [
-        ("MA 크로스오버", ret1, tc1, wc1),
-        ("RSI 스윙", ret2, tc2, wc2),
-        ("트렌드 추종(기존)", ret3, tc3, wc3),
-        ("AI 일봉", ret4, tc4, wc4),
-    ]
-    if has_5min:
-        strategies.append(("AI 5분봉 단타⚡", ret5, tc5, wc5))
-
     print(f"{'전략':<22} {'수익률':<12} {'거래횟수':<10} {'승률':<8}")
     print("-" * 60)
 
-    for name, ret, tc, wc in strategies:
-        wr = f"{wc/tc*100:.0f}%" if tc > 0 else "N/A"
-        print(f"{name:<22} {ret:+6.2f}%      {tc}회        {wr:>4}")
+    for r in results:
+        wr = f"{r.win_rate:.0f}%" if r.trades > 0 else "N/A"
+        print(f"{r.name:<22} {r.return_pct:+6.2f}%      {r.trades}회        {wr:>4}")
 
     # Buy & Hold
     print(f"{'─' * 60}")
@@ -564,15 +841,9 @@ def run_backtest():
         print(f"{'Buy&Hold (5분봉)':<22} {buy_hold_5min:+6.2f}%      0회        N/A")
 
     # ── 종합 순위 ──
-    results_all = [
-        ("MA 크로스오버", ret1, tc1),
-        ("RSI 스윙", ret2, tc2),
-        ("트렌드 추종(기존)", ret3, tc3),
-        ("AI 일봉", ret4, tc4),
-        ("Buy&Hold(일봉)", buy_hold_daily, 0),
-    ]
+    results_all = [(r.name, r.return_pct, r.trades) for r in results]
+    results_all.append(("Buy&Hold(일봉)", buy_hold_daily, 0))
     if has_5min:
-        results_all.append(("AI 5분봉 단타⚡", ret5, tc5))
         results_all.append(("Buy&Hold(5분봉)", buy_hold_5min, 0))
     results_all.sort(key=lambda x: x[1], reverse=True)
 
@@ -587,4 +858,15 @@ def run_backtest():
 
 
 if __name__ == "__main__":
-    run_backtest()
+    if "--portfolio" in sys.argv:
+        args = sys.argv[sys.argv.index("--portfolio") + 1:]
+        tickers = [a for a in args if not a.startswith("--")] or None
+        run_portfolio_backtest(tickers, default_portfolio_strategies(include_ai="--ai" in sys.argv))
+    elif "--breakout" in sys.argv:
+        run_breakout_backtest()
+    elif "--compare-retrain" in sys.argv:
+        df = prepare_5min_data("233740.KS")
+        if df is not None:
+            compare_retrain_modes(df, 0.000146, 0.000146)
+    else:
+        run_backtest()
@@ -0,0 +1,348 @@
+# bar_store.py
+# 로컬 OHLCV 저장소 (종목/주기별 · 날짜 파티션 · 메모리맵 NumPy)
+# ──────────────────────────────────────────────────────────
+# 봇 시작/백테스트마다 yfinance로 같은 과거 데이터를 다시 받던 것을
+# 로컬 파일로 대체합니다. 동기화(sync)는 저장된 구간 밖의 날짜만 받아서
+# 파티션에 덧붙이고, 읽기(load)는 np.load(mmap_mode='r')로 바로 읽습니다.
+#
+# 디렉터리 구조:
+#   market_data/<티커>/<주기>/meta.json       (타임존)
+#   market_data/<티커>/<주기>/2024-05-02.npy  (분봉: 일 단위 파티션)
+#   market_data/<티커>/1d/2024-05.npy         (일봉: 월 단위 파티션)
+#
+# source: (ticker, interval, start, end) → yfinance 형식 DataFrame 을 돌려주는 함수.
+#         기본값은 yfinance_source. 테스트/오프라인에서는 FrameSource 등으로 대체합니다.
+#
+# 여러 봇이 동시에 시작해도 안전하도록 sync는 <주기 디렉터리>/.lock 을 잡고(token_cache와 같은
+# 파일 잠금) 파일은 프로세스별 임시 파일에 쓴 뒤 os.replace로 교체합니다. 저장에 실패하면
+# 받은 데이터를 메모리에 두고 load에 합쳐서 돌려줍니다. (봇은 네트워크 데이터로 계속 진행)
+# ──────────────────────────────────────────────────────────
+import os
+import json
+import uuid
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from token_cache import file_lock
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_data")
+
+BAR_DTYPE = np.dtype([
+    ('time', '<i8'),      # epoch ns (UTC)
+    ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+    ('close', '<f8'), ('volume', '<f8'),
+])
+
+# yfinance 분봉 조회 가능 기간 (일)
+MAX_LOOKBACK_DAYS = {'1m': 7, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '60m': 729, '1h': 729}
+
+KOREAN_COLUMNS = {'open': '시가', 'high': '고가', 'low': '저가', 'close': '종가', 'volume': '거래량'}
+
+
+def is_daily(interval):
+    return interval.endswith('d') or interval.endswith('wk') or interval.endswith('mo')
+
+
+# ══════════════════════════════════════════════════════════
+# 데이터 소스
+# ══════════════════════════════════════════════════════════
+
+def yfinance_source(ticker, interval, start, end, timeout=10):
+    """yfinance에서 [start, end) 구간 캔들을 받습니다."""
+    import yfinance as yf
+    return yf.download(ticker, start=start, end=end, interval=interval,
+                       timeout=timeout, progress=False)
+
+
+class FrameSource:
+    """메모리의 DataFrame으로 yfinance를 대신하는 로컬 데이터 소스 (오프라인/백테스트용)
+
+    frames: {(ticker, interval): yfinance 형식 DataFrame (DatetimeIndex + Open/High/Low/Close/Volume)}
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = []
+
+    def __call__(self, ticker, interval, start, end):
+        self.calls.append((ticker, interval, start, end))
+        df = self.frames.get((ticker, interval))
+        if df is None or len(df) == 0:
+            return pd.DataFrame()
+        index = df.index
+        local = index.tz_localize(None) if index.tz is not None else index
+        mask = (local >= pd.Timestamp(start)) & (local < pd.Timestamp(end))
+        return df[mask]
+
+
+def _normalize(raw):
+    """yfinance 형식 DataFrame → (BAR_DTYPE 배열, 타임존 문자열)"""
+    if raw is None or len(raw) == 0:
+        return np.empty(0, dtype=BAR_DTYPE), None
+    df = raw
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    index = pd.DatetimeIndex(df.index)
+    tz = str(index.tz) if index.tz is not None else ''
+    times = index.tz_convert('UTC').tz_localize(None) if index.tz is not None else index
+
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars['time'] = times.values.astype('datetime64[ns]').view('i8')
+    for field, col in (('open', 'Open'), ('high', 'High'), ('low', 'Low'),
+                       ('close', 'Close'), ('volume', 'Volume')):
+        bars[field] = df[col].to_numpy(dtype=float)
+    bars = bars[~np.isnan(bars['close'])]
+    return bars, tz
+
+
+def _tmp_path(path):
+    """동시에 쓰는 다른 프로세스/스레드와 겹치지 않는 임시 파일 경로"""
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+# ══════════════════════════════════════════════════════════
+# 저장소
+# ══════════════════════════════════════════════════════════
+
+class BarStore:
+    def __init__(self, root=DEFAULT_ROOT, source=None, offline=False):
+        """
+        Args:
+            root: 저장 디렉터리
+            source: 누락 구간을 받을 데이터 소스 (기본 yfinance_source)
+            offline: True면 sync가 네트워크 없이 로컬 데이터만 사용
+        """
+        self.root = root
+        self.source = source or yfinance_source
+        self.offline = offline
+        self._unsaved = {}  # {(ticker, interval): (tz, [캔들 배열])} 저장 실패 시 받은 데이터
+
+    # ── 경로/메타 ──
+
+    def _dir(self, ticker, interval):
+        return os.path.join(self.root, ticker.replace('/', '_'), interval)
+
+    def _meta(self, ticker, interval):
+        meta_file = os.path.join(self._dir(ticker, interval), 'meta.json')
+        if not os.path.exists(meta_file):
+            return {}
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, ticker, interval, **updates):
+        meta = self._meta(ticker, interval)
+        meta.update(updates)
+        os.makedirs(self._dir(ticker, interval), exist_ok=True)
+        path = os.path.join(self._dir(ticker, interval), 'meta.json')
+        tmp = _tmp_path(path)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def _tz(self, ticker, interval):
+        return self._meta(ticker, interval).get('tz', '')
+
+    def partitions(self, ticker, interval):
+        """저장된 파티션 키 목록 (오름차순)"""
+        path = self._dir(ticker, interval)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name[:-4] for name in os.listdir(path) if name.endswith('.npy'))
+
+    def _partition_keys(self, bars, tz, interval):
+        """각 캔들이 속할 파티션 키 (거래소 현지 날짜 기준)"""
+        times = pd.DatetimeIndex(np.asarray(bars['time']).view('datetime64[ns]'))
+        if tz:
+            times = times.tz_localize('UTC').tz_convert(tz)
+        fmt = '%Y-%m' if is_daily(interval) else '%Y-%m-%d'
+        return np.asarray(times.strftime(fmt))
+
+    def _read_partition(self, ticker, interval, key):
+        return np.load(os.path.join(self._dir(ticker, interval), f"{key}.npy"), mmap_mode='r')
+
+    def _write_partition(self, ticker, interval, key, bars):
+        """파티션을 기존 데이터와 병합해 저장합니다. (시간 중복 시 새 데이터 우선)"""
+        path = os.path.join(self._dir(ticker, interval), f"{key}.npy")
+        if os.path.exists(path):
+            old = np.load(path)
+            old = old[~np.isin(old['time'], bars['time'])]
+            bars = np.concatenate([old, bars])
+        bars = np.sort(bars, order='time')
+        tmp = _tmp_path(path)
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, bars)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def write(self, ticker, interval, raw):
+        """yfinance 형식 DataFrame을 파티션별로 저장합니다. (sync가 잠금을 잡고 호출) Returns: 저장한 캔들 수"""
+        bars, tz = _normalize(raw)
+        if len(bars) == 0:
+            return 0
+        if 'tz' not in self._meta(ticker, interval):
+            self._write_meta(ticker, interval, tz=tz)
+        tz = self._tz(ticker, interval)
+
+        keys = self._partition_keys(bars, tz, interval)
+        for key in np.unique(keys):
+            self._write_partition(ticker, interval, key, bars[keys == key])
+        return len(bars)
+
+    def _keep_unsaved(self, ticker, interval, raw, error):
+        """저장 실패: 받은 데이터를 메모리에 두고 load 결과에 합칩니다."""
+        print(f"⚠️ {ticker} {interval} 로컬 저장 실패, 받은 데이터만 사용합니다: {error}")
+        bars, tz = _normalize(raw)
+        if len(bars) == 0:
+            return 0
+        entry = self._unsaved.setdefault((ticker, interval), (tz, []))
+        entry[1].append(bars)
+        return len(bars)
+
+    # ── 동기화 ──
+
+    def _stored_range(self, ticker, interval):
+        """저장된 첫/마지막 캔들의 현지 날짜 (없으면 None, None)"""
+        parts = self.partitions(ticker, interval)
+        if not parts:
+            return None, None
+        tz = self._tz(ticker, interval)
+        first = self._read_partition(ticker, interval, parts[0])['time']
+        last = self._read_partition(ticker, interval, parts[-1])['time']
+        if len(first) == 0 or len(last) == 0:
+            return None, None
+        bounds = pd.DatetimeIndex(np.array([first[0], last[-1]]).view('datetime64[ns]'))
+        if tz:
+            bounds = bounds.tz_localize('UTC').tz_convert(tz)
+        return bounds[0].date(), bounds[1].date()
+
+    def sync(self, ticker, interval, days, today=None):
+        """최근 days일 구간 중 로컬에 없는 날짜만 받아 저장합니다.
+
+        - 저장된 마지막 날짜는 장중 미완성일 수 있으므로 다시 받습니다.
+        - 과거 방향으로 비어 있는 구간(처음 저장 이후 days를 늘린 경우)도 채웁니다.
+        Returns: 새로 받은 캔들 수
+        """
+        if self.offline:
+            return 0
+        with ExitStack() as stack:
+            try:
+                os.makedirs(self._dir(ticker, interval), exist_ok=True)
+                stack.enter_context(file_lock(os.path.join(self._dir(ticker, interval), '.lock')))
+                writable = True
+            except OSError as e:  # 읽기 전용 디렉터리 등
+                print(f"⚠️ {ticker} {interval} 로컬 저장소 잠금 실패: {e}")
+                writable = False
+            return self._sync(ticker, interval, days, today, writable)
+
+    def _sync(self, ticker, interval, days, today, writable):
+        today = today or date.today()
+        lookback = min(days, MAX_LOOKBACK_DAYS.get(interval, days))
+        wanted_start = today - timedelta(days=lookback)
+        end = today + timedelta(days=1)
+
+        # covered_from: 이미 요청한 적 있는 가장 이른 날짜 (주말/휴장일 구간 재요청 방지)
+        first, last = self._stored_range(ticker, interval)
+        covered_from = self._meta(ticker, interval).get('covered_from')
+        covered_from = date.fromisoformat(covered_from) if covered_from else first
+        ranges = []
+        if first is None:
+            ranges.append((wanted_start, end))
+        else:
+            if wanted_start < covered_from:
+                ranges.append((wanted_start, first))
+            ranges.append((max(last, wanted_start), end))
+
+        fetched = 0
+        for start, stop in ranges:
+            if start >= stop:
+                continue
+            try:
+                raw = self.source(ticker, interval, start, stop)
+            except Exception as e:
+                print(f"⚠️ {ticker} {interval} 데이터 수신 실패 ({start}~{stop}): {e}")
+                continue
+            if not writable:
+                fetched += self._keep_unsaved(ticker, interval, raw, "잠금 없음")
+                continue
+            try:
+                fetched += self.write(ticker, interval, raw)
+                if start == wanted_start and (covered_from is None or start < covered_from):
+                    self._write_meta(ticker, interval, covered_from=start.isoformat())
+            except (OSError, ValueError) as e:
+                fetched += self._keep_unsaved(ticker, interval, raw, e)
+        return fetched
+
+    # ── 읽기 ──
+
+    def load(self, ticker, interval, start=None, end=None, last_partitions=None):
+        """로컬 캔들을 DataFrame으로 읽습니다.
+
+        start/end: 현지 날짜 기준 [start, end) (date 또는 'YYYY-MM-DD')
+        last_partitions: 마지막 N개 파티션만 읽기 (예: 1 → 가장 최근 거래일)
+        Returns: 시간(일봉은 날짜), 시가, 고가, 저가, 종가, 거래량 컬럼 DataFrame
+        """
+        time_col = '날짜' if is_daily(interval) else '시간'
+        parts = self.partitions(ticker, interval)
+        if start is not None or end is not None:
+            width = 7 if is_daily(interval) else 10
+            lo = str(start)[:width] if start is not None else ''
+            hi = str(end)[:width] if end is not None else '9999'
+            parts = [p for p in parts if lo <= p <= hi]
+        if last_partitions:
+            parts = parts[-last_partitions:]
+
+        arrays = [self._read_partition(ticker, interval, p) for p in parts]
+        bars = np.concatenate(arrays) if arrays else np.empty(0, dtype=BAR_DTYPE)
+        tz = self._tz(ticker, interval)
+        if (ticker, interval) in self._unsaved:
+            unsaved_tz, pending = self._unsaved[(ticker, interval)]
+            tz = tz or unsaved_tz
+            fresh = np.concatenate(pending)
+            bars = np.sort(np.concatenate([bars[~np.isin(bars['time'], fresh['time'])], fresh]), order='time')
+            if last_partitions:
+                keys = self._partition_keys(bars, tz, interval)
+                bars = bars[np.isin(keys, np.unique(keys)[-last_partitions:])]
+
+        times = pd.DatetimeIndex(np.asarray(bars['time']).view('datetime64[ns]'))
+        if tz:
+            times = times.tz_localize('UTC').tz_convert(tz)
+        df = pd.DataFrame({time_col: times})
+        for field, col in KOREAN_COLUMNS.items():
+            df[col] = bars[field]
+
+        local = times.tz_localize(None) if tz else times
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= local >= pd.Timestamp(start)
+        if end is not None:
+            mask &= local < pd.Timestamp(end)
+        return df[mask].reset_index(drop=True)
+
+
+# ══════════════════════════════════════════════════════════
+# 기본 저장소
+# ══════════════════════════════════════════════════════════
+
+DEFAULT_STORE = BarStore(offline=os.getenv("BAR_STORE_OFFLINE", "") == "1")
+
+
+def load_bars(ticker, interval, days, store=None):
+    """최근 days일 캔들을 동기화 후 로컬에서 읽습니다."""
+    store = store or DEFAULT_STORE
+    store.sync(ticker, interval, days)
+    start = date.today() - timedelta(days=days)
+    return store.load(ticker, interval, start=start)
+
+
+def load_latest_session(ticker, interval, store=None):
+    """가장 최근 거래일 캔들만 동기화 후 읽습니다. (yfinance period='1d'와 동일)"""
+    store = store or DEFAULT_STORE
+    store.sync(ticker, interval, 1)
+    return store.load(ticker, interval, last_partitions=1)
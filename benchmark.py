@@ -0,0 +1,978 @@
+# benchmark.py
+# 성능 개선 검증용 벤치마크 (기존 구현과 결과 동일성 + 속도 비교)
+# ──────────────────────────────────────────────────────────
+# 실행: python benchmark.py
+# 합성 데이터(랜덤워크)로 측정하므로 네트워크/API 키 없이 동작합니다.
+# ──────────────────────────────────────────────────────────
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import backtester
+import broker
+from backtest_engine import execute
+import data_manager
+from data_manager import label_forward_target
+from optimizer import build_grid, run_grid_search, simulate_grid, simulate_trades
+import replay
+from streaming_indicators import IndicatorState
+
+
+# ══════════════════════════════════════════════════════════
+# 합성 데이터
+# ══════════════════════════════════════════════════════════
+
+def make_synthetic_bars(n, seed=42, start_price=10000.0, sigma=0.002):
+    """랜덤워크 기반 5분봉 OHLCV 데이터를 생성합니다. (sigma: 캔들당 변동성)"""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, sigma, n)))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0, sigma, n)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.integers(1000, 100000, n).astype(float)
+    index = 1000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    return pd.DataFrame({
+        '시간': pd.date_range('2024-01-02 09:00', periods=n, freq='5min'),
+        '시가': open_, '고가': high, '저가': low, '종가': close,
+        '거래량': volume, 'KOSDAQ_Index': index,
+    })
+
+
+def _timeit(fn, repeat=1):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+# ══════════════════════════════════════════════════════════
+# 1. 타겟 라벨링 (루프 vs 벡터화)
+# ══════════════════════════════════════════════════════════
+
+def _label_loop(df, lookahead, profit_target):
+    """기존 add_indicators의 for 루프 라벨링 (비교 기준)"""
+    target = pd.Series(0, index=df.index)
+    for i in range(len(df) - lookahead):
+        current_price = df['종가'].iloc[i]
+        future_highs = df['고가'].iloc[i + 1:i + 1 + lookahead]
+        if len(future_highs) > 0:
+            max_profit = (future_highs / current_price - 1).max()
+            if max_profit >= profit_target:
+                target.iloc[i] = 1
+    return target.to_numpy()
+
+
+def _label_daily_loop(df, lookahead, profit_target):
+    """기존 add_daily_indicators의 for 루프 라벨링 (다음날 시가 진입)"""
+    target = pd.Series(0, index=df.index)
+    for i in range(len(df) - lookahead - 1):
+        entry_price = df['시가'].iloc[i + 1]
+        if entry_price <= 0:
+            continue
+        future_highs = df['고가'].iloc[i + 1:i + 1 + lookahead]
+        max_profit = (future_highs / entry_price - 1).max()
+        if max_profit >= profit_target:
+            target.iloc[i] = 1
+    return target.to_numpy()
+
+
+def bench_labels(n=100_000):
+    print(f"\n[타겟 라벨링] {n:,}개 캔들")
+    df_5min = make_synthetic_bars(n)
+    df_daily = make_synthetic_bars(n, sigma=0.015)
+
+    cases = [
+        ("5분봉 0.8%/6캔들", df_5min, 6, 0.008),
+        ("5분봉 1.5%/6캔들", df_5min, 6, 0.015),
+        ("일봉 3%/5일", df_daily, 5, 0.03),
+    ]
+    for name, df, lookahead, profit_target in cases:
+        loop_labels, t_loop = _timeit(lambda: _label_loop(df, lookahead, profit_target))
+        vec_labels, t_vec = _timeit(
+            lambda: label_forward_target(df['종가'], df['고가'], lookahead, profit_target), repeat=3)
+        same = np.array_equal(loop_labels, vec_labels)
+        print(f"  {name:<18} 루프 {t_loop:8.3f}s | 벡터 {t_vec:8.4f}s | "
+              f"x{t_loop / t_vec:,.0f} | 라벨 일치: {'✅' if same else '❌'} "
+              f"(양성 {vec_labels.sum():,}개)")
+        assert same, f"{name}: 라벨 불일치"
+
+    df, lookahead, profit_target = df_daily, 5, 0.03
+    loop_labels, t_loop = _timeit(lambda: _label_daily_loop(df, lookahead, profit_target))
+
+    def _daily_vec():
+        entry_prices = df['시가'].shift(-1)
+        target = label_forward_target(entry_prices, df['고가'], lookahead, profit_target,
+                                      n_valid=len(df) - lookahead - 1)
+        target[(entry_prices <= 0).to_numpy()] = 0
+        return target
+
+    vec_labels, t_vec = _timeit(_daily_vec, repeat=3)
+    same = np.array_equal(loop_labels, vec_labels)
+    print(f"  {'일봉(익일 시가 진입)':<18} 루프 {t_loop:8.3f}s | 벡터 {t_vec:8.4f}s | "
+          f"x{t_loop / t_vec:,.0f} | 라벨 일치: {'✅' if same else '❌'} "
+          f"(양성 {vec_labels.sum():,}개)")
+    assert same, "일봉(익일 시가 진입): 라벨 불일치"
+
+
+# ══════════════════════════════════════════════════════════
+# 2. 실시간 지표 갱신 (전체 재계산 vs 증분)
+# ══════════════════════════════════════════════════════════
+
+def bench_streaming(n=4_700, ticks=200):
+    """60일치 5분봉(약 4,700개)에서 새 캔들 1개 도착 시 최신 피처 행 계산 비용 비교"""
+    print(f"\n[실시간 지표] 시딩 {n:,}개 + 새 캔들 {ticks}개")
+    df = make_synthetic_bars(n + ticks)
+    features = data_manager.get_feature_columns(data_manager.add_indicators(df.iloc[:n].copy()))
+
+    state, t_seed = _timeit(lambda: IndicatorState.from_frame(df.iloc[:n]))
+
+    t_full = t_stream = 0.0
+    max_diff = 0.0
+    for end in range(n + 1, n + ticks + 1):
+        window = df.iloc[:end]
+        ref, dt = _timeit(lambda: data_manager.add_indicators(window.copy()).iloc[-1][features])
+        t_full += dt
+        row, dt = _timeit(lambda: state.sync(window))
+        t_stream += dt
+        diff = ((row[features] - ref).abs() / ref.abs().clip(lower=1e-9)).max()
+        max_diff = max(max_diff, float(diff))
+
+    print(f"  시딩 1회: {t_seed:.3f}s")
+    print(f"  캔들당 전체 재계산 {t_full / ticks * 1000:8.2f}ms | 증분 {t_stream / ticks * 1000:6.3f}ms | "
+          f"x{t_full / t_stream:,.0f} | 최대 상대오차 {max_diff:.1e}")
+
+    # 백테스트/최적화용 5분봉 지표(backtester.prepare_5min_data)도 실전과 같은 볼린저 밴드
+    with replay._patched([(backtester, 'load_bars', lambda ticker, interval, days: df.copy())]), \
+            contextlib.redirect_stdout(io.StringIO()):
+        backtest_df = backtester.prepare_5min_data('TEST')
+    live_df = data_manager.add_indicators(df.copy())
+    common = backtest_df.index.intersection(live_df.index)
+    bb_diff = float((backtest_df.loc[common, 'BB_Pct'] - live_df.loc[common, 'BB_Pct']).abs().max())
+    print(f"  BB_Pct 백테스트 vs 실전 {len(common):,}행 최대 차이 {bb_diff:.1e}")
+    assert max_diff < 1e-6 and len(common) > 0 and bb_diff < 1e-12, "증분 지표 또는 백테스트 지표가 실전 계산과 다릅니다"
+
+
+# ══════════════════════════════════════════════════════════
+# 3. 로컬 시세 저장소 (최초 동기화 vs 재시작 시 로드)
+# ══════════════════════════════════════════════════════════
+
+def bench_bar_store(days=60, processes=4):
+    """yfinance 대신 FrameSource로 60일 5분봉을 동기화/로드하는 비용 측정"""
+    import tempfile
+    from datetime import timedelta
+    from bar_store import BarStore, FrameSource
+
+    print(f"\n[로컬 시세 저장소] {days}일 5분봉")
+    bars = make_synthetic_bars(days * 78)
+    today = bars['시간'].iloc[-1].date()
+    raw = bars.set_index(bars['시간'].dt.tz_localize('Asia/Seoul')).rename(columns={
+        '시가': 'Open', '고가': 'High', '저가': 'Low', '종가': 'Close', '거래량': 'Volume'})
+    source = FrameSource({('TEST', '5m'): raw})
+
+    with tempfile.TemporaryDirectory() as root:
+        store = BarStore(root, source=source)
+        cold, t_cold = _timeit(lambda: store.sync('TEST', '5m', days, today=today))
+        source.calls.clear()
+        warm, t_warm = _timeit(lambda: store.sync('TEST', '5m', days, today=today))
+        df, t_load = _timeit(lambda: store.load('TEST', '5m', start=today - timedelta(days=days)), repeat=5)
+
+    print(f"  최초 동기화 {cold:,}개 {t_cold * 1000:7.1f}ms | 재동기화 {warm:,}개 (요청 {len(source.calls)}회) "
+          f"{t_warm * 1000:6.1f}ms | 로드 {len(df):,}개 {t_load * 1000:6.1f}ms")
+    assert np.allclose(df['종가'].to_numpy(), bars['종가'].to_numpy()[-len(df):])
+
+    # 봇 여러 개가 같은 파티션을 동시에 동기화 / 저장 실패 시 받은 데이터로 계속
+    import multiprocessing
+    with tempfile.TemporaryDirectory() as root:
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            loaded = pool.map(_sync_in_process, [(root, raw, days, today)] * processes)
+        leftovers = [name for _, _, names in os.walk(root) for name in names if name.endswith('.tmp')]
+        race_ok = len(set(loaded)) == 1 and loaded[0][0] == len(df) and not leftovers
+
+        blocked = os.path.join(root, 'not_a_dir')
+        open(blocked, 'w').close()
+        no_lock = BarStore(os.path.join(blocked, 'store'), source=source)  # 디렉터리를 만들 수 없음
+        no_lock.sync('TEST', '5m', days, today=today)
+        broken = BarStore(os.path.join(root, 'broken'), source=source)
+        broken._write_partition = _fail_write
+        broken.sync('TEST', '5m', days, today=today)
+        fallback = [store.load('TEST', '5m', start=today - timedelta(days=days)) for store in (no_lock, broken)]
+        fallback_ok = all(len(f) == len(df) and np.allclose(f['종가'], df['종가']) for f in fallback)
+    print(f"  동시 동기화 {processes}개 프로세스 → 로드 결과 동일 · 임시 파일 0개: {'✅' if race_ok else '❌'} | "
+          f"잠금/저장 실패 → 받은 데이터로 로드: {'✅' if fallback_ok else '❌'}")
+    assert race_ok and fallback_ok, "로컬 시세 저장소: 동시 동기화/저장 실패 처리 오류"
+
+
+def _sync_in_process(args):
+    from bar_store import BarStore, FrameSource
+    root, raw, days, today = args
+    store = BarStore(root, source=FrameSource({('TEST', '5m'): raw}))
+    store.sync('TEST', '5m', days, today=today)
+    df = store.load('TEST', '5m', start=today - pd.Timedelta(days=days))
+    return len(df), round(float(df['종가'].sum()), 6)
+
+
+def _fail_write(*args):
+    raise OSError(28, "No space left on device")
+
+
+# ══════════════════════════════════════════════════════════
+# 4. 파라미터 그리드 시뮬레이션 (조합별 루프 vs 조합 벡터화)
+# ══════════════════════════════════════════════════════════
+
+def _synthetic_probs(prices, seed=7):
+    """가격 흐름과 약하게 상관된 가짜 상승 확률 (모델 없이 매매 경로를 만들기 위함)"""
+    rng = np.random.default_rng(seed)
+    future = np.concatenate([prices[6:] / prices[:-6] - 1, np.zeros(6)])
+    return np.clip(0.5 + future * 40 + rng.normal(0, 0.12, len(prices)), 0, 1)
+
+
+def bench_optimizer_grid(n=1_200):
+    """캐시된 (가격, 확률)로 64개 / 4,096개 조합을 시뮬레이션"""
+    prices = make_synthetic_bars(n)['종가'].to_numpy()
+    probs = _synthetic_probs(prices)
+    fee = 0.000146
+    spaces = {
+        "64개 (매수/익절/손절)": {
+            'BUY_THRESHOLD': [0.55, 0.60, 0.65, 0.70],
+            'TAKE_PROFIT': [0.010, 0.015, 0.020, 0.025],
+            'STOP_LOSS': [-0.008, -0.010, -0.012, -0.015],
+        },
+        "4,096개 (+매도/트레일링)": {
+            'BUY_THRESHOLD': [0.55, 0.60, 0.65, 0.70],
+            'TAKE_PROFIT': [0.010, 0.015, 0.020, 0.025],
+            'STOP_LOSS': [-0.008, -0.010, -0.012, -0.015],
+            'SELL_THRESH': [0.30, 0.35, 0.40, 0.45],
+            'TRAIL_ACTIVATE': [0.005, 0.01, 0.015, 0.02],
+            'TRAIL_STOP': [0.003, 0.005, 0.008, 0.01],
+        },
+    }
+
+    print(f"\n[파라미터 그리드] 테스트 구간 {n:,}캔들")
+    for name, space in spaces.items():
+        grid = build_grid(space)
+        size = len(next(iter(grid.values())))
+
+        def _loop():
+            return [simulate_trades(prices, probs, {k: v[c] for k, v in grid.items()}, fee, fee)
+                    for c in range(size)]
+
+        loop_results, t_loop = _timeit(_loop)
+        metrics, t_vec = _timeit(lambda: simulate_grid(prices, probs, grid, fee, fee), repeat=3)
+        ref = np.array(loop_results)
+        same = (np.array_equal(ref[:, 0], metrics['Return'])
+                and np.array_equal(ref[:, 1], metrics['Trades'])
+                and np.array_equal(ref[:, 2], metrics['WinRate']))
+        print(f"  {name:<22} 루프 {t_loop:8.3f}s | 벡터 {t_vec:8.4f}s | x{t_loop / t_vec:,.0f} | "
+              f"결과 일치: {'✅' if same else '❌'} (평균 거래 {ref[:, 1].mean():.0f}회)")
+        assert same, f"{name}: 그리드 시뮬레이션 결과 불일치"
+
+
+def bench_parallel_grid(n=1_200, workers=None):
+    """SELL_THRESH/TRAIL_*까지 포함한 46,656개 조합을 프로세스 수별로 실행 (CPU 코어 수만큼 선형 확장 기대)"""
+    import contextlib
+    import io
+    import os
+
+    workers = workers or (1, max(2, os.cpu_count() or 1))
+
+    prices = make_synthetic_bars(n)['종가'].to_numpy()
+    probs = _synthetic_probs(prices)
+    fee = 0.000146
+    space = {
+        'BUY_THRESHOLD': [0.55, 0.60, 0.65, 0.70, 0.75, 0.80],
+        'TAKE_PROFIT': [0.010, 0.015, 0.020, 0.025, 0.030, 0.040],
+        'STOP_LOSS': [-0.006, -0.008, -0.010, -0.012, -0.015, -0.020],
+        'SELL_THRESH': [0.25, 0.30, 0.35, 0.40, 0.45, 0.50],
+        'TRAIL_ACTIVATE': [0.005, 0.0075, 0.01, 0.0125, 0.015, 0.02],
+        'TRAIL_STOP': [0.002, 0.003, 0.005, 0.0075, 0.01, 0.015],
+    }
+    ref = simulate_grid(prices, probs, build_grid(space), fee, fee)
+
+    print(f"\n[병렬 그리드] {len(ref['Return']):,}개 조합 × {n:,}캔들")
+    base = None
+    for w in workers:
+        with contextlib.redirect_stdout(io.StringIO()):  # 진행률 출력 생략
+            df, t = _timeit(lambda: run_grid_search(prices, probs, space, fee, fee, workers=w))
+        df = df.sort_index()
+        same = (np.array_equal(df['Return'].to_numpy(), ref['Return'])
+                and np.array_equal(df['Trades'].to_numpy(), ref['Trades']))
+        base = base or t
+        print(f"  프로세스 {w}개: {t:7.3f}s | x{base / t:4.1f} | 결과 일치: {'✅' if same else '❌'}")
+        assert same, f"프로세스 {w}개: 병렬 그리드 결과 불일치"
+
+
+# ══════════════════════════════════════════════════════════
+# 5. 전략 체결 (iloc/캔들 루프 vs 공통 체결 엔진)
+# ══════════════════════════════════════════════════════════
+
+def _rule_loop(df, buy_rule, sell_rule, buy_fee, sell_fee, start=0):
+    """기존 backtester 전략의 캔들별 iloc 루프 (buy_rule(i), sell_rule(i, 수익률))"""
+    balance, holdings, bought_price, trade_count, win_count = 10000000, 0, 0, 0, 0
+    for i in range(start, len(df)):
+        price = df['종가'].iloc[i]
+        if holdings == 0:
+            if buy_rule(i):
+                holdings = int(balance * 0.95 / (price * (1 + buy_fee)))
+                if holdings > 0:
+                    balance -= holdings * price * (1 + buy_fee)
+                    bought_price = price
+        elif sell_rule(i, (price - bought_price) / bought_price):
+            balance += holdings * price * (1 - sell_fee)
+            trade_count += 1
+            if price > bought_price:
+                win_count += 1
+            holdings = 0
+            bought_price = 0
+    if holdings > 0:
+        balance += holdings * df['종가'].iloc[-1] * (1 - sell_fee)
+        trade_count += 1
+        if df['종가'].iloc[-1] > bought_price:
+            win_count += 1
+    return balance, trade_count, win_count
+
+
+def bench_rule_strategies(n=5_000):
+    """MA 크로스 / RSI 스윙 / 추세 추종을 기존 루프와 비교 (일봉 약 20년 분량)"""
+    df = make_synthetic_bars(n, sigma=0.015)
+    close = df['종가']
+    df['MA5'] = close.rolling(5).mean()
+    df['MA20'] = close.rolling(20).mean()
+    delta = close.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / 14, adjust=False).mean()
+    df['RSI'] = 100 - 100 / (1 + gain / loss)
+    df = df.dropna().reset_index(drop=True)
+    fee = 0.00015
+
+    col = lambda name: (lambda i: df[name].iloc[i])
+    ma5, ma20, rsi, price = col('MA5'), col('MA20'), col('RSI'), col('종가')
+    cases = {
+        "MA 크로스": (backtester.strategy_ma_crossover, 1,
+                     lambda i: ma5(i - 1) <= ma20(i - 1) and ma5(i) > ma20(i),
+                     lambda i, p: ma5(i - 1) >= ma20(i - 1) and ma5(i) < ma20(i)),
+        "RSI 스윙": (backtester.strategy_rsi_swing, 0,
+                    lambda i: rsi(i) < 35 and ma5(i) > ma20(i),
+                    lambda i, p: rsi(i) > 70 or p <= -0.03),
+        "추세 추종": (backtester.strategy_trend_follow, 0,
+                    lambda i: price(i) > ma20(i) and rsi(i) > 50,
+                    lambda i, p: price(i) < ma20(i)),
+    }
+
+    print(f"\n[규칙 기반 전략] {len(df):,}캔들")
+    for name, (strategy, start, buy_rule, sell_rule) in cases.items():
+        ref, t_loop = _timeit(lambda: _rule_loop(df, buy_rule, sell_rule, fee, fee, start))
+        got, t_arr = _timeit(lambda: strategy(df, fee, fee), repeat=5)
+        same = ref == got
+        print(f"  {name:<8} 루프 {t_loop * 1000:8.1f}ms | 배열 {t_arr * 1000:6.2f}ms | "
+              f"x{t_loop / t_arr:,.0f} | 결과 일치: {'✅' if same else '❌'} ({ref[1]}회 거래)")
+        assert same, f"{name}: 전략 시뮬레이션 결과 불일치"
+
+
+def bench_execution_engine(n=20_000):
+    """AI 일봉/5분봉 청산 규칙(익절·손절·트레일링·수익 중 반전)을 기존 캔들 루프와 비교"""
+    prices = make_synthetic_bars(n)['종가'].to_numpy()
+    probs = _synthetic_probs(prices)
+    fee = 0.000146
+
+    print(f"\n[공통 체결 엔진] {n:,}캔들")
+    scalp = backtester.AIScalp()
+    ref, t_loop = _timeit(lambda: simulate_trades(prices, probs, {}, fee, fee))
+    (bal, tc, wc), t_eng = _timeit(lambda: execute(
+        prices, probs >= scalp.BUY_THRESH, probs < scalp.SELL_THRESH, fee, fee, **scalp.rules()), repeat=3)
+    got = ((bal / 10000000 - 1) * 100, tc, wc / tc * 100 if tc > 0 else 0)
+    same = ref == got
+    print(f"  AI 5분봉  루프 {t_loop * 1000:8.1f}ms | 엔진 {t_eng * 1000:6.2f}ms | "
+          f"x{t_loop / t_eng:,.0f} | 결과 일치: {'✅' if same else '❌'} ({tc}회 거래)")
+    assert same, "AI 5분봉: 체결 엔진 결과 불일치"
+
+    daily = backtester.AIDaily()
+    df = pd.DataFrame({'종가': prices})
+    ref, t_loop = _timeit(lambda: _rule_loop(
+        df, lambda i: probs[i] >= 0.60, lambda i, p: p >= 0.03 or p <= -0.02 or probs[i] < 0.4, fee, fee))
+    got, t_eng = _timeit(lambda: execute(
+        prices, probs >= daily.BUY_THRESH, probs < daily.SELL_THRESH, fee, fee, **daily.rules()), repeat=3)
+    same = ref == got
+    print(f"  AI 일봉    루프 {t_loop * 1000:8.1f}ms | 엔진 {t_eng * 1000:6.2f}ms | "
+          f"x{t_loop / t_eng:,.0f} | 결과 일치: {'✅' if same else '❌'} ({got[1]}회 거래)")
+    assert same, "AI 일봉: 체결 엔진 결과 불일치"
+
+
+# ══════════════════════════════════════════════════════════
+# 6. 변동성 돌파 (분봉 루프 vs K 조합 벡터화)
+# ══════════════════════════════════════════════════════════
+
+def make_synthetic_sessions(days, seed=3, sigma=0.0008):
+    """거래일마다 09:00~15:30 1분봉 + 같은 데이터로 만든 일봉 (랜덤워크, 장 시작 갭/가끔 분봉 갭 포함)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2023-01-02', periods=days)
+    minutes = pd.to_timedelta(np.arange(9 * 60, 15 * 60 + 31), unit='min')
+    times = (dates.values[:, None] + minutes.values[None, :]).ravel()
+    steps = rng.normal(0, sigma, (days, len(minutes)))
+    steps[:, 0] += rng.normal(0, 0.01, days)
+    close = 10000 * np.exp(np.cumsum(steps.ravel()))
+    jumps = np.exp(rng.normal(0, 0.02, len(close)) * (rng.random(len(close)) < 0.003))  # 가끔 분봉 갭 (슬리피지 포기 유도)
+    open_ = np.concatenate([[10000.0], close[:-1]]) * jumps
+    spread = np.abs(rng.normal(0, sigma, len(close))) * close
+    minute_df = pd.DataFrame({'시간': times, '시가': open_, '고가': np.maximum(open_, close) + spread,
+                              '저가': np.minimum(open_, close) - spread, '종가': close})
+    day = minute_df['시간'].dt.normalize()
+    daily_df = minute_df.groupby(day).agg(시가=('시가', 'first'), 고가=('고가', 'max'),
+                                          저가=('저가', 'min'), 종가=('종가', 'last'))
+    return minute_df, daily_df.rename_axis('날짜').reset_index()
+
+
+def _breakout_loop(sessions, k_min, k_max, fee, ratio=0.70, max_slippage=0.01, exit_minute=375):
+    """main.run_bot 흐름을 분봉 하나씩 따라가는 기준 구현 (1개 K 조합)"""
+    balance, trades, wins, skipped = 10000000.0, 0, 0, 0
+    for d in range(len(sessions['dates'])):
+        o, h, c = sessions['open'][d], sessions['high'][d], sessions['close'][d]
+        day_range = sessions['prev_high'][d] - sessions['prev_low'][d]
+        noise = 1 - abs(sessions['prev_open'][d] - sessions['prev_close'][d]) / day_range
+        if noise <= 0.4:
+            k = k_min
+        elif noise >= 0.7:
+            k = k_max
+        else:
+            k = k_min + (noise - 0.4) / (0.7 - 0.4) * (k_max - k_min)
+        target = o[np.isfinite(o)][0] + day_range * float(np.round(k, 2))
+
+        fill = None
+        for m in range(exit_minute):
+            if np.isfinite(h[m]) and h[m] >= target:
+                fill = max(o[m], target)
+                break
+        if fill is None:
+            continue
+        if (fill - target) / target > max_slippage:
+            skipped += 1
+            continue
+        qty = int(balance * ratio / fill)
+        if qty <= 0:
+            continue
+        later = np.flatnonzero(np.isfinite(o[exit_minute:]))
+        exit_price = o[exit_minute + later[0]] if len(later) else c[np.isfinite(c)][-1]
+        pnl = qty * exit_price * (1 - fee) - qty * fill * (1 + fee)
+        balance += pnl
+        trades += 1
+        wins += pnl > 0
+    return (balance / 10000000 - 1) * 100, trades, skipped
+
+
+def bench_breakout(days=500):
+    """실전 변동성 돌파를 K_MIN × K_MAX 그리드로 시뮬레이션 (약 2년치 1분봉)"""
+    minute_df, daily_df = make_synthetic_sessions(days)
+    sessions, t_build = _timeit(lambda: backtester.build_sessions(minute_df, daily_df))
+    k_mins = np.round(np.arange(0.1, 0.61, 0.05), 2)
+    k_maxs = np.round(np.arange(0.3, 1.01, 0.05), 2)
+    grid = [(lo, hi) for lo in k_mins for hi in k_maxs if lo <= hi]
+    fee = 0.00004
+
+    print(f"\n[변동성 돌파] {len(sessions['dates'])}거래일 × {len(minute_df) // days}분, {len(grid)}개 K 조합 "
+          f"(행렬 변환 {t_build * 1000:.0f}ms)")
+    sample = grid[::max(1, len(grid) // 8)]
+    ref, t_loop = _timeit(lambda: [_breakout_loop(sessions, lo, hi, fee) for lo, hi in sample])
+    metrics, t_vec = _timeit(lambda: backtester.simulate_breakout_grid(
+        sessions, [g[0] for g in grid], [g[1] for g in grid], fee, fee), repeat=3)
+    pos = [grid.index(g) for g in sample]
+    got = list(zip(metrics['Return'][pos], metrics['Trades'][pos], metrics['Skipped'][pos]))
+    same = all(abs(r[0] - g[0]) < 1e-9 and r[1:] == tuple(g[1:]) for r, g in zip(ref, got))
+    per_combo_loop = t_loop / len(sample)
+    print(f"  분봉 루프 {per_combo_loop * len(grid):7.2f}s (추정) | 벡터 {t_vec:6.3f}s | "
+          f"x{per_combo_loop * len(grid) / t_vec:,.0f} | 결과 일치: {'✅' if same else '❌'} "
+          f"(샘플 조합 평균 거래 {np.mean([r[1] for r in ref]):.0f}회, 슬리피지 포기 {np.mean([r[2] for r in ref]):.0f}일)")
+    assert same, "변동성 돌파: 그리드 시뮬레이션 결과 불일치"
+
+
+def _replay_reference(day_bars, prev_day, k, cash=10000000, ratio=0.70, max_slippage=0.01):
+    """main.run_bot이 리플레이에서 해야 할 체결 (매수가, 매도가) — 없으면 None, 슬리피지 포기면 'skip'"""
+    o, h, l, c = (day_bars[col].to_numpy() for col in ('시가', '고가', '저가', '종가'))
+    up = c >= o
+    path = np.column_stack([o, np.where(up, l, h), np.where(up, h, l), c])  # 15초 단위 현재가
+    target = o[0] + (prev_day['고가'] - prev_day['저가']) * k
+    hits = np.flatnonzero(path[:380].ravel() >= target)  # 15:20 이후는 장 마감 처리
+    if len(hits) == 0:
+        return None
+    buy = path.ravel()[hits[0]]
+    if (buy - target) / target > max_slippage:
+        return 'skip'
+    if int(cash * ratio / buy) <= 0:
+        return None
+    sell_at = max(375 * 60, hits[0] * 15 + 3)  # 15:15 청산 (그 뒤 매수면 체결 확인 2초 + 루프 1초 뒤)
+    return buy, path[sell_at // 60, sell_at % 60 // 15]
+
+
+def bench_replay(days=10):
+    """main.run_bot을 가상 시계로 하루씩 리플레이 (1초 폴링 그대로) — 체결이 분봉 경로와 일치하는지"""
+    import main as live_bot
+    minute_df, daily_df = make_synthetic_sessions(days + 1, seed=5, sigma=0.0015)
+    minute_df['거래량'] = 0.0
+    feed = replay.ReplayFeed({(live_bot.TICKER, '1m'): minute_df})
+    dates = daily_df['날짜'].dt.date
+    print(f"\n[리플레이] main.run_bot {days}거래일 (CHECK_INTERVAL={live_bot.CHECK_INTERVAL}초)")
+
+    same, walls, loops, traded = True, [], 0, []
+    for d in range(1, days + 1):
+        result = replay.replay_bot(live_bot, feed, dates.iloc[d])
+        walls.append(result['wall_seconds'])
+        loops += result['sleeps']
+        prev = daily_df.iloc[d - 1]
+        k = live_bot.calculate_dynamic_k(prev['시가'], prev['종가'], prev['고가'], prev['저가'])
+        expected = _replay_reference(minute_df[minute_df['시간'].dt.date == dates.iloc[d]], prev, k)
+        got = [f['price'] for f in result['fills']]
+        if isinstance(expected, tuple):
+            traded.append(dates.iloc[d])
+            same &= len(got) == 2 and np.allclose(got, expected, rtol=0, atol=1e-9)
+        else:
+            same &= got == []
+    print(f"  하루 평균 {np.mean(walls) * 1000:.0f}ms (최대 {max(walls) * 1000:.0f}ms, 가상 6.7시간, "
+          f"sleep {loops // days:,}회/일) | 매매 {len(traded)}일 | 체결 일치: {'✅' if same else '❌'}")
+
+    # 주문 응답에 주문번호(ODNO)가 없으면 체결 조회 없이 바로 미체결 처리
+    queries = []
+    orig_get_order = replay.ReplayBroker.get_order
+    no_odno = [
+        (replay.ReplayBroker, '_accepted', lambda self: {"rt_cd": "0", "msg1": "주문 전송 완료", "output": {}}),
+        (replay.ReplayBroker, 'get_order', lambda self, *args: queries.append(args) or orig_get_order(self, *args)),
+    ]
+    with replay._patched(no_odno):
+        result = replay.replay_bot(live_bot, feed, traded[0])
+    no_odno_ok = queries == [] and "미체결" in result['log']
+    print(f"  주문번호 없는 응답 → 체결 조회 {len(queries)}회, 미체결 처리: {'✅' if no_odno_ok else '❌'}")
+    assert same and no_odno_ok, "리플레이: main.run_bot 체결이 분봉 경로와 불일치 또는 주문번호 없는 응답 처리 실패"
+
+
+class _KISStubHandler(BaseHTTPRequestHandler):
+    """현재가/토큰 응답만 흉내 내는 로컬 KIS 서버 (keep-alive 지원, 최신 토큰이 아니면 EGW00123)"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 헤더/본문 분할 전송 시 지연 ACK(40ms) 방지
+    connections = set()
+    issued = 0  # 토큰 발급 횟수
+    delay = 0.0  # 조회 응답 지연 (초)
+    fail_every = 0  # n번째 조회마다 503 (0이면 없음)
+    gets = 0
+
+    def _reply(self, payload, status=200):
+        _KISStubHandler.connections.add(self.client_address)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        auth = self.headers.get("Authorization")
+        if auth is not None and auth != f"Bearer TOKEN{_KISStubHandler.issued}":
+            self._reply({"rt_cd": "1", "msg_cd": "EGW00123", "msg1": "기간이 만료된 token 입니다."})
+            return
+        _KISStubHandler.gets += 1
+        if _KISStubHandler.fail_every and _KISStubHandler.gets % _KISStubHandler.fail_every == 0:
+            self._reply({"rt_cd": "1", "msg1": "일시적 오류"}, status=503)
+            return
+        time.sleep(_KISStubHandler.delay)
+        self._reply({"rt_cd": "0", "output": {"stck_prpr": "10250", "stck_oprc": "10100"}})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(0.05)  # 토큰 발급은 느림 (동시 발급 경쟁 재현용)
+        _KISStubHandler.issued += 1
+        self._reply({"access_token": f"TOKEN{_KISStubHandler.issued}", "expires_in": 86400})
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_kis_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KISStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_kis_session(n=300):
+    """현재가 조회 n회: 호출마다 새 연결(기존 requests.get) vs KISClient 커넥션 풀"""
+    import requests
+
+    server, url = _start_kis_stub()
+    path = "uapi/domestic-stock/v1/quotations/inquire-price"
+    print(f"\n[KIS 세션] 로컬 서버 현재가 조회 {n}회 (TLS 없음 — 실서버는 연결당 핸드셰이크 비용이 더 큼)")
+
+    def fresh():
+        _KISStubHandler.connections.clear()
+        prices = [float(requests.get(f"{url}/{path}", params={"FID_INPUT_ISCD": "229200"},
+                                     timeout=broker.API_TIMEOUT).json()["output"]["stck_prpr"]) for _ in range(n)]
+        return prices, len(_KISStubHandler.connections)
+
+    def pooled():
+        _KISStubHandler.connections.clear()
+        client = broker.KISClient("KEY", "SECRET", url, session=broker.make_session(), token_cache=None)
+        client.issue_token()
+        prices = [client.get_current_price("229200") for _ in range(n)]
+        return prices, len(_KISStubHandler.connections)
+
+    (ref, conn_ref), t_fresh = _timeit(fresh)
+    (got, conn_got), t_pool = _timeit(pooled)
+    server.shutdown()
+    server.server_close()
+    same = ref == got
+    print(f"  새 연결 {t_fresh / n * 1000:6.2f}ms/회 (연결 {conn_ref}개) | 풀 {t_pool / n * 1000:6.2f}ms/회 "
+          f"(연결 {conn_got}개) | x{t_fresh / t_pool:.1f} | 결과 일치: {'✅' if same else '❌'}")
+    assert same and conn_got == 1, "KIS 세션: 커넥션 재사용 실패"
+
+
+
+def bench_async_broker(delay=0.03, calls=60):
+    """시작 조회 4건: 순차 vs async_broker 동시 요청 / 호출 제한기가 1초 구간당 한도를 지키는지"""
+    import asyncio
+    import async_broker
+
+    server, url = _start_kis_stub()
+    _KISStubHandler.delay = delay
+    print(f"\n[비동기 브로커] 로컬 서버 (조회 응답 {delay * 1000:.0f}ms)")
+
+    client = broker.KISClient("KEY", "SECRET", url, session=broker.make_session(), token_cache=None)
+    client.issue_token()
+    client.get_current_price("229200")  # 연결 준비
+    names = ("get_current_price", "get_today_open", "get_current_price", "get_today_open")
+
+    def serial():
+        return [getattr(client, name)("229200") for name in names]
+
+    def concurrent():
+        kis = async_broker.AsyncKISClient(client, limiter=async_broker.RateLimiter(20))
+        return async_broker.run(*(getattr(kis, name)("229200") for name in names))
+
+    concurrent()  # 풀 연결 수 확보
+    ref, t_serial = _timeit(serial)
+    got, t_conc = _timeit(concurrent)
+    same = ref == got
+    print(f"  시작 조회 {len(names)}건: 순차 {t_serial * 1000:6.1f}ms | 동시 {t_conc * 1000:6.1f}ms "
+          f"| x{t_serial / t_conc:.1f} | 결과 일치: {'✅' if same else '❌'}")
+
+    # 호출 제한: rate=20건/초로 calls건 동시 요청 → 어느 1초 구간에도 20건 이하
+    _KISStubHandler.delay = 0.0
+    limiter = async_broker.RateLimiter(20)
+    kis = async_broker.AsyncKISClient(client, limiter=limiter)
+    starts = []
+
+    async def timed():
+        await limiter.acquire()
+        starts.append(time.monotonic())
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(kis.executor, client.get_current_price, "229200")
+
+    _, t_limited = _timeit(lambda: asyncio.run(async_broker._gather([timed() for _ in range(calls)])))
+    starts.sort()
+    peak = max(sum(1 for t in starts[i:] if t - s < 1.0) for i, s in enumerate(starts))
+    server.shutdown()
+    server.server_close()
+    within = peak <= limiter.rate
+    print(f"  {calls}건 @ {limiter.rate}건/초: {t_limited:5.2f}초 (이론 {(calls - limiter.rate) // limiter.rate * limiter.window:.2f}초) "
+          f"| 1초 최대 {peak}건 | 한도 준수: {'✅' if within else '❌'}")
+    assert same and within, "비동기 브로커: 결과 불일치 또는 호출 한도 초과"
+
+
+def bench_price_stream(ticks=50, poll_interval=1.0):
+    """돌파 감지 지연: REST 1초 폴링(계산) vs WebSocket 체결가 푸시(실측) / 끊김 시 REST fallback 후 재접속"""
+    import price_stream
+
+    print(f"\n[실시간 체결가] 로컬 리플레이 서버 틱 {ticks}건")
+    server = price_stream.ReplayPriceServer()
+    feed = price_stream.KISPriceStream("KEY", "SECRET", "http://127.0.0.1", ["229200"], ws_url=server.url)
+    feed.approval_key = "APPROVAL"
+    feed.start()
+    feed.wait_connected(5)
+
+    rng = np.random.default_rng(11)
+    latencies, got = [], []
+    price = 10000.0
+    for _ in range(ticks):
+        time.sleep(rng.uniform(0.005, 0.02))
+        price += 5
+        sent = time.perf_counter()
+        server.push(price_stream.kis_tick_message("229200", price))
+        feed.wait("229200", price - 5, timeout=1.0)
+        latencies.append(time.perf_counter() - sent)
+        got.append(feed.get("229200"))
+    feed.stop()
+    server.close()
+
+    # 1초 폴링: 틱 시각이 폴링 사이 어디든 균등 → 다음 폴링까지 대기 + REST 응답(로컬 ~2ms, 실서버 수십 ms)
+    arrivals = rng.uniform(0, poll_interval, 100_000)
+    poll_latency = poll_interval - arrivals + 0.002
+    same = got == [10000.0 + 5 * (i + 1) for i in range(ticks)]
+    print(f"  폴링 평균 {poll_latency.mean() * 1000:6.1f}ms (최대 {poll_latency.max() * 1000:.0f}ms, 시간당 REST {3600 / poll_interval:,.0f}회) "
+          f"| 스트림 평균 {np.mean(latencies) * 1000:5.2f}ms (최대 {max(latencies) * 1000:.1f}ms, REST 0회) "
+          f"| 가격 일치: {'✅' if same else '❌'}")
+
+    # 연결 끊김: fallback(REST)으로 가격을 계속 받고, 재접속 후 다시 스트림
+    rest_calls = []
+    server = price_stream.ReplayPriceServer(
+        scripts=[[(0.0, price_stream.upbit_tick_message("KRW-ETH", 1.0)), (0.05, None)]])
+    feed = price_stream.UpbitPriceStream(["KRW-ETH"], ws_url=server.url,
+                                         fallback=lambda market: rest_calls.append(market) or 2.0)
+    feed.start()
+    feed.wait_connected(5)
+    feed.wait("KRW-ETH", None, 1.0)
+    first = feed.get("KRW-ETH")
+    time.sleep(0.2)
+    during = feed.get("KRW-ETH")
+    reconnected = feed.wait_connected(5)
+    server.push(price_stream.upbit_tick_message("KRW-ETH", 3.0))
+    feed.wait("KRW-ETH", None, 1.0)
+    after = feed.get("KRW-ETH")
+    feed.stop()
+    server.close()
+    fallback_ok = (first, during, after) == (1.0, 2.0, 3.0) and len(rest_calls) == 1 and reconnected
+    print(f"  끊김 → REST fallback {len(rest_calls)}회 → 재접속 {feed.reconnects}회 후 스트림 복귀: {'✅' if fallback_ok else '❌'}")
+
+    # 반쯤 끊긴 연결: 소켓은 열려 있지만 틱도 pong도 없음 → 2×ping_interval 뒤 REST + 재접속
+    # (pong이 오는 조용한 연결은 그대로 유지)
+    ping_interval = 0.1
+    liveness = {}
+    for answer_pings in (True, False):
+        rest_calls = []
+        server = price_stream.ReplayPriceServer(
+            scripts=[[(0.0, price_stream.upbit_tick_message("KRW-ETH", 1.0))]], answer_pings=answer_pings)
+        feed = price_stream.UpbitPriceStream(["KRW-ETH"], ws_url=server.url, ping_interval=ping_interval,
+                                             fallback=lambda market: rest_calls.append(market) or 2.0)
+        feed.start()
+        feed.wait_connected(5)
+        feed.wait("KRW-ETH", None, 1.0)
+        time.sleep(ping_interval * 5)
+        liveness[answer_pings] = (feed.get("KRW-ETH"), len(rest_calls), feed.reconnects)
+        feed.stop()
+        server.close()
+    quiet_ok = liveness[True] == (1.0, 0, 0)
+    hung_ok = liveness[False][:2] == (2.0, 1) and liveness[False][2] >= 1
+    print(f"  무응답 {ping_interval * 5:.1f}초: pong 있음 → 스트림 유지 {'✅' if quiet_ok else '❌'} | "
+          f"pong 없음 → REST fallback + 재접속 {liveness[False][2]}회 {'✅' if hung_ok else '❌'}")
+    assert same and fallback_ok and quiet_ok and hung_ok, "실시간 체결가: 가격 불일치 또는 fallback/재접속 실패"
+
+def _issue_in_process(args):
+    """다른 프로세스(봇)에서 같은 캐시 파일로 토큰 준비"""
+    url, path = args
+    from token_cache import TokenCache
+    return broker.KISClient("KEY", "SECRET", url, session=broker.make_session(),
+                            token_cache=TokenCache(path)).issue_token()
+
+
+def bench_token_cache(processes=4):
+    """봇 재시작/동시 실행 시 토큰 발급 횟수와 시작 지연 (디스크 캐시 + 파일 잠금)"""
+    import multiprocessing
+    import tempfile
+    from token_cache import TokenCache
+
+    server, url = _start_kis_stub()
+    tmp = tempfile.mkdtemp()
+    print(f"\n[KIS 토큰 캐시] 로컬 서버 (발급 50ms)")
+
+    path = f"{tmp}/cold.json"
+    _KISStubHandler.issued = 0
+    client = broker.KISClient("KEY", "SECRET", url, token_cache=TokenCache(path))
+    _, t_cold = _timeit(client.issue_token)
+    restarted = broker.KISClient("KEY", "SECRET", url, token_cache=TokenCache(path))
+    _, t_warm = _timeit(restarted.issue_token)
+    restart_ok = restarted.token == client.token and _KISStubHandler.issued == 1
+
+    path = f"{tmp}/race.json"
+    issued_before = _KISStubHandler.issued
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        tokens = pool.map(_issue_in_process, [(url, path)] * processes)
+    race_ok = len(set(tokens)) == 1 and _KISStubHandler.issued - issued_before == 1
+
+    # 선제 갱신: 만료 1시간 전이 되면 다음 요청 전에 재발급 / 서버가 토큰을 거부하면 재발급 후 재시도
+    now = [1_000_000.0]
+    cache = TokenCache(f"{tmp}/refresh.json", clock=lambda: now[0])
+    client = broker.KISClient("KEY", "SECRET", url, token_cache=cache)
+    client.issue_token()
+    now[0] += 86400 - cache.refresh_margin + 1
+    price = client.get_current_price("229200")
+    _KISStubHandler.issued += 1  # 다른 곳에서 재발급되어 현재 토큰이 무효가 된 상황
+    price_after_reject = client.get_current_price("229200")
+    metrics = cache.metrics()
+    refresh_ok = price == price_after_reject == 10250.0 and metrics["refreshes"] == 3
+
+    # 함수형 API: 호출마다 같은 KISClient 재사용 → 봇이 옛 토큰을 계속 넘겨도 재발급은 1회
+    saved_clients = dict(broker._clients)
+    broker._clients.clear()
+    shared = broker.client_for("KEY", "SECRET", url)
+    shared.token_cache = TokenCache(f"{tmp}/functions.json")
+    token = shared.issue_token()
+    issued_before = _KISStubHandler.issued
+    _KISStubHandler.issued += 1  # 서버 쪽에서 토큰 무효화
+    prices = [broker.get_current_price(token, "KEY", "SECRET", url, "229200") for _ in range(5)]
+    clients, reissued = len(broker._clients), _KISStubHandler.issued - issued_before - 1
+    reuse_ok = prices == [10250.0] * 5 and clients == 1 and reissued == 1
+    broker._clients.clear()
+    broker._clients.update(saved_clients)
+
+    server.shutdown()
+    server.server_close()
+    ok = restart_ok and race_ok and refresh_ok and reuse_ok
+    print(f"  첫 시작 {t_cold * 1000:5.1f}ms (발급) | 재시작 {t_warm * 1000:5.2f}ms (캐시) | "
+          f"동시 시작 {processes}개 프로세스 → 발급 1회: {'✅' if race_ok else '❌'} | "
+          f"선제/거부 갱신 {metrics['refreshes']}회 (평균 {metrics['refresh_avg_ms']:.0f}ms): {'✅' if refresh_ok else '❌'}")
+    print(f"  함수형 API 5회 (무효 토큰 전달) → 클라이언트 {clients}개, 재발급 {reissued}회: {'✅' if reuse_ok else '❌'}")
+    assert ok, "KIS 토큰 캐시: 재사용/잠금/갱신 실패"
+
+
+def bench_fill_tracker(orders=500, seed=11):
+    """주문 후 체결 확인 시간: 2초 간격 잔고 조회(기존) vs fill_tracker 지수 백오프 (가상 시계, 거래소 체결 지연 분포)"""
+    from datetime import datetime
+    import async_broker
+    import fill_tracker
+
+    rng = np.random.default_rng(seed)
+    # 거래소 체결 반영 지연: 보통 수십~수백 ms, 가끔 수 초, 1%는 끝내 미체결
+    delays = rng.lognormal(np.log(0.15), 0.9, orders)
+    delays[rng.random(orders) < 0.01] = np.inf
+    clock = replay.SimClock(datetime(2024, 1, 2, 9, 0), datetime(2024, 1, 3, 9, 0))
+    book = {}
+
+    def get_order(order_no):
+        placed_at, qty, delay = book[order_no]
+        done = clock.time() - placed_at >= delay
+        return {"rt_cd": "0", "output1": [{"odno": order_no, "ord_qty": str(qty), "tot_ccld_qty": str(qty if done else 0),
+                                           "rmn_qty": str(0 if done else qty), "avg_prvs": "10250" if done else "0",
+                                           "tot_ccld_amt": str(10250 * qty if done else 0)}]}
+
+    limiter = async_broker.RateLimiter(async_broker.RATE_LIMITS["MOCK"], clock=clock.time)
+    tracker = fill_tracker.FillTracker(get_order, lambda res: fill_tracker.kis_fill(res, 0.00014), limiter=limiter)
+    old, fills = [], []
+    with replay._patched([(fill_tracker, "time", clock.time_module())]):
+        for i, delay in enumerate(delays):
+            # 기존: 2초 쉬고 잔고 조회 × 최대 10회
+            polls = int(np.ceil(delay / 2.0)) if delay <= 20 else None
+            old.append(polls * 2.0 if polls else None)
+            book[str(i)] = (clock.time(), 10, delay)
+            fills.append(tracker.wait(str(i)))
+            clock.sleep(1.0)  # 다음 주문까지 간격 (모의 서버 호출 제한 구간 분리)
+
+    got = [f["latency"] for f in fills if f]
+    ref = [t for t in old if t is not None]
+    same = (len(got) == len(ref) and all(f["quantity"] == 10 and f["price"] == 10250 for f in fills if f)
+            and all((f is None) == (t is None) for f, t in zip(fills, old)))
+    m = tracker.metrics()
+    print(f"\n[체결 확인] 주문 {orders}건 (체결 지연 중앙값 {np.median(delays[np.isfinite(delays)]) * 1000:.0f}ms, "
+          f"미체결 {orders - len(ref)}건)")
+    print(f"  기존 2초×10회  p50 {np.percentile(ref, 50) * 1000:6.0f}ms  p90 {np.percentile(ref, 90) * 1000:6.0f}ms  "
+          f"최대 {max(ref) * 1000:6.0f}ms")
+    print(f"  fill_tracker  p50 {m['p50_ms']:6.0f}ms  p90 {m['p90_ms']:6.0f}ms  최대 {m['max_ms']:6.0f}ms  "
+          f"(평균 조회 {m['avg_polls']:.1f}회, 호출 제한 대기 {limiter.waits}회) | 체결 판정 일치: {'✅' if same else '❌'}")
+
+    # 잔여 수량(rmn_qty)이 빠진 응답: 미체결 행은 계속 조회, 전량 체결 행만 완료
+    def row(**fields):
+        return fill_tracker.kis_fill({"rt_cd": "0", "output1": [dict(ord_qty="10", **fields)]})
+    blank_ok = (not row(tot_ccld_qty="0")["done"] and not row(tot_ccld_qty="0", rmn_qty="")["done"]
+                and not row(tot_ccld_qty="4")["done"] and row(tot_ccld_qty="10")["done"]
+                and row(tot_ccld_qty="4", rmn_qty="0")["done"])
+    print(f"  rmn_qty 없는 응답 → 미체결 행을 완료로 오판하지 않음: {'✅' if blank_ok else '❌'}")
+    assert same and blank_ok, "체결 확인: fill_tracker 결과가 기존 잔고 조회와 불일치 또는 rmn_qty 누락 오판"
+
+
+def bench_latency(samples=20_000, calls=60, overhead_calls=100_000):
+    """API 응답 시간 계측: 히스토그램 분위수 오차 · 호출당 계측 비용 · 에러/재시도 집계 · DB 저장/리포트"""
+    import tempfile
+    import latency
+
+    # 히스토그램 분위수 vs 정확한 분위수
+    rng = np.random.default_rng(3)
+    ms = rng.lognormal(np.log(20), 0.8, samples)
+    rec = latency.LatencyRecorder()
+    for m in ms:
+        rec.record("sim", m / 1000)
+    got = rec.summary()["sim"]
+    exact = np.percentile(ms, [50, 95, 99])
+    q_err = max(abs(got[k] - e) / e for k, e in zip(("p50_ms", "p95_ms", "p99_ms"), exact))
+    print(f"\n[API 계측] 로그정규 응답 시간 {samples:,}건: p50/p95/p99 정확값 "
+          f"{exact[0]:.1f}/{exact[1]:.1f}/{exact[2]:.1f}ms → 히스토그램 "
+          f"{got['p50_ms']:.1f}/{got['p95_ms']:.1f}/{got['p99_ms']:.1f}ms (오차 최대 {q_err:.1%})")
+
+    # 계측 비용 (빈 함수 호출 기준)
+    rec = latency.LatencyRecorder()
+    noop = latency.timed("noop")(lambda: None)
+    with replay._patched([(latency, "RECORDER", rec)]):
+        _, t_timed = _timeit(lambda: [noop() for _ in range(overhead_calls)])
+    _, t_plain = _timeit(lambda: [(lambda: None)() for _ in range(overhead_calls)])
+    overhead_us = (t_timed - t_plain) / overhead_calls * 1e6
+
+    # 로컬 KIS 서버: 3번째 조회마다 503(자동 재시도) + 토큰 무효화(재발급 후 재요청) + 연결 실패
+    server, url = _start_kis_stub()
+    _KISStubHandler.fail_every, _KISStubHandler.gets = 3, 0
+    rec = latency.LatencyRecorder()
+    with replay._patched([(latency, "RECORDER", rec)]):
+        client = broker.KISClient("KEY", "SECRET", url, session=broker.make_session(), token_cache=None)
+        client.issue_token()
+        prices = [client.get_current_price("229200") for _ in range(calls)]
+        _KISStubHandler.issued += 1  # 서버 쪽에서 토큰 만료 → EGW00123 → 재발급 1회
+        prices.append(client.get_current_price("229200"))
+        dead = broker.KISClient("KEY", "SECRET", "http://127.0.0.1:9", session=broker.make_session(),
+                                token="T", token_cache=None)
+        missing = dead.get_current_price("229200")
+    _KISStubHandler.fail_every = 0
+    server.shutdown()
+    server.server_close()
+    summary = rec.summary()
+    price = summary["kis.get_current_price"]
+    retries_expected = _KISStubHandler.gets - (calls + 1)  # 유효 토큰 조회 중 성공 응답 외 = 503 재시도
+    counted = (all(p == 10250.0 for p in prices) and missing is None and price["calls"] == calls + 2
+               and price["errors"] == 1 and price["retries"] == retries_expected + 1)
+
+    # DB 저장(두 번 나눠서 누적) → 리포트가 메모리 집계와 같은지
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trades.db")
+        rec.db_path = db_path
+        t0 = time.perf_counter()
+        rec.flush()
+        t_flush = time.perf_counter() - t0
+        rec.record("kis.get_current_price", 0.002)
+        rec.flush()
+        rows = latency.load_report(db_path)
+    summary = rec.summary()
+    stored = {endpoint: s for _, endpoint, s in rows}
+    same = stored.keys() == summary.keys() and all(
+        all(abs(stored[e][k] - summary[e][k]) < 1e-6 for k in ("calls", "errors", "retries", "p50_ms", "p99_ms", "max_ms"))
+        for e in summary)
+    print(f"  계측 비용 {overhead_us:.1f}µs/호출 | 로컬 서버 현재가 {calls + 2}회: 재시도 {price['retries']}회 "
+          f"(503 {retries_expected} + 토큰 재발급 1), 연결 실패 에러 {price['errors']}회: {'✅' if counted else '❌'}")
+    print(f"  DB 저장 {t_flush * 1000:.1f}ms (엔드포인트 {len(summary)}개) | 2회 누적 저장 → 리포트 = 메모리 집계: "
+          f"{'✅' if same else '❌'}")
+    latency.print_report(rows)
+    assert q_err < 0.1 and counted and same, "API 계측: 분위수/집계/저장 불일치"
+
+
+def main():
+    print("=" * 80)
+    print("⏱️ 성능 벤치마크")
+    print("=" * 80)
+    bench_labels()
+    bench_streaming()
+    bench_bar_store()
+    bench_optimizer_grid()
+    bench_parallel_grid()
+    bench_rule_strategies()
+    bench_execution_engine()
+    bench_breakout()
+    bench_replay()
+    bench_kis_session()
+    bench_async_broker()
+    bench_price_stream()
+    bench_token_cache()
+    bench_fill_tracker()
+    bench_latency()
+    print("\n✅ 모든 벤치마크 완료")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,8 +15,13 @@ import yfinance as yf
 import pandas as pd
 
 import broker
+import async_broker
+import fill_tracker
+import latency
+from bar_store import load_bars
 import data_manager
 import model as ai_model
+from streaming_indicators import IndicatorState
 from telegram_notifier import TelegramNotifier
 
 # ── 환경 설정 ──
@@ -103,15 +108,13 @@ def wait_for_market_open():
 
 
 def get_yesterday_range():
-    df = yf.download(TICKER, period='5d', interval='1d')
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
+    df = load_bars(TICKER, '1d', 14)
     today = date.today()
-    df_past = df[df.index.date < today]
+    df_past = df[df['날짜'].dt.date < today]
     if len(df_past) == 0:
         return None, None, None
     yesterday = df_past.iloc[-1]
-    return float(yesterday['High']), float(yesterday['Low']), float(yesterday['High'] - yesterday['Low'])
+    return float(yesterday['고가']), float(yesterday['저가']), float(yesterday['고가'] - yesterday['저가'])
 
 
 def get_today_open_yf():
@@ -127,6 +130,7 @@ def get_today_open_yf():
 # ── 메인 봇 ──
 def run_bot():
     notifier = TelegramNotifier(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+    latency.start()  # API 응답 시간 기록 → trade DB (리포트: python latency.py)
     notify(notifier, "🚀 <b>복합 전략 봇 시작</b>", "모드: 🟢 모의투자\n변동성 돌파 + AI 필터/청산")
 
     print("=" * 60)
@@ -140,6 +144,11 @@ def run_bot():
         notify(notifier, "❌ <b>에러</b>", "토큰 발급 실패")
         print("❌ 토큰 발급 실패. 종료합니다.")
         return
+    mock = async_broker.AsyncKISClient(
+        broker.client_for(MOCK_APP_KEY, MOCK_APP_SECRET, URL_MOCK, MOCK_ACC_NO, "MOCK", token_mock))
+    # 매수 체결 확인: 주문번호로 체결 내역 조회 (모의 서버 호출 제한 공유)
+    fills = fill_tracker.FillTracker(mock.client.get_order, lambda res: fill_tracker.kis_fill(res, BUY_FEE),
+                                     limiter=mock.limiter)
 
     # ── STEP 2: 전일 변동폭 ──
     yesterday_high, yesterday_low, yesterday_range = get_yesterday_range()
@@ -166,6 +175,9 @@ def run_bot():
     ai_model.save_model(xgb_model, MODEL_FILE)
     print("✅ AI 학습 완료!")
 
+    # 실시간 지표 상태 (60일치로 1회 시딩 → 이후 새 캔들만 증분 반영)
+    indicator_state = IndicatorState.from_frame(df_base)
+
     # ── STEP 4: 미청산 포지션 확인 ──
     bought_price, holding_qty = load_unclosed_position()
     highest_price = bought_price
@@ -266,10 +278,9 @@ def run_bot():
                 df_base = data_manager.refresh_data(df_base, TICKER)
                 last_data_refresh = current_time
 
-            df_live = data_manager.add_indicators(df_base.copy())
+            latest = indicator_state.sync(df_base)
             prob = 0.0
-            if df_live is not None and len(df_live) > 0:
-                latest = df_live.iloc[-1]
+            if latest is not None:
                 _, prob = ai_model.predict_signal(xgb_model, latest, features, BUY_THRESH)
 
             # ── 대기: 이중 조건 (돌파 + AI) ──
@@ -307,18 +318,13 @@ def run_bot():
                         STOCK_CODE, buy_qty, current_price, mode="MOCK")
 
                     if res.get('rt_cd') == '0':
-                        for _ in range(10):
-                            time.sleep(2)
-                            bp = broker.get_stock_balance(
-                                token_mock, MOCK_APP_KEY, MOCK_APP_SECRET, URL_MOCK, MOCK_ACC_NO,
-                                STOCK_CODE, mode="MOCK")
-                            if bp > 0:
-                                bought_price = bp
-                                qty = broker.get_holding_quantity(
-                                    token_mock, MOCK_APP_KEY, MOCK_APP_SECRET, URL_MOCK, MOCK_ACC_NO,
-                                    STOCK_CODE, mode="MOCK")
-                                holding_qty = qty if qty is not None and qty > 0 else buy_qty
-                                break
+                        # 체결 확인: 주문번호로 체결 조회 (0.25초부터 간격 2배, 최대 20초)
+                        # 응답에 주문번호가 없으면 조회하지 않고 미확인으로 처리
+                        order_no = res.get('output', {}).get('ODNO')
+                        fill = fills.wait(order_no) if order_no else None
+                        if fill:
+                            bought_price = fill["price"] or current_price
+                            holding_qty = fill["quantity"]
                         else:
                             bought_price = current_price
                             holding_qty = buy_qty
@@ -15,6 +15,10 @@ import yfinance as yf
 import pandas as pd
 
 import broker
+import async_broker
+import fill_tracker
+import latency
+from bar_store import load_bars
 from telegram_notifier import TelegramNotifier
 
 # ── 환경 설정 ──
@@ -94,21 +98,19 @@ def wait_for_market_open():
 
 def get_yesterday_range():
     """전일 고가-저가 변동폭과 시가/종가를 구합니다."""
-    df = yf.download(TICKER, period='5d', interval='1d')
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
+    df = load_bars(TICKER, '1d', 14)
 
     today = date.today()
-    df_past = df[df.index.date < today]
+    df_past = df[df['날짜'].dt.date < today]
 
     if len(df_past) == 0:
         print("❌ 전일 데이터를 찾을 수 없습니다.")
         return None, None, None, None, None
 
     yesterday = df_past.iloc[-1]
-    return (float(yesterday['High']), float(yesterday['Low']),
-            float(yesterday['High'] - yesterday['Low']),
-            float(yesterday['Open']), float(yesterday['Close']))
+    return (float(yesterday['고가']), float(yesterday['저가']),
+            float(yesterday['고가'] - yesterday['저가']),
+            float(yesterday['시가']), float(yesterday['종가']))
 
 
 def calculate_dynamic_k(yesterday_open, yesterday_close, yesterday_high, yesterday_low):
@@ -151,6 +153,7 @@ def get_today_open_yf():
 # ── 메인 봇 ──
 def run_bot():
     notifier = TelegramNotifier(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+    latency.start()  # API 응답 시간 기록 → trade DB (리포트: python latency.py)
     notify(notifier, "🚀 <b>변동성 돌파 봇 시작</b>", "모드: 🟢 모의투자")
 
     print("=" * 60)
@@ -164,6 +167,11 @@ def run_bot():
         notify(notifier, "❌ <b>에러</b>", "토큰 발급 실패")
         print("❌ 토큰 발급 실패. 종료합니다.")
         return
+    mock = async_broker.AsyncKISClient(
+        broker.client_for(MOCK_APP_KEY, MOCK_APP_SECRET, URL_MOCK, MOCK_ACC_NO, "MOCK", token_mock))
+    # 매수 체결 확인: 주문번호로 체결 내역 조회 (모의 서버 호출 제한 공유)
+    fills = fill_tracker.FillTracker(mock.client.get_order, lambda res: fill_tracker.kis_fill(res, BUY_FEE),
+                                     limiter=mock.limiter)
 
     # ── STEP 2: 전일 변동폭 + 노이즈 기반 K 계산 ──
     yesterday_high, yesterday_low, yesterday_range, yesterday_open, yesterday_close = get_yesterday_range()
@@ -305,21 +313,12 @@ def run_bot():
                         STOCK_CODE, buy_qty, current_price, mode="MOCK")
 
                     if res.get('rt_cd') == '0':
-                        # 체결 확인 (20초 대기)
-                        bought_price = 0
-                        holding_qty = 0
-                        for _ in range(10):
-                            time.sleep(2)
-                            bp = broker.get_stock_balance(
-                                token_mock, MOCK_APP_KEY, MOCK_APP_SECRET, URL_MOCK, MOCK_ACC_NO,
-                                STOCK_CODE, mode="MOCK")
-                            if bp > 0:
-                                bought_price = bp
-                                qty = broker.get_holding_quantity(
-                                    token_mock, MOCK_APP_KEY, MOCK_APP_SECRET, URL_MOCK, MOCK_ACC_NO,
-                                    STOCK_CODE, mode="MOCK")
-                                holding_qty = qty if qty is not None and qty > 0 else buy_qty
-                                break
+                        # 체결 확인: 주문번호로 체결 조회 (0.25초부터 간격 2배, 최대 20초)
+                        # 응답에 주문번호가 없으면 조회하지 않고 미확인으로 처리
+                        order_no = res.get('output', {}).get('ODNO')
+                        fill = fills.wait(order_no) if order_no else None
+                        bought_price = (fill["price"] or current_price) if fill else 0
+                        holding_qty = fill["quantity"] if fill else 0
 
                         if holding_qty > 0:
                             log_trade("매수", bought_price, holding_qty, reason=f"돌파(목표 {target_price:,.0f}원)")
@@ -330,8 +329,8 @@ def run_bot():
                         else:
                             # 20초 내 잔고 미확인 → 미체결로 판단, 당일 매매 포기
                             notify(notifier, "⚠️ <b>미체결 감지</b>",
-                                   f"20초 내 잔고 미확인\n주문은 장마감 시 자동 취소됩니다\n당일 매매를 포기합니다")
-                            print(f"⚠️ 미체결: 20초 내 잔고 확인 실패. 당일 매매 포기.")
+                                   f"20초 내 체결 미확인\n주문은 장마감 시 자동 취소됩니다\n당일 매매를 포기합니다")
+                            print(f"⚠️ 미체결: 20초 내 체결 확인 실패. 당일 매매 포기.")
                             state = "SOLD"
                     else:
                         notify(notifier, "❌ <b>매수 실패</b>", f"{res.get('msg1')}")
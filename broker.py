@@ -2,7 +2,14 @@
 import requests
 import json
 import os
+import time
+from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import latency
+from token_cache import DEFAULT_CACHE
 
 load_dotenv()
 
@@ -12,6 +19,9 @@ URL_REAL = os.getenv("URL_REAL")     # 실전 서버 (시세용)
 URL_MOCK = os.getenv("URL_MOCK")  # 모의 서버 (잔고/주문용)
 
 API_TIMEOUT = 10  # 모든 API 호출의 타임아웃 (초)
+POOL_SIZE = 4     # 서버(호스트)당 유지할 keep-alive 연결 수 (실전 시세 + 모의 주문 동시 사용 여유)
+TOKEN_EXPIRES_IN = 86400  # 응답에 expires_in이 없을 때 가정하는 토큰 유효기간 (초)
+TOKEN_REJECTED = ("EGW00121", "EGW00123")  # 유효하지 않은 토큰 / 기간이 만료된 토큰
 
 # ── 실전/모의 tr_id 매핑 ──
 TR_IDS = {
@@ -20,15 +30,44 @@ TR_IDS = {
         "stock_balance":   "TTTC8434R",
         "buy_order":       "TTTC0802U",
         "sell_order":      "TTTC0801U",
+        "order_inquiry":   "TTTC8001R",
     },
     "MOCK": {
         "balance_inquiry": "VTTC8908R",
         "stock_balance":   "VTTC8434R",
         "buy_order":       "VTTC0802U",
         "sell_order":      "VTTC0801U",
+        "order_inquiry":   "VTTC8001R",
     },
 }
 
+# ── 커넥션 풀 ──
+# 조회(GET)만 재시도합니다. 주문(POST)은 서버에 도달했을 수 있어 재시도하면 중복 체결 위험이 있습니다.
+# (연결 자체가 안 된 경우는 요청이 나가지 않았으므로 메서드와 무관하게 재시도)
+RETRY = Retry(total=2, connect=2, read=2, status=2, backoff_factor=0.2,
+              status_forcelist=(500, 502, 503, 504), allowed_methods=frozenset({"GET"}),
+              raise_on_status=False)
+
+_session = None
+
+
+def make_session(pool_size=POOL_SIZE, retry=RETRY):
+    """keep-alive 커넥션 풀 + 재시도 어댑터를 단 requests.Session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return latency.instrument_session(session)
+
+
+def get_session():
+    """프로세스 공용 세션 (모든 KISClient와 모듈 함수가 같은 연결을 재사용)"""
+    global _session
+    if _session is None:
+        _session = make_session()
+    return _session
+
+
 def _safe_json(res):
     """응답을 JSON으로 파싱합니다. 실패 시 빈 dict 반환."""
     try:
@@ -37,323 +76,412 @@ def _safe_json(res):
         print(f"❌ JSON 파싱 실패 (HTTP {res.status_code}): {res.text[:200]}")
         return {}
 
-def get_access_token(app_key, app_secret, url_base):
-    headers = {"content-type":"application/json"}
-    body = {
-        "grant_type": "client_credentials",
-        "appkey": app_key,
-        "appsecret": app_secret
-    }
-    PATH = "oauth2/tokenP"
-    URL = f"{url_base}/{PATH}"
-
-    try:
-        res = requests.post(URL, headers=headers, data=json.dumps(body), timeout=API_TIMEOUT)
-        res_data = _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 토큰 발급 요청 실패: {e}")
-        return None
-
-    if 'access_token' in res_data:
-        return res_data['access_token']
-    else:
-        print("❌ 토큰 발급 실패!")
-        print(f"응답 내용: {res_data}")
-        return None
-
-def get_current_price(token, app_key, app_secret, url_base, stock_code):
-    """한국투자증권 API를 통해 현재가를 가져옵니다."""
-    PATH = "uapi/domestic-stock/v1/quotations/inquire-price"
-    URL = f"{url_base}/{PATH}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": "FHKST01010100"
-    }
-
-    params = {
-        "FID_COND_MRKT_DIV_CODE": "J",
-        "FID_INPUT_ISCD": stock_code
-    }
 
-    try:
-        res = requests.get(URL, headers=headers, params=params, timeout=API_TIMEOUT)
-        res_data = _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 현재가 조회 요청 실패: {e}")
-        return None
+# ══════════════════════════════════════════════════════════
+# KIS 클라이언트
+# ══════════════════════════════════════════════════════════
+
+class KISClient:
+    """
+    한국투자증권 REST 클라이언트: 앱 키/시크릿, 서버 주소, 토큰, 계좌를 들고 있어
+    호출마다 긴 인자 목록을 넘기지 않아도 되고, 공용 세션으로 TCP/TLS 연결을 재사용합니다.
+
+        client = KISClient(APP_KEY, APP_SECRET, URL_REAL, acc_no=ACC_NO, mode="REAL")
+        client.issue_token()
+        price = client.get_current_price("229200")
+
+    issue_token()은 token_cache(기본: 디스크 캐시)의 유효한 토큰을 먼저 재사용하고,
+    이후 요청마다 만료 임박 여부를 확인해 미리 재발급합니다. 서버가 토큰을 거부하면 재발급 후 1회 재시도합니다.
+    token을 직접 넘기면 token_cache에 같은 토큰이 있을 때 만료 시각도 가져와 똑같이 미리 재발급합니다.
+    """
+
+    def __init__(self, app_key, app_secret, url_base, acc_no=None, mode="MOCK", token=None, session=None,
+                 token_cache=DEFAULT_CACHE):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.url_base = url_base
+        self.acc_no = acc_no
+        self.mode = mode
+        self.session = session or get_session()
+        self.token_cache = token_cache
+        self._headers = {}  # tr_id → 요청 헤더 (토큰이 바뀌면 초기화)
+        self.use_token(token)
+
+    @property
+    def token(self):
+        return self._token
+
+    @token.setter
+    def token(self, value):
+        self._token = value
+        self._headers.clear()
+
+    def use_token(self, token):
+        """밖에서 받은 토큰으로 교체 (get_access_token 결과 등) — 캐시에 있는 토큰이면 만료 시각도 기억"""
+        self.token = token
+        cached = self.token_cache.lookup(self.app_key, self.url_base) if self.token_cache and token else None
+        self.token_expires_at = cached[1] if cached and cached[0] == token else None
+
+    def _headers_for(self, tr_id):
+        headers = self._headers.get(tr_id)
+        if headers is None:
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self._token}",
+                "appkey": self.app_key,
+                "appsecret": self.app_secret,
+                "tr_id": tr_id,
+            }
+            self._headers[tr_id] = headers
+        return headers
+
+    def _now(self):
+        return self.token_cache.clock() if self.token_cache else time.time()
+
+    def _request(self, method, path, tr_id, **kwargs):
+        if self.token_expires_at is not None and self.token_expires_at - self._now() <= self._refresh_margin():
+            self.issue_token()  # 만료 임박 → 선제 갱신
+        res_data = _safe_json(self.session.request(method, f"{self.url_base}/{path}",
+                                                   headers=self._headers_for(tr_id), timeout=API_TIMEOUT, **kwargs))
+        if res_data.get('msg_cd') in TOKEN_REJECTED and self.issue_token(rejected=True):
+            latency.note_retry()
+            res_data = _safe_json(self.session.request(method, f"{self.url_base}/{path}",
+                                                       headers=self._headers_for(tr_id), timeout=API_TIMEOUT, **kwargs))
+        if res_data.get('rt_cd', '0') != '0':
+            latency.note_error()  # HTTP 200이어도 rt_cd로 실패를 알리는 응답
+        return res_data
+
+    def _get(self, path, tr_id, params):
+        return self._request("GET", path, tr_id, params=params)
+
+    def _post(self, path, tr_id, body):
+        return self._request("POST", path, tr_id, data=json.dumps(body))
+
+    def _refresh_margin(self):
+        return self.token_cache.refresh_margin if self.token_cache else 0
+
+    # ── 인증 ──
+    def issue_token(self, rejected=False):
+        """
+        접근 토큰을 준비합니다. (캐시에 유효한 토큰이 있으면 재사용, 없으면 발급)
+        rejected=True: 현재 토큰을 서버가 거부함 → 캐시의 같은 토큰도 버리고 새로 발급
+        실패 시 None 반환.
+        """
+        if self.token_cache is None:
+            issued = self._request_token()
+        else:
+            issued = self.token_cache.get(self.app_key, self.url_base, self._request_token,
+                                          rejected=self.token if rejected else None)
+        if issued is None:
+            return None
+        self.token, self.token_expires_at = issued
+        return self.token
+
+    @latency.timed("kis.request_token", is_error=lambda issued: issued is None)
+    def _request_token(self):
+        """KIS 토큰 발급 API 호출 → (token, 만료 시각 epoch 초) 또는 None"""
+        headers = {"content-type": "application/json"}
+        body = {
+            "grant_type": "client_credentials",
+            "appkey": self.app_key,
+            "appsecret": self.app_secret
+        }
+
+        try:
+            res = self.session.post(f"{self.url_base}/oauth2/tokenP", headers=headers,
+                                    data=json.dumps(body), timeout=API_TIMEOUT)
+            res_data = _safe_json(res)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 토큰 발급 요청 실패: {e}")
+            return None
 
-    if res_data.get('output'):
-        return float(res_data['output']['stck_prpr'])
-    else:
-        print(f"❌ 시세 조회 실패: {res_data.get('msg1')}")
-        return None
+        if 'access_token' in res_data:
+            expires_in = float(res_data.get('expires_in') or TOKEN_EXPIRES_IN)
+            return res_data['access_token'], self._now() + expires_in
+        else:
+            print("❌ 토큰 발급 실패!")
+            print(f"응답 내용: {res_data}")
+            return None
 
-def get_yesterday_ohlc(token, app_key, app_secret, url_base, stock_code):
-    """KIS API를 통해 전일 시가/고가/저가/종가를 가져옵니다."""
-    PATH = "uapi/domestic-stock/v1/quotations/inquire-daily-itemchartprice"
-    URL = f"{url_base}/{PATH}"
-
-    from datetime import datetime, timezone, timedelta
-    kst = timezone(timedelta(hours=9))
-    today = datetime.now(kst)
-    today_str = today.strftime('%Y%m%d')
-    # 시작일을 30일 전으로 설정하여 전일 데이터가 반드시 포함되도록 함
-    start_str = (today - timedelta(days=30)).strftime('%Y%m%d')
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": "FHKST03010100"
-    }
-
-    params = {
-        "FID_COND_MRKT_DIV_CODE": "J",
-        "FID_INPUT_ISCD": stock_code,
-        "FID_INPUT_DATE_1": start_str,
-        "FID_INPUT_DATE_2": today_str,
-        "FID_PERIOD_DIV_CODE": "D",
-        "FID_ORG_ADJ_PRC": "0"
-    }
+    # ── 시세 ──
+    def _inquire_price(self, stock_code):
+        return self._get("uapi/domestic-stock/v1/quotations/inquire-price", "FHKST01010100", {
+            "FID_COND_MRKT_DIV_CODE": "J",
+            "FID_INPUT_ISCD": stock_code
+        })
+
+    @latency.timed("kis.get_current_price")
+    def get_current_price(self, stock_code):
+        """현재가를 가져옵니다. 실패 시 None 반환."""
+        try:
+            res_data = self._inquire_price(stock_code)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 현재가 조회 요청 실패: {e}")
+            return None
 
-    try:
-        res = requests.get(URL, headers=headers, params=params, timeout=API_TIMEOUT)
-        res_data = _safe_json(res)
-        items = res_data.get('output2', [])
-        if items and len(items) >= 1:
-            # output2[0]은 당일(또는 가장 최근), 전일 데이터를 찾음
-            for item in items:
-                if item.get('stck_bsop_date') != today_str:
-                    return {
-                        'open': float(item['stck_oprc']),
-                        'high': float(item['stck_hgpr']),
-                        'low': float(item['stck_lwpr']),
-                        'close': float(item['stck_clpr'])
-                    }
-            # 전일 데이터를 찾지 못한 경우 (모든 항목이 당일)
-            print(f"⚠️ KIS API: 전일 데이터를 찾지 못했습니다. (항목 수: {len(items)}, 모두 당일 날짜)")
+        if res_data.get('output'):
+            return float(res_data['output']['stck_prpr'])
+        else:
+            print(f"❌ 시세 조회 실패: {res_data.get('msg1')}")
             return None
-    except Exception as e:
-        print(f"❌ KIS API 전일 데이터 조회 실패: {e}")
-    return None
 
+    @latency.timed("kis.get_today_open")
+    def get_today_open(self, stock_code):
+        """당일 시가를 가져옵니다. 실패 시 None 반환."""
+        try:
+            res_data = self._inquire_price(stock_code)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 시가 조회 요청 실패: {e}")
+            return None
 
-def get_today_open(token, app_key, app_secret, url_base, stock_code):
-    """한국투자증권 API를 통해 당일 시가를 가져옵니다."""
-    PATH = "uapi/domestic-stock/v1/quotations/inquire-price"
-    URL = f"{url_base}/{PATH}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": "FHKST01010100"
-    }
-
-    params = {
-        "FID_COND_MRKT_DIV_CODE": "J",
-        "FID_INPUT_ISCD": stock_code
-    }
+        if res_data.get('output'):
+            return float(res_data['output']['stck_oprc'])
+        else:
+            print(f"❌ 시가 조회 실패: {res_data.get('msg1')}")
+            return None
 
-    try:
-        res = requests.get(URL, headers=headers, params=params, timeout=API_TIMEOUT)
-        res_data = _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 시가 조회 요청 실패: {e}")
+    @latency.timed("kis.get_yesterday_ohlc")
+    def get_yesterday_ohlc(self, stock_code):
+        """전일 시가/고가/저가/종가를 가져옵니다. 실패 시 None 반환."""
+        kst = timezone(timedelta(hours=9))
+        today = datetime.now(kst)
+        today_str = today.strftime('%Y%m%d')
+        # 시작일을 30일 전으로 설정하여 전일 데이터가 반드시 포함되도록 함
+        start_str = (today - timedelta(days=30)).strftime('%Y%m%d')
+
+        params = {
+            "FID_COND_MRKT_DIV_CODE": "J",
+            "FID_INPUT_ISCD": stock_code,
+            "FID_INPUT_DATE_1": start_str,
+            "FID_INPUT_DATE_2": today_str,
+            "FID_PERIOD_DIV_CODE": "D",
+            "FID_ORG_ADJ_PRC": "0"
+        }
+
+        try:
+            res_data = self._get("uapi/domestic-stock/v1/quotations/inquire-daily-itemchartprice",
+                                 "FHKST03010100", params)
+            items = res_data.get('output2', [])
+            if items and len(items) >= 1:
+                # output2[0]은 당일(또는 가장 최근), 전일 데이터를 찾음
+                for item in items:
+                    if item.get('stck_bsop_date') != today_str:
+                        return {
+                            'open': float(item['stck_oprc']),
+                            'high': float(item['stck_hgpr']),
+                            'low': float(item['stck_lwpr']),
+                            'close': float(item['stck_clpr'])
+                        }
+                # 전일 데이터를 찾지 못한 경우 (모든 항목이 당일)
+                print(f"⚠️ KIS API: 전일 데이터를 찾지 못했습니다. (항목 수: {len(items)}, 모두 당일 날짜)")
+                return None
+        except Exception as e:
+            print(f"❌ KIS API 전일 데이터 조회 실패: {e}")
         return None
 
-    if res_data.get('output'):
-        return float(res_data['output']['stck_oprc'])
-    else:
-        print(f"❌ 시가 조회 실패: {res_data.get('msg1')}")
-        return None
+    # ── 계좌 ──
+    @latency.timed("kis.get_balance")
+    def get_balance(self, stock_code):
+        """계좌의 현금 잔고(주문 가능 금액)를 숫자로 반환합니다."""
+        params = {
+            "CANO": self.acc_no,
+            "ACNT_PRDT_CD": "01",
+            "PDNO": stock_code,
+            "ORD_UNPR": "0",
+            "ORD_DVSN": "00",
+            "CMA_EVLU_AMT_ICLD_YN": "Y",
+            "OVRS_ICLD_YN": "N"
+        }
+
+        try:
+            res_data = self._get("uapi/domestic-stock/v1/trading/inquire-psbl-order",
+                                 TR_IDS[self.mode]["balance_inquiry"], params)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 잔고 조회 요청 실패: {e}")
+            return 0
+
+        # 주문 가능 현금 추출
+        output = res_data.get('output', {})
+        cash = output.get('ord_psbl_cash') or output.get('nrcvb_buy_amt') or '0'
+        return int(float(cash))
+
+    def _inquire_balance(self):
+        return self._get("uapi/domestic-stock/v1/trading/inquire-balance", TR_IDS[self.mode]["stock_balance"], {
+            "CANO": self.acc_no,
+            "ACNT_PRDT_CD": "01",
+            "AFHR_FLG": "N",
+            "OVAL_DVSN": "00",
+            "IVRE_DVSN": "01",
+            "SORT_DVSN": "01",
+            "CTX_AREA_FK100": "",
+            "CTX_AREA_NK100": ""
+        })
+
+    @latency.timed("kis.get_stock_balance")
+    def get_stock_balance(self, stock_code):
+        """특정 종목의 매수 평균가를 반환합니다. 보유하지 않으면 0 반환."""
+        try:
+            res_data = self._inquire_balance()
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 종목잔고 조회 요청 실패: {e}")
+            return 0
+
+        stocks = res_data.get('output1', [])
+
+        if not stocks:
+            print("🔎 잔고가 비어있습니다.")
+            return 0
+
+        for s in stocks:
+            if s.get('pdno') == stock_code:
+                avg_price = s.get('pavg') or s.get('pchs_avg_pric') or s.get('prvs_pdno_pavg')
+                if avg_price:
+                    print(f"🎯 잔고 확인 성공! 매수단가: {avg_price}원")
+                    return float(avg_price)
+                else:
+                    print(f"⚠️ 매수단가 키를 찾을 수 없어요. 실제 데이터: {s}")
+                    return 0
+        return 0
 
+    @latency.timed("kis.get_holding_quantity")
+    def get_holding_quantity(self, stock_code):
+        """특정 종목의 보유 수량을 반환합니다. 보유하지 않으면 0, API 실패 시 None 반환."""
+        try:
+            res_data = self._inquire_balance()
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 보유수량 조회 요청 실패: {e}")
+            return None
 
-def get_balance(token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
-    """계좌의 현금 잔고(주문 가능 금액)를 숫자로 반환합니다."""
-    PATH = "uapi/domestic-stock/v1/trading/inquire-psbl-order"
-    URL = f"{url_base}/{PATH}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": TR_IDS[mode]["balance_inquiry"]
-    }
-
-    params = {
-        "CANO": acc_no,
-        "ACNT_PRDT_CD": "01",
-        "PDNO": stock_code,
-        "ORD_UNPR": "0",
-        "ORD_DVSN": "00",
-        "CMA_EVLU_AMT_ICLD_YN": "Y",
-        "OVRS_ICLD_YN": "N"
-    }
+        if res_data is None:
+            print(f"❌ 보유수량 조회 응답 파싱 실패")
+            return None
 
-    try:
-        res = requests.get(URL, headers=headers, params=params, timeout=API_TIMEOUT)
-        res_data = _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 잔고 조회 요청 실패: {e}")
+        stocks = res_data.get('output1', [])
+        for s in stocks:
+            if s.get('pdno') == stock_code:
+                qty = s.get('hldg_qty') or s.get('cblc_qty13') or '0'
+                return int(float(qty))
         return 0
 
-    # 주문 가능 현금 추출
-    output = res_data.get('output', {})
-    cash = output.get('ord_psbl_cash') or output.get('nrcvb_buy_amt') or '0'
-    return int(float(cash))
+    # ── 주문 (시장가) ──
+    def _order(self, side, stock_code, quantity):
+        body = {
+            "CANO": self.acc_no,
+            "ACNT_PRDT_CD": "01",
+            "PDNO": stock_code,
+            "ORD_DVSN": "01",
+            "ORD_QTY": str(quantity),
+            "ORD_UNPR": "0"
+        }
+        return self._post("uapi/domestic-stock/v1/trading/order-cash", TR_IDS[self.mode][side], body)
+
+    @latency.timed("kis.post_order")
+    def post_order(self, stock_code, quantity, price=0):
+        """매수 주문. Returns: 응답 dict (rt_cd '0'=성공)"""
+        try:
+            return self._order("buy_order", stock_code, quantity)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 매수 주문 요청 실패: {e}")
+            return {"rt_cd": "-1", "msg1": str(e)}
+
+    @latency.timed("kis.post_sell_order")
+    def post_sell_order(self, stock_code, quantity, price=0):
+        """매도 주문. Returns: 응답 dict (rt_cd '0'=성공)"""
+        try:
+            return self._order("sell_order", stock_code, quantity)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 매도 주문 요청 실패: {e}")
+            return {"rt_cd": "-1", "msg1": str(e)}
+
+    @latency.timed("kis.get_order")
+    def get_order(self, order_no):
+        """
+        당일 주문 체결 조회 (주문번호 = 주문 응답의 output.ODNO).
+        Returns: 응답 dict (output1[0]: ord_qty · tot_ccld_qty · avg_prvs · tot_ccld_amt · rmn_qty) 실패 시 빈 dict
+        """
+        today = datetime.now(timezone(timedelta(hours=9))).strftime("%Y%m%d")
+        try:
+            return self._get("uapi/domestic-stock/v1/trading/inquire-daily-ccld", TR_IDS[self.mode]["order_inquiry"], {
+                "CANO": self.acc_no,
+                "ACNT_PRDT_CD": "01",
+                "INQR_STRT_DT": today,
+                "INQR_END_DT": today,
+                "SLL_BUY_DVSN_CD": "00",
+                "INQR_DVSN": "00",
+                "PDNO": "",
+                "CCLD_DVSN": "00",
+                "ORD_GNO_BRNO": "",
+                "ODNO": order_no,
+                "INQR_DVSN_3": "00",
+                "INQR_DVSN_1": "",
+                "CTX_AREA_FK100": "",
+                "CTX_AREA_NK100": "",
+            })
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 주문 체결 조회 요청 실패: {e}")
+            return {}
+
+
+# ══════════════════════════════════════════════════════════
+# 함수형 API (기존 봇 호환 — 내부적으로 KISClient + 공용 세션 사용)
+# ══════════════════════════════════════════════════════════
+
+_clients = {}  # (서버, 앱 키, 계좌, 모드) → [KISClient, 호출자가 마지막으로 넘긴 토큰]
+
+
+def client_for(app_key, app_secret, url_base, acc_no=None, mode="MOCK", token=None):
+    """
+    (서버, 앱 키, 계좌, 모드)마다 KISClient 1개를 만들어 재사용합니다.
+    호출자가 새 토큰을 넘기면 그 토큰으로 바꾸고, 같은 토큰이면 클라이언트가 선제/거부 갱신한
+    토큰을 계속 씁니다. (봇은 시작 때 받은 토큰을 계속 넘기므로 갱신된 토큰이 되돌려지면 안 됨)
+    """
+    key = (url_base, app_key, acc_no, mode)
+    entry = _clients.get(key)
+    if entry is None:
+        entry = _clients[key] = [KISClient(app_key, app_secret, url_base, acc_no, mode, token), token]
+    elif token != entry[1]:
+        entry[0].use_token(token)
+        entry[1] = token
+    return entry[0]
 
-def get_stock_balance(token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
-    """특정 종목의 매수 평균가를 반환합니다. 보유하지 않으면 0 반환."""
-    PATH = "uapi/domestic-stock/v1/trading/inquire-balance"
-    URL = f"{url_base}/{PATH}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": TR_IDS[mode]["stock_balance"]
-    }
-
-    params = {
-        "CANO": acc_no,
-        "ACNT_PRDT_CD": "01",
-        "AFHR_FLG": "N",
-        "OVAL_DVSN": "00",
-        "IVRE_DVSN": "01",
-        "SORT_DVSN": "01",
-        "CTX_AREA_FK100": "",
-        "CTX_AREA_NK100": ""
-    }
 
-    try:
-        res = requests.get(URL, headers=headers, params=params, timeout=API_TIMEOUT)
-        res_data = _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 종목잔고 조회 요청 실패: {e}")
-        return 0
+def get_access_token(app_key, app_secret, url_base):
+    return client_for(app_key, app_secret, url_base).issue_token()
 
-    stocks = res_data.get('output1', [])
+def get_current_price(token, app_key, app_secret, url_base, stock_code):
+    """한국투자증권 API를 통해 현재가를 가져옵니다."""
+    return client_for(app_key, app_secret, url_base, token=token).get_current_price(stock_code)
 
-    if not stocks:
-        print("🔎 잔고가 비어있습니다.")
-        return 0
+def get_yesterday_ohlc(token, app_key, app_secret, url_base, stock_code):
+    """KIS API를 통해 전일 시가/고가/저가/종가를 가져옵니다."""
+    return client_for(app_key, app_secret, url_base, token=token).get_yesterday_ohlc(stock_code)
 
-    for s in stocks:
-        if s.get('pdno') == stock_code:
-            avg_price = s.get('pavg') or s.get('pchs_avg_pric') or s.get('prvs_pdno_pavg')
-            if avg_price:
-                print(f"🎯 잔고 확인 성공! 매수단가: {avg_price}원")
-                return float(avg_price)
-            else:
-                print(f"⚠️ 매수단가 키를 찾을 수 없어요. 실제 데이터: {s}")
-                return 0
-    return 0
 
-def get_holding_quantity(token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
-    """특정 종목의 보유 수량을 반환합니다. 보유하지 않으면 0, API 실패 시 None 반환."""
-    PATH = "uapi/domestic-stock/v1/trading/inquire-balance"
-    URL = f"{url_base}/{PATH}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": TR_IDS[mode]["stock_balance"]
-    }
-
-    params = {
-        "CANO": acc_no,
-        "ACNT_PRDT_CD": "01",
-        "AFHR_FLG": "N",
-        "OVAL_DVSN": "00",
-        "IVRE_DVSN": "01",
-        "SORT_DVSN": "01",
-        "CTX_AREA_FK100": "",
-        "CTX_AREA_NK100": ""
-    }
+def get_today_open(token, app_key, app_secret, url_base, stock_code):
+    """한국투자증권 API를 통해 당일 시가를 가져옵니다."""
+    return client_for(app_key, app_secret, url_base, token=token).get_today_open(stock_code)
 
-    try:
-        res = requests.get(URL, headers=headers, params=params, timeout=API_TIMEOUT)
-        res_data = _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 보유수량 조회 요청 실패: {e}")
-        return None
 
-    if res_data is None:
-        print(f"❌ 보유수량 조회 응답 파싱 실패")
-        return None
+def get_balance(token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
+    """계좌의 현금 잔고(주문 가능 금액)를 숫자로 반환합니다."""
+    return client_for(app_key, app_secret, url_base, acc_no, mode, token).get_balance(stock_code)
 
-    stocks = res_data.get('output1', [])
-    for s in stocks:
-        if s.get('pdno') == stock_code:
-            qty = s.get('hldg_qty') or s.get('cblc_qty13') or '0'
-            return int(float(qty))
-    return 0
+def get_stock_balance(token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
+    """특정 종목의 매수 평균가를 반환합니다. 보유하지 않으면 0 반환."""
+    return client_for(app_key, app_secret, url_base, acc_no, mode, token).get_stock_balance(stock_code)
+
+def get_holding_quantity(token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
+    """특정 종목의 보유 수량을 반환합니다. 보유하지 않으면 0, API 실패 시 None 반환."""
+    return client_for(app_key, app_secret, url_base, acc_no, mode, token).get_holding_quantity(stock_code)
 
 # 매수
 def post_order(token, app_key, app_secret, url_base, acc_no, stock_code, quantity, price, mode="MOCK"):
-    PATH = "uapi/domestic-stock/v1/trading/order-cash"
-    URL = f"{url_base}/{PATH}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": TR_IDS[mode]["buy_order"]
-    }
-
-    body = {
-        "CANO": acc_no,
-        "ACNT_PRDT_CD": "01",
-        "PDNO": stock_code,
-        "ORD_DVSN": "01",
-        "ORD_QTY": str(quantity),
-        "ORD_UNPR": "0"
-    }
-
-    try:
-        res = requests.post(URL, headers=headers, data=json.dumps(body), timeout=API_TIMEOUT)
-        return _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 매수 주문 요청 실패: {e}")
-        return {"rt_cd": "-1", "msg1": str(e)}
+    return client_for(app_key, app_secret, url_base, acc_no, mode, token).post_order(stock_code, quantity, price)
 
 # 매도
 def post_sell_order(token, app_key, app_secret, url_base, acc_no, stock_code, quantity, price, mode="MOCK"):
-    PATH = "uapi/domestic-stock/v1/trading/order-cash"
-    URL = f"{url_base}/{PATH}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
-        "appkey": app_key,
-        "appsecret": app_secret,
-        "tr_id": TR_IDS[mode]["sell_order"]
-    }
-
-    body = {
-        "CANO": acc_no,
-        "ACNT_PRDT_CD": "01",
-        "PDNO": stock_code,
-        "ORD_DVSN": "01",
-        "ORD_QTY": str(quantity),
-        "ORD_UNPR": "0"
-    }
+    return client_for(app_key, app_secret, url_base, acc_no, mode, token).post_sell_order(stock_code, quantity, price)
 
-    try:
-        res = requests.post(URL, headers=headers, data=json.dumps(body), timeout=API_TIMEOUT)
-        return _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 매도 주문 요청 실패: {e}")
-        return {"rt_cd": "-1", "msg1": str(e)}
+# 체결 조회
+def get_order(token, app_key, app_secret, url_base, acc_no, order_no, mode="MOCK"):
+    return client_for(app_key, app_secret, url_base, acc_no, mode, token).get_order(order_no)
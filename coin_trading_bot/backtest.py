@@ -14,26 +14,25 @@ backtest.py — 변동성 돌파 전략 백테스트
 ──────────────────────────────────────────────────────────
 """
 import requests
+import numpy as np
 import time
 import json
 import os
 from datetime import datetime, timedelta
 from collections import defaultdict
 
-# ── 설정 ──────────────────────────────────────────────────
-COINS = ["KRW-ETH", "KRW-XRP", "KRW-SOL", "KRW-DOGE", "KRW-ADA"]
-BTC_MARKET = "KRW-BTC"
+from minute_store import MinuteStore, to_candles
+from config import COINS, BTC_MARKET, BUY_FEE, SELL_FEE, K_MIN, K_MAX
 
+# ── 설정 (대상 코인/수수료/K 범위는 config.py) ────────────────
 FETCH_DAYS = 420       # API에서 가져올 일수 (피처 윈도우 여유분 포함)
 BACKTEST_START = 15    # 처음 15일은 피처 계산용으로 버퍼
 
 CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backtest_cache")
-MINUTE_CACHE_DIR = os.path.join(CACHE_DIR, "minutes")
+MINUTE_CACHE_DIR = os.path.join(CACHE_DIR, "minutes")          # (구) 날짜별 JSON 캐시
+MINUTE_STORE_DIR = os.path.join(CACHE_DIR, "minute_store")     # 종목별 바이너리 저장소
+MINUTE_STORE = MinuteStore(MINUTE_STORE_DIR, unit=5)
 
-BUY_FEE = 0.0005      # 업비트 매수 수수료 0.05%
-SELL_FEE = 0.0005      # 업비트 매도 수수료 0.05%
-K_MIN = 0.3
-K_MAX = 0.6
 TRAILING_STOP_PCT = 0.02  # 고점 대비 2% 하락 시 청산
 
 API_BASE = "https://api.upbit.com"
@@ -193,23 +192,34 @@ def fetch_minute_candles(market, date_str, unit=5):
     return candles
 
 
-def load_or_fetch_minutes(market, date_str, unit=5):
-    """분봉 데이터를 캐시에서 로드하거나 API로 가져옵니다."""
-    os.makedirs(MINUTE_CACHE_DIR, exist_ok=True)
-    safe_name = market.replace("-", "_")
-    cache_file = os.path.join(MINUTE_CACHE_DIR, f"{safe_name}_{date_str}.json")
+def load_minute_array(market, date_str, unit=5):
+    """분봉 배열(메모리맵 슬라이스)을 저장소에서 로드하거나 API로 가져옵니다.
+    저장소에 없고 (구) JSON 캐시가 있으면 API 대신 JSON을 옮겨 담습니다.
+    Returns: MINUTE_DTYPE 배열 또는 None
+    """
+    store = MINUTE_STORE if unit == MINUTE_STORE.unit else MinuteStore(MINUTE_STORE_DIR, unit)
+    arr = store.day(market, date_str)
+    if arr is not None:
+        return arr
 
-    if os.path.exists(cache_file):
-        with open(cache_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+    safe_name = market.replace("-", "_")
+    legacy_file = os.path.join(MINUTE_CACHE_DIR, f"{safe_name}_{date_str}.json")
+    if unit == 5 and os.path.exists(legacy_file):
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            candles = json.load(f)
+    else:
+        candles = fetch_minute_candles(market, date_str, unit)
 
-    candles = fetch_minute_candles(market, date_str, unit)
+    if not candles:
+        return None
+    store.append_day(market, date_str, candles)
+    return store.day(market, date_str)
 
-    if candles:
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(candles, f, ensure_ascii=False)
 
-    return candles
+def load_or_fetch_minutes(market, date_str, unit=5):
+    """분봉 데이터를 캐시에서 로드하거나 API로 가져옵니다. (list of dict)"""
+    arr = load_minute_array(market, date_str, unit)
+    return to_candles(arr) if arr is not None else []
 
 
 def simulate_trailing_stop(minute_candles, entry_price, trailing_pct=TRAILING_STOP_PCT):
@@ -254,6 +264,50 @@ def simulate_trailing_stop(minute_candles, entry_price, trailing_pct=TRAILING_ST
     return last_close, "time_exit", highest, minute_candles[-1]["datetime_kst"]
 
 
+def simulate_trailing_stop_array(minutes, entry_price, trailing_pcts):
+    """simulate_trailing_stop의 NumPy 버전. 여러 트레일링 폭을 한 번에 계산합니다.
+
+    minutes: MINUTE_DTYPE 배열 (time/high/low/close 필드, load_minute_array 결과)
+    trailing_pcts: 트레일링 폭 목록 (예: [0.01, 0.02, 0.05])
+
+    - 진입 캔들: 고가 ≥ entry_price 인 첫 캔들 (argmax)
+    - 진입 후 고점: np.maximum.accumulate(고가)와 entry_price 중 큰 값
+    - 청산 캔들: 저가 ≤ 고점 × (1 - 폭) 인 첫 캔들 (폭별 argmax)
+
+    Returns: (exit_prices, exit_reasons, peaks, exit_times) — 각각 trailing_pcts 길이의 배열
+    """
+    pcts = np.asarray(trailing_pcts, dtype=float)
+    if minutes is None or len(minutes) == 0:
+        return (np.full(len(pcts), float(entry_price)), np.full(len(pcts), "no_data", dtype=object),
+                np.full(len(pcts), float(entry_price)), np.full(len(pcts), "", dtype=object))
+
+    high = np.asarray(minutes["high"], dtype=float)
+    low = np.asarray(minutes["low"], dtype=float)
+    last_time = str(np.datetime_as_string(minutes["time"][-1], unit="s"))
+    last_close = float(minutes["close"][-1])
+
+    entered = high >= entry_price
+    if not entered.any():
+        # 진입 못 함 → 기존 함수와 동일하게 마지막 종가 시간 청산
+        return (np.full(len(pcts), last_close), np.full(len(pcts), "time_exit", dtype=object),
+                np.full(len(pcts), float(entry_price)), np.full(len(pcts), last_time, dtype=object))
+
+    start = int(entered.argmax())
+    peak = np.maximum.accumulate(np.maximum(high[start:], entry_price))
+    trail = peak[None, :] * (1 - pcts[:, None])          # (폭, 캔들)
+    hit = low[None, start:] <= trail
+    fired = hit.any(axis=1)
+    first = hit.argmax(axis=1)
+
+    rows = np.arange(len(pcts))
+    exit_prices = np.where(fired, trail[rows, first], last_close)
+    peaks = np.where(fired, peak[first], peak[-1])
+    reasons = np.where(fired, "trailing_stop", "time_exit").astype(object)
+    exit_idx = np.where(fired, start + first, len(minutes) - 1)
+    exit_times = np.datetime_as_string(minutes["time"][exit_idx], unit="s").astype(object)
+    return exit_prices, reasons, peaks, exit_times
+
+
 # ══════════════════════════════════════════════════════════
 # 피처 계산
 # ══════════════════════════════════════════════════════════
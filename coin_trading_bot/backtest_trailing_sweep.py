@@ -9,8 +9,9 @@ from backtest import (
     COINS, BTC_MARKET, BACKTEST_START, BUY_FEE, SELL_FEE,
     CACHE_DIR, MINUTE_CACHE_DIR,
     load_or_fetch, dynamic_k, build_features, analyze,
-    load_or_fetch_minutes, simulate_trailing_stop,
+    MINUTE_STORE, load_minute_array, simulate_trailing_stop_array,
 )
+from minute_store import migrate_json_cache
 
 # 테스트할 트레일링 폭
 TRAILING_PCTS = [0.01, 0.015, 0.02, 0.03, 0.04, 0.05, 0.07, 0.10, None]
@@ -47,36 +48,44 @@ def run_trailing_sweep(coin, candles, btc_by_date):
             "nextopen_pnl": (nextopen_price * (1 - SELL_FEE)) / (entry_price * (1 + BUY_FEE)) - 1,
         })
 
-    # 분봉 데이터 미리 로드 (캐시에서)
+    # 분봉 데이터 미리 로드 (저장소 메모리맵 슬라이스, 복사 없음)
     minute_data = {}
     missing = 0
     for bd in breakout_days:
-        mc = load_or_fetch_minutes(coin, bd["date"])
-        if mc:
-            minute_data[bd["date"]] = mc
+        arr = load_minute_array(coin, bd["date"])
+        if arr is not None and len(arr) > 0:
+            minute_data[bd["date"]] = arr
         else:
             missing += 1
 
     if missing > 0:
         print(f"    (분봉 데이터 없는 날: {missing}일 — 해당 거래는 익일시가 청산 적용)")
 
-    # 각 트레일링 폭별 시뮬레이션
+    # 돌파일마다 모든 트레일링 폭을 한 번에 시뮬레이션
+    trail_pcts = [p for p in TRAILING_PCTS if p is not None]
+    day_results = {}
+    for bd in breakout_days:
+        mc = minute_data.get(bd["date"])
+        if mc is not None:
+            day_results[bd["date"]] = simulate_trailing_stop_array(mc, bd["entry_price"], trail_pcts)
+
+    # 각 트레일링 폭별 집계
     results = {}
     for trail_pct in TRAILING_PCTS:
         label = f"{trail_pct*100:.1f}%" if trail_pct else "없음(시간청산)"
 
+        j = trail_pcts.index(trail_pct) if trail_pct is not None else None
         pnls = []
         trailing_fired = 0
         for bd in breakout_days:
-            mc = minute_data.get(bd["date"])
+            sim = day_results.get(bd["date"])
 
-            if trail_pct is None or not mc:
+            if trail_pct is None or sim is None:
                 # 트레일링 없음 or 분봉 없음 → 익일 시가 청산
                 pnls.append(bd["nextopen_pnl"] * 100)
                 continue
 
-            exit_price, reason, peak, _ = simulate_trailing_stop(
-                mc, bd["entry_price"], trail_pct)
+            exit_price, reason = sim[0][j], sim[1][j]
 
             pnl = (exit_price * (1 - SELL_FEE)) / (bd["entry_price"] * (1 + BUY_FEE)) - 1
             pnls.append(pnl * 100)
@@ -117,6 +126,11 @@ def main():
     print("  테스트: 1%, 1.5%, 2%, 3%, 4%, 5%, 7%, 10%, 없음(시간청산)")
     print("=" * 76)
 
+    # (구) 날짜별 JSON 분봉 캐시가 남아 있으면 종목별 저장소로 한 번에 이전
+    migrated = migrate_json_cache(MINUTE_CACHE_DIR, MINUTE_STORE)
+    if any(migrated.values()):
+        print(f"  분봉 캐시 이전: {sum(migrated.values())}일 ({len(migrated)}종목)")
+
     # 데이터 로드
     all_data = {}
     all_data[BTC_MARKET] = load_or_fetch(BTC_MARKET)
@@ -0,0 +1,414 @@
+"""
+benchmark.py — 코인 백테스트 성능 개선 검증 (기존 구현과 결과 동일성 + 속도 비교)
+──────────────────────────────────────────────────────────
+실행: python benchmark.py
+합성 분봉(랜덤워크)으로 측정하므로 네트워크 없이 동작합니다.
+──────────────────────────────────────────────────────────
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from backtest import simulate_trailing_stop, simulate_trailing_stop_array
+from backtest_trailing_sweep import TRAILING_PCTS
+from minute_store import MINUTE_DTYPE, to_candles
+
+
+# ══════════════════════════════════════════════════════════
+# 합성 데이터
+# ══════════════════════════════════════════════════════════
+
+def make_synthetic_minutes(n=288, seed=0, start_price=1000.0, sigma=0.004, date_str="2024-01-01"):
+    """업비트 사이클(09:00~익일 08:55) 5분봉 랜덤워크를 생성합니다."""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, sigma, n)))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0, sigma, n)) * close
+    arr = np.empty(n, dtype=MINUTE_DTYPE)
+    arr["time"] = np.datetime64(f"{date_str}T09:00:00") + np.arange(n) * np.timedelta64(5, "m")
+    arr["open"] = open_
+    arr["high"] = np.maximum(open_, close) + spread
+    arr["low"] = np.minimum(open_, close) - spread
+    arr["close"] = close
+    return arr
+
+
+def _timeit(fn, repeat=1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+# ══════════════════════════════════════════════════════════
+# 1. 트레일링 스탑 시뮬레이션 (dict 루프 vs NumPy)
+# ══════════════════════════════════════════════════════════
+
+def bench_trailing_stop(days=500):
+    """돌파일 days개 × TRAILING_PCTS 전체를 기존 함수와 비교"""
+    print(f"\n[트레일링 스탑] 돌파일 {days}개 × 트레일링 폭 {len(TRAILING_PCTS) - 1}개")
+    pcts = [p for p in TRAILING_PCTS if p is not None]
+    rng = np.random.default_rng(1)
+    cases = []
+    for seed in range(days):
+        arr = make_synthetic_minutes(seed=seed)
+        # 진입가: 대부분 범위 안, 일부는 진입 불가(최고가 초과)/시가 아래
+        entry = float(arr["open"][0] * rng.choice([0.99, 1.0, 1.005, 1.01, 1.03, 2.0]))
+        cases.append((arr, to_candles(arr), entry))
+    cases.append((np.empty(0, dtype=MINUTE_DTYPE), [], 1000.0))  # 분봉 없음
+
+    def _loop():
+        return [[simulate_trailing_stop(candles, entry, p) for p in pcts] for _, candles, entry in cases]
+
+    def _vec():
+        return [simulate_trailing_stop_array(arr, entry, pcts) for arr, _, entry in cases]
+
+    loop_results, t_loop = _timeit(_loop)
+    vec_results, t_vec = _timeit(_vec, repeat=3)
+
+    mismatches = 0
+    fired = 0
+    for per_pct, (prices, reasons, peaks, times) in zip(loop_results, vec_results):
+        for j, (price, reason, peak, exit_time) in enumerate(per_pct):
+            same = (price == prices[j] and reason == reasons[j]
+                    and peak == peaks[j] and exit_time == times[j])
+            mismatches += not same
+            fired += reason == "trailing_stop"
+
+    print(f"  루프 {t_loop:8.3f}s | NumPy {t_vec:8.4f}s | x{t_loop / t_vec:,.0f} | "
+          f"결과 일치: {'✅' if mismatches == 0 else '❌'} (트레일링 발동 {fired:,}건)")
+    assert mismatches == 0, f"트레일링 스탑 결과 불일치 {mismatches}건"
+
+
+# ══════════════════════════════════════════════════════════
+# 2. 실전 사이클 리플레이 (가상 시계)
+# ══════════════════════════════════════════════════════════
+
+def _cycle_reference(arr, prev, k, cash, fee, ratio=0.70, max_slippage=0.01):
+    """run_daily_cycle이 리플레이에서 끝나야 할 현금 (돌파 매수 → 익일 08:55 시간 청산)"""
+    up = arr["close"] >= arr["open"]
+    path = np.column_stack([arr["open"], np.where(up, arr["low"], arr["high"]),
+                            np.where(up, arr["high"], arr["low"]), arr["close"]])  # 75초 단위 현재가
+    target = arr["open"][0] + (prev["high"] - prev["low"]) * k
+    hits = np.flatnonzero(path[:-1].ravel() >= target)  # 08:55 봉부터는 청산 시각
+    if len(hits) == 0:
+        return cash, 0
+    buy = path.ravel()[hits[0]]
+    if (buy - target) / target > max_slippage:
+        return cash, 0
+    amount = int(cash * ratio)
+    volume = amount / (1 + fee) / buy
+    return cash - amount + volume * path[-1, 0] * (1 - fee), 1
+
+
+def bench_replay(days=5):
+    """main.run_daily_cycle을 하루(24시간)씩 리플레이 — 체결/잔고가 분봉 경로와 일치하는지"""
+    import main as bot
+    from replay import replay_daily_cycle
+
+    dates = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-01") + days + 1)
+    arrs = [make_synthetic_minutes(seed=10 + i, start_price=3000000.0, sigma=0.003, date_str=str(d))
+            for i, d in enumerate(dates)]
+    minutes = {bot.MARKET: np.concatenate(arrs)}
+    daily = {bot.MARKET: [{"date": str(d), "open": a["open"][0], "high": a["high"].max(), "low": a["low"].min(),
+                           "close": a["close"][-1], "volume": 0.0} for d, a in zip(dates, arrs)]}
+    print(f"\n[리플레이] run_daily_cycle {days}일 (CHECK_INTERVAL={bot.CHECK_INTERVAL}초, BTC 필터 데이터 없음)")
+
+    same, walls, trades = True, [], 0
+    for d in range(1, days + 1):
+        result = replay_daily_cycle(str(dates[d]), minutes, daily, cash=1000000)
+        walls.append(result["wall_seconds"])
+        prev = daily[bot.MARKET][d - 1]
+        k = bot.calculate_dynamic_k(prev["open"], prev["close"], prev["high"], prev["low"])
+        cash, traded = _cycle_reference(arrs[d], prev, k, 1000000, bot.BUY_FEE)
+        trades += traded
+        same &= abs(result["cash"] - cash) < 1e-6 and result["trades"] == traded
+    print(f"  사이클 평균 {np.mean(walls):.2f}s (가상 24시간) | 매매 {trades}일 | 잔고 일치: {'✅' if same else '❌'}")
+    assert same, "리플레이: run_daily_cycle 체결이 분봉 경로와 불일치"
+
+
+# ══════════════════════════════════════════════════════════
+# 3. 멀티 마켓 시세 스트림 (마켓별 REST 폴링 vs 한 연결 구독 + 최신가 테이블)
+# ══════════════════════════════════════════════════════════
+
+def bench_ticker_fanout(ticks=2_000, reads=200_000):
+    """전 마켓을 한 연결로 구독 → 루프는 테이블만 읽음 (틱당 네트워크 0회) / 스냅샷 일관성 / 끊김 시 배치 1회"""
+    import threading
+    from shared import price_stream
+    from main import WATCH_MARKETS
+
+    print(f"\n[시세 스트림] {len(WATCH_MARKETS)}개 마켓 한 연결 구독 ({', '.join(WATCH_MARKETS)})")
+    server = price_stream.ReplayPriceServer()
+    batch_calls = []
+    feed = price_stream.UpbitPriceStream(WATCH_MARKETS, ws_url=server.url,
+                                         batch_fallback=lambda markets: batch_calls.append(markets) or {})
+    feed.start()
+    feed.wait_connected(5)
+    for i, market in enumerate(WATCH_MARKETS):
+        server.push(price_stream.upbit_tick_message(market, 1000.0 + i))
+    while len(feed.snapshot()) < len(WATCH_MARKETS):  # 첫 틱 전 마켓은 배치 REST로 채워짐
+        feed.wait(WATCH_MARKETS[-1], None, 0.01)
+    warmup_calls = feed.fallback_calls
+
+    t0 = time.perf_counter()
+    for _ in range(reads // len(WATCH_MARKETS)):
+        for market in WATCH_MARKETS:
+            feed.get(market)
+    t_read = (time.perf_counter() - t0) / reads
+    zero_network = feed.fallback_calls == warmup_calls
+    got = feed.snapshot()
+    same = got == {m: 1000.0 + i for i, m in enumerate(WATCH_MARKETS)}
+
+    # 일관성: 전 마켓을 같은 값으로 갱신하는 틱 묶음을 쓰는 동안, 잠금 없이 읽은 스냅샷이 섞이지 않는지
+    torn, done = [0], threading.Event()
+
+    def reader():
+        while not done.is_set():
+            if len(set(feed.snapshot().values())) != 1:
+                torn[0] += 1
+
+    feed._push([(m, 0.0) for m in WATCH_MARKETS])
+    thread = threading.Thread(target=reader)
+    thread.start()
+    for v in range(1, ticks + 1):
+        feed._push([(m, float(v)) for m in WATCH_MARKETS])
+    done.set()
+    thread.join()
+    feed.stop()
+    server.close()
+
+    # 끊긴 동안: 루프가 매 초 전 마켓을 읽어도 REST는 배치 1회
+    batch_calls.clear()
+    feed = price_stream.UpbitPriceStream(WATCH_MARKETS, ws_url="ws://127.0.0.1:9", poll_interval=1.0,
+                                         batch_fallback=lambda markets: batch_calls.append(markets) or {})
+    for _ in range(100):
+        for market in WATCH_MARKETS:
+            feed.get(market)
+    one_batch = len(batch_calls) == 1 and batch_calls[0] == WATCH_MARKETS
+
+    print(f"  가격 읽기 {t_read * 1e9:5.0f}ns/회 (REST 0회: {'✅' if zero_network else '❌'}) | "
+          f"틱 묶음 {ticks:,}건 쓰는 중 스냅샷 섞임 {torn[0]}회 | 끊김 시 {len(WATCH_MARKETS)}개 마켓 × 100회 읽기 → "
+          f"배치 REST {len(batch_calls)}회 | 가격 일치: {'✅' if same else '❌'}")
+    assert same and zero_network and torn[0] == 0 and one_batch, "시세 스트림: 테이블/스냅샷/배치 fallback 이상"
+
+
+# ══════════════════════════════════════════════════════════
+# 4. 다종목 돌파 스캐너 (리플레이 vs 분봉 경로의 첫 돌파)
+# ══════════════════════════════════════════════════════════
+
+def _scan_reference(arrs, prevs, cash, fee, ratio=0.70, max_slippage=0.01):
+    """scanner.run_daily_cycle이 끝나야 할 현금과 매수 마켓 (시간순 첫 돌파, 동시면 돌파 강도 최대)"""
+    from backtest import dynamic_k
+
+    paths, targets = {}, {}
+    for market, arr in arrs.items():
+        up = arr["close"] >= arr["open"]
+        paths[market] = np.column_stack([arr["open"], np.where(up, arr["low"], arr["high"]),
+                                         np.where(up, arr["high"], arr["low"]), arr["close"]]).ravel()
+        prev = prevs[market]
+        targets[market] = arr["open"][0] + (prev["high"] - prev["low"]) * dynamic_k(prev)
+    armed = set(arrs)
+    for i in range(len(next(iter(paths.values()))) - 4):  # 08:55 봉부터는 청산 시각
+        hits = sorted(((paths[m][i] - targets[m]) / targets[m], m) for m in armed if paths[m][i] >= targets[m])
+        for strength, market in reversed(hits):
+            if strength > max_slippage:
+                armed.discard(market)
+                continue
+            amount = int(cash * ratio)
+            volume = amount / (1 + fee) / paths[market][i]
+            return cash - amount + volume * paths[market][-4] * (1 - fee), market
+    return cash, None
+
+
+def bench_scanner(days=5, wide=50, checks=20_000):
+    """scanner 리플레이 체결이 분봉 경로의 첫 돌파와 같은지 + 마켓 수십 개일 때 판정/조회 비용"""
+    import scanner
+    from replay import replay_daily_cycle
+
+    markets = list(scanner.SCAN_MARKETS)
+    dates = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-01") + days + 1)
+    arrs = {m: [make_synthetic_minutes(seed=100 * j + i, start_price=1000.0 * (j + 1), sigma=0.003, date_str=str(d))
+                for i, d in enumerate(dates)] for j, m in enumerate(markets)}
+    minutes = {m: np.concatenate(a) for m, a in arrs.items()}
+    daily = {m: [{"date": str(d), "open": a["open"][0], "high": a["high"].max(), "low": a["low"].min(),
+                  "close": a["close"][-1], "volume": 1.0} for d, a in zip(dates, arrs[m])] for m in markets}
+    print(f"\n[다종목 스캐너] {len(markets)}개 코인 {days}일 리플레이 (필터: {scanner.SCAN_FILTER}, BTC 데이터 없음)")
+
+    same, walls, picked = True, [], []
+    for d in range(1, days + 1):
+        result = replay_daily_cycle(str(dates[d]), minutes, daily, cash=1000000, module=scanner)
+        walls.append(result["wall_seconds"])
+        cash, market = _scan_reference({m: arrs[m][d] for m in markets}, {m: daily[m][d - 1] for m in markets},
+                                       1000000, scanner.BUY_FEE)
+        buys = [f["market"] for f in result["fills"] if f["side"] == "bid"]
+        picked.append(market.split("-")[1] if market else "-")
+        same &= abs(result["cash"] - cash) < 1e-6 and buys == ([market] if market else [])
+
+    # 감시 대상 밖 코인의 미청산 포지션 복구 → 그 코인도 구독해 08:55 청산
+    held = markets[-1]
+    qty, avg = 0.5, daily[held][0]["close"]
+    saved = scanner.SCAN_MARKETS, scanner.load_unclosed_position
+    scanner.SCAN_MARKETS, scanner.load_unclosed_position = markets[:-1], lambda: (held, avg, qty)
+    try:
+        result = replay_daily_cycle(str(dates[1]), minutes, daily, cash=1000000, module=scanner,
+                                    holdings={held.split("-")[1]: (qty, avg)})
+    finally:
+        scanner.SCAN_MARKETS, scanner.load_unclosed_position = saved
+    sells = [(f["market"], f["price"]) for f in result["fills"] if f["side"] == "ask"]
+    recover_ok = sells == [(held, arrs[held][1]["open"][-1])]  # 08:55 봉 시가
+
+    # 마켓 수십 개: 틱마다 판정 비용 (스냅샷 dict 한 번 훑기)
+    rng = np.random.default_rng(0)
+    names = [f"KRW-C{i:02d}" for i in range(wide)]
+    targets = {m: {"target": 100.0 + i, "features": {"date": "2024-01-01"}} for i, m in enumerate(names)}
+    wide_scanner = scanner.BreakoutScanner(targets)
+    snapshots = [{m: 90.0 + i + rng.uniform(0, 5) for i, m in enumerate(names)} for _ in range(64)]
+    _, t_check = _timeit(lambda: [wide_scanner.check(snapshots[i & 63]) for i in range(checks)])
+    print(f"  사이클 평균 {np.mean(walls):.2f}s | 매수 코인 {picked} | 잔고·종목 일치: {'✅' if same else '❌'}")
+    print(f"  감시 대상 밖 {held} 보유 복구 → 08:55 청산: {'✅' if recover_ok else '❌'}")
+    print(f"  {wide}개 마켓: 판정 {t_check / checks * 1e6:.1f}µs/틱 | 감시 REST 0회/틱 (끊기면 배치 1회/초) | "
+          f"09:00 일봉 {wide}건 @ {scanner.QUOTE_RATE}건/초 = {wide / scanner.QUOTE_RATE:.1f}초")
+    assert same and recover_ok, "다종목 스캐너: 리플레이 체결이 첫 돌파 경로와 불일치 또는 복구 포지션 미청산"
+
+
+# ══════════════════════════════════════════════════════════
+# 5. 업비트 클라이언트 (호출마다 새 연결 + PyJWT vs 공용 세션 + 계좌 스냅샷 + Signer)
+# ══════════════════════════════════════════════════════════
+
+_ACCOUNTS = [{"currency": "KRW", "balance": "1000000.0", "avg_buy_price": "0"},
+             {"currency": "ETH", "balance": "0.5", "avg_buy_price": "3500000"}]
+
+
+class _UpbitStubHandler(BaseHTTPRequestHandler):
+    """계좌/주문 응답만 흉내 내는 로컬 업비트 서버 (keep-alive, JWT 서명·query_hash 검증)"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 헤더/본문 분할 전송 시 지연 ACK(40ms) 방지
+    secret = "SECRET" * 6  # HS256 권장 키 길이(32바이트) 이상
+    connections = set()
+    requests = 0
+    rejected = 0
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _verify(self, query):
+        import jwt
+        import upbit_broker
+
+        cls = _UpbitStubHandler
+        cls.connections.add(self.client_address)
+        cls.requests += 1
+        try:
+            claims = jwt.decode(self.headers["Authorization"][7:], cls.secret, algorithms=["HS256"])
+            ok = claims.get("query_hash") == (upbit_broker._query_hash(query) if query else None)
+        except (jwt.PyJWTError, TypeError):
+            ok = False
+        cls.rejected += not ok
+        return ok
+
+    def do_GET(self):
+        self._reply(_ACCOUNTS if self._verify(None) else {"error": {"name": "invalid_query_payload"}})
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self._reply({"uuid": "stub-order"} if self._verify(query) else {"error": {"name": "invalid_query_payload"}})
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_upbit_client(checks=200, tokens=20_000):
+    """루프 1회 계좌 확인(보유 수량 + 매수 평균가): 기존 함수 2회 호출 vs UpbitClient 스냅샷 1회"""
+    import uuid
+    import jwt
+    import requests
+    import upbit_broker
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _UpbitStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"\n[업비트 클라이언트] 로컬 서버 계좌 확인 {checks}회 (TLS 없음 — 실서버는 연결당 핸드셰이크 비용이 더 큼)")
+
+    def legacy_accounts():
+        """기존 upbit_broker: 호출마다 PyJWT 토큰 + requests.get 새 연결"""
+        token = jwt.encode({"access_key": "KEY", "nonce": str(uuid.uuid4())}, _UpbitStubHandler.secret)
+        return requests.get(f"{url}/v1/accounts", headers={"Authorization": f"Bearer {token}"},
+                            timeout=upbit_broker.API_TIMEOUT).json()
+
+    def legacy():
+        out = []
+        for _ in range(checks):
+            qty = next(float(i["balance"]) for i in legacy_accounts() if i["currency"] == "ETH")
+            avg = next(float(i["avg_buy_price"]) for i in legacy_accounts() if i["currency"] == "ETH")
+            out.append((qty, avg))
+        return out
+
+    now = [0.0]
+    client = upbit_broker.UpbitClient("KEY", _UpbitStubHandler.secret, session=upbit_broker.make_session(), clock=lambda: now[0])
+
+    def pooled():
+        out = []
+        for _ in range(checks):
+            now[0] += upbit_broker.ACCOUNTS_TTL  # 체크 간격 ≥ TTL: 체크마다 새 스냅샷
+            out.append((client.get_holding_quantity("ETH"), client.get_avg_buy_price("ETH")))
+        return out
+
+    old_base, upbit_broker.API_BASE = upbit_broker.API_BASE, url
+    try:
+        stub = _UpbitStubHandler
+        stub.connections.clear()
+        stub.requests = 0
+        ref, t_legacy = _timeit(legacy)
+        req_legacy, conn_legacy = stub.requests, len(stub.connections)
+        stub.connections.clear()
+        stub.requests = 0
+        got, t_pooled = _timeit(pooled)
+        req_pooled, conn_pooled = stub.requests, len(stub.connections)
+        order = client.post_buy_order("KRW-ETH", price=5000)  # query_hash 서명 확인 + 스냅샷 폐기
+        fresh = client.get_holding_quantity("ETH") is not None and stub.requests == req_pooled + 2
+    finally:
+        upbit_broker.API_BASE = old_base
+        server.shutdown()
+        server.server_close()
+
+    secret = _UpbitStubHandler.secret
+    signer = upbit_broker.Signer("KEY", secret)
+    _, t_jwt = _timeit(lambda: [jwt.encode({"access_key": "KEY", "nonce": str(uuid.uuid4())}, secret)
+                                for _ in range(tokens)])
+    _, t_sign = _timeit(lambda: [signer.token() for _ in range(tokens)])
+
+    same = ref == got and stub.rejected == 0 and order.get("uuid") == "stub-order" and fresh
+    print(f"  기존 {t_legacy / checks * 1000:6.2f}ms/체크 (요청 {req_legacy / checks:.0f}회, 연결 {conn_legacy}개) | "
+          f"UpbitClient {t_pooled / checks * 1000:6.2f}ms/체크 (요청 {req_pooled / checks:.0f}회, 연결 {conn_pooled}개) | "
+          f"x{t_legacy / t_pooled:.1f}")
+    print(f"  JWT 서명 PyJWT {t_jwt / tokens * 1e6:.1f}µs → Signer {t_sign / tokens * 1e6:.1f}µs | "
+          f"서명 검증 실패 {stub.rejected}회 | 주문 후 새 잔고 조회: {'✅' if fresh else '❌'} | "
+          f"결과 일치: {'✅' if same else '❌'}")
+    assert same and req_pooled == checks and conn_pooled == 1, "업비트 클라이언트: 요청 수/결과 불일치"
+
+
+def main():
+    print("=" * 72)
+    print("⏱️ 코인 백테스트 성능 벤치마크")
+    print("=" * 72)
+    bench_trailing_stop()
+    bench_replay()
+    bench_ticker_fanout()
+    bench_scanner()
+    bench_upbit_client()
+    print("\n✅ 모든 벤치마크 완료")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# config.py
+# 코인 봇 공통 설정 — main.py(ETH 단일), scanner.py(다종목), backtest.py가 같이 씀
+# ──────────────────────────────────────────────────────────
+# 봇끼리 서로의 모듈을 불러오지 않도록 API 키, 대상 코인, 매매/사이클 설정을 여기에 모읍니다.
+# 봇별 설정(마켓, 로그 파일, 필터 등)은 각 봇 파일에 둡니다.
+# ──────────────────────────────────────────────────────────
+import os
+from datetime import timezone, timedelta
+from dotenv import load_dotenv
+
+# ── 환경 설정 ──
+load_dotenv()
+UPBIT_ACCESS_KEY = os.getenv("UPBIT_ACCESS_KEY")
+UPBIT_SECRET_KEY = os.getenv("UPBIT_SECRET_KEY")
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
+
+# ── 대상 코인 ──
+COINS = ["KRW-ETH", "KRW-XRP", "KRW-SOL", "KRW-DOGE", "KRW-ADA"]
+BTC_MARKET = "KRW-BTC"
+
+# ── 매매 파라미터 ──
+K_MIN = 0.3                # 추세 명확 시 최소 K (노이즈 비율 ≤ 0.4)
+K_MAX = 0.6                # 노이즈 심할 때 최대 K (노이즈 비율 ≥ 0.7)
+MAX_SLIPPAGE = 0.01        # 목표가 대비 1% 이상 올라가 있으면 매수 스킵
+POSITION_RATIO = 0.70      # 현금의 70% 투입
+CHECK_INTERVAL = 1         # 1초마다 체크
+# 업비트 수수료 (0.05%)
+BUY_FEE = 0.0005
+SELL_FEE = 0.0005
+# 사이클 시간 (KST)
+CYCLE_START_HOUR = 9       # 09:00 새 사이클 시작
+CYCLE_START_MINUTE = 0
+SELL_HOUR = 8              # 08:55 청산
+SELL_MINUTE = 55
+
+KST = timezone(timedelta(hours=9))
+
+
+def is_sell_time(now):
+    """청산 시각인지 확인합니다 (08:55~08:59)."""
+    return now.hour == SELL_HOUR and now.minute >= SELL_MINUTE
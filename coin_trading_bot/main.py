@@ -16,46 +16,32 @@
 import os
 import csv
 import time
-from datetime import datetime, timezone, timedelta
-from dotenv import load_dotenv
+from datetime import datetime
 
 import upbit_broker
+from shared import price_stream, fill_tracker, latency
 from telegram_notifier import TelegramNotifier
 from trade_logger import init_db, log_entry, log_exit
 from feature_extractor import extract_all_features
+from config import (
+    UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, COINS, BTC_MARKET,
+    K_MIN, K_MAX, MAX_SLIPPAGE, POSITION_RATIO, CHECK_INTERVAL, BUY_FEE, SELL_FEE,
+    CYCLE_START_HOUR, CYCLE_START_MINUTE, SELL_HOUR, SELL_MINUTE, KST, is_sell_time,
+)
 
-# ── 환경 설정 ──
-load_dotenv()
-UPBIT_ACCESS_KEY = os.getenv("UPBIT_ACCESS_KEY")
-UPBIT_SECRET_KEY = os.getenv("UPBIT_SECRET_KEY")
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
-
+# ── 환경 설정 (공통 설정은 config.py) ──
 MARKET = "KRW-ETH"         # 업비트 마켓 코드
 CURRENCY = "ETH"            # 계좌 조회용 통화
+# 시세 스트림 구독 마켓 (한 번에 구독: 매매 마켓, BTC 필터, 백테스트 대상 코인)
+WATCH_MARKETS = list(dict.fromkeys([MARKET, BTC_MARKET] + COINS))
 
 # ── 전략 파라미터 ──
 BOT_NAME = "ETH-Volatility"
 LOG_FILE = "trade_log_eth.csv"
-K_MIN = 0.3                # 추세 명확 시 최소 K (노이즈 비율 ≤ 0.4)
-K_MAX = 0.6                # 노이즈 심할 때 최대 K (노이즈 비율 ≥ 0.7)
-MAX_SLIPPAGE = 0.01        # 목표가 대비 1% 이상 올라가 있으면 매수 스킵
-POSITION_RATIO = 0.70      # 현금의 70% 투입
-CHECK_INTERVAL = 1         # 1초마다 체크
-# 업비트 수수료 (0.05%)
-BUY_FEE = 0.0005
-SELL_FEE = 0.0005
-# 사이클 시간 (KST)
-CYCLE_START_HOUR = 9       # 09:00 새 사이클 시작
-CYCLE_START_MINUTE = 0
-SELL_HOUR = 8              # 08:55 청산
-SELL_MINUTE = 55
 # BTC 하락 필터
 BTC_FILTER_ENABLED = True
 BTC_FILTER_THRESHOLD = -1.0  # BTC 전일 대비 이 %이하이면 매수 스킵
 
-KST = timezone(timedelta(hours=9))
-
 
 # ── 유틸리티 ──
 def log_trade(side, price, quantity, profit=0, reason=""):
@@ -134,6 +120,7 @@ def run_bot():
 
     # DB 초기화 (테이블 없으면 생성)
     init_db()
+    latency.start()  # API 응답 시간 → 같은 DB (리포트: python ../latency.py)
 
     print("=" * 60)
     print(f"🚀 ETH 변동성 돌파 봇 시작! (업비트)")
@@ -157,6 +144,9 @@ def run_bot():
 
 def run_daily_cycle(notifier):
     """하루 사이클: 09:00 시작 → 다음날 08:55 청산"""
+    # 계좌 조회는 스냅샷 캐시를 공유 (보유 수량 + 매수 평균가를 조회 1회로)
+    upbit = upbit_broker.UpbitClient(UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY)
+    fills = fill_tracker.FillTracker(upbit.get_order, fill_tracker.upbit_fill)
 
     now = datetime.now(KST)
     print(f"\n{'='*60}")
@@ -212,7 +202,7 @@ def run_daily_cycle(notifier):
         print(f"   BTC 전일 종가: {btc_yesterday_close:,.0f}원 (필터 기준)")
 
     # ── STEP 3: 포지션 확인 ──
-    actual_qty = upbit_broker.get_holding_quantity(UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, CURRENCY)
+    actual_qty = upbit.get_holding_quantity(CURRENCY)
     csv_price, csv_qty = load_unclosed_position()
 
     if actual_qty is None:
@@ -228,7 +218,7 @@ def run_daily_cycle(notifier):
             bought_price, holding_qty = 0, 0
             state = "WAITING"
     elif actual_qty > 0:
-        actual_price = upbit_broker.get_avg_buy_price(UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, CURRENCY)
+        actual_price = upbit.get_avg_buy_price(CURRENCY)
         bought_price = actual_price if actual_price > 0 else csv_price
         holding_qty = actual_qty
         if bought_price <= 0:
@@ -296,29 +286,39 @@ def run_daily_cycle(notifier):
 
     cycle_start_time = datetime.now(KST)  # hard cutoff 판단용
     trade_id = None  # 거래 로그 ID (SQLite)
-    loop_count = 0
-    MANUAL_CHECK_INTERVAL = 15
+    MANUAL_CHECK_SECONDS = 15  # 15초마다 잔고 조회로 수동매매 감지 (틱 수와 무관)
+    last_manual_check = time.time()
+    last_status_print = 0.0  # 상태 출력은 틱마다가 아니라 CHECK_INTERVAL초에 1회
     zero_qty_count = 0
 
+    # 체결가는 WebSocket ticker 한 연결로 전 마켓(매매 마켓 + BTC 필터 + 백테스트 코인)을 받아
+    # 최신가 테이블에서 읽음 (틱당 네트워크 호출 0회), 끊긴 동안에는 배치 현재가 조회 1회/초
+    feed = price_stream.UpbitPriceStream(
+        WATCH_MARKETS, batch_fallback=lambda markets: upbit_broker.get_batch_prices(markets))
+    feed.start()
+
     # 잔고 미리 조회 (돌파 시 즉시 매수하기 위해)
     cached_buy_amount = 0
     if state == "WAITING":
-        cash = upbit_broker.get_balance(UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY)
+        cash = upbit.get_balance()
         cached_buy_amount = int(cash * POSITION_RATIO)
         print(f"   현금: {cash:,.0f}원 → 매수 금액: {cached_buy_amount:,}원")
 
     while True:
         try:
             now = datetime.now(KST)
-            loop_count += 1
-            check_manual = (loop_count % MANUAL_CHECK_INTERVAL == 0)
+            check_manual = time.time() - last_manual_check >= MANUAL_CHECK_SECONDS
+            if check_manual:
+                last_manual_check = time.time()
+            show_status = time.time() - last_status_print >= CHECK_INTERVAL
+            if show_status:
+                last_status_print = time.time()
 
             # 청산 시각 체크 (08:55)
             if is_sell_time(now) and state == "BOUGHT":
-                sell_price = upbit_broker.get_current_price(MARKET)
+                sell_price = feed.get(MARKET)
                 if sell_price and sell_price > 0 and holding_qty > 0:
-                    res = upbit_broker.post_sell_order(
-                        UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, MARKET, volume=holding_qty)
+                    res = upbit.post_sell_order(MARKET, volume=holding_qty)
 
                     if "uuid" in res:
                         profit_rate = (sell_price * (1 - SELL_FEE) / (bought_price * (1 + BUY_FEE)) - 1) * 100
@@ -364,7 +364,7 @@ def run_daily_cycle(notifier):
                 return
 
             # 현재가 조회
-            current_price = upbit_broker.get_current_price(MARKET)
+            current_price = feed.get(MARKET)
             if current_price is None:
                 time.sleep(10)
                 continue
@@ -373,11 +373,9 @@ def run_daily_cycle(notifier):
             if state == "WAITING":
                 # 수동 매수 감지
                 if check_manual:
-                    actual_qty = upbit_broker.get_holding_quantity(
-                        UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, CURRENCY)
+                    actual_qty = upbit.get_holding_quantity(CURRENCY)
                     if actual_qty is not None and actual_qty > 0:
-                        actual_price = upbit_broker.get_avg_buy_price(
-                            UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, CURRENCY)
+                        actual_price = upbit.get_avg_buy_price(CURRENCY)
                         bought_price = actual_price if actual_price > 0 else current_price
                         holding_qty = actual_qty
                         notify(notifier, "🔍 <b>수동 매수 감지</b>",
@@ -387,13 +385,14 @@ def run_daily_cycle(notifier):
                         time.sleep(CHECK_INTERVAL)
                         continue
 
-                print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | "
-                      f"목표가: {target_price:,.0f}원 | 대기 중")
+                if show_status:
+                    print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | "
+                          f"목표가: {target_price:,.0f}원 | 대기 중")
 
                 if current_price >= target_price:
                     # BTC 하락 필터 체크
                     if BTC_FILTER_ENABLED and btc_yesterday_close:
-                        btc_now = upbit_broker.get_current_price("KRW-BTC")
+                        btc_now = feed.get(BTC_MARKET)
                         if btc_now and btc_yesterday_close > 0:
                             btc_change = (btc_now - btc_yesterday_close) / btc_yesterday_close * 100
                             if btc_change <= BTC_FILTER_THRESHOLD:
@@ -429,24 +428,13 @@ def run_daily_cycle(notifier):
                     print(f"\n🔥 돌파! {current_price:,.0f}원 ≥ {target_price:,.0f}원")
                     print(f"   매수 금액: {cached_buy_amount:,}원")
 
-                    res = upbit_broker.post_buy_order(
-                        UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, MARKET, price=cached_buy_amount)
+                    res = upbit.post_buy_order(MARKET, price=cached_buy_amount)
 
                     if "uuid" in res:
-                        # 체결 확인 (20초 대기)
-                        order_uuid = res["uuid"]
-                        bought_price = 0
-                        holding_qty = 0
-                        for _ in range(10):
-                            time.sleep(2)
-                            qty = upbit_broker.get_holding_quantity(
-                                UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, CURRENCY)
-                            if qty is not None and qty > 0:
-                                holding_qty = qty
-                                avg = upbit_broker.get_avg_buy_price(
-                                    UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, CURRENCY)
-                                bought_price = avg if avg > 0 else current_price
-                                break
+                        # 체결 확인: 주문 조회로 체결가/수량/수수료 확인 (0.25초부터 간격 2배, 최대 20초)
+                        fill = fills.wait(res["uuid"])
+                        bought_price = (fill["price"] or current_price) if fill else 0
+                        holding_qty = fill["quantity"] if fill else 0
 
                         if holding_qty > 0:
                             log_trade("매수", bought_price, holding_qty,
@@ -471,12 +459,13 @@ def run_daily_cycle(notifier):
                                    f"가격: {bought_price:,.0f}원\n수량: {holding_qty:.8f} ETH\n"
                                    f"목표가: {target_price:,.0f}원\n"
                                    f"청산: 내일 08:55 시간 청산")
-                            print(f"✅ 매수 체결! {bought_price:,.0f}원 × {holding_qty:.8f} ETH")
+                            print(f"✅ 매수 체결! {bought_price:,.0f}원 × {holding_qty:.8f} ETH "
+                                  f"(수수료 {fill['fee']:,.0f}원, 확인 {fill['latency'] * 1000:.0f}ms)")
                             state = "BOUGHT"
                         else:
                             notify(notifier, "⚠️ <b>미체결 감지</b>",
-                                   f"20초 내 잔고 미확인\n당일 매매를 포기합니다")
-                            print(f"⚠️ 미체결: 20초 내 잔고 확인 실패.")
+                                   f"20초 내 체결 미확인\n당일 매매를 포기합니다")
+                            print(f"⚠️ 미체결: 20초 내 체결 확인 실패.")
                             state = "SOLD"
                     else:
                         error_msg = res.get("error", {}).get("message", str(res))
@@ -487,8 +476,7 @@ def run_daily_cycle(notifier):
             elif state == "BOUGHT":
                 # 수동 매도 감지
                 if check_manual:
-                    actual_qty = upbit_broker.get_holding_quantity(
-                        UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, CURRENCY)
+                    actual_qty = upbit.get_holding_quantity(CURRENCY)
                     if actual_qty is None:
                         print(f"⚠️ 잔고 조회 실패 → 기존 수량 유지")
                         zero_qty_count = 0
@@ -516,15 +504,18 @@ def run_daily_cycle(notifier):
 
                 profit_rate = (current_price * (1 - SELL_FEE) / (bought_price * (1 + BUY_FEE)) - 1) * 100
 
-                print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | "
-                      f"수익률: {profit_rate:+.2f}% | "
-                      f"보유 ({holding_qty:.6f} ETH) | 08:55 청산 대기")
+                if show_status:
+                    print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | "
+                          f"수익률: {profit_rate:+.2f}% | "
+                          f"보유 ({holding_qty:.6f} ETH) | 08:55 청산 대기")
 
             # ── 청산 완료 ──
             elif state == "SOLD":
-                print(f"[{now.strftime('%H:%M:%S')}] 청산 완료. 다음 사이클 대기 중...")
+                if show_status:
+                    print(f"[{now.strftime('%H:%M:%S')}] 청산 완료. 다음 사이클 대기 중...")
 
-            time.sleep(CHECK_INTERVAL)
+            # 새 체결가가 오면 즉시, 아니면 CHECK_INTERVAL초 뒤 다음 루프
+            feed.wait(MARKET, current_price, CHECK_INTERVAL)
 
         except Exception as e:
             error_msg = f"에러: {str(e)}"
@@ -535,11 +526,6 @@ def run_daily_cycle(notifier):
             time.sleep(60)
 
 
-def is_sell_time(now):
-    """청산 시각인지 확인합니다 (08:55~08:59)."""
-    return now.hour == SELL_HOUR and now.minute >= SELL_MINUTE
-
-
 def is_next_cycle(now):
     """다음 사이클 전환 시점인지 확인합니다.
     WAITING 상태에서 다음날 08:55 이후 = 사이클 종료
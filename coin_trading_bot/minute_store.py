@@ -0,0 +1,176 @@
+"""
+minute_store.py — 백테스트용 분봉 바이너리 저장소
+──────────────────────────────────────────────────────────
+기존 캐시는 종목×날짜마다 JSON 파일 1개(backtest_cache/minutes/KRW_ETH_2024-01-01.json)라
+스윕 한 번에 수천 개의 작은 JSON을 파싱합니다.
+
+여기서는 종목별로 파일 2개만 사용합니다:
+  backtest_cache/minute_store/KRW_ETH_5m.bin         MINUTE_DTYPE 레코드를 이어 붙인 원시 배열
+  backtest_cache/minute_store/KRW_ETH_5m.index.json  {날짜: [시작, 끝]} 레코드 범위
+
+읽기는 np.memmap으로 열어 날짜별 슬라이스(복사 없음)를 돌려주고,
+쓰기는 파일 끝에 덧붙인 뒤 인덱스만 교체합니다 (append-only).
+──────────────────────────────────────────────────────────
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+MINUTE_DTYPE = np.dtype([
+    ("time", "datetime64[s]"),   # candle_date_time_kst
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+])
+
+LEGACY_FILE_PATTERN = re.compile(r"^(?P<market>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.json$")
+
+
+def from_candles(candles):
+    """list of dict (fetch_minute_candles 형식) → MINUTE_DTYPE 배열"""
+    arr = np.empty(len(candles), dtype=MINUTE_DTYPE)
+    if not candles:
+        return arr
+    arr["time"] = np.array([c["datetime_kst"] for c in candles], dtype="datetime64[s]")
+    for field in ("open", "high", "low", "close"):
+        arr[field] = [c[field] for c in candles]
+    return arr
+
+
+def to_candles(arr):
+    """MINUTE_DTYPE 배열 → list of dict (simulate_trailing_stop 등 기존 함수용)"""
+    times = np.datetime_as_string(arr["time"], unit="s")
+    return [
+        {"datetime_kst": str(t), "open": float(o), "high": float(h),
+         "low": float(l), "close": float(c)}
+        for t, o, h, l, c in zip(times, arr["open"], arr["high"], arr["low"], arr["close"])
+    ]
+
+
+class MinuteStore:
+    def __init__(self, root, unit=5):
+        self.root = root
+        self.unit = unit
+        self._indexes = {}   # market → {date: (start, stop)}
+        self._arrays = {}    # market → np.memmap
+
+    # ── 경로 ──
+
+    def _base(self, market):
+        return os.path.join(self.root, f"{market.replace('-', '_')}_{self.unit}m")
+
+    def _data_file(self, market):
+        return self._base(market) + ".bin"
+
+    def _index_file(self, market):
+        return self._base(market) + ".index.json"
+
+    # ── 인덱스 ──
+
+    def index(self, market):
+        """{날짜: (시작, 끝)} 레코드 범위"""
+        if market not in self._indexes:
+            path = self._index_file(market)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    self._indexes[market] = {d: tuple(r) for d, r in json.load(f).items()}
+            else:
+                self._indexes[market] = {}
+        return self._indexes[market]
+
+    def dates(self, market):
+        return sorted(self.index(market))
+
+    def has(self, market, date_str):
+        return date_str in self.index(market)
+
+    # ── 읽기 ──
+
+    def array(self, market):
+        """종목 전체 분봉 (메모리맵, 읽기 전용)"""
+        if market not in self._arrays:
+            path = self._data_file(market)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                return np.empty(0, dtype=MINUTE_DTYPE)
+            self._arrays[market] = np.memmap(path, dtype=MINUTE_DTYPE, mode="r")
+        return self._arrays[market]
+
+    def day(self, market, date_str):
+        """해당 날짜(업비트 사이클 09:00~익일 08:59) 분봉 슬라이스. 없으면 None"""
+        span = self.index(market).get(date_str)
+        if span is None:
+            return None
+        return self.array(market)[span[0]:span[1]]
+
+    # ── 쓰기 ──
+
+    def append_days(self, market, days):
+        """{날짜: MINUTE_DTYPE 배열}을 파일 끝에 덧붙입니다. 이미 있는 날짜/빈 배열은 건너뜁니다.
+        Returns: 추가된 날짜 수
+        """
+        index = dict(self.index(market))
+        new = [(d, arr) for d, arr in sorted(days.items()) if d not in index and len(arr) > 0]
+        if not new:
+            return 0
+
+        os.makedirs(self.root, exist_ok=True)
+        data_file = self._data_file(market)
+        offset = os.path.getsize(data_file) // MINUTE_DTYPE.itemsize if os.path.exists(data_file) else 0
+        with open(data_file, "ab") as f:
+            for date_str, arr in new:
+                arr = np.ascontiguousarray(arr, dtype=MINUTE_DTYPE)
+                f.write(arr.tobytes())
+                index[date_str] = (offset, offset + len(arr))
+                offset += len(arr)
+
+        tmp = self._index_file(market) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({d: list(r) for d, r in index.items()}, f)
+        os.replace(tmp, self._index_file(market))
+
+        self._indexes[market] = index
+        self._arrays.pop(market, None)  # 파일 길이가 바뀌었으므로 다시 매핑
+        return len(new)
+
+    def append_day(self, market, date_str, candles):
+        return self.append_days(market, {date_str: from_candles(candles)})
+
+
+def migrate_json_cache(json_dir, store):
+    """기존 날짜별 JSON 분봉 캐시를 MinuteStore로 한 번에 옮깁니다. (JSON 파일은 그대로 둠)
+    Returns: {market: 추가된 날짜 수}
+    """
+    if not os.path.isdir(json_dir):
+        return {}
+
+    by_market = {}
+    for name in os.listdir(json_dir):
+        m = LEGACY_FILE_PATTERN.match(name)
+        if not m:
+            continue
+        market = m.group("market").replace("_", "-")
+        by_market.setdefault(market, []).append((m.group("date"), name))
+
+    migrated = {}
+    for market, files in sorted(by_market.items()):
+        days = {}
+        for date_str, name in files:
+            if store.has(market, date_str):
+                continue
+            with open(os.path.join(json_dir, name), "r", encoding="utf-8") as f:
+                days[date_str] = from_candles(json.load(f))
+        migrated[market] = store.append_days(market, days)
+    return migrated
+
+
+if __name__ == "__main__":
+    from backtest import MINUTE_CACHE_DIR, MINUTE_STORE
+
+    result = migrate_json_cache(MINUTE_CACHE_DIR, MINUTE_STORE)
+    if not result:
+        print(f"  옮길 JSON 캐시가 없습니다: {MINUTE_CACHE_DIR}")
+    for market, count in result.items():
+        print(f"  {market}: {count}일 이전 완료 (총 {len(MINUTE_STORE.dates(market))}일)")
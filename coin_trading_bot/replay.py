@@ -0,0 +1,438 @@
+"""
+replay.py — 실전 사이클(main.run_daily_cycle) 리플레이 하네스
+──────────────────────────────────────────────────────────
+저장된 5분봉/일봉 위에서 main.run_daily_cycle을 코드 수정 없이 그대로 실행합니다.
+  - time.sleep → 가상 시계만 전진
+  - 시세 대기(feed.wait/wait_ticks) → 다음 가격 변화(분봉 4등분 경계, 최대 다음 정각 분)로 바로 이동
+    (1초씩 돌던 감시 루프를 가격이 바뀌는 순간에만 돌려 24시간 사이클이 1초 안에 끝남.
+     청산 08:55 · 09:00 같은 시각 조건은 모두 정각 분이라 건너뛰지 않음)
+  - datetime.now(KST) → 가상 시각
+  - upbit_broker → ReplayUpbit (분봉으로 현재가/시가/일봉 응답, 시장가 주문은 즉시 체결)
+  - 텔레그램 → 메시지 기록, CSV/SQLite 거래 로그 → 임시 디렉터리
+
+실행: python replay.py 2024-03-15 [KRW-ETH]
+  (분봉: backtest.load_minute_array, 일봉: backtest.load_or_fetch — 캐시에 없으면 API 조회)
+──────────────────────────────────────────────────────────
+"""
+import contextlib
+import functools
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time as _time
+from datetime import datetime as _datetime, timedelta, timezone
+
+import numpy as np
+
+import main as bot
+from shared import price_stream, fill_tracker
+import trade_logger
+
+KST = timezone(timedelta(hours=9))
+
+
+class ReplayFinished(BaseException):
+    """가상 시계가 종료 시각을 넘김 (사이클의 except Exception에 잡히지 않도록 BaseException)"""
+
+
+# ══════════════════════════════════════════════════════════
+# 가상 시계
+# ══════════════════════════════════════════════════════════
+
+class SimClock:
+    def __init__(self, start, end):
+        """start/end: KST 기준 naive datetime"""
+        self.now_kst = start.replace(tzinfo=KST)
+        self.end = end.replace(tzinfo=KST)
+        self.wall_s = int(start.replace(tzinfo=timezone.utc).timestamp())  # KST 벽시계 초 (MINUTE_DTYPE 시각과 같은 기준)
+        self.sleeps = 0
+
+    def now(self, tz=None):
+        if tz is None:
+            return self.now_kst.replace(tzinfo=None)
+        return self.now_kst.astimezone(tz)
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.now_kst += timedelta(seconds=seconds)
+        self.wall_s += seconds
+        if self.now_kst > self.end:
+            raise ReplayFinished()
+
+    def time(self):
+        return self.now_kst.timestamp()
+
+    def datetime_class(self):
+        clock = self
+
+        class SimDatetime(_datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now(tz)
+
+        return SimDatetime
+
+    def time_module(self):
+        clock = self
+
+        class SimTime:
+            sleep = staticmethod(clock.sleep)
+            time = staticmethod(clock.time)
+            monotonic = staticmethod(clock.time)
+
+            def __getattr__(self, name):
+                return getattr(_time, name)
+
+        return SimTime()
+
+
+# ══════════════════════════════════════════════════════════
+# 가짜 업비트
+# ══════════════════════════════════════════════════════════
+
+class ReplayUpbit:
+    """
+    upbit_broker와 같은 함수 이름/인자를 가진 가짜 거래소.
+    minutes: {market: MINUTE_DTYPE 배열 (시간순)}, daily: {market: load_or_fetch 형식 일봉 (oldest first)}
+    진행 중인 5분봉 안에서 현재가는 양봉이면 시가→저가→고가→종가, 음봉이면 시가→고가→저가→종가로 움직입니다.
+    """
+
+    def __init__(self, clock, minutes, daily, cash, fee=0.0):
+        self.clock = clock
+        self.daily = daily
+        self.cash = float(cash)
+        self.fee = fee
+        self.holdings = {}  # 통화 → [수량, 평단]
+        self.fills = []
+        self._bars = {}
+        for market, arr in minutes.items():
+            starts = arr["time"].astype("datetime64[s]").astype(np.int64)
+            up = arr["close"] >= arr["open"]
+            path = np.column_stack([arr["open"], np.where(up, arr["low"], arr["high"]),
+                                    np.where(up, arr["high"], arr["low"]), arr["close"]])
+            unit = int(starts[1] - starts[0]) if len(starts) > 1 else 300
+            self._bars[market] = (arr, starts, path, unit)
+
+    def _cycle_date(self):
+        """업비트 일봉 날짜 (09:00 KST에 바뀜)"""
+        return (self.clock.now() - timedelta(hours=9)).strftime("%Y-%m-%d")
+
+    def _started(self, market):
+        """(지금까지 시작된 분봉 수, 분봉 데이터)"""
+        arr, starts, path, unit = self._bars[market]
+        return np.searchsorted(starts, self.clock.wall_s, side="right"), arr, starts, path, unit
+
+    def _today_candle(self, market):
+        """진행 중인 일봉 (이번 사이클 분봉으로 구성, 없으면 None)"""
+        if market not in self._bars:
+            return None
+        n, arr, starts, path, unit = self._started(market)
+        cycle_start = np.datetime64(f"{self._cycle_date()}T09:00:00").astype(np.int64)
+        first = np.searchsorted(starts, cycle_start, side="left")
+        if n <= first:
+            return None
+        price = self.get_current_price(market)
+        return {"date": self._cycle_date(), "open": float(arr["open"][first]),
+                "high": max(float(arr["high"][first:n - 1].max(initial=price)), price),
+                "low": min(float(arr["low"][first:n - 1].min(initial=price)), price),
+                "close": price, "volume": 0.0}
+
+    # ── 시세 ──
+    def get_current_price(self, market="KRW-ETH"):
+        if market not in self._bars:
+            return None
+        n, arr, starts, path, unit = self._started(market)
+        if n == 0:
+            return None
+        elapsed = self.clock.wall_s - starts[n - 1]
+        if elapsed < unit:
+            return float(path[n - 1, min(3, int(elapsed * 4 // unit))])
+        return float(path[n - 1, 3])
+
+    def next_change(self, markets):
+        """markets 중 가장 먼저 현재가가 바뀌는 벽시계 초 (다음 정각 분을 넘지 않음)"""
+        now = self.clock.wall_s
+        nearest = (now // 60 + 1) * 60
+        for market in markets:
+            if market not in self._bars:
+                continue
+            n, arr, starts, path, unit = self._started(market)
+            if n < len(starts):
+                nearest = min(nearest, starts[n])
+            if n > 0:
+                elapsed = now - starts[n - 1]
+                if elapsed < unit * 3 / 4:
+                    nearest = min(nearest, starts[n - 1] + (int(elapsed * 4 // unit) + 1) * unit / 4)
+        return nearest
+
+    def get_batch_prices(self, markets):
+        prices = {}
+        for market in markets:
+            price = self.get_current_price(market)
+            if price is not None:
+                prices[market] = price
+        return prices
+
+    def get_daily_candles(self, market="KRW-ETH", count=15):
+        """최신순 (진행 중인 오늘 일봉 포함)"""
+        today = self._cycle_date()
+        past = [dict(c) for c in self.daily.get(market, []) if c["date"] < today]
+        today_candle = self._today_candle(market)
+        candles = past[::-1]
+        if today_candle is not None:
+            candles.insert(0, today_candle)
+        return candles[:count]
+
+    def get_yesterday_ohlc(self, market="KRW-ETH"):
+        candles = self.get_daily_candles(market, count=2)
+        if len(candles) < 2:
+            return None
+        y = candles[1]
+        return {"open": y["open"], "high": y["high"], "low": y["low"], "close": y["close"]}
+
+    def get_today_open(self, market="KRW-ETH"):
+        today = self._today_candle(market)
+        return today["open"] if today else None
+
+    # ── 계좌 ──
+    def get_balance(self, access_key, secret_key):
+        return self.cash
+
+    def get_holding_quantity(self, access_key, secret_key, currency="ETH"):
+        return self.holdings.get(currency, [0.0, 0.0])[0]
+
+    def get_avg_buy_price(self, access_key, secret_key, currency="ETH"):
+        return self.holdings.get(currency, [0.0, 0.0])[1]
+
+    # ── 주문 (시장가) ──
+    def post_buy_order(self, access_key, secret_key, market="KRW-ETH", price=0):
+        current = self.get_current_price(market)
+        if current is None or price <= 0 or price > self.cash:
+            return {"error": {"message": "insufficient_funds_bid"}}
+        volume = price / (1 + self.fee) / current
+        qty, avg = self.holdings.get(market.split("-")[1], [0.0, 0.0])
+        self.holdings[market.split("-")[1]] = [qty + volume, (qty * avg + volume * current) / (qty + volume)]
+        self.cash -= price
+        return self._fill(market, "bid", current, volume, fee=price - volume * current)
+
+    def post_sell_order(self, access_key, secret_key, market="KRW-ETH", volume=0):
+        currency = market.split("-")[1]
+        current = self.get_current_price(market)
+        qty, avg = self.holdings.get(currency, [0.0, 0.0])
+        if current is None or volume <= 0 or volume > qty + 1e-12:
+            return {"error": {"message": "insufficient_funds_ask"}}
+        left = qty - volume
+        self.holdings[currency] = [left, avg] if left > 1e-12 else [0.0, 0.0]
+        self.cash += volume * current * (1 - self.fee)
+        return self._fill(market, "ask", current, volume, fee=volume * current * self.fee)
+
+    def _fill(self, market, side, price, volume, fee=0.0):
+        uuid_str = f"replay-{len(self.fills)}"
+        self.fills.append({"uuid": uuid_str, "time": self.clock.now(), "market": market,
+                           "side": side, "price": price, "volume": volume, "fee": fee})
+        return {"uuid": uuid_str, "side": side, "market": market, "state": "wait"}
+
+    def get_order(self, access_key, secret_key, uuid_str):
+        for fill in self.fills:
+            if fill["uuid"] == uuid_str:
+                return {"uuid": uuid_str, "state": "done", "side": fill["side"], "market": fill["market"],
+                        "executed_volume": str(fill["volume"]), "paid_fee": str(fill["fee"]),
+                        "trades": [{"price": str(fill["price"]), "volume": str(fill["volume"]),
+                                    "funds": str(fill["price"] * fill["volume"])}]}
+        return {}
+
+    def UpbitClient(self, access_key=None, secret_key=None, **kwargs):
+        return ReplayUpbitClient(self)
+
+
+class ReplayUpbitClient:
+    """UpbitClient와 같은 메서드 이름 → ReplayUpbit 함수로 위임 (계좌 캐시 없음)"""
+
+    def __init__(self, upbit):
+        self.upbit = upbit
+
+    def get_batch_prices(self, markets):
+        return self.upbit.get_batch_prices(markets)
+
+    def get_current_price(self, market="KRW-ETH"):
+        return self.upbit.get_current_price(market)
+
+    def get_yesterday_ohlc(self, market="KRW-ETH"):
+        return self.upbit.get_yesterday_ohlc(market)
+
+    def get_daily_candles(self, market="KRW-ETH", count=15):
+        return self.upbit.get_daily_candles(market, count)
+
+    def get_today_open(self, market="KRW-ETH"):
+        return self.upbit.get_today_open(market)
+
+    def get_balance(self):
+        return self.upbit.get_balance(None, None)
+
+    def get_holding_quantity(self, currency="ETH"):
+        return self.upbit.get_holding_quantity(None, None, currency)
+
+    def get_avg_buy_price(self, currency="ETH"):
+        return self.upbit.get_avg_buy_price(None, None, currency)
+
+    def post_buy_order(self, market="KRW-ETH", price=0):
+        return self.upbit.post_buy_order(None, None, market, price)
+
+    def post_sell_order(self, market="KRW-ETH", volume=0):
+        return self.upbit.post_sell_order(None, None, market, volume)
+
+    def get_order(self, uuid_str):
+        return self.upbit.get_order(None, None, uuid_str)
+
+
+class RecordingNotifier:
+    """TelegramNotifier 대체: 전송 대신 메시지를 모아 둡니다."""
+
+    def __init__(self, bot_token=None, chat_id=None):
+        self.messages = []
+
+    def send_message(self, text):
+        self.messages.append(text)
+
+
+class _ReplayFeed(price_stream.RestPriceFeed):
+    """RestPriceFeed + 가상 시계: 새 체결가 대기는 다음 가격 변화 시각까지 한 번에 이동
+    (실전 스트림도 새 체결가가 오면 바로 깨어나므로 1초 폴링과 같은 순간에 같은 가격을 봄)"""
+
+    def __init__(self, upbit, clock, **kwargs):
+        super().__init__(sleep=clock.sleep, **kwargs)
+        self.upbit = upbit
+        self.clock = clock
+
+    def _jump(self, codes):
+        self.sleep(max(self.upbit.next_change(codes) - self.clock.wall_s, 0.001))
+
+    def wait(self, code, last=None, timeout=1.0):
+        self._jump([code])
+
+    def wait_ticks(self, seen, timeout=1.0):
+        self._jump(self.codes)
+
+
+class _RestStreams:
+    """price_stream 대체: WebSocket 대신 ReplayUpbit REST 조회 + 가상 시계 대기"""
+
+    def __init__(self, upbit, clock):
+        self.upbit = upbit
+        self.clock = clock
+
+    def UpbitPriceStream(self, codes, fallback=None, batch_fallback=None, **kwargs):
+        return _ReplayFeed(self.upbit, self.clock, fallback=fallback, batch_fallback=batch_fallback, codes=codes)
+
+
+# ══════════════════════════════════════════════════════════
+# 리플레이 실행
+# ══════════════════════════════════════════════════════════
+
+@contextlib.contextmanager
+def _patched(targets):
+    saved = [(obj, name, getattr(obj, name)) for obj, name, _ in targets]
+    try:
+        for obj, name, value in targets:
+            setattr(obj, name, value)
+        yield
+    finally:
+        for obj, name, value in reversed(saved):
+            setattr(obj, name, value)
+
+
+def replay_daily_cycle(day, minutes, daily, cash=1000000, start="08:50", check_interval=None, quiet=True, module=None,
+                       holdings=None):
+    """
+    day 사이클(당일 09:00 ~ 익일 08:55)을 리플레이합니다.
+
+    Args:
+        day: 'YYYY-MM-DD' (사이클 시작일)
+        minutes: {market: MINUTE_DTYPE 배열} — main.MARKET 필수, BTC 필터를 쓰면 KRW-BTC도
+        daily: {market: 일봉 리스트 (oldest first)} — day 이전 16일 이상
+        start: 가상 시계 시작 시각 (09:00 이전이면 run_daily_cycle이 09:00까지 대기)
+        check_interval: main.CHECK_INTERVAL 덮어쓰기 (None=1초 그대로)
+        quiet: 봇 출력 숨김 (결과 dict의 'log'에 보관)
+        module: run_daily_cycle(notifier)을 가진 봇 모듈 (None=main, scanner 등)
+        holdings: 시작 시 보유 코인 {통화: (수량, 평단)} (미청산 포지션 복구 검증용)
+    Returns: dict (fills, messages, trades, sleeps, sim_seconds, wall_seconds, cash, holdings, log)
+    """
+    module = module or bot
+    begin = _datetime.strptime(f"{day} {start}", "%Y-%m-%d %H:%M")
+    end = begin.replace(hour=9, minute=5) + timedelta(days=1)
+    clock = SimClock(begin, end)
+    upbit = ReplayUpbit(clock, minutes, daily, cash, fee=bot.BUY_FEE)
+    for currency, (qty, avg) in (holdings or {}).items():
+        upbit.holdings[currency] = [qty, avg]
+    notifier = RecordingNotifier()
+
+    log = io.StringIO()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trades.db")
+        targets = [
+            (module, "time", clock.time_module()),
+            (module, "datetime", clock.datetime_class()),
+            (module, "upbit_broker", upbit),
+            (module, "price_stream", _RestStreams(upbit, clock)),
+            (fill_tracker, "time", clock.time_module()),
+            (module, "LOG_FILE", os.path.join(tmp, "trade_log.csv")),
+            (module, "init_db", functools.partial(trade_logger.init_db, db_path)),
+            (module, "log_entry", functools.partial(trade_logger.log_entry, db_path=db_path)),
+            (module, "log_exit", functools.partial(trade_logger.log_exit, db_path=db_path)),
+        ]
+        if check_interval is not None:
+            targets.append((module, "CHECK_INTERVAL", check_interval))
+        t0 = _time.perf_counter()
+        output = contextlib.redirect_stdout(log) if quiet else contextlib.nullcontext()
+        with _patched(targets), output:
+            trade_logger.init_db(db_path)
+            try:
+                module.run_daily_cycle(notifier)
+            except ReplayFinished:
+                pass
+        wall = _time.perf_counter() - t0
+
+        conn = sqlite3.connect(db_path)
+        trades = conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+        conn.close()
+
+    return {
+        "fills": upbit.fills,
+        "messages": notifier.messages,
+        "trades": trades,
+        "sleeps": clock.sleeps,
+        "sim_seconds": (clock.now_kst - begin.replace(tzinfo=KST)).total_seconds(),
+        "wall_seconds": wall,
+        "cash": upbit.cash,
+        "holdings": upbit.holdings,
+        "log": log.getvalue(),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("사용법: python replay.py YYYY-MM-DD [마켓]")
+        sys.exit(1)
+
+    from backtest import BTC_MARKET, load_minute_array, load_or_fetch
+
+    day = sys.argv[1]
+    if len(sys.argv) > 2:
+        bot.MARKET, bot.CURRENCY = sys.argv[2], sys.argv[2].split("-")[1]
+    markets = [bot.MARKET, BTC_MARKET]
+    minutes = {m: load_minute_array(m, day) for m in markets}
+    minutes = {m: arr for m, arr in minutes.items() if arr is not None and len(arr) > 0}
+    if bot.MARKET not in minutes:
+        print(f"❌ {bot.MARKET} {day} 분봉이 없습니다.")
+        sys.exit(1)
+    daily = {m: load_or_fetch(m) for m in markets}
+
+    result = replay_daily_cycle(day, minutes, daily)
+    print(f"⏪ {bot.MARKET} {day} 사이클 리플레이: 가상 {result['sim_seconds'] / 3600:.1f}시간 → "
+          f"실제 {result['wall_seconds']:.2f}초 (sleep {result['sleeps']:,}회)")
+    for fill in result["fills"]:
+        print(f"   {fill['time']:%m-%d %H:%M:%S} {'매수' if fill['side'] == 'bid' else '매도'} "
+              f"{fill['price']:,.0f}원 × {fill['volume']:.6f}")
+    print(f"   최종 현금 {result['cash']:,.0f}원, 거래 기록 {result['trades']}건, 알림 {len(result['messages'])}건")
@@ -0,0 +1,330 @@
+# scanner.py
+# 다종목 변동성 돌파 스캐너 — 업비트 (SCAN_MARKETS 동시 감시 → 첫 돌파 1종목 매수)
+# ──────────────────────────────────────────────────────────
+# backtest.backtest_multicoin의 실전판:
+#   09:00  코인별 목표가 = 당일시가 + 전일 변동폭 × K (1회 계산, 일봉 조회는 초당 QUOTE_RATE건 이하)
+#   감시   전 코인 시세를 한 소스로 — WebSocket 한 연결의 최신가 테이블 (끊기면 배치 현재가 1회/초)
+#   진입   돌파 + SCAN_FILTER 통과한 첫 코인 매수 (같은 순간 여러 개면 돌파 강도가 큰 코인 — 백테스트와 같은 기준)
+#   청산   다음날 08:55 시간 청산 → 종료 (main.py와 같은 사이클, cron 1일 1회)
+#
+# 감시 비용은 코인 수와 무관 (스트림 1연결 + fallback 배치 1회/초)이라 수십 개 마켓도
+# 업비트 시세 API 한도(초당 10회) 안에서 돕니다. 목표가 계산만 코인 수만큼 일봉을 조회합니다.
+#
+# - 슬리피지 초과 코인은 당일 감시 대상에서 제외하고 나머지 감시 계속 (main.py는 당일 매매 포기)
+# - BTC 필터는 돌파 순간의 BTC 시세로 판정 (필터에 걸린 코인은 계속 감시 → BTC 회복 시 진입 가능)
+# ──────────────────────────────────────────────────────────
+import os
+import csv
+import time
+from datetime import datetime
+
+import upbit_broker
+from shared import price_stream, fill_tracker, latency
+from telegram_notifier import TelegramNotifier
+from trade_logger import init_db, log_entry, log_exit
+from feature_extractor import extract_all_features
+from backtest import FILTERS, COMBO_FILTERS, dynamic_k, build_features, btc_daily_change
+from config import (
+    UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, COINS, BTC_MARKET,
+    MAX_SLIPPAGE, POSITION_RATIO, CHECK_INTERVAL, BUY_FEE, SELL_FEE,
+    CYCLE_START_HOUR, CYCLE_START_MINUTE, KST, is_sell_time,
+)
+
+# ── 전략 파라미터 ──
+BOT_NAME = "MultiCoin-Volatility"
+LOG_FILE = "trade_log_multicoin.csv"
+SCAN_MARKETS = COINS            # 감시 코인 (config.COINS — backtest.py와 동일)
+SCAN_FILTER = "BTC 하락 스킵"    # backtest.FILTERS / COMBO_FILTERS 이름 (None이면 필터 없음)
+QUOTE_RATE = 8                  # 목표가 계산 시 일봉 조회 초당 건수 (시세 API 한도 10회/초)
+DAILY_COUNT = 16                # 피처 계산용 일봉 수 (오늘 포함)
+
+
+# ── 유틸리티 ──
+def log_trade(market, side, price, quantity, profit=0, reason=""):
+    file_exists = os.path.isfile(LOG_FILE)
+    with open(LOG_FILE, mode='a', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(['시간', '마켓', '구분', '가격', '수량', '순수익률', '사유'])
+        time_str = datetime.now(KST).strftime('%Y-%m-%d %H:%M:%S')
+        writer.writerow([time_str, market, side, f"{price:.8g}", f"{quantity:.8f}", f"{profit:.2f}%", reason])
+
+
+def load_unclosed_position():
+    """CSV 마지막 기록이 매수면 (마켓, 가격, 수량) — 없으면 (None, 0, 0)"""
+    if not os.path.isfile(LOG_FILE):
+        return None, 0, 0
+    try:
+        with open(LOG_FILE, newline='', encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+        if rows and rows[-1]['구분'] == '매수':
+            return rows[-1]['마켓'], float(rows[-1]['가격']), float(rows[-1]['수량'])
+    except Exception:
+        pass
+    return None, 0, 0
+
+
+def notify(notifier, title, body):
+    msg = f"[{BOT_NAME}] {title}\n\n{body}\n시간: {datetime.now(KST).strftime('%H:%M:%S')}"
+    notifier.send_message(msg)
+
+
+def resolve_filter(name):
+    """설정 이름 → backtest 필터 함수 (None이면 전부 통과)"""
+    if name is None:
+        return None
+    return FILTERS.get(name) or COMBO_FILTERS[name]
+
+
+# ══════════════════════════════════════════════════════════
+# 목표가 계산 (09:00 1회)
+# ══════════════════════════════════════════════════════════
+
+def build_targets(markets, btc_daily, sleep=time.sleep):
+    """
+    코인별 목표가와 진입 피처 준비. 일봉 조회는 초당 QUOTE_RATE건으로 나눠 보냅니다.
+    btc_daily: BTC 일봉 (최신순, [0]=오늘 진행 중)
+    Returns: {market: {target, k, today_open, y_range, daily(최신순), features}} — 변동폭 0/데이터 부족 코인 제외
+    """
+    btc_by_date = {c["date"]: c for c in btc_daily}
+    targets = {}
+    for i, market in enumerate(markets):
+        if i:
+            sleep(1 / QUOTE_RATE)
+        daily = upbit_broker.get_daily_candles(market, count=DAILY_COUNT)
+        if len(daily) < 2:
+            print(f"   ⚠️ {market} 일봉 부족 → 감시 제외")
+            continue
+        today, yesterday = daily[0], daily[1]
+        y_range = yesterday["high"] - yesterday["low"]
+        if y_range == 0 or today["open"] <= 0:
+            print(f"   ⚠️ {market} 전일 변동폭 0 → 감시 제외")
+            continue
+        k = dynamic_k(yesterday)
+        candles = daily[::-1]  # backtest 피처는 오래된 순
+        targets[market] = {
+            "target": today["open"] + y_range * k,
+            "k": k,
+            "today_open": today["open"],
+            "y_range": y_range,
+            "daily": daily,
+            "features": build_features(candles, len(candles) - 1, btc_by_date),
+        }
+    return targets
+
+
+# ══════════════════════════════════════════════════════════
+# 돌파 판정
+# ══════════════════════════════════════════════════════════
+
+class BreakoutScanner:
+    """
+    targets: build_targets() 결과
+    filter_fn: backtest 필터 (features dict → 통과 여부). BTC 피처는 돌파 순간 시세로 다시 계산
+    btc_daily: BTC 일봉 (최신순) — BTC 필터용 전일 종가
+    """
+
+    def __init__(self, targets, filter_fn=None, btc_daily=None, max_slippage=MAX_SLIPPAGE):
+        self.targets = dict(targets)
+        self.filter_fn = filter_fn
+        self.max_slippage = max_slippage
+        self.btc_yesterday = btc_daily[1] if btc_daily and len(btc_daily) >= 2 else None
+        self.skipped = {}  # market → 사유 (당일 감시 제외)
+
+    def live_features(self, market, btc_now):
+        features = dict(self.targets[market]["features"])
+        if self.btc_yesterday is not None and btc_now:
+            today = features["date"]
+            change, trend = btc_daily_change({today: {"close": btc_now}, "prev": self.btc_yesterday}, today, "prev")
+            features["btc_24h_change"], features["btc_trend"] = change, trend
+        return features
+
+    def check(self, prices):
+        """
+        prices: {market: 현재가} (스트림 스냅샷)
+        Returns: 진입 신호 dict {market, price, target, strength, features} 또는 None
+        """
+        candidates = []
+        for market, t in self.targets.items():
+            price = prices.get(market)
+            if price is not None and price >= t["target"]:
+                candidates.append(((price - t["target"]) / t["target"], market, price))
+        if not candidates:
+            return None
+
+        btc_now = prices.get(BTC_MARKET)
+        for strength, market, price in sorted(candidates, reverse=True):
+            if strength > self.max_slippage:
+                self.skipped[market] = f"슬리피지 +{strength:.2%}"
+                del self.targets[market]
+                continue
+            features = self.live_features(market, btc_now)
+            if self.filter_fn and not self.filter_fn(features):
+                continue
+            return {"market": market, "price": price, "target": self.targets[market]["target"],
+                    "strength": strength, "features": features}
+        return None
+
+
+# ══════════════════════════════════════════════════════════
+# 사이클
+# ══════════════════════════════════════════════════════════
+
+def run_bot():
+    notifier = TelegramNotifier(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+    notify(notifier, "🚀 <b>다종목 변동성 돌파 봇 시작</b>",
+           f"감시: {', '.join(SCAN_MARKETS)}\n필터: {SCAN_FILTER or '없음'}\n모드: cron 1일 1회")
+    init_db()
+    latency.start()  # API 응답 시간 → 같은 DB (리포트: python ../latency.py)
+    try:
+        run_daily_cycle(notifier)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        notify(notifier, "❌ <b>사이클 에러</b>", f"사이클 에러: {str(e)}")
+    notify(notifier, "⏹️ <b>봇 종료</b>", "프로세스를 종료합니다. 내일 09:00에 cron이 재시작합니다.")
+
+
+def run_daily_cycle(notifier):
+    """09:00 목표가 계산 → 첫 돌파 코인 매수 → 다음날 08:55 청산"""
+    upbit = upbit_broker.UpbitClient(UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY)
+    fills = fill_tracker.FillTracker(upbit.get_order, fill_tracker.upbit_fill)
+    now = datetime.now(KST)
+    print(f"\n{'='*60}")
+    print(f"📅 다종목 사이클 시작: {now.strftime('%Y-%m-%d %H:%M:%S')} ({len(SCAN_MARKETS)}개 코인)")
+    print(f"{'='*60}")
+
+    # ── STEP 1: 09:00 대기 ──
+    while True:
+        now = datetime.now(KST)
+        if now.hour > CYCLE_START_HOUR or (now.hour == CYCLE_START_HOUR and now.minute >= CYCLE_START_MINUTE):
+            break
+        time.sleep(10)
+
+    # ── STEP 2: 미청산 포지션 복구 (CSV 기록 + 실제 잔고) ──
+    market, bought_price, holding_qty = load_unclosed_position()
+    state = "WAITING"
+    if market is not None:
+        actual_qty = upbit.get_holding_quantity(market.split("-")[1])
+        if actual_qty is None or actual_qty > 0:
+            holding_qty = actual_qty or holding_qty
+            notify(notifier, "⚡ <b>포지션 복구</b>", f"{market}: {holding_qty:.8f} (매수가 {bought_price:,.4g}원)")
+            state = "BOUGHT"
+
+    # ── STEP 3: 코인별 목표가 ──
+    btc_daily = upbit_broker.get_daily_candles(BTC_MARKET, count=2)
+    scanner = None
+    if state == "WAITING":
+        targets = build_targets(SCAN_MARKETS, btc_daily, sleep=time.sleep)
+        if not targets:
+            notify(notifier, "❌ <b>에러</b>", "목표가를 계산한 코인이 없습니다.")
+            return
+        scanner = BreakoutScanner(targets, resolve_filter(SCAN_FILTER), btc_daily)
+        lines = [f"{m}: {t['target']:,.4g}원 (K={t['k']})" for m, t in targets.items()]
+        print("📋 오늘의 목표가\n   " + "\n   ".join(lines))
+        notify(notifier, "📋 <b>오늘의 목표가</b>", "\n".join(lines))
+
+    # ── STEP 4: 감시 루프 ── (복구한 포지션이 SCAN_MARKETS 밖 코인이어도 청산 가격을 받도록 함께 구독)
+    feed = price_stream.UpbitPriceStream(
+        list(dict.fromkeys(list(SCAN_MARKETS) + [BTC_MARKET] + ([market] if state == "BOUGHT" else []))),
+        batch_fallback=lambda markets: upbit_broker.get_batch_prices(markets))
+    feed.start()
+
+    cycle_start_time = datetime.now(KST)
+    trade_id = None
+    cash = upbit.get_balance() if state == "WAITING" else 0
+    buy_amount = int(cash * POSITION_RATIO)
+
+    while True:
+        try:
+            now = datetime.now(KST)
+            seen = feed.ticks
+            prices = feed.snapshot()
+
+            # 청산 (08:55)
+            if is_sell_time(now) and state == "BOUGHT":
+                sell_price = prices.get(market)
+                if not sell_price:
+                    print(f"⚠️ {market} 현재가 조회 실패 → 다음 루프에서 재시도")
+                    time.sleep(CHECK_INTERVAL)
+                    continue
+                res = upbit.post_sell_order(market, volume=holding_qty)
+                if "uuid" in res:
+                    profit_rate = (sell_price * (1 - SELL_FEE) / (bought_price * (1 + BUY_FEE)) - 1) * 100
+                    log_trade(market, "매도", sell_price, holding_qty, profit=profit_rate, reason="사이클 청산")
+                    try:
+                        log_exit(trade_id, sell_price, profit_rate, "time_exit")
+                    except Exception as e:
+                        print(f"   [TradeLogger] 청산 기록 실패: {e}")
+                    notify(notifier, "📤 <b>사이클 청산!</b>", f"{market} {sell_price:,.4g}원\n수익률: {profit_rate:+.2f}%")
+                    print(f"✅ {market} 청산! 수익률: {profit_rate:+.2f}%")
+                    return
+                print(f"⚠️ 매도 실패: {res} → 다음 루프에서 재시도")
+                time.sleep(CHECK_INTERVAL)
+                continue
+
+            if state == "WAITING" and is_sell_time(now):
+                notify(notifier, "⏹️ <b>사이클 종료</b>",
+                       "오늘은 돌파 없음." + "".join(f"\n{m}: {r}" for m, r in scanner.skipped.items()))
+                print("⏹️ 돌파 없이 사이클 종료.")
+                return
+            if state == "BOUGHT" and (now - cycle_start_time).total_seconds() > 20 * 3600 \
+                    and now.hour == CYCLE_START_HOUR and now.minute >= CYCLE_START_MINUTE:
+                notify(notifier, "🚨 <b>긴급: 미청산 포지션!</b>", f"{market} {holding_qty:.8f} 미청산 → 새 프로세스에 위임")
+                return
+
+            if state == "WAITING":
+                signal = scanner.check(prices)
+                if signal is None:
+                    if not scanner.targets:
+                        notify(notifier, "⚠️ <b>감시 종료</b>",
+                               "모든 코인이 제외됨" + "".join(f"\n{m}: {r}" for m, r in scanner.skipped.items()))
+                        return
+                    feed.wait_ticks(seen, CHECK_INTERVAL)  # 새 틱이 오면 즉시 다시 판정
+                    continue
+                if buy_amount < 5000:  # 업비트 최소 주문 금액
+                    notify(notifier, "⚠️ <b>잔고 부족</b>", f"매수 금액: {buy_amount:,}원")
+                    return
+
+                market = signal["market"]
+                print(f"\n🔥 {market} 돌파! {signal['price']:,.4g}원 ≥ {signal['target']:,.4g}원 "
+                      f"(강도 +{signal['strength']:.2%})")
+                res = upbit.post_buy_order(market, price=buy_amount)
+                if "uuid" not in res:
+                    error_msg = res.get("error", {}).get("message", str(res))
+                    notify(notifier, "❌ <b>매수 실패</b>", f"{market}: {error_msg}")
+                    return
+
+                fill = fills.wait(res["uuid"])
+                if fill is None:
+                    notify(notifier, "⚠️ <b>미체결 감지</b>", f"{market}: 20초 내 체결 미확인\n당일 매매를 포기합니다")
+                    return
+                holding_qty = fill["quantity"]
+                bought_price = fill["price"] or signal["price"]
+
+                log_trade(market, "매수", bought_price, holding_qty, reason=f"첫 돌파(목표 {signal['target']:,.4g}원)")
+                try:
+                    t = scanner.targets[market]
+                    features = extract_all_features(t["daily"], btc_daily, bought_price, t["k"], t["target"])
+                    features.update(symbol=market, entry_price=bought_price, position_size=holding_qty)
+                    trade_id = log_entry(features)
+                except Exception as e:
+                    print(f"   [TradeLogger] 피처/기록 실패 (매매 계속): {e}")
+                notify(notifier, "📈 <b>첫 돌파 매수!</b>",
+                       f"{market} {bought_price:,.4g}원 × {holding_qty:.8f}\n목표가: {signal['target']:,.4g}원\n"
+                       f"청산: 내일 08:55 시간 청산")
+                state = "BOUGHT"
+                continue
+
+            # 보유 중: 08:55까지 대기 (보유 코인 새 체결가가 오면 즉시, 아니면 CHECK_INTERVAL초 뒤)
+            feed.wait(market, prices.get(market), CHECK_INTERVAL)
+
+        except Exception as e:
+            notify(notifier, "❌ <b>에러 발생</b>", f"에러: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            time.sleep(60)
+
+
+if __name__ == "__main__":
+    run_bot()
@@ -0,0 +1,18 @@
+# shared.py
+# 주식 봇과 같이 쓰는 루트 공용 모듈 불러오기
+# ──────────────────────────────────────────────────────────
+# 저장소 루트의 모듈을 그대로 가져와 코인 봇에 복사본을 두지 않습니다.
+#   from shared import price_stream, fill_tracker, latency
+# 루트는 sys.path 맨 뒤에 추가 → 이름이 겹치는 main/replay/benchmark 등은
+# 이 폴더 것이 계속 우선합니다.
+# ──────────────────────────────────────────────────────────
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+import price_stream  # noqa: E402
+import fill_tracker  # noqa: E402
+import latency  # noqa: E402
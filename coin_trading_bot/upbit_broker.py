@@ -1,33 +1,98 @@
 # upbit_broker.py
 # 업비트 REST API 래퍼 (broker.py 대응)
 # ──────────────────────────────────────────────────────────
-# 인증: JWT (PyJWT + hashlib)
+# 인증: JWT (HS256, hmac + hashlib로 직접 서명)
 # 매 요청마다 access_key + nonce로 토큰 생성
+# (헤더 세그먼트 · HMAC 키 · 페이로드 앞부분은 Signer가 미리 만들어 둠)
+#
+# UpbitClient: 공용 keep-alive 세션 + /v1/accounts 스냅샷 캐시 (ACCOUNTS_TTL초)
+#   → 한 번의 조회로 KRW 잔고 · 보유 수량 · 매수 평균가를 함께 응답
+# 모듈 함수는 기존 시그니처 그대로 (내부적으로 캐시 없는 UpbitClient + 공용 세션)
 # ──────────────────────────────────────────────────────────
-import uuid
+import base64
 import hashlib
-import jwt
+import hmac
+import json
+import time
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlencode, unquote
 
+from shared import latency
+
 API_BASE = "https://api.upbit.com"
 API_TIMEOUT = 10
+POOL_SIZE = 4        # keep-alive 연결 수 (시세 배치 조회 + 계좌/주문 동시 사용 여유)
+ACCOUNTS_TTL = 1.0   # 계좌 스냅샷 재사용 시간 (초) — 같은 체크 안의 잔고/수량/평단 조회는 1회로
+
+# 조회(GET)만 재시도합니다. 주문(POST)은 서버에 도달했을 수 있어 재시도하면 중복 체결 위험이 있습니다.
+RETRY = Retry(total=2, connect=2, read=2, status=2, backoff_factor=0.2,
+              status_forcelist=(500, 502, 503, 504), allowed_methods=frozenset({"GET"}),
+              raise_on_status=False)
+
+_session = None
+
+
+def make_session(pool_size=POOL_SIZE, retry=RETRY):
+    """keep-alive 커넥션 풀 + 재시도 어댑터를 단 requests.Session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return latency.instrument_session(session)
+
+
+def get_session():
+    """프로세스 공용 세션 (모든 UpbitClient와 모듈 함수가 같은 연결을 재사용)"""
+    global _session
+    if _session is None:
+        _session = make_session()
+    return _session
+
+
+# ── JWT 서명 ──
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+_JWT_HEADER = _b64(b'{"alg":"HS256","typ":"JWT"}')
+
+
+def _query_hash(query):
+    """업비트 query_hash: 인코딩 전 형태의 쿼리 문자열 SHA512"""
+    return hashlib.sha512(unquote(urlencode(query, doseq=True)).encode()).hexdigest()
+
+
+class Signer:
+    """
+    키마다 한 번만 준비하는 HS256 서명기 (PyJWT jwt.encode와 같은 토큰 형식).
+    헤더 세그먼트와 HMAC 키 상태를 재사용하고, 호출마다 nonce(uuid4)와 query_hash만 새로 넣습니다.
+    """
+
+    def __init__(self, access_key, secret_key):
+        self.access_key = access_key
+        self._mac = hmac.new(secret_key.encode(), digestmod=hashlib.sha256)
+        self._prefix = '{"access_key":' + json.dumps(access_key) + ',"nonce":"'
+
+    def token(self, query=None):
+        payload = self._prefix + str(uuid.uuid4()) + '"'
+        if query:
+            payload += ',"query_hash":"' + _query_hash(query) + '","query_hash_alg":"SHA512"'
+        signing_input = _JWT_HEADER + b"." + _b64((payload + "}").encode())
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return (signing_input + b"." + _b64(mac.digest())).decode()
+
+    def headers(self, query=None):
+        return {"Authorization": "Bearer " + self.token(query)}
 
 
 def _make_token(access_key, secret_key, query=None):
     """업비트 JWT 토큰을 생성합니다."""
-    payload = {
-        "access_key": access_key,
-        "nonce": str(uuid.uuid4()),
-    }
-    if query:
-        query_string = unquote(urlencode(query, doseq=True)).encode()
-        m = hashlib.sha512()
-        m.update(query_string)
-        payload["query_hash"] = m.hexdigest()
-        payload["query_hash_alg"] = "SHA512"
-
-    return jwt.encode(payload, secret_key)
+    return Signer(access_key, secret_key).token(query)
 
 
 def _safe_json(res):
@@ -39,211 +104,278 @@ def _safe_json(res):
         return {}
 
 
+# ══════════════════════════════════════════════════════════
+# 업비트 클라이언트
+# ══════════════════════════════════════════════════════════
+
+class UpbitClient:
+    """
+    업비트 REST 클라이언트: 키와 서명기를 들고 있고 공용 세션으로 TCP/TLS 연결을 재사용합니다.
+
+        upbit = UpbitClient(UPBIT_ACCESS_KEY, UPBIT_SECRET_KEY)
+        qty = upbit.get_holding_quantity("ETH")   # /v1/accounts 조회
+        avg = upbit.get_avg_buy_price("ETH")      # accounts_ttl초 안이면 같은 스냅샷 재사용
+
+    주문을 내면 계좌 스냅샷을 버리므로 체결 확인 조회는 항상 새 잔고를 봅니다.
+    accounts_ttl=0이면 캐시 없이 매번 조회합니다. (모듈 함수가 이 방식)
+    """
+
+    def __init__(self, access_key=None, secret_key=None, session=None, accounts_ttl=ACCOUNTS_TTL,
+                 clock=time.monotonic):
+        self.signer = Signer(access_key, secret_key) if secret_key else None
+        self.session = session or get_session()
+        self.accounts_ttl = accounts_ttl
+        self.clock = clock
+        self._accounts = None
+        self._accounts_at = 0.0
+        self.accounts_requests = 0
+        self.accounts_hits = 0
+
+    def _request(self, method, path, query=None, auth=False, **kwargs):
+        headers = self.signer.headers(query) if auth else None
+        if method == "GET":
+            kwargs["params"] = query
+        else:
+            kwargs["json"] = query
+        res = self.session.request(method, f"{API_BASE}{path}", headers=headers, timeout=API_TIMEOUT, **kwargs)
+        return _safe_json(res)
+
+    # ── 시세 조회 (인증 불필요) ──
+    @latency.timed("upbit.get_batch_prices")
+    def get_batch_prices(self, markets):
+        """여러 종목의 현재가를 한 번에 조회합니다.
+        markets: list of str (예: ["KRW-ETH", "KRW-BTC", "KRW-SOL"])
+        Returns: dict {market: price} 실패 시 빈 dict
+        """
+        try:
+            data = self._request("GET", "/v1/ticker", {"markets": ",".join(markets)})
+            if isinstance(data, list):
+                return {item["market"]: float(item["trade_price"]) for item in data}
+        except requests.exceptions.RequestException as e:
+            print(f"   배치 시세 조회 실패: {e}")
+        return {}
+
+    @latency.timed("upbit.get_current_price")
+    def get_current_price(self, market="KRW-ETH"):
+        """현재가를 조회합니다. 실패 시 None 반환."""
+        try:
+            data = self._request("GET", "/v1/ticker", {"markets": market})
+            if isinstance(data, list) and len(data) > 0:
+                return float(data[0]["trade_price"])
+        except requests.exceptions.RequestException as e:
+            print(f"   현재가 조회 실패: {e}")
+        return None
+
+    @latency.timed("upbit.get_yesterday_ohlc")
+    def get_yesterday_ohlc(self, market="KRW-ETH"):
+        """전일 일봉 OHLC를 조회합니다. 실패 시 None 반환.
+        Returns: dict {open, high, low, close} or None
+        """
+        try:
+            data = self._request("GET", "/v1/candles/days", {"market": market, "count": 2})
+            if isinstance(data, list) and len(data) >= 2:
+                # data[0] = 오늘(진행중), data[1] = 어제(완성)
+                y = data[1]
+                return {
+                    "open": float(y["opening_price"]),
+                    "high": float(y["high_price"]),
+                    "low": float(y["low_price"]),
+                    "close": float(y["trade_price"]),
+                }
+        except requests.exceptions.RequestException as e:
+            print(f"   전일 OHLC 조회 실패: {e}")
+        return None
+
+    @latency.timed("upbit.get_daily_candles")
+    def get_daily_candles(self, market="KRW-ETH", count=15):
+        """최근 N일치 일봉을 조회합니다. 최신순 리스트 반환.
+        Returns: list of dict {open, high, low, close, volume, date} or []
+        """
+        try:
+            data = self._request("GET", "/v1/candles/days", {"market": market, "count": count})
+            if isinstance(data, list) and len(data) > 0:
+                candles = []
+                for d in data:
+                    candles.append({
+                        "open": float(d["opening_price"]),
+                        "high": float(d["high_price"]),
+                        "low": float(d["low_price"]),
+                        "close": float(d["trade_price"]),
+                        "volume": float(d["candle_acc_trade_volume"]),
+                        "date": d["candle_date_time_kst"][:10],
+                    })
+                return candles
+        except requests.exceptions.RequestException as e:
+            print(f"   일봉 조회 실패: {e}")
+        return []
+
+    @latency.timed("upbit.get_today_open")
+    def get_today_open(self, market="KRW-ETH"):
+        """당일 시가를 조회합니다. 실패 시 None 반환."""
+        try:
+            data = self._request("GET", "/v1/candles/days", {"market": market, "count": 1})
+            if isinstance(data, list) and len(data) > 0:
+                return float(data[0]["opening_price"])
+        except requests.exceptions.RequestException as e:
+            print(f"   당일 시가 조회 실패: {e}")
+        return None
+
+    # ── 계좌 조회 (인증 필요) ──
+    def get_accounts(self):
+        """/v1/accounts 스냅샷 → {통화: 항목}. accounts_ttl초 안이면 캐시 재사용, API 실패 시 None."""
+        now = self.clock()
+        if self._accounts is not None and now - self._accounts_at < self.accounts_ttl:
+            self.accounts_hits += 1
+            return self._accounts
+        accounts = self._fetch_accounts()
+        if accounts is not None:
+            self._accounts = accounts
+            self._accounts_at = now
+        return accounts
+
+    @latency.timed("upbit.get_accounts")
+    def _fetch_accounts(self):
+        self.accounts_requests += 1
+        try:
+            data = self._request("GET", "/v1/accounts", auth=True)
+        except requests.exceptions.RequestException as e:
+            print(f"   계좌 조회 실패: {e}")
+            return None
+        if not isinstance(data, list):
+            return None
+        return {item.get("currency"): item for item in data}
+
+    def invalidate_accounts(self):
+        """계좌 스냅샷 폐기 (다음 조회는 서버에서 새로)"""
+        self._accounts = None
+
+    def get_balance(self):
+        """KRW 현금 잔고를 반환합니다. 실패 시 0 반환."""
+        item = (self.get_accounts() or {}).get("KRW")
+        return float(item.get("balance", 0)) if item else 0
+
+    def get_holding_quantity(self, currency="ETH"):
+        """특정 코인 보유 수량을 반환합니다. 미보유 0, API 실패 시 None."""
+        accounts = self.get_accounts()
+        if accounts is None:
+            return None  # API 실패
+        item = accounts.get(currency)
+        return float(item.get("balance", 0)) if item else 0
+
+    def get_avg_buy_price(self, currency="ETH"):
+        """특정 코인 매수 평균가를 반환합니다. 미보유 0, API 실패 시 0."""
+        item = (self.get_accounts() or {}).get(currency)
+        return float(item.get("avg_buy_price", 0)) if item else 0
+
+    # ── 주문 (인증 필요) ──
+    def _order(self, query, label):
+        self.invalidate_accounts()
+        try:
+            return self._request("POST", "/v1/orders", query, auth=True)
+        except requests.exceptions.RequestException as e:
+            print(f"   {label} 주문 실패: {e}")
+            return {"error": {"message": str(e)}}
+
+    @latency.timed("upbit.post_buy_order")
+    def post_buy_order(self, market="KRW-ETH", price=0):
+        """시장가 매수 (KRW 금액 지정). 업비트는 매수 시 금액(원)을 지정합니다.
+        Returns: 응답 dict (uuid 포함) or 에러 dict
+        """
+        return self._order({
+            "market": market,
+            "side": "bid",
+            "ord_type": "price",   # 시장가 매수 = KRW 금액 지정
+            "price": str(price),
+        }, "매수")
+
+    @latency.timed("upbit.post_sell_order")
+    def post_sell_order(self, market="KRW-ETH", volume=0):
+        """시장가 매도 (코인 수량 지정).
+        Returns: 응답 dict (uuid 포함) or 에러 dict
+        """
+        return self._order({
+            "market": market,
+            "side": "ask",
+            "ord_type": "market",   # 시장가 매도 = 수량 지정
+            "volume": str(volume),
+        }, "매도")
+
+    @latency.timed("upbit.get_order")
+    def get_order(self, uuid_str):
+        """주문 상태를 조회합니다.
+        Returns: 응답 dict or 빈 dict
+        """
+        try:
+            return self._request("GET", "/v1/order", {"uuid": uuid_str}, auth=True)
+        except requests.exceptions.RequestException as e:
+            print(f"   주문 조회 실패: {e}")
+            return {}
+
+
+# ══════════════════════════════════════════════════════════
+# 함수형 API (기존 호출 호환 — 내부적으로 UpbitClient + 공용 세션, 계좌 캐시 없음)
+# ══════════════════════════════════════════════════════════
+
+def _client(access_key=None, secret_key=None):
+    return UpbitClient(access_key, secret_key, accounts_ttl=0)
+
+
 # ── 시세 조회 (인증 불필요) ──
 
 def get_batch_prices(markets):
-    """여러 종목의 현재가를 한 번에 조회합니다.
-    markets: list of str (예: ["KRW-ETH", "KRW-BTC", "KRW-SOL"])
-    Returns: dict {market: price} 실패 시 빈 dict
-    """
-    url = f"{API_BASE}/v1/ticker"
-    params = {"markets": ",".join(markets)}
-    try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list):
-            return {item["market"]: float(item["trade_price"]) for item in data}
-    except requests.exceptions.RequestException as e:
-        print(f"   배치 시세 조회 실패: {e}")
-    return {}
+    """여러 종목의 현재가를 한 번에 조회합니다. Returns: dict {market: price} 실패 시 빈 dict"""
+    return _client().get_batch_prices(markets)
 
 
 def get_current_price(market="KRW-ETH"):
     """현재가를 조회합니다. 실패 시 None 반환."""
-    url = f"{API_BASE}/v1/ticker"
-    params = {"markets": market}
-    try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list) and len(data) > 0:
-            return float(data[0]["trade_price"])
-    except requests.exceptions.RequestException as e:
-        print(f"   현재가 조회 실패: {e}")
-    return None
+    return _client().get_current_price(market)
 
 
 def get_yesterday_ohlc(market="KRW-ETH"):
-    """전일 일봉 OHLC를 조회합니다. 실패 시 None 반환.
-    Returns: dict {open, high, low, close} or None
-    """
-    url = f"{API_BASE}/v1/candles/days"
-    params = {"market": market, "count": 2}
-    try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list) and len(data) >= 2:
-            # data[0] = 오늘(진행중), data[1] = 어제(완성)
-            y = data[1]
-            return {
-                "open": float(y["opening_price"]),
-                "high": float(y["high_price"]),
-                "low": float(y["low_price"]),
-                "close": float(y["trade_price"]),
-            }
-    except requests.exceptions.RequestException as e:
-        print(f"   전일 OHLC 조회 실패: {e}")
-    return None
+    """전일 일봉 OHLC를 조회합니다. 실패 시 None 반환."""
+    return _client().get_yesterday_ohlc(market)
 
 
 def get_daily_candles(market="KRW-ETH", count=15):
-    """최근 N일치 일봉을 조회합니다. 최신순 리스트 반환.
-    Returns: list of dict {open, high, low, close, volume, date} or []
-    """
-    url = f"{API_BASE}/v1/candles/days"
-    params = {"market": market, "count": count}
-    try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list) and len(data) > 0:
-            candles = []
-            for d in data:
-                candles.append({
-                    "open": float(d["opening_price"]),
-                    "high": float(d["high_price"]),
-                    "low": float(d["low_price"]),
-                    "close": float(d["trade_price"]),
-                    "volume": float(d["candle_acc_trade_volume"]),
-                    "date": d["candle_date_time_kst"][:10],
-                })
-            return candles
-    except requests.exceptions.RequestException as e:
-        print(f"   일봉 조회 실패: {e}")
-    return []
+    """최근 N일치 일봉을 조회합니다. 최신순 리스트 반환."""
+    return _client().get_daily_candles(market, count)
 
 
 def get_today_open(market="KRW-ETH"):
     """당일 시가를 조회합니다. 실패 시 None 반환."""
-    url = f"{API_BASE}/v1/candles/days"
-    params = {"market": market, "count": 1}
-    try:
-        res = requests.get(url, params=params, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list) and len(data) > 0:
-            return float(data[0]["opening_price"])
-    except requests.exceptions.RequestException as e:
-        print(f"   당일 시가 조회 실패: {e}")
-    return None
+    return _client().get_today_open(market)
 
 
 # ── 계좌 조회 (인증 필요) ──
 
 def get_balance(access_key, secret_key):
     """KRW 현금 잔고를 반환합니다. 실패 시 0 반환."""
-    url = f"{API_BASE}/v1/accounts"
-    token = _make_token(access_key, secret_key)
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        res = requests.get(url, headers=headers, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list):
-            for item in data:
-                if item.get("currency") == "KRW":
-                    return float(item.get("balance", 0))
-    except requests.exceptions.RequestException as e:
-        print(f"   잔고 조회 실패: {e}")
-    return 0
+    return _client(access_key, secret_key).get_balance()
 
 
 def get_holding_quantity(access_key, secret_key, currency="ETH"):
     """특정 코인 보유 수량을 반환합니다. 미보유 0, API 실패 시 None."""
-    url = f"{API_BASE}/v1/accounts"
-    token = _make_token(access_key, secret_key)
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        res = requests.get(url, headers=headers, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list):
-            for item in data:
-                if item.get("currency") == currency:
-                    return float(item.get("balance", 0))
-            return 0  # 코인을 보유하고 있지 않음
-    except requests.exceptions.RequestException as e:
-        print(f"   보유수량 조회 실패: {e}")
-    return None  # API 실패
+    return _client(access_key, secret_key).get_holding_quantity(currency)
 
 
 def get_avg_buy_price(access_key, secret_key, currency="ETH"):
     """특정 코인 매수 평균가를 반환합니다. 미보유 0, API 실패 시 0."""
-    url = f"{API_BASE}/v1/accounts"
-    token = _make_token(access_key, secret_key)
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        res = requests.get(url, headers=headers, timeout=API_TIMEOUT)
-        data = _safe_json(res)
-        if isinstance(data, list):
-            for item in data:
-                if item.get("currency") == currency:
-                    return float(item.get("avg_buy_price", 0))
-    except requests.exceptions.RequestException as e:
-        print(f"   매수평균가 조회 실패: {e}")
-    return 0
+    return _client(access_key, secret_key).get_avg_buy_price(currency)
 
 
 # ── 주문 (인증 필요) ──
 
 def post_buy_order(access_key, secret_key, market="KRW-ETH", price=0):
-    """시장가 매수 (KRW 금액 지정). 업비트는 매수 시 금액(원)을 지정합니다.
-    Returns: 응답 dict (uuid 포함) or 에러 dict
-    """
-    url = f"{API_BASE}/v1/orders"
-    query = {
-        "market": market,
-        "side": "bid",
-        "ord_type": "price",   # 시장가 매수 = KRW 금액 지정
-        "price": str(price),
-    }
-    token = _make_token(access_key, secret_key, query)
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        res = requests.post(url, json=query, headers=headers, timeout=API_TIMEOUT)
-        return _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"   매수 주문 실패: {e}")
-        return {"error": {"message": str(e)}}
+    """시장가 매수 (KRW 금액 지정). Returns: 응답 dict (uuid 포함) or 에러 dict"""
+    return _client(access_key, secret_key).post_buy_order(market, price)
 
 
 def post_sell_order(access_key, secret_key, market="KRW-ETH", volume=0):
-    """시장가 매도 (코인 수량 지정).
-    Returns: 응답 dict (uuid 포함) or 에러 dict
-    """
-    url = f"{API_BASE}/v1/orders"
-    query = {
-        "market": market,
-        "side": "ask",
-        "ord_type": "market",   # 시장가 매도 = 수량 지정
-        "volume": str(volume),
-    }
-    token = _make_token(access_key, secret_key, query)
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        res = requests.post(url, json=query, headers=headers, timeout=API_TIMEOUT)
-        return _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"   매도 주문 실패: {e}")
-        return {"error": {"message": str(e)}}
+    """시장가 매도 (코인 수량 지정). Returns: 응답 dict (uuid 포함) or 에러 dict"""
+    return _client(access_key, secret_key).post_sell_order(market, volume)
 
 
 def get_order(access_key, secret_key, uuid_str):
-    """주문 상태를 조회합니다.
-    Returns: 응답 dict or 빈 dict
-    """
-    url = f"{API_BASE}/v1/order"
-    query = {"uuid": uuid_str}
-    token = _make_token(access_key, secret_key, query)
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        res = requests.get(url, params=query, headers=headers, timeout=API_TIMEOUT)
-        return _safe_json(res)
-    except requests.exceptions.RequestException as e:
-        print(f"   주문 조회 실패: {e}")
-        return {}
+    """주문 상태를 조회합니다. Returns: 응답 dict or 빈 dict"""
+    return _client(access_key, secret_key).get_order(uuid_str)
@@ -1,56 +1,35 @@
 # data_manager.py
 # XGBoost 전략용 데이터 엔진 (일봉 + 5분봉)
-import yfinance as yf
 import pandas_ta as ta
 import pandas as pd
 import numpy as np
 
+from bar_store import load_bars, load_latest_session
+
 
 # ══════════════════════════════════════════════════════════
 # 5분봉 데이터 (기존 유지, backtester용)
 # ══════════════════════════════════════════════════════════
 
+def _with_kosdaq_index(df, index_data):
+    """5분봉에 같은 시각의 코스닥 지수 종가를 KOSDAQ_Index 컬럼으로 붙입니다."""
+    index_data = index_data[['시간', '종가']].rename(columns={'종가': 'KOSDAQ_Index'})
+    return pd.merge(df, index_data, on='시간', how='left').ffill()
+
+
 def fetch_large_data(ticker):
-    """60일치 5분봉 데이터 + 코스닥 지수를 수집합니다."""
+    """60일치 5분봉 데이터 + 코스닥 지수를 수집합니다. (로컬 저장소에 없는 구간만 다운로드)"""
     print(f"📥 {ticker} 및 코스닥 지수 60일 데이터 수집 중...")
-    df = yf.download(tickers=ticker, period='60d', interval='5m')
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    df = df.reset_index().rename(columns={
-        'Datetime': '시간', 'Close': '종가', 'High': '고가',
-        'Low': '저가', 'Open': '시가', 'Volume': '거래량'
-    })
-
-    index_data = yf.download(tickers='^KQ11', period='60d', interval='5m')
-    if isinstance(index_data.columns, pd.MultiIndex):
-        index_data.columns = index_data.columns.get_level_values(0)
-    index_data = index_data.reset_index()[['Datetime', 'Close']].rename(
-        columns={'Datetime': '시간', 'Close': 'KOSDAQ_Index'}
-    )
-
-    df = pd.merge(df, index_data, on='시간', how='left').ffill()
-    return df
+    df = load_bars(ticker, '5m', 60)
+    index_data = load_bars('^KQ11', '5m', 60)
+    return _with_kosdaq_index(df, index_data)
 
 
 def fetch_today_data(ticker):
     """당일 5분봉 데이터만 가볍게 다운로드합니다."""
-    df = yf.download(tickers=ticker, period='1d', interval='5m')
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    df = df.reset_index().rename(columns={
-        'Datetime': '시간', 'Close': '종가', 'High': '고가',
-        'Low': '저가', 'Open': '시가', 'Volume': '거래량'
-    })
-
-    index_data = yf.download(tickers='^KQ11', period='1d', interval='5m')
-    if isinstance(index_data.columns, pd.MultiIndex):
-        index_data.columns = index_data.columns.get_level_values(0)
-    index_data = index_data.reset_index()[['Datetime', 'Close']].rename(
-        columns={'Datetime': '시간', 'Close': 'KOSDAQ_Index'}
-    )
-
-    df = pd.merge(df, index_data, on='시간', how='left').ffill()
-    return df
+    df = load_latest_session(ticker, '5m')
+    index_data = load_latest_session('^KQ11', '5m')
+    return _with_kosdaq_index(df, index_data)
 
 
 def refresh_data(df_base, ticker):
@@ -65,12 +44,42 @@ def refresh_data(df_base, ticker):
     return df_merged
 
 
+def label_forward_target(entry_prices, highs, lookahead, profit_target, n_valid=None):
+    """향후 lookahead 캔들 이내 profit_target 수익 도달 여부를 벡터 연산으로 라벨링합니다.
+
+    i번째 라벨 = max(highs[i+1 : i+1+lookahead]) / entry_prices[i] - 1 >= profit_target
+    (역순 rolling max 후 한 칸 당겨서 미래 고가 최댓값을 한 번에 계산)
+
+    n_valid: 앞에서부터 라벨을 계산할 행 수 (기본값 len - lookahead, 나머지 행은 0)
+    Returns: np.ndarray (0/1, int)
+    """
+    entry = np.asarray(entry_prices, dtype=float)
+    high = pd.Series(np.asarray(highs, dtype=float))
+    n = len(entry)
+    if n_valid is None:
+        n_valid = n - lookahead
+    n_valid = min(max(n_valid, 0), n)
+
+    future_max = high[::-1].rolling(lookahead, min_periods=1).max()[::-1].shift(-1).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hit = (future_max / entry - 1) >= profit_target
+
+    target = np.zeros(n, dtype=int)
+    target[:n_valid] = hit[:n_valid]
+    return target
+
+
+# 볼린저 밴드 표준편차 자유도. pandas_ta 기본값은 버전/TA-Lib 설치 여부에 따라 0 또는 1이라
+# 명시적으로 지정하고 TA-Lib 경로(ddof 무시)도 끕니다. streaming_indicators·backtester도 같은 값을 사용합니다.
+BB_DDOF = 0
+
+
 def add_indicators(df):
     """XGBoost 5분봉 학습용 피처를 계산합니다."""
     if len(df) < 50:
         return None
 
-    bb = ta.bbands(df['종가'], length=20, std=2)
+    bb = ta.bbands(df['종가'], length=20, std=2, ddof=BB_DDOF, talib=False)
     if bb is not None:
         df['BB_Lower'] = bb.iloc[:, 0]
         df['BB_Mid'] = bb.iloc[:, 1]
@@ -120,15 +129,7 @@ def add_indicators(df):
 
     lookahead = 6
     profit_target = 0.008  # 0.8% (5분봉 단타용, 1.5%에서 하향)
-    target = pd.Series(0, index=df.index)
-    for i in range(len(df) - lookahead):
-        current_price = df['종가'].iloc[i]
-        future_highs = df['고가'].iloc[i + 1:i + 1 + lookahead]
-        if len(future_highs) > 0:
-            max_profit = (future_highs / current_price - 1).max()
-            if max_profit >= profit_target:
-                target.iloc[i] = 1
-    df['target'] = target
+    df['target'] = label_forward_target(df['종가'], df['고가'], lookahead, profit_target)
 
     df.dropna(inplace=True)
     return df
@@ -165,13 +166,7 @@ DAILY_FEATURES = [
 def fetch_daily_data(ticker):
     """1년치 일봉 데이터를 수집합니다."""
     print(f"📥 {ticker} 1년치 일봉 데이터 수집 중...")
-    df = yf.download(ticker, period='1y', interval='1d')
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    df = df.reset_index().rename(columns={
-        'Date': '날짜', 'Close': '종가', 'High': '고가',
-        'Low': '저가', 'Open': '시가', 'Volume': '거래량'
-    })
+    df = load_bars(ticker, '1d', 365)
     print(f"   총 {len(df)}개 일봉 로드 완료")
     return df
 
@@ -185,7 +180,7 @@ def add_daily_indicators(df):
     df['MA20'] = ta.sma(df['종가'], length=20)
     df['RSI'] = ta.rsi(df['종가'], length=14)
 
-    bb = ta.bbands(df['종가'], length=20, std=2)
+    bb = ta.bbands(df['종가'], length=20, std=2, ddof=BB_DDOF, talib=False)
     if bb is not None:
         df['BB_Lower'] = bb.iloc[:, 0]
         df['BB_Upper'] = bb.iloc[:, 2]
@@ -203,15 +198,10 @@ def add_daily_indicators(df):
     # (실제 매매: 어제 데이터로 예측 → 오늘 시가에 매수)
     lookahead = 5
     profit_target = 0.03
-    target = pd.Series(0, index=df.index)
-    for i in range(len(df) - lookahead - 1):
-        entry_price = df['시가'].iloc[i + 1]  # 다음날 시가 (실제 진입가)
-        if entry_price <= 0:
-            continue
-        future_highs = df['고가'].iloc[i + 1:i + 1 + lookahead]
-        max_profit = (future_highs / entry_price - 1).max()
-        if max_profit >= profit_target:
-            target.iloc[i] = 1
+    entry_prices = df['시가'].shift(-1)  # 다음날 시가 (실제 진입가)
+    target = label_forward_target(entry_prices, df['고가'], lookahead, profit_target,
+                                  n_valid=len(df) - lookahead - 1)
+    target[(entry_prices <= 0).to_numpy()] = 0
     df['target'] = target
 
     df.dropna(inplace=True)
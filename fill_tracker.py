@@ -0,0 +1,127 @@
+# fill_tracker.py
+# 주문 체결 확인 (주문 상태 조회 + 지수 백오프, KIS/업비트 공통)
+# ──────────────────────────────────────────────────────────
+# 주문 직후 2초씩 최대 10번 잔고를 조회하던 것을, 주문번호로 체결 내역을 직접 조회해
+# 체결되는 즉시 빠져나오도록 바꿉니다. 조회 간격은 FIRST_DELAY부터 BACKOFF배씩 늘어나고
+# (최대 MAX_DELAY) 전체 FILL_TIMEOUT초 안에 체결되지 않으면 포기합니다.
+#
+#   fills = FillTracker(kis.get_order, kis_fill, limiter=limiter)          # KIS (output.ODNO)
+#   fills = FillTracker(upbit.get_order, upbit_fill)                       # 업비트 (uuid)
+#   fill = fills.wait(order_id)   # → {"price", "quantity", "fee", "done", "latency", "polls"} 또는 None
+#
+# 체결가/수량/수수료는 거래소가 돌려준 체결 내역 그대로입니다. (KIS 체결 조회에는 수수료가 없어
+# fee_rate로 계산) 부분 체결 후 시간 초과면 체결된 만큼만 돌려줍니다. (done=False)
+# metrics(): 체결 확인까지 걸린 시간 분포 (p50/p90/max)
+# ──────────────────────────────────────────────────────────
+import time
+
+FILL_TIMEOUT = 20.0  # 체결 확인 최대 대기 (초) — 기존 2초 × 10회와 같은 한도
+FIRST_DELAY = 0.25   # 첫 조회까지 대기 (시장가는 보통 이 안에 체결)
+BACKOFF = 2.0        # 조회 간격 증가 배수
+MAX_DELAY = 1.0      # 조회 간격 상한 (초) — 늦은 체결도 1초 안에 확인
+
+
+# ══════════════════════════════════════════════════════════
+# 거래소 응답 → 체결 상태 {"done", "quantity", "price", "fee"} (아직 조회되지 않으면 None)
+# ══════════════════════════════════════════════════════════
+
+def kis_fill(res, fee_rate=0.0):
+    """KIS 주문 체결 조회(inquire-daily-ccld) 응답"""
+    res = res or {}
+    rows = res.get("output1") or []
+    if res.get("rt_cd") != "0" or not rows:
+        return None
+    row = rows[0]
+    ordered = float(row.get("ord_qty") or 0)
+    quantity = float(row.get("tot_ccld_qty") or 0)
+    amount = float(row.get("tot_ccld_amt") or 0)
+    price = float(row.get("avg_prvs") or 0) or (amount / quantity if quantity else 0)
+    # 잔여 수량 필드가 비어 있으면 0(=완료)이 아니라 주문 - 체결로 계산 (빈 행을 완료로 오판 방지)
+    left = float(row["rmn_qty"]) if row.get("rmn_qty") not in (None, "") else ordered - quantity
+    return {
+        "done": ordered > 0 and (quantity >= ordered or left == 0 or row.get("cncl_yn") == "Y"),
+        "quantity": int(quantity),
+        "price": price,
+        "fee": (amount or price * quantity) * fee_rate,
+    }
+
+
+def upbit_fill(order):
+    """업비트 주문 조회(/v1/order) 응답 — 시장가 매수는 잔여 금액 때문에 'cancel'로 끝나는 경우가 많음"""
+    if not order or "uuid" not in order:
+        return None
+    quantity = float(order.get("executed_volume") or 0)
+    trades = order.get("trades") or []
+    funds = sum(float(t.get("funds") or float(t["price"]) * float(t["volume"])) for t in trades)
+    return {
+        "done": order.get("state") in ("done", "cancel"),
+        "quantity": quantity,
+        "price": funds / quantity if quantity and trades else 0,
+        "fee": float(order.get("paid_fee") or 0),
+    }
+
+
+# ══════════════════════════════════════════════════════════
+# 체결 추적기
+# ══════════════════════════════════════════════════════════
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FillTracker:
+    """
+    query: 주문번호 → 거래소 응답 (KISClient.get_order / UpbitClient.get_order)
+    parse: 응답 → 체결 상태 (kis_fill / upbit_fill, 필요하면 functools.partial로 fee_rate 지정)
+    limiter: async_broker.RateLimiter 등 reserve() → 대기 초를 주는 호출 제한기 (없으면 제한 없음)
+    """
+
+    def __init__(self, query, parse, timeout=FILL_TIMEOUT, first_delay=FIRST_DELAY, backoff=BACKOFF,
+                 max_delay=MAX_DELAY, limiter=None):
+        self.query = query
+        self.parse = parse
+        self.timeout = timeout
+        self.first_delay = first_delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.limiter = limiter
+        self.latencies = []  # 체결 확인까지 걸린 시간 (초)
+        self.polls = []      # 체결 확인까지 조회 횟수
+        self.misses = 0      # 시간 안에 체결을 확인하지 못한 주문 수
+
+    def wait(self, order_id):
+        """order_id 체결 확인 → 체결 dict, 미체결/취소/조회 실패면 None"""
+        start = time.monotonic()
+        delay = self.first_delay
+        polls = 0
+        status = None
+        while True:
+            time.sleep(max(0.0, min(delay, start + self.timeout - time.monotonic())))
+            if self.limiter is not None:
+                time.sleep(self.limiter.reserve())
+            polls += 1
+            status = self.parse(self.query(order_id)) or status
+            if (status and status["done"]) or time.monotonic() - start >= self.timeout:
+                break
+            delay = min(delay * self.backoff, self.max_delay)
+
+        latency = time.monotonic() - start
+        if not status or status["quantity"] <= 0:
+            self.misses += 1
+            return None
+        self.latencies.append(latency)
+        self.polls.append(polls)
+        return dict(status, order_id=order_id, latency=latency, polls=polls)
+
+    def metrics(self):
+        """체결 확인 시간 분포 (ms)"""
+        times = self.latencies
+        return {
+            "fills": len(times),
+            "misses": self.misses,
+            "p50_ms": _percentile(times, 0.5) * 1000 if times else None,
+            "p90_ms": _percentile(times, 0.9) * 1000 if times else None,
+            "max_ms": max(times) * 1000 if times else None,
+            "avg_polls": sum(self.polls) / len(self.polls) if self.polls else None,
+        }
@@ -0,0 +1,333 @@
+# latency.py
+# 브로커 API 응답 시간 계측 (엔드포인트별 히스토그램 · 에러/재시도 수 → SQLite, KIS/업비트 공통)
+# ──────────────────────────────────────────────────────────
+# 클라이언트 메서드에 @timed("kis.get_current_price")를 붙이면 호출마다 걸린 시간을
+# 메모리의 로그 구간 히스토그램(구간 폭 약 9%)에 더합니다. 세션에는 instrument_session()으로
+# 훅을 달아 연결 실패 · HTTP 4xx/5xx · urllib3 자동 재시도를 같은 호출에 함께 기록합니다.
+#
+#   - 기록: 메모리만 (호출당 수 µs, DB 접근 없음)
+#   - 저장: start() 이후 FLUSH_INTERVAL초마다 + 종료 시 trade_logger와 같은 DB에 누적
+#           (api_latency: 일자·엔드포인트·구간별 건수 / api_calls: 호출·에러·재시도 수)
+#   - 리포트: python latency.py [--db 경로] [YYYY-MM-DD]  → 일자·엔드포인트별 p50/p95/p99
+#
+# DB 저장 실패가 봇 운영을 멈추면 안 됨 (trade_logger와 같은 원칙, 실패는 출력만)
+# ──────────────────────────────────────────────────────────
+import atexit
+import functools
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+
+import requests
+
+KST = timezone(timedelta(hours=9))
+
+DEFAULT_DB_PATH = os.environ.get("TRADE_DB_PATH", os.path.expanduser("~/trades.db"))  # trade_logger와 같은 DB
+FLUSH_INTERVAL = 60       # DB 저장 주기 (초)
+BUCKETS_PER_DOUBLING = 8  # 히스토그램 해상도: 2배 구간을 8칸으로 (칸 폭 약 9%)
+
+CREATE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS api_latency (
+        day TEXT NOT NULL,
+        endpoint TEXT NOT NULL,
+        bucket INTEGER NOT NULL,   -- 상한 = 2^(bucket/8) ms
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, endpoint, bucket)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS api_calls (
+        day TEXT NOT NULL,
+        endpoint TEXT NOT NULL,
+        calls INTEGER NOT NULL,
+        errors INTEGER NOT NULL,
+        retries INTEGER NOT NULL,
+        total_ms REAL NOT NULL,
+        max_ms REAL NOT NULL,
+        PRIMARY KEY (day, endpoint)
+    );
+    """,
+]
+
+
+def bucket_of(ms):
+    """응답 시간(ms) → 히스토그램 구간 번호"""
+    return math.ceil(math.log2(max(ms, 1e-3)) * BUCKETS_PER_DOUBLING)
+
+
+def bucket_ms(bucket):
+    """구간 번호 → 구간 상한 (ms)"""
+    return 2 ** (bucket / BUCKETS_PER_DOUBLING)
+
+
+def percentile(hist, q):
+    """{구간: 건수} 히스토그램의 q 분위수 (구간 상한, ms)"""
+    total = sum(hist.values())
+    if total == 0:
+        return None
+    rank = q * total
+    seen = 0
+    for bucket in sorted(hist):
+        seen += hist[bucket]
+        if seen >= rank:
+            return bucket_ms(bucket)
+    return bucket_ms(max(hist))
+
+
+# ══════════════════════════════════════════════════════════
+# 호출 중 에러/재시도 표시 (세션 훅 → 같은 스레드의 @timed 호출로 전달)
+# ══════════════════════════════════════════════════════════
+
+_local = threading.local()
+
+
+def _note(name, n=1):
+    setattr(_local, name, getattr(_local, name, 0) + n)
+
+
+def note_error():
+    """진행 중인 호출을 실패로 기록 (응답은 왔지만 API가 거부한 경우 등)"""
+    _note("errors")
+
+
+def note_retry(n=1):
+    """진행 중인 호출의 재시도 횟수 추가 (토큰 재발급 후 재요청 등)"""
+    _note("retries", n)
+
+
+def instrument_session(session):
+    """session.request를 감싸 연결 실패 · HTTP 4xx/5xx · urllib3 재시도를 현재 호출에 기록"""
+    send = session.request
+
+    @functools.wraps(send)
+    def request(method, url, **kwargs):
+        try:
+            res = send(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            note_error()
+            raise
+        history = getattr(getattr(res.raw, "retries", None), "history", None)
+        if history:
+            note_retry(len(history))
+        if res.status_code >= 400:
+            note_error()
+        return res
+
+    session.request = request
+    return session
+
+
+# ══════════════════════════════════════════════════════════
+# 기록기
+# ══════════════════════════════════════════════════════════
+
+class LatencyRecorder:
+    """
+    (일자, 엔드포인트)별 히스토그램과 호출/에러/재시도 수를 메모리에 모읍니다.
+    totals: 프로세스 시작 후 전체 (summary용) / pending: 마지막 저장 이후분 (flush가 DB에 더하고 비움)
+    """
+
+    def __init__(self, db_path=None, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._pending = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self.flushes = 0
+
+    @staticmethod
+    def _add(table, key, bucket, ms, error, retries):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = {"hist": {}, "calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0}
+        entry["hist"][bucket] = entry["hist"].get(bucket, 0) + 1
+        entry["calls"] += 1
+        entry["errors"] += bool(error)
+        entry["retries"] += retries
+        entry["total_ms"] += ms
+        if ms > entry["max_ms"]:
+            entry["max_ms"] = ms
+
+    def record(self, endpoint, seconds, error=False, retries=0):
+        ms = seconds * 1000
+        key = (datetime.now(KST).strftime("%Y-%m-%d"), endpoint)
+        bucket = bucket_of(ms)
+        with self._lock:
+            self._add(self._totals, key, bucket, ms, error, retries)
+            self._add(self._pending, key, bucket, ms, error, retries)
+
+    def summary(self, day=None):
+        """{엔드포인트: {calls, errors, retries, avg_ms, p50_ms, p95_ms, p99_ms, max_ms}} (이 프로세스 기록분)"""
+        with self._lock:
+            items = [(k, dict(v, hist=dict(v["hist"]))) for k, v in self._totals.items()]
+        merged = {}
+        for (d, endpoint), entry in items:
+            if day is None or d == day:
+                _merge(merged, endpoint, entry)
+        return {endpoint: _stats(entry) for endpoint, entry in merged.items()}
+
+    # ── 저장 ──
+    def start(self, db_path=None):
+        """주기적 DB 저장 시작 (봇 시작 시 1회) — 종료 시에도 남은 기록 저장"""
+        self.db_path = db_path or self.db_path or DEFAULT_DB_PATH
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name="latency-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+        return self
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """마지막 저장 이후 기록을 DB에 누적. 저장한 (일자, 엔드포인트) 수 반환, 실패 시 기록을 되돌려 놓고 0."""
+        if self.db_path is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            conn = sqlite3.connect(self.db_path)
+            with conn:
+                for sql in CREATE_TABLES_SQL:
+                    conn.execute(sql)
+                for (day, endpoint), entry in pending.items():
+                    conn.executemany("""
+                        INSERT INTO api_latency (day, endpoint, bucket, count) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(day, endpoint, bucket) DO UPDATE SET count = count + excluded.count
+                    """, [(day, endpoint, b, n) for b, n in entry["hist"].items()])
+                    conn.execute("""
+                        INSERT INTO api_calls (day, endpoint, calls, errors, retries, total_ms, max_ms)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(day, endpoint) DO UPDATE SET
+                            calls = calls + excluded.calls, errors = errors + excluded.errors,
+                            retries = retries + excluded.retries, total_ms = total_ms + excluded.total_ms,
+                            max_ms = MAX(max_ms, excluded.max_ms)
+                    """, (day, endpoint, entry["calls"], entry["errors"], entry["retries"],
+                          entry["total_ms"], entry["max_ms"]))
+            conn.close()
+        except Exception as e:
+            print(f"   [Latency] DB 저장 실패: {e}")
+            with self._lock:
+                for key, entry in pending.items():
+                    _merge(self._pending, key, entry)
+            return 0
+        self.flushes += 1
+        return len(pending)
+
+
+def _merge(table, key, entry):
+    into = table.get(key)
+    if into is None:
+        table[key] = dict(entry, hist=dict(entry["hist"]))
+        return
+    for bucket, n in entry["hist"].items():
+        into["hist"][bucket] = into["hist"].get(bucket, 0) + n
+    for name in ("calls", "errors", "retries", "total_ms"):
+        into[name] += entry[name]
+    into["max_ms"] = max(into["max_ms"], entry["max_ms"])
+
+
+def _stats(entry):
+    hist, top = entry["hist"], entry["max_ms"]
+    q = {name: percentile(hist, level) for name, level in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99))}
+    return dict({
+        "calls": entry["calls"],
+        "errors": entry["errors"],
+        "retries": entry["retries"],
+        "avg_ms": entry["total_ms"] / entry["calls"] if entry["calls"] else None,
+        "max_ms": top,
+    }, **{name: min(v, top) if v is not None else None for name, v in q.items()})  # 구간 상한이 최댓값을 넘지 않게
+
+
+RECORDER = LatencyRecorder()
+
+
+def start(db_path=None):
+    """공용 기록기의 주기적 DB 저장 시작"""
+    return RECORDER.start(db_path)
+
+
+def timed(endpoint, is_error=None):
+    """
+    클라이언트 메서드 계측 데코레이터.
+    is_error: 반환값 → 실패 여부 (예외 없이 실패 응답을 돌려주는 메서드용, 예: 주문 rt_cd != '0')
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            errors0 = getattr(_local, "errors", 0)
+            retries0 = getattr(_local, "retries", 0)
+            failed = True
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                failed = is_error is not None and is_error(result)
+                return result
+            finally:
+                elapsed = time.perf_counter() - t0
+                errors = getattr(_local, "errors", 0) - errors0
+                RECORDER.record(endpoint, elapsed, failed or errors > 0, getattr(_local, "retries", 0) - retries0)
+        return wrapper
+    return decorator
+
+
+# ══════════════════════════════════════════════════════════
+# 리포트
+# ══════════════════════════════════════════════════════════
+
+def load_report(db_path=None, day=None):
+    """DB 누적분 → [(일자, 엔드포인트, 통계 dict)] (일자 · 엔드포인트 순)"""
+    conn = sqlite3.connect(db_path or DEFAULT_DB_PATH)
+    try:
+        where, args = ("WHERE day = ?", (day,)) if day else ("", ())
+        calls = conn.execute(f"SELECT day, endpoint, calls, errors, retries, total_ms, max_ms "
+                             f"FROM api_calls {where} ORDER BY day, endpoint", args).fetchall()
+        hists = {}
+        for d, endpoint, bucket, count in conn.execute(
+                f"SELECT day, endpoint, bucket, count FROM api_latency {where}", args):
+            hists.setdefault((d, endpoint), {})[bucket] = count
+    except sqlite3.OperationalError:  # 아직 저장된 기록 없음
+        return []
+    finally:
+        conn.close()
+    return [(d, endpoint, _stats({"hist": hists.get((d, endpoint), {}), "calls": n, "errors": errors,
+                                  "retries": retries, "total_ms": total_ms, "max_ms": max_ms}))
+            for d, endpoint, n, errors, retries, total_ms, max_ms in calls]
+
+
+def print_report(rows):
+    if not rows:
+        print("기록된 API 호출이 없습니다.")
+        return
+    print(f"{'일자':<10}  {'엔드포인트':<28} {'호출':>6} {'에러':>5} {'재시도':>5} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'최대':>8}  (ms)")
+    day = None
+    for d, endpoint, s in rows:
+        if day is not None and d != day:
+            print()
+        day = d
+        print(f"{d:<10}  {endpoint:<28} {s['calls']:>6,} {s['errors']:>5,} {s['retries']:>5,} "
+              f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    db_path = None
+    if "--db" in args:
+        i = args.index("--db")
+        if i + 1 >= len(args):
+            print("사용법: python latency.py [--db 경로] [YYYY-MM-DD]")
+            sys.exit(1)
+        db_path = args[i + 1]
+        del args[i:i + 2]
+    print_report(load_report(db_path, args[0] if args else None))
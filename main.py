@@ -15,6 +15,11 @@ import yfinance as yf
 import pandas as pd
 
 import broker
+import async_broker
+import fill_tracker
+import latency
+import price_stream
+from bar_store import load_bars
 from telegram_notifier import TelegramNotifier
 
 # ── 환경 설정 ──
@@ -94,34 +99,31 @@ def wait_for_market_open():
 
 
 def get_yesterday_range_yf():
-    """(fallback) yfinance로 전일 고가-저가 변동폭과 시가/종가를 구합니다."""
-    df = yf.download(TICKER, period='5d', interval='1d', timeout=10)
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
+    """(fallback) yfinance로 전일 고가-저가 변동폭과 시가/종가를 구합니다. (로컬 일봉 저장소 경유)"""
+    df = load_bars(TICKER, '1d', 14)
 
     # 한국 시간 기준 오늘 (UTC+9)
     kst = timezone(timedelta(hours=9))
     today = datetime.now(kst).date()
-    df_past = df[df.index.date < today]
+    df_past = df[df['날짜'].dt.date < today]
 
     if len(df_past) == 0:
         print("❌ yfinance: 전일 데이터를 찾을 수 없습니다.")
         return None, None, None, None, None
 
     yesterday = df_past.iloc[-1]
-    return (float(yesterday['High']), float(yesterday['Low']),
-            float(yesterday['High'] - yesterday['Low']),
-            float(yesterday['Open']), float(yesterday['Close']))
+    return (float(yesterday['고가']), float(yesterday['저가']),
+            float(yesterday['고가'] - yesterday['저가']),
+            float(yesterday['시가']), float(yesterday['종가']))
 
 
-def get_yesterday_range(token=None):
+def get_yesterday_range(ohlc=None):
     """전일 고가-저가 변동폭과 시가/종가를 구합니다.
-    1차: KIS API (빠르고 안정적)
+    1차: KIS API (시작 시 동시 조회한 전일 OHLC)
     2차: yfinance (fallback, timeout 10초)
     """
     # 1차: KIS API
-    if token:
-        ohlc = broker.get_yesterday_ohlc(token, APP_KEY, APP_SECRET, URL_REAL, STOCK_CODE)
+    if ohlc is not None:
         if ohlc:
             high, low = ohlc['high'], ohlc['low']
             print(f"✅ KIS API로 전일 데이터 조회 성공")
@@ -176,6 +178,7 @@ def get_today_open_yf():
 # ── 메인 봇 ──
 def run_bot():
     notifier = TelegramNotifier(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+    latency.start()  # API 응답 시간 기록 → trade DB (리포트: python latency.py)
     notify(notifier, "🚀 <b>변동성 돌파 봇 시작</b>", "모드: 🔴 실전투자")
 
     print("=" * 60)
@@ -190,8 +193,16 @@ def run_bot():
             print("❌ 토큰 발급 실패. 종료합니다.")
             return
 
+        # 서로 독립인 시작 조회 4건(전일 시세 · 보유 수량 · 매수 평균가 · 현재가)을 동시에 요청
+        kis = async_broker.AsyncKISClient(broker.client_for(APP_KEY, APP_SECRET, URL_REAL, ACC_NO, "REAL", token))
+        fills = fill_tracker.FillTracker(kis.client.get_order, lambda res: fill_tracker.kis_fill(res, BUY_FEE),
+                                         limiter=kis.limiter)
+        ohlc, actual_qty, actual_price, start_price = async_broker.run(
+            kis.get_yesterday_ohlc(STOCK_CODE), kis.get_holding_quantity(STOCK_CODE),
+            kis.get_stock_balance(STOCK_CODE), kis.get_current_price(STOCK_CODE))
+
         # ── STEP 2: 전일 변동폭 + 노이즈 기반 K 계산 ──
-        yesterday_high, yesterday_low, yesterday_range, yesterday_open, yesterday_close = get_yesterday_range(token)
+        yesterday_high, yesterday_low, yesterday_range, yesterday_open, yesterday_close = get_yesterday_range(ohlc)
         if yesterday_range is None:
             notify(notifier, "❌ <b>에러</b>", "전일 데이터 조회 실패")
             return
@@ -212,8 +223,6 @@ def run_bot():
         print(f"   노이즈 비율: {noise_ratio:.2f} → K={K} (범위: {K_MIN}~{K_MAX})")
 
         # ── STEP 3: 실제 계좌 기준 포지션 확인 (수동 매매 대응) ──
-        actual_qty = broker.get_holding_quantity(
-            token, APP_KEY, APP_SECRET, URL_REAL, ACC_NO, STOCK_CODE, mode="REAL")
         csv_price, csv_qty = load_unclosed_position()
 
         if actual_qty is None:
@@ -232,15 +241,12 @@ def run_bot():
                 state = "WAITING"
         elif actual_qty > 0:
             # 실제 보유 중 → 매수가는 계좌에서 조회 (CSV보다 정확)
-            actual_price = broker.get_stock_balance(
-                token, APP_KEY, APP_SECRET, URL_REAL, ACC_NO, STOCK_CODE, mode="REAL")
             bought_price = actual_price if actual_price > 0 else csv_price
             holding_qty = actual_qty
             # 매수가를 어디서도 못 구한 경우 → 현재가로 대체 (0원 방지)
             if bought_price <= 0:
-                fallback_price = broker.get_current_price(token, APP_KEY, APP_SECRET, URL_REAL, STOCK_CODE)
-                if fallback_price and fallback_price > 0:
-                    bought_price = fallback_price
+                if start_price and start_price > 0:
+                    bought_price = start_price
                     print(f"⚠️ 매수가 조회 실패 → 현재가({bought_price:,.0f}원)로 대체")
                 else:
                     notify(notifier, "❌ <b>매수가 조회 불가</b>",
@@ -318,18 +324,29 @@ def run_bot():
         return
 
     # ── STEP 5: 메인 루프 ──
-    print(f"\n👀 모니터링 시작 (1분 간격)")
+    print(f"\n👀 모니터링 시작 (실시간 체결가, 끊기면 {CHECK_INTERVAL}초 REST 폴링)")
     print("-" * 40)
 
+    # 체결가는 WebSocket으로 받고, 연결 전/끊김 동안에는 REST 현재가 조회로 대체
+    feed = price_stream.KISPriceStream(
+        APP_KEY, APP_SECRET, URL_REAL, [STOCK_CODE],
+        fallback=lambda code: broker.get_current_price(token, APP_KEY, APP_SECRET, URL_REAL, code))
+    feed.start()
+
     kst = timezone(timedelta(hours=9))
-    loop_count = 0
-    MANUAL_TRADE_CHECK_INTERVAL = 15  # 15루프(=30초)마다 잔고 조회로 수동매매 감지
+    MANUAL_TRADE_CHECK_SECONDS = 30  # 30초마다 잔고 조회로 수동매매 감지 (틱 수와 무관)
+    last_manual_check = time.time()
+    last_status_print = 0.0  # 상태 출력은 틱마다가 아니라 CHECK_INTERVAL초에 1회
     zero_qty_count = 0  # 연속 0주 감지 횟수 (KIS API 일시적 누락 방어)
     while True:
         try:
             now = datetime.now(kst)
-            loop_count += 1
-            check_manual = (loop_count % MANUAL_TRADE_CHECK_INTERVAL == 0)
+            check_manual = time.time() - last_manual_check >= MANUAL_TRADE_CHECK_SECONDS
+            if check_manual:
+                last_manual_check = time.time()
+            show_status = time.time() - last_status_print >= CHECK_INTERVAL
+            if show_status:
+                last_status_print = time.time()
 
             # 장 마감 체크 (15:30 이후 → 봇 종료)
             if now.hour >= 15 and now.minute >= 30:
@@ -351,7 +368,7 @@ def run_bot():
                 time.sleep(60)
                 continue
 
-            current_price = broker.get_current_price(token, APP_KEY, APP_SECRET, URL_REAL, STOCK_CODE)
+            current_price = feed.get(STOCK_CODE)
             if current_price is None:
                 time.sleep(60)
                 continue
@@ -380,7 +397,8 @@ def run_bot():
                     time.sleep(CHECK_INTERVAL)
                     continue
 
-                print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | 목표가: {target_price:,.0f}원 | 대기 중")
+                if show_status:
+                    print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | 목표가: {target_price:,.0f}원 | 대기 중")
 
                 if current_price >= target_price:
                     # 슬리피지 체크: 목표가 대비 너무 올라갔으면 스킵
@@ -411,21 +429,12 @@ def run_bot():
                         STOCK_CODE, buy_qty, current_price, mode="REAL")
 
                     if res.get('rt_cd') == '0':
-                        # 체결 확인 (20초 대기)
-                        bought_price = 0
-                        holding_qty = 0
-                        for _ in range(10):
-                            time.sleep(2)
-                            bp = broker.get_stock_balance(
-                                token, APP_KEY, APP_SECRET, URL_REAL, ACC_NO,
-                                STOCK_CODE, mode="REAL")
-                            if bp > 0:
-                                bought_price = bp
-                                qty = broker.get_holding_quantity(
-                                    token, APP_KEY, APP_SECRET, URL_REAL, ACC_NO,
-                                    STOCK_CODE, mode="REAL")
-                                holding_qty = qty if qty is not None and qty > 0 else buy_qty
-                                break
+                        # 체결 확인: 주문번호로 체결 조회 (0.25초부터 간격 2배, 최대 20초)
+                        # 응답에 주문번호가 없으면 조회하지 않고 미확인으로 처리
+                        order_no = res.get('output', {}).get('ODNO')
+                        fill = fills.wait(order_no) if order_no else None
+                        bought_price = (fill["price"] or current_price) if fill else 0
+                        holding_qty = fill["quantity"] if fill else 0
 
                         if holding_qty > 0:
                             log_trade("매수", bought_price, holding_qty, reason=f"돌파(목표 {target_price:,.0f}원)")
@@ -436,8 +445,8 @@ def run_bot():
                         else:
                             # 20초 내 잔고 미확인 → 미체결로 판단, 당일 매매 포기
                             notify(notifier, "⚠️ <b>미체결 감지</b>",
-                                   f"20초 내 잔고 미확인\n주문은 장마감 시 자동 취소됩니다\n당일 매매를 포기합니다")
-                            print(f"⚠️ 미체결: 20초 내 잔고 확인 실패. 당일 매매 포기.")
+                                   f"20초 내 체결 미확인\n주문은 장마감 시 자동 취소됩니다\n당일 매매를 포기합니다")
+                            print(f"⚠️ 미체결: 20초 내 체결 확인 실패. 당일 매매 포기.")
                             state = "SOLD"
                     else:
                         notify(notifier, "❌ <b>매수 실패</b>", f"{res.get('msg1')}")
@@ -471,9 +480,10 @@ def run_bot():
                     holding_qty = actual_qty  # 수량 동기화 (부분 매도 대응)
 
                 profit_rate = (current_price * (1 - SELL_FEE) / (bought_price * (1 + BUY_FEE)) - 1) * 100
-                print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | 수익률: {profit_rate:+.2f}% | 청산 대기")
+                if show_status:
+                    print(f"[{now.strftime('%H:%M:%S')}] 현재가: {current_price:,.0f}원 | 수익률: {profit_rate:+.2f}% | 청산 대기")
 
-                # 15:15 이후 청산 (15:30까지 매 루프 재시도)
+                # 15:15 이후 청산 (15:30까지 CHECK_INTERVAL초마다 재시도 — 틱마다 주문/알림 반복 방지)
                 if now.hour == 15 and now.minute >= 15:
                     sell_price = current_price
                     # current_price가 None이면 재조회
@@ -495,14 +505,20 @@ def run_bot():
                             notify(notifier, "⚠️ <b>매도 실패 (재시도 중)</b>",
                                    f"{res.get('msg1')}\n15:30까지 계속 재시도합니다.")
                             print(f"⚠️ 매도 실패: {res.get('msg1')} → 다음 루프에서 재시도")
+                            time.sleep(CHECK_INTERVAL)
+                            continue
                     else:
                         print(f"⚠️ 현재가 조회 실패 → 다음 루프에서 재시도")
+                        time.sleep(CHECK_INTERVAL)
+                        continue
 
             # ── 청산 완료: 장 마감까지 대기 ──
             elif state == "SOLD":
-                print(f"[{now.strftime('%H:%M:%S')}] 청산 완료. 장 마감 대기 중...")
+                if show_status:
+                    print(f"[{now.strftime('%H:%M:%S')}] 청산 완료. 장 마감 대기 중...")
 
-            time.sleep(CHECK_INTERVAL)
+            # 새 체결가가 오면 즉시, 아니면 CHECK_INTERVAL초 뒤 다음 루프
+            feed.wait(STOCK_CODE, current_price, CHECK_INTERVAL)
 
         except Exception as e:
             error_msg = f"에러: {str(e)}"
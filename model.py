@@ -2,7 +2,7 @@
 # XGBoost 모델 학습/예측/저장/로드
 # 레버리지 ETF 5분봉 단타에 최적화된 하이퍼파라미터
 import os
-import pandas as pd
+import numpy as np
 from xgboost import XGBClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
@@ -72,6 +72,48 @@ def train_model(df, features):
     return model
 
 
+def to_feature_matrix(df, features):
+    """DataFrame의 피처 컬럼을 predict_proba_batch 입력용 연속 float32 행렬로 변환합니다."""
+    return np.ascontiguousarray(df[features].to_numpy(dtype=np.float32))
+
+
+def _iteration_range(model):
+    """predict_proba와 같은 트리 범위 (early stopping 시 best_iteration까지)"""
+    try:
+        return (0, model.best_iteration + 1)
+    except AttributeError:  # early stopping 미사용 → 전체 트리
+        return (0, 0)
+
+
+def predict_proba_batch(model, X):
+    """
+    여러 행의 상승 확률을 한 번에 예측합니다. (DataFrame/DMatrix 생성 없이 inplace_predict)
+
+    Args:
+        X: (행 수, 피처 수) float32 ndarray (to_feature_matrix 결과)
+    Returns:
+        (행 수,) ndarray — predict_proba(X)[:, 1]과 동일
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    return model.get_booster().inplace_predict(
+        X, iteration_range=_iteration_range(model), validate_features=False)
+
+
+_row_buffers = {}  # 피처 수 → (1, 피처 수) float32 버퍼 (단일 행 예측 재사용)
+
+
+def predict_proba_row(model, row_data, features):
+    """단일 캔들의 상승 확률을 예측합니다. 미리 할당한 버퍼에 값을 채워 재사용합니다."""
+    buf = _row_buffers.get(len(features))
+    if buf is None:
+        buf = _row_buffers[len(features)] = np.empty((1, len(features)), dtype=np.float32)
+    for j, name in enumerate(features):
+        buf[0, j] = row_data[name]
+    return float(predict_proba_batch(model, buf)[0])
+
+
 def predict_signal(model, row_data, features, threshold=0.60):
     """
     단일 캔들 데이터에 대해 매수 신호를 예측합니다.
@@ -81,8 +123,7 @@ def predict_signal(model, row_data, features, threshold=0.60):
         signal: 'BUY' | 'HOLD'
         probability: 상승 확률 (0.0 ~ 1.0)
     """
-    input_df = pd.DataFrame([row_data[features].values], columns=features)
-    prob = model.predict_proba(input_df)[0][1]
+    prob = predict_proba_row(model, row_data, features)
 
     if prob >= threshold:
         return 'BUY', prob
@@ -1,22 +1,353 @@
 # optimizer.py
 # AI 5분봉 전략 파라미터 최적화 도구
 # 다양한 설정 조합을 테스트하여 최적의 전략 찾기
-
+#
+# 구조:
+#   1단계 prepare_probabilities: 모델을 한 번만 학습하고 테스트 구간 확률 벡터를 캐시
+#   2단계 simulate_grid        : 캐시된 (가격, 확률)로 모든 파라미터 조합을 NumPy로 동시 시뮬레이션
+#   run_grid_search            : 조합을 나눠 프로세스 풀에서 병렬 실행 ((가격, 확률)은 공유 메모리)
+# (청산 파라미터만 바뀌므로 조합마다 같은 모델을 다시 학습/예측할 필요가 없음)
+
+import os
+import time
 import pandas as pd
 import numpy as np
 from itertools import product
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 from backtester import prepare_5min_data, strategy_ai_5min_scalp
+from model import predict_proba_batch, to_feature_matrix
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score
 
 
-def optimize_parameters(ticker="233740.KS"):
+FEATURES = [
+    '종가', 'MA5', 'MA20', 'RSI',
+    'BB_Pct', 'MACD', 'MACD_Hist',
+    'StochRSI_K', 'StochRSI_D', 'ATR',
+    'Vol_Ratio', 'Vol_Spike', 'Body_Ratio',
+    'Ret_1', 'Ret_3', 'Ret_6', 'Ret_12',
+    'MA5_Dist', 'MA20_Dist', 'Intraday_Pos',
+    'VOL', 'Vol_6', '거래량',
+]
+
+# 그리드에 없는 파라미터의 기본값 (main.py와 동일)
+DEFAULT_PARAMS = {
+    'BUY_THRESHOLD': 0.65,
+    'TAKE_PROFIT': 0.015,
+    'STOP_LOSS': -0.012,
+    'SELL_THRESH': 0.40,
+    'TRAIL_ACTIVATE': 0.01,
+    'TRAIL_STOP': 0.005,
+}
+
+INITIAL_BALANCE = 10000000
+POSITION_RATIO = 0.80
+
+
+# ══════════════════════════════════════════════════════════
+# 1단계: 1회 학습 + 확률 캐시
+# ══════════════════════════════════════════════════════════
+
+def prepare_probabilities(df, features, split_ratio=0.75):
+    """
+    학습 구간으로 모델을 한 번 학습하고 테스트 구간의 (종가, 상승 확률) 배열을 반환합니다.
+
+    Returns:
+        (prices, probs) — 둘 다 테스트 구간 길이의 float64 ndarray
+    """
+    split_idx = int(len(df) * split_ratio)
+    train = df.iloc[:split_idx]
+    test = df.iloc[split_idx:]
+
+    pos = train['target'].sum()
+    neg = len(train) - pos
+    scale_w = neg / pos if pos > 0 else 1.0
+
+    ai = XGBClassifier(
+        n_jobs=-1, n_estimators=300, learning_rate=0.05,
+        max_depth=6, min_child_weight=5,
+        subsample=0.8, colsample_bytree=0.8,
+        reg_alpha=0.1, reg_lambda=1.0,
+        scale_pos_weight=scale_w,
+        eval_metric='logloss', random_state=42,
+    )
+    ai.fit(train[features], train['target'], verbose=False)
+
+    probs = predict_proba_batch(ai, to_feature_matrix(test, features)).astype(np.float64)
+    prices = test['종가'].to_numpy(dtype=np.float64)
+    return prices, probs
+
+
+# ══════════════════════════════════════════════════════════
+# 2단계: 매매 시뮬레이션
+# ══════════════════════════════════════════════════════════
+
+def simulate_trades(prices, probs, params, buy_fee, sell_fee):
+    """
+    단일 파라미터 조합의 매매 시뮬레이션 (캔들 단위 루프, simulate_grid 검증 기준)
+
+    Returns:
+        (수익률 %, 거래 횟수, 승률 %)
+    """
+    p = {**DEFAULT_PARAMS, **params}
+    balance = INITIAL_BALANCE
+    holdings = 0
+    bought_price = 0
+    highest_price = 0
+    trailing_active = False
+    trade_count = 0
+    win_count = 0
+
+    for price, up_prob in zip(prices, probs):
+        if holdings == 0:
+            if up_prob >= p['BUY_THRESHOLD']:
+                holdings = int(balance * POSITION_RATIO / (price * (1 + buy_fee)))
+                if holdings > 0:
+                    balance -= holdings * price * (1 + buy_fee)
+                    bought_price = price
+                    highest_price = price
+                    trailing_active = False
+
+        elif holdings > 0:
+            profit_rate = (price - bought_price) / bought_price
+            sell = False
+
+            if profit_rate >= p['TAKE_PROFIT']:
+                sell = True
+            elif profit_rate <= p['STOP_LOSS']:
+                sell = True
+            elif trailing_active:
+                drop = (price - highest_price) / highest_price
+                if drop <= -p['TRAIL_STOP']:
+                    sell = True
+            elif up_prob < p['SELL_THRESH'] and profit_rate > 0:
+                sell = True
+
+            if price > highest_price:
+                highest_price = price
+            if not trailing_active and profit_rate >= p['TRAIL_ACTIVATE']:
+                trailing_active = True
+
+            if sell:
+                balance += holdings * price * (1 - sell_fee)
+                trade_count += 1
+                if price > bought_price:
+                    win_count += 1
+                holdings = 0
+                bought_price = 0
+                highest_price = 0
+                trailing_active = False
+
+    if holdings > 0:
+        balance += holdings * prices[-1] * (1 - sell_fee)
+        trade_count += 1
+        if prices[-1] > bought_price:
+            win_count += 1
+
+    ret = (balance / INITIAL_BALANCE - 1) * 100
+    win_rate = (win_count / trade_count * 100) if trade_count > 0 else 0
+    return ret, trade_count, win_rate
+
+
+def simulate_grid(prices, probs, grid, buy_fee, sell_fee):
+    """
+    모든 파라미터 조합을 한 번의 캔들 루프로 동시에 시뮬레이션합니다.
+    (조합 축은 NumPy 벡터 연산 → 조합 수가 수천 개여도 캔들 수만큼만 반복)
+
+    Args:
+        grid: {파라미터 이름: (조합 수,) 배열} — 없는 파라미터는 DEFAULT_PARAMS 사용
+    Returns:
+        {'Return': 수익률 %, 'Trades': 거래 횟수, 'WinRate': 승률 %} — 각각 (조합 수,) 배열
+    """
+    size = len(next(iter(grid.values())))
+    p = {name: np.broadcast_to(np.asarray(grid.get(name, value), dtype=float), (size,))
+         for name, value in DEFAULT_PARAMS.items()}
+    buy_th, tp, sl = p['BUY_THRESHOLD'], p['TAKE_PROFIT'], p['STOP_LOSS']
+    sell_th, trail_act, trail_stop = p['SELL_THRESH'], p['TRAIL_ACTIVATE'], p['TRAIL_STOP']
+    min_buy_th = buy_th.min()
+
+    balance = np.full(size, float(INITIAL_BALANCE))
+    holdings = np.zeros(size)
+    bought_price = np.zeros(size)
+    highest_price = np.zeros(size)
+    trailing_active = np.zeros(size, dtype=bool)
+    trade_count = np.zeros(size, dtype=np.int64)
+    win_count = np.zeros(size, dtype=np.int64)
+    profit_rate = np.zeros(size)
+    drop = np.zeros(size)
+
+    for price, up_prob in zip(prices, probs):
+        held = holdings > 0
+        any_held = held.any()
+        if not any_held and up_prob < min_buy_th:
+            continue  # 모든 조합이 관망
+
+        # 보유 중: 청산 판단 (익절 → 손절 → 트레일링 or AI 반전)
+        if any_held:
+            np.divide(price - bought_price, bought_price, out=profit_rate, where=held)
+            np.divide(price - highest_price, highest_price, out=drop, where=held)
+            sell = held & (
+                (profit_rate >= tp) | (profit_rate <= sl)
+                | (trailing_active & (drop <= -trail_stop))
+                | (~trailing_active & (up_prob < sell_th) & (profit_rate > 0))
+            )
+            highest_price = np.where(held & (price > highest_price), price, highest_price)
+            trailing_active |= held & (profit_rate >= trail_act)
+
+            if sell.any():
+                balance = np.where(sell, balance + holdings * price * (1 - sell_fee), balance)
+                trade_count += sell
+                win_count += sell & (price > bought_price)
+                holdings[sell] = 0
+                bought_price[sell] = 0
+                highest_price[sell] = 0
+                trailing_active[sell] = False
+
+        # 미보유: 매수 판단 (같은 캔들에서 청산된 조합은 다음 캔들부터)
+        buy = ~held & (up_prob >= buy_th)
+        if buy.any():
+            qty = np.floor(balance * POSITION_RATIO / (price * (1 + buy_fee)))
+            buy &= qty > 0
+            holdings = np.where(buy, qty, holdings)
+            balance = np.where(buy, balance - qty * price * (1 + buy_fee), balance)
+            bought_price[buy] = price
+            highest_price[buy] = price
+            trailing_active[buy] = False
+
+    # 잔여 포지션 청산
+    held = holdings > 0
+    if len(prices) > 0:
+        last = prices[-1]
+        balance = np.where(held, balance + holdings * last * (1 - sell_fee), balance)
+        trade_count += held
+        win_count += held & (last > bought_price)
+
+    ret = (balance / INITIAL_BALANCE - 1) * 100
+    win_rate = np.where(trade_count > 0, win_count / np.maximum(trade_count, 1) * 100, 0)
+    return {'Return': ret, 'Trades': trade_count, 'WinRate': win_rate}
+
+
+def build_grid(space):
+    """{파라미터 이름: 후보 목록} → {파라미터 이름: 조합별 값 배열} (데카르트 곱)"""
+    unknown = [n for n in space if n not in DEFAULT_PARAMS]
+    if unknown:
+        raise ValueError(f"알 수 없는 파라미터: {unknown} (사용 가능: {list(DEFAULT_PARAMS)})")
+    names = list(space)
+    combos = np.array(list(product(*(space[n] for n in names))), dtype=float)
+    return {name: combos[:, k] for k, name in enumerate(names)}
+
+
+# ══════════════════════════════════════════════════════════
+# 병렬 그리드 서치 (프로세스 풀 + 공유 메모리)
+# ══════════════════════════════════════════════════════════
+
+_shared = {}  # 워커 프로세스: 공유 메모리 핸들과 (가격, 확률) 뷰
+
+
+def _attach_shared(shm_name, n):
+    """워커 초기화: 부모가 만든 공유 메모리를 복사 없이 (가격, 확률) 배열로 연결합니다."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+    _shared.update(shm=shm, prices=arrays[0], probs=arrays[1])
+
+
+def _simulate_chunk(start, grid_chunk, buy_fee, sell_fee):
+    return start, simulate_grid(_shared['prices'], _shared['probs'], grid_chunk, buy_fee, sell_fee)
+
+
+def run_grid_search(prices, probs, space, buy_fee, sell_fee, workers=None, chunk_size=None):
+    """
+    임의의 파라미터 공간을 조합별로 나눠 여러 프로세스에서 시뮬레이션합니다.
+
+    Args:
+        space: {파라미터 이름: 후보 목록} (DEFAULT_PARAMS의 키 중 아무거나)
+        workers: 프로세스 수 (기본 CPU 수, 1이면 현재 프로세스에서 실행)
+        chunk_size: 작업 1개당 조합 수 (기본: 워커당 4개 작업이 되도록)
+    Returns:
+        파라미터 + Return/Trades/WinRate/Score 컬럼의 DataFrame (Score 내림차순)
+    """
+    grid = build_grid(space)
+    size = len(next(iter(grid.values())))
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(256, -(-size // (workers * 4)))
+
+    metrics = {'Return': np.zeros(size), 'Trades': np.zeros(size, dtype=np.int64),
+               'WinRate': np.zeros(size)}
+    t0 = time.time()
+
+    def _collect(start, chunk_metrics, done):
+        for name, values in chunk_metrics.items():
+            metrics[name][start:start + len(values)] = values
+        print(f"  진행: {done:,}/{size:,} 완료 ({done / size * 100:5.1f}%, {time.time() - t0:.1f}초)")
+
+    starts = range(0, size, chunk_size)
+    if workers == 1 or size <= chunk_size:
+        done = 0
+        for start in starts:
+            chunk = {k: v[start:start + chunk_size] for k, v in grid.items()}
+            chunk_metrics = simulate_grid(prices, probs, chunk, buy_fee, sell_fee)
+            done += len(chunk_metrics['Return'])
+            _collect(start, chunk_metrics, done)
+    else:
+        n = len(prices)
+        shm = shared_memory.SharedMemory(create=True, size=max(2 * n * 8, 1))
+        try:
+            arrays = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+            arrays[0], arrays[1] = prices, probs
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared,
+                                     initargs=(shm.name, n)) as pool:
+                futures = [pool.submit(_simulate_chunk, start,
+                                       {k: v[start:start + chunk_size] for k, v in grid.items()},
+                                       buy_fee, sell_fee)
+                           for start in starts]
+                done = 0
+                for future in as_completed(futures):
+                    start, chunk_metrics = future.result()
+                    done += len(chunk_metrics['Return'])
+                    _collect(start, chunk_metrics, done)
+            del arrays
+        finally:
+            shm.close()
+            shm.unlink()
+
+    results_df = pd.DataFrame({**grid, **metrics})
+    results_df['Score'] = results_df['Return']  # 정렬 기준
+    return results_df.sort_values('Score', ascending=False)
+
+
+# ══════════════════════════════════════════════════════════
+# 그리드 서치
+# ══════════════════════════════════════════════════════════
+
+DEFAULT_SPACE = {
+    'BUY_THRESHOLD': [0.55, 0.60, 0.65, 0.70],      # 낮을수록 공격적
+    'TAKE_PROFIT': [0.010, 0.015, 0.020, 0.025],    # 익절 목표
+    'STOP_LOSS': [-0.008, -0.010, -0.012, -0.015],  # 손절선
+}
+
+# 표 출력 형식: (헤더, 퍼센트 표시 여부)
+PARAM_LABELS = {
+    'BUY_THRESHOLD': ('매수임계', False),
+    'TAKE_PROFIT': ('익절', True),
+    'STOP_LOSS': ('손절', True),
+    'SELL_THRESH': ('매도임계', False),
+    'TRAIL_ACTIVATE': ('트레일시작', True),
+    'TRAIL_STOP': ('트레일폭', True),
+}
+
+
+def optimize_parameters(ticker="233740.KS", space=None, workers=None):
     """
     그리드 서치로 최적 파라미터 탐색
     - BUY_THRESHOLD: AI 매수 확률 임계값
     - TAKE_PROFIT: 익절 수익률
     - STOP_LOSS: 손절 수익률
-    - TRAILING_ACTIVATE: 트레일링 활성화 수익률
+    - SELL_THRESH / TRAIL_ACTIVATE / TRAIL_STOP: space에 넣으면 함께 탐색 (없으면 DEFAULT_PARAMS 고정)
+
+    Args:
+        space: {파라미터 이름: 후보 목록} (기본 DEFAULT_SPACE)
+        workers: 병렬 프로세스 수 (기본 CPU 수)
     """
 
     print("=" * 60)
@@ -32,144 +363,34 @@ def optimize_parameters(ticker="233740.KS"):
 
     print(f"   총 {len(df)}개 5분봉 로드 완료")
 
-    # 파라미터 그리드
-    buy_thresholds = [0.55, 0.60, 0.65, 0.70]      # 낮을수록 공격적
-    take_profits = [0.010, 0.015, 0.020, 0.025]     # 익절 목표
-    stop_losses = [-0.008, -0.010, -0.012, -0.015]  # 손절선
+    space = space or DEFAULT_SPACE
 
     # ETF 수수료 (실전 기준: 0.0146%, 수수료 우대, 거래세 면제)
     buy_fee = 0.000146
     sell_fee = 0.000146
-    results = []
-
-    print(f"\n🧪 총 {len(buy_thresholds) * len(take_profits) * len(stop_losses)}가지 조합 테스트 중...\n")
-
-    for i, (buy_th, tp, sl) in enumerate(product(buy_thresholds, take_profits, stop_losses), 1):
-        # 백테스트 실행 (strategy_ai_5min_scalp 수정 버전)
-        features = [
-            '종가', 'MA5', 'MA20', 'RSI',
-            'BB_Pct', 'MACD', 'MACD_Hist',
-            'StochRSI_K', 'StochRSI_D', 'ATR',
-            'Vol_Ratio', 'Vol_Spike', 'Body_Ratio',
-            'Ret_1', 'Ret_3', 'Ret_6', 'Ret_12',
-            'MA5_Dist', 'MA20_Dist', 'Intraday_Pos',
-            'VOL', 'Vol_6', '거래량',
-        ]
-        features = [f for f in features if f in df.columns]
-
-        split_idx = int(len(df) * 0.75)
-        train = df.iloc[:split_idx]
-        test = df.iloc[split_idx:].copy()
-
-        pos = train['target'].sum()
-        neg = len(train) - pos
-        scale_w = neg / pos if pos > 0 else 1.0
-
-        ai = XGBClassifier(
-            n_jobs=-1, n_estimators=300, learning_rate=0.05,
-            max_depth=6, min_child_weight=5,
-            subsample=0.8, colsample_bytree=0.8,
-            reg_alpha=0.1, reg_lambda=1.0,
-            scale_pos_weight=scale_w,
-            eval_metric='logloss', random_state=42,
-        )
-        ai.fit(train[features], train['target'], verbose=False)
-
-        # 파라미터 적용한 백테스트
-        SELL_THRESH = 0.40
-        TRAIL_ACTIVATE = 0.01
-        TRAIL_STOP = 0.005
-
-        balance = 10000000
-        holdings = 0
-        bought_price = 0
-        highest_price = 0
-        trailing_active = False
-        trade_count = 0
-        win_count = 0
-
-        for j in range(len(test)):
-            row = test.iloc[j]
-            price = row['종가']
-            input_data = pd.DataFrame([row[features].values], columns=features)
-            up_prob = ai.predict_proba(input_data)[0][1]
-
-            if holdings == 0:
-                if up_prob >= buy_th:  # 파라미터 적용
-                    holdings = int(balance * 0.80 / (price * (1 + buy_fee)))
-                    if holdings > 0:
-                        balance -= holdings * price * (1 + buy_fee)
-                        bought_price = price
-                        highest_price = price
-                        trailing_active = False
-
-            elif holdings > 0:
-                profit_rate = (price - bought_price) / bought_price
-                sell = False
-
-                if profit_rate >= tp:  # 파라미터 적용
-                    sell = True
-                elif profit_rate <= sl:  # 파라미터 적용
-                    sell = True
-                elif trailing_active:
-                    drop = (price - highest_price) / highest_price
-                    if drop <= -TRAIL_STOP:
-                        sell = True
-                elif up_prob < SELL_THRESH and profit_rate > 0:
-                    sell = True
-
-                if price > highest_price:
-                    highest_price = price
-                if not trailing_active and profit_rate >= TRAIL_ACTIVATE:
-                    trailing_active = True
-
-                if sell:
-                    balance += holdings * price * (1 - sell_fee)
-                    trade_count += 1
-                    if price > bought_price:
-                        win_count += 1
-                    holdings = 0
-                    bought_price = 0
-                    highest_price = 0
-                    trailing_active = False
-
-        if holdings > 0:
-            balance += holdings * test.iloc[-1]['종가'] * (1 - total_fee / 2)
-            trade_count += 1
-            if test.iloc[-1]['종가'] > bought_price:
-                win_count += 1
-
-        ret = (balance / 10000000 - 1) * 100
-        win_rate = (win_count / trade_count * 100) if trade_count > 0 else 0
-
-        results.append({
-            'BUY_THRESHOLD': buy_th,
-            'TAKE_PROFIT': tp,
-            'STOP_LOSS': sl,
-            'Return': ret,
-            'Trades': trade_count,
-            'WinRate': win_rate,
-            'Score': ret  # 정렬 기준
-        })
 
-        if i % 16 == 0:
-            print(f"  진행: {i}/{len(buy_thresholds) * len(take_profits) * len(stop_losses)} 완료...")
+    # 1단계: 모델 1회 학습 + 테스트 구간 확률 캐시
+    features = [f for f in FEATURES if f in df.columns]
+    print("\n🧠 모델 학습 및 테스트 구간 확률 계산 (1회)...")
+    prices, probs = prepare_probabilities(df, features)
 
-    # 결과 정렬
-    results_df = pd.DataFrame(results)
-    results_df = results_df.sort_values('Score', ascending=False)
+    # 2단계: 전체 조합 병렬 시뮬레이션
+    total = int(np.prod([len(v) for v in space.values()]))
+    print(f"\n🧪 총 {total:,}가지 조합 테스트 중... (프로세스 {workers or os.cpu_count()}개)\n")
+    results_df = run_grid_search(prices, probs, space, buy_fee, sell_fee, workers=workers)
 
+    names = list(space)
     print("\n" + "=" * 80)
     print("🏆 최적 파라미터 TOP 10")
     print("=" * 80)
-    print(f"{'순위':<4} {'매수임계':<8} {'익절':<8} {'손절':<8} {'수익률':<10} {'거래':<6} {'승률':<8}")
+    header = " ".join(f"{PARAM_LABELS[n][0]:<8}" for n in names)
+    print(f"{'순위':<4} {header} {'수익률':<10} {'거래':<6} {'승률':<8}")
     print("-" * 80)
 
-    for idx, row in results_df.head(10).iterrows():
-        print(f"{results_df.index.get_loc(idx)+1:<4} "
-              f"{row['BUY_THRESHOLD']:<8.2f} "
-              f"{row['TAKE_PROFIT']*100:<7.1f}% "
-              f"{row['STOP_LOSS']*100:<7.1f}% "
+    for rank, (_, row) in enumerate(results_df.head(10).iterrows(), 1):
+        cells = " ".join(f"{row[n]*100:<7.1f}%" if PARAM_LABELS[n][1] else f"{row[n]:<8.2f}"
+                         for n in names)
+        print(f"{rank:<4} {cells} "
               f"{row['Return']:+9.2f}% "
               f"{int(row['Trades']):<6} "
               f"{row['WinRate']:>6.1f}%")
@@ -179,9 +400,8 @@ def optimize_parameters(ticker="233740.KS"):
     # 최적값
     best = results_df.iloc[0]
     print("\n✅ 최적 설정:")
-    print(f"   BUY_THRESHOLD = {best['BUY_THRESHOLD']}")
-    print(f"   TAKE_PROFIT = {best['TAKE_PROFIT']}")
-    print(f"   STOP_LOSS = {best['STOP_LOSS']}")
+    for name in names:
+        print(f"   {name} = {best[name]}")
     print(f"   예상 수익률: {best['Return']:+.2f}%")
     print(f"   거래 횟수: {int(best['Trades'])}회")
     print(f"   승률: {best['WinRate']:.1f}%")
@@ -0,0 +1,583 @@
+# price_stream.py
+# 실시간 체결가 스트림 (KIS 실시간 / 업비트 WebSocket 공통 인터페이스 + REST 폴링 fallback)
+# ──────────────────────────────────────────────────────────
+# 1초마다 REST로 현재가를 묻는 대신, 거래소가 체결마다 밀어주는 가격을 받아
+# 돌파 체크를 바로 깨웁니다.
+#
+#   feed = UpbitPriceStream(["KRW-ETH"], fallback=upbit_broker.get_current_price)
+#   feed.start()
+#   price = feed.get("KRW-ETH")                    # 최신 체결가 (끊겼거나 아직 틱이 없으면 REST)
+#   feed.wait("KRW-ETH", price, CHECK_INTERVAL)     # 가격이 바뀌면 즉시, 아니면 최대 CHECK_INTERVAL초 대기
+#
+#   - 연결이 끊기면 REST 폴링으로 자동 전환하고, 백그라운드에서 지수 백오프로 재접속
+#   - 2×ping_interval 동안 프레임(틱/pong)이 하나도 없으면 반쯤 끊긴 연결로 보고 REST 전환 + 재접속
+#   - 최신가 테이블은 쓰기 때마다 새 dict로 교체 (copy-on-write) → 읽기는 잠금 없이 일관된 스냅샷
+#   - batch_fallback을 주면 REST도 종목 수와 무관하게 poll_interval마다 1회 (업비트 get_batch_prices)
+#   - WebSocket(RFC 6455)은 표준 라이브러리(socket/ssl)로 직접 구현 (추가 의존성 없음)
+#   - ReplayPriceServer: 미리 정한 틱을 보내는 로컬 서버 (벤치마크/리플레이 검증용)
+#
+# 루트(KIS)와 coin_trading_bot/(업비트)이 같이 씁니다. (코인 봇은 coin_trading_bot/shared.py로 불러옴)
+# ──────────────────────────────────────────────────────────
+import base64
+import hashlib
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+KIS_WS_REAL = "ws://ops.koreainvestment.com:21000"
+KIS_WS_MOCK = "ws://ops.koreainvestment.com:31000"
+KIS_TR_TRADE = "H0STCNT0"  # 국내주식 실시간 체결가
+UPBIT_WS_URL = "wss://api.upbit.com/websocket/v1"
+
+
+# ══════════════════════════════════════════════════════════
+# WebSocket (RFC 6455 최소 구현: 텍스트/바이너리, 조각 프레임, ping/pong, close)
+# ══════════════════════════════════════════════════════════
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def _mask(key, data):
+    n = len(data)
+    repeated = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(n, "big")
+
+
+class WebSocket:
+    """client=True면 보내는 프레임을 마스킹 (서버 쪽은 마스킹하지 않음)"""
+
+    def __init__(self, sock, client=True):
+        self.sock = sock
+        self.client = client
+        self._buf = bytearray()
+        self._send_lock = threading.Lock()
+        self._fragments = None  # (opcode, [payload, ...]) — 조각 프레임 조립 중
+        self.last_frame = time.monotonic()  # 마지막 프레임 수신 시각 (ping/pong/close 포함)
+
+    @classmethod
+    def connect(cls, url, timeout=10):
+        parts = urlsplit(url)
+        secure = parts.scheme == "wss"
+        sock = socket.create_connection((parts.hostname, parts.port or (443 if secure else 80)), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        sock.sendall((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                      f"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        ws = cls(sock, client=True)
+        status, headers = ws._read_head()
+        if status.split()[1:2] != ["101"] or headers.get("sec-websocket-accept") != _accept_key(key):
+            sock.close()
+            raise ConnectionError(f"WebSocket 핸드셰이크 실패: {status}")
+        return ws
+
+    @classmethod
+    def accept(cls, sock):
+        """서버 쪽 핸드셰이크 (ReplayPriceServer용)"""
+        ws = cls(sock, client=False)
+        _, headers = ws._read_head()
+        sock.sendall((f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {_accept_key(headers['sec-websocket-key'])}\r\n\r\n").encode())
+        return ws
+
+    def _read_head(self):
+        while b"\r\n\r\n" not in self._buf:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("핸드셰이크 중 연결 종료")
+            self._buf += chunk
+        end = self._buf.index(b"\r\n\r\n")
+        lines = self._buf[:end].decode("latin-1").split("\r\n")
+        del self._buf[:end + 4]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return lines[0], headers
+
+    def settimeout(self, seconds):
+        self.sock.settimeout(seconds)
+
+    def send(self, data, opcode=None):
+        if isinstance(data, str):
+            data, opcode = data.encode(), opcode or OP_TEXT
+        opcode = opcode or OP_BINARY
+        n = len(data)
+        head = bytearray([0x80 | opcode])
+        mask_bit = 0x80 if self.client else 0
+        if n < 126:
+            head.append(mask_bit | n)
+        elif n < 65536:
+            head.append(mask_bit | 126)
+            head += n.to_bytes(2, "big")
+        else:
+            head.append(mask_bit | 127)
+            head += n.to_bytes(8, "big")
+        if self.client:
+            key = os.urandom(4)
+            head += key
+            data = _mask(key, data) if n else data
+        with self._send_lock:
+            self.sock.sendall(bytes(head) + data)
+
+    def ping(self, data=b""):
+        self.send(data, OP_PING)
+
+    def _parse_frame(self):
+        """버퍼에 프레임 하나가 온전히 있으면 (fin, opcode, payload)를 꺼내고, 아니면 None (버퍼 유지)"""
+        buf = self._buf
+        if len(buf) < 2:
+            return None
+        fin, opcode = buf[0] & 0x80, buf[0] & 0x0F
+        masked, n = buf[1] & 0x80, buf[1] & 0x7F
+        pos = 2
+        if n == 126:
+            if len(buf) < 4:
+                return None
+            n, pos = int.from_bytes(buf[2:4], "big"), 4
+        elif n == 127:
+            if len(buf) < 10:
+                return None
+            n, pos = int.from_bytes(buf[2:10], "big"), 10
+        key = None
+        if masked:
+            if len(buf) < pos + 4:
+                return None
+            key, pos = bytes(buf[pos:pos + 4]), pos + 4
+        if len(buf) < pos + n:
+            return None
+        payload = bytes(buf[pos:pos + n])
+        del buf[:pos + n]
+        if key is not None and n:
+            payload = _mask(key, payload)
+        return fin, opcode, payload
+
+    def recv(self):
+        """
+        다음 데이터 메시지 → str(텍스트) 또는 bytes(바이너리).
+        ping에는 자동으로 pong, close/연결 종료는 ConnectionError, 시간 초과는 socket.timeout
+        (시간 초과로 끊겨도 받다 만 프레임은 버퍼에 남아 다음 recv에서 이어 받음)
+        """
+        while True:
+            frame = self._parse_frame()
+            if frame is None:
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    raise ConnectionError("WebSocket 연결 종료")
+                self._buf += chunk
+                continue
+            fin, opcode, payload = frame
+            self.last_frame = time.monotonic()
+            if opcode == OP_PING:
+                self.send(payload, OP_PONG)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                try:
+                    self.send(payload[:2], OP_CLOSE)
+                except OSError:
+                    pass
+                raise ConnectionError("WebSocket close 수신")
+            if opcode == OP_CONT and self._fragments is not None:
+                self._fragments[1].append(payload)
+            else:
+                self._fragments = (opcode, [payload])
+            if not fin:
+                continue
+            opcode, parts = self._fragments
+            self._fragments = None
+            data = b"".join(parts)
+            return data.decode() if opcode == OP_TEXT else data
+
+    def close(self):
+        try:
+            self.send(b"\x03\xe8", OP_CLOSE)
+        except OSError:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+# ══════════════════════════════════════════════════════════
+# 공통 인터페이스
+# ══════════════════════════════════════════════════════════
+
+class RestPriceFeed:
+    """REST 폴링만 하는 가격 피드 (스트림 미사용 시 / 리플레이용) — PriceStream과 같은 메서드"""
+    connected = False
+    ticks = 0
+
+    def __init__(self, fallback=None, sleep=time.sleep, batch_fallback=None, codes=()):
+        self.fallback = fallback
+        self.batch_fallback = batch_fallback
+        self.codes = list(codes)
+        self.sleep = sleep
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def get(self, code):
+        if self.fallback is None:
+            return self.batch_fallback([code]).get(code)
+        return self.fallback(code)
+
+    def snapshot(self):
+        if self.batch_fallback is None:
+            return {code: self.fallback(code) for code in self.codes}
+        return self.batch_fallback(self.codes)
+
+    def wait(self, code, last=None, timeout=1.0):
+        self.sleep(timeout)
+
+    def wait_ticks(self, seen, timeout=1.0):
+        self.sleep(timeout)
+
+
+class PriceStream:
+    """
+    WebSocket 체결가 스트림의 공통 부분 (연결/구독/재접속/최신가 테이블/대기).
+    하위 클래스: ws_url, subscribe_messages(), parse(ws, message) → [(code, price), ...]
+
+    fallback: code → 현재가 (REST) — 연결 전/끊김/틱 없음일 때 get()이 사용
+    batch_fallback: [code, ...] → {code: 현재가} (REST 한 번에 전 종목) — 있으면 fallback 대신 사용
+    poll_interval: batch_fallback 결과 재사용 시간 (초)
+    ping_interval: 이 시간 동안 수신이 없으면 ping (업비트는 120초 무수신 시 연결 종료)
+                   2×ping_interval 동안 pong도 없으면 가격을 믿지 않고(REST) 재접속
+    """
+    ws_url = None
+
+    def __init__(self, codes, fallback=None, batch_fallback=None, poll_interval=1.0,
+                 ping_interval=30.0, reconnect_max=30.0, connect_timeout=10.0):
+        self.codes = list(codes)
+        self.fallback = fallback
+        self.batch_fallback = batch_fallback
+        self.poll_interval = poll_interval
+        self.ping_interval = ping_interval
+        self.reconnect_max = reconnect_max
+        self.connect_timeout = connect_timeout
+        self.connected = False
+        self._prices = {}  # code → 최신 체결가 (수신 스레드만 교체, 내용은 바꾸지 않음)
+        self._polled = {}  # batch_fallback 결과 (호출한 스레드만 교체)
+        self._polled_at = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+        self.ticks = 0
+        self.reconnects = 0
+        self.fallback_calls = 0
+        self.last_error = None
+
+    # ── 수명 ──
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def wait_connected(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: self.connected, timeout)
+
+    def _live(self):
+        """연결됨 + 최근 2×ping_interval 안에 프레임 수신 (아니면 틱이 끊긴 반쯤 열린 연결일 수 있음)"""
+        ws = self._ws
+        return (self.connected and ws is not None
+                and time.monotonic() - ws.last_frame < 2 * self.ping_interval)
+
+    # ── 조회 ──
+    def get(self, code):
+        """최신 체결가 (스트림이 끊겼거나 응답이 없거나 이 종목 틱이 아직 없으면 fallback REST 조회)"""
+        if self._live():
+            price = self._prices.get(code)
+            if price is not None:
+                return price
+        return self._poll(code)
+
+    def snapshot(self):
+        """전 종목 최신가 {code: price} — 잠금 없이 읽는 불변 스냅샷 (끊긴 동안에는 REST 배치 결과)"""
+        live = self._live()
+        if live and len(self._prices) == len(self.codes):
+            return self._prices
+        if self.batch_fallback is None:
+            return self._prices if live else {}
+        self._poll(None)
+        return {**self._polled, **self._prices} if live else self._polled
+
+    def _poll(self, code):
+        if self.batch_fallback is not None:
+            now = time.monotonic()
+            if self._polled_at is None or now - self._polled_at >= self.poll_interval:
+                self.fallback_calls += 1
+                self._polled = self.batch_fallback(self.codes) or {}
+                self._polled_at = now
+            return self._polled.get(code)
+        if self.fallback is None:
+            return None
+        self.fallback_calls += 1
+        return self.fallback(code)
+
+    def wait(self, code, last=None, timeout=1.0):
+        """code 가격이 last와 달라질 때까지 최대 timeout초 대기 (끊긴 동안은 timeout = REST 폴링 주기)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.connected and self._prices.get(code, last) != last, timeout)
+
+    def wait_ticks(self, seen, timeout=1.0):
+        """틱 수(self.ticks)가 seen에서 늘어날 때까지 최대 timeout초 대기 — 여러 종목 중 아무 틱이나 기다릴 때"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.connected and self.ticks != seen, timeout)
+
+    # ── 수신 스레드 ──
+    def _push(self, ticks):
+        if not ticks:
+            return
+        prices = dict(self._prices)
+        prices.update(ticks)
+        self._prices = prices  # 참조 교체 한 번 → 읽는 쪽은 잠금 없이 옛/새 테이블 중 하나를 통째로 봄
+        self.ticks += len(ticks)
+        with self._cond:
+            self._cond.notify_all()
+
+    def _set_connected(self, value):
+        if not value:
+            self._prices = {}  # 끊긴 동안의 가격은 믿지 않음 → REST
+        with self._cond:
+            self.connected = value
+            self._cond.notify_all()
+
+    def _open(self):
+        return WebSocket.connect(self.ws_url, timeout=self.connect_timeout)
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            ws = None
+            try:
+                ws = self._ws = self._open()
+                for message in self.subscribe_messages():
+                    ws.send(message)
+                ws.settimeout(self.ping_interval)
+                self._set_connected(True)
+                backoff = 1.0
+                while not self._stop.is_set():
+                    try:
+                        message = ws.recv()
+                    except socket.timeout:
+                        if time.monotonic() - ws.last_frame >= 2 * self.ping_interval:
+                            raise TimeoutError("WebSocket 무응답 (ping에 pong 없음)")
+                        ws.ping()
+                        continue
+                    self._push(self.parse(ws, message))
+            except Exception as e:  # 연결 끊김 · 시간 초과 · 잘못된 메시지 → 재접속
+                self.last_error = e
+            finally:
+                self._set_connected(False)
+                self._ws = None
+                if ws is not None:
+                    ws.close()
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.reconnect_max)
+
+    def subscribe_messages(self):
+        raise NotImplementedError
+
+    def parse(self, ws, message):
+        raise NotImplementedError
+
+
+# ══════════════════════════════════════════════════════════
+# 거래소별 프로토콜
+# ══════════════════════════════════════════════════════════
+
+class KISPriceStream(PriceStream):
+    """
+    KIS 실시간 체결가 (H0STCNT0).
+    접속키(approval_key)를 /oauth2/Approval에서 받아 종목마다 구독 메시지를 보냅니다.
+    수신 형식: '0|H0STCNT0|003|종목^시각^현재가^...^종목^시각^현재가^...' (레코드 여러 건이 이어 붙음)
+    """
+
+    def __init__(self, app_key, app_secret, url_base, codes, ws_url=None, **kwargs):
+        super().__init__(codes, **kwargs)
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.url_base = url_base
+        self.ws_url = ws_url or (KIS_WS_MOCK if "vts" in str(url_base) else KIS_WS_REAL)
+        self.approval_key = None
+
+    def _open(self):
+        if self.approval_key is None:
+            res = requests.post(f"{self.url_base}/oauth2/Approval", timeout=self.connect_timeout,
+                                headers={"content-type": "application/json"},
+                                data=json.dumps({"grant_type": "client_credentials",
+                                                 "appkey": self.app_key, "secretkey": self.app_secret}))
+            key = res.json().get("approval_key")
+            if not key:
+                raise ConnectionError(f"KIS 실시간 접속키 발급 실패: {res.text[:200]}")
+            self.approval_key = key
+        return super()._open()
+
+    def subscribe_messages(self):
+        for code in self.codes:
+            yield json.dumps({
+                "header": {"approval_key": self.approval_key, "custtype": "P",
+                           "tr_type": "1", "content-type": "utf-8"},
+                "body": {"input": {"tr_id": KIS_TR_TRADE, "tr_key": code}},
+            })
+
+    def parse(self, ws, message):
+        if isinstance(message, bytes):
+            message = message.decode()
+        if message[:1] in ("0", "1"):
+            _, tr_id, count, data = message.split("|", 3)
+            if tr_id != KIS_TR_TRADE:
+                return []
+            fields = data.split("^")
+            n = int(count)
+            width = len(fields) // n
+            return [(fields[i * width], float(fields[i * width + 2])) for i in range(n)]
+        header = json.loads(message).get("header", {})
+        if header.get("tr_id") == "PINGPONG":
+            ws.send(message)  # 서버 PINGPONG은 그대로 돌려줘야 연결 유지
+        return []
+
+
+class UpbitPriceStream(PriceStream):
+    """업비트 ticker 스트림 (마켓 코드 여러 개를 한 연결로 구독, 응답은 바이너리 JSON)"""
+    ws_url = UPBIT_WS_URL
+
+    def __init__(self, codes, ws_url=None, **kwargs):
+        super().__init__(codes, **kwargs)
+        if ws_url:
+            self.ws_url = ws_url
+
+    def subscribe_messages(self):
+        yield json.dumps([{"ticket": str(uuid.uuid4())},
+                          {"type": "ticker", "codes": self.codes, "isOnlyRealtime": True}])
+
+    def parse(self, ws, message):
+        data = json.loads(message)
+        if data.get("type") != "ticker":
+            return []
+        return [(data["code"], float(data["trade_price"]))]
+
+
+# ══════════════════════════════════════════════════════════
+# 로컬 리플레이 서버 (검증용)
+# ══════════════════════════════════════════════════════════
+
+def kis_tick_message(code, price, hhmmss="090000"):
+    return f"0|{KIS_TR_TRADE}|001|{code}^{hhmmss}^{price:.0f}"
+
+
+def upbit_tick_message(code, price):
+    return json.dumps({"type": "ticker", "code": code, "trade_price": price}).encode()
+
+
+class ReplayPriceServer:
+    """
+    접속마다 구독 메시지를 subscribe_count개 받은 뒤 script의 (지연 초, 메시지)를 차례로 보냅니다.
+    메시지가 None이면 그 자리에서 연결을 끊습니다. (fallback/재접속 검증)
+    script가 끝나면 push()로 넣은 메시지를 계속 보냅니다.
+    answer_pings=False면 ping에 pong을 보내지 않습니다. (반쯤 끊긴 연결 검증)
+    """
+
+    def __init__(self, scripts=None, subscribe_count=1, host="127.0.0.1", answer_pings=True):
+        self.scripts = list(scripts or [])  # 접속 순서대로 하나씩 사용
+        self.subscribe_count = subscribe_count
+        self.answer_pings = answer_pings
+        self.subscriptions = []
+        self.connections = 0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sock = socket.create_server((host, 0))
+        self.url = f"ws://{host}:{self._sock.getsockname()[1]}"
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while not self._closed:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        script = self.scripts.pop(0) if self.scripts else []
+        self.connections += 1
+        ws = None
+        try:
+            ws = WebSocket.accept(conn)
+            for _ in range(self.subscribe_count):
+                self.subscriptions.append(ws.recv())
+            if self.answer_pings:
+                threading.Thread(target=self._drain, args=(ws,), daemon=True).start()
+            for delay, message in script:
+                time.sleep(delay)
+                if message is None:
+                    conn.shutdown(socket.SHUT_RDWR)
+                    return
+                ws.send(message)
+            while not self._closed:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._queue or self._closed)
+                    if self._closed:
+                        return
+                    message = self._queue.pop(0)
+                ws.send(message)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _drain(ws):
+        """클라이언트 프레임을 계속 읽어 ping에 pong (recv가 자동 응답)"""
+        try:
+            while True:
+                ws.recv()
+        except OSError:
+            pass
+
+    def push(self, message):
+        with self._cond:
+            self._queue.append(message)
+            self._cond.notify_all()
+
+    def close(self):
+        self._closed = True
+        with self._cond:
+            self._cond.notify_all()
+        self._sock.close()
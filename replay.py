@@ -0,0 +1,493 @@
+# replay.py
+# 실전 봇 루프 리플레이 하네스 (가상 시계 + 가짜 브로커)
+# ──────────────────────────────────────────────────────────
+# main.run_bot / bot_volatility.run_bot / bot_combined.run_bot을 코드 수정 없이
+# 저장된 분봉 위에서 그대로 실행합니다.
+#   - time.sleep → 가상 시계만 전진 (실제 대기 없음)
+#   - datetime.now / date.today → 가상 시계 시각
+#   - broker → ReplayBroker (분봉으로 현재가/시가/전일 OHLC 응답, 주문은 즉시 체결)
+#   - load_bars / data_manager 시세 → 가상 시각까지 완성된 캔들만
+#   - 텔레그램/CSV/모델 파일 → 메모리 기록 / 임시 디렉터리
+#
+# 실행: python replay.py main 2025-01-15   (로컬 시세 저장소의 1분봉 사용)
+# ──────────────────────────────────────────────────────────
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time as _time
+from datetime import date as _date, datetime as _datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import data_manager
+import fill_tracker
+import price_stream
+
+KST = timezone(timedelta(hours=9))
+INTERVAL_SECONDS = {'1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '1h': 3600, '1d': 86400}
+BOT_MODULES = ('main', 'bot_volatility', 'bot_combined')
+
+
+class ReplayFinished(BaseException):
+    """가상 시계가 종료 시각을 넘김 (봇 루프의 except Exception에 잡히지 않도록 BaseException)"""
+
+
+class ReplayStalled(BaseException):
+    """sleep 없이 시각 조회만 반복 (시계가 멈춘 채 무한 루프)"""
+
+
+# ══════════════════════════════════════════════════════════
+# 가상 시계
+# ══════════════════════════════════════════════════════════
+
+class SimClock:
+    MAX_CALLS_WITHOUT_SLEEP = 100000
+
+    def __init__(self, start, end):
+        """start/end: KST 기준 naive datetime"""
+        self.now_kst = start.replace(tzinfo=KST)
+        self.end = end.replace(tzinfo=KST)
+        self.wall_ns = pd.Timestamp(start).value  # KST 벽시계 ns (저장된 캔들 시각과 같은 기준)
+        self.sleeps = 0
+        self._calls = 0
+
+    def now(self, tz=None):
+        self._calls += 1
+        if self._calls > self.MAX_CALLS_WITHOUT_SLEEP:
+            raise ReplayStalled(f"{self.now_kst:%H:%M:%S}에서 sleep 없이 {self._calls}회 시각 조회")
+        if tz is None:
+            return self.now_kst.replace(tzinfo=None)  # 봇 서버는 KST 로컬 시간 기준
+        if tz == KST:
+            return self.now_kst
+        return self.now_kst.astimezone(tz)
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self._calls = 0
+        self.now_kst += timedelta(seconds=seconds)
+        self.wall_ns += int(seconds * 10**9)
+        if self.now_kst > self.end:
+            raise ReplayFinished()
+
+    def time(self):
+        return self.now_kst.timestamp()
+
+    def datetime_class(self):
+        """now()가 가상 시각을 돌려주는 datetime 대체 클래스"""
+        clock = self
+
+        class SimDatetime(_datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now(tz)
+
+        return SimDatetime
+
+    def date_class(self):
+        clock = self
+
+        class SimDate(_date):
+            @classmethod
+            def today(cls):
+                return clock.now().date()
+
+        return SimDate
+
+    def time_module(self):
+        """sleep/time/monotonic만 가상 시계로 바꾼 time 모듈 대체 객체"""
+        clock = self
+
+        class SimTime:
+            sleep = staticmethod(clock.sleep)
+            time = staticmethod(clock.time)
+            monotonic = staticmethod(clock.time)
+
+            def __getattr__(self, name):
+                return getattr(_time, name)
+
+        return SimTime()
+
+
+# ══════════════════════════════════════════════════════════
+# 저장된 시세
+# ══════════════════════════════════════════════════════════
+
+class ReplayFeed:
+    """
+    (종목, 주기)별 캔들 DataFrame을 가상 시각 기준으로 잘라 돌려줍니다.
+    캔들은 '시작 시각 + 주기'가 지나야 완성된 것으로 봅니다. 일봉이 없으면 1분봉을 날짜별로 묶어 만듭니다.
+
+    현재가는 진행 중인 1분봉 안에서 15초씩 시가 → 가까운 극값 → 반대 극값 → 종가 순으로 움직입니다.
+    (양봉: 시가→저가→고가→종가, 음봉: 시가→고가→저가→종가 — 1초 폴링 봇도 분봉 고가/저가를 보게 됨)
+    """
+    TICK_SECONDS = 15
+
+    def __init__(self, frames):
+        """frames: {(ticker, interval): bar_store.load 형식 DataFrame ('시간' 또는 '날짜' + 시가/고가/저가/종가/거래량)}"""
+        self.frames = {}
+        self.paths = {}  # 종목 → 1분봉별 [시가, 첫 극값, 둘째 극값, 종가]
+        for (ticker, interval), df in frames.items():
+            self._add(ticker, interval, df)
+        for ticker, interval in list(self.frames):
+            if interval == '1m' and (ticker, '1d') not in self.frames:
+                self._add(ticker, '1d', self._daily_from_minutes(self.frames[(ticker, '1m')][0]))
+
+    def _add(self, ticker, interval, df):
+        time_col = '날짜' if bar_store.is_daily(interval) else '시간'
+        df = df.sort_values(time_col).reset_index(drop=True)
+        starts = pd.to_datetime(df[time_col]).values.astype('datetime64[ns]').view('i8')
+        self.frames[(ticker, interval)] = (df, starts, starts + INTERVAL_SECONDS[interval] * 10**9)
+        if interval == '1m':
+            o, h, l, c = (df[col].to_numpy(dtype=float) for col in ('시가', '고가', '저가', '종가'))
+            up = c >= o
+            self.paths[ticker] = np.column_stack([o, np.where(up, l, h), np.where(up, h, l), c])
+
+    @staticmethod
+    def _daily_from_minutes(df):
+        day = pd.to_datetime(df['시간']).dt.normalize()
+        daily = df.groupby(day).agg(시가=('시가', 'first'), 고가=('고가', 'max'), 저가=('저가', 'min'),
+                                    종가=('종가', 'last'), 거래량=('거래량', 'sum'))
+        return daily.rename_axis('날짜').reset_index()
+
+    @staticmethod
+    def _ns(now):
+        """KST naive datetime 또는 SimClock.wall_ns → ns"""
+        if isinstance(now, int):
+            return now
+        return pd.Timestamp(now.replace(tzinfo=None)).value
+
+    def bars(self, ticker, interval, now, days=None):
+        """now(KST naive)까지 완성된 캔들 (days: 최근 며칠만)"""
+        if (ticker, interval) not in self.frames:
+            return pd.DataFrame(columns=['날짜' if bar_store.is_daily(interval) else '시간',
+                                         '시가', '고가', '저가', '종가', '거래량'])
+        df, starts, ends = self.frames[(ticker, interval)]
+        stop = np.searchsorted(ends, self._ns(now), side='right')
+        first = 0 if days is None else np.searchsorted(starts, pd.Timestamp(now.date() - timedelta(days=days)).value)
+        out = df.iloc[first:stop]
+        return out.reset_index(drop=True).copy()
+
+    def latest_session(self, ticker, interval, now):
+        """마지막 완성 캔들이 속한 날짜의 캔들만"""
+        if (ticker, interval) not in self.frames:
+            return self.bars(ticker, interval, now)
+        df, starts, ends = self.frames[(ticker, interval)]
+        stop = np.searchsorted(ends, self._ns(now), side='right')
+        if stop == 0:
+            return df.iloc[:0].copy()
+        day_ns = 86400 * 10**9
+        first = np.searchsorted(starts, starts[stop - 1] // day_ns * day_ns)
+        return df.iloc[first:stop].reset_index(drop=True).copy()
+
+    def price(self, ticker, now):
+        """현재가 (첫 1분봉 시작 전이면 None)"""
+        _, starts, ends = self.frames[(ticker, '1m')]
+        ns = self._ns(now)
+        i = starts.searchsorted(ns, side='right') - 1
+        if i < 0:
+            return None
+        if ends[i] > ns:
+            return float(self.paths[ticker][i, min(3, (ns - starts[i]) // (self.TICK_SECONDS * 10**9))])
+        return float(self.paths[ticker][i, 3])
+
+    def today_open(self, ticker, now):
+        """당일 첫 1분봉 시가 (아직 시작 전이면 None)"""
+        _, starts, _ = self.frames[(ticker, '1m')]
+        first = np.searchsorted(starts, pd.Timestamp(now.date()).value, side='left')
+        if first >= len(starts) or starts[first] > self._ns(now):
+            return None
+        return float(self.paths[ticker][first, 0])
+
+    def yesterday_ohlc(self, ticker, now):
+        daily = self.bars(ticker, '1d', now)
+        daily = daily[pd.to_datetime(daily['날짜']).dt.date < now.date()]
+        if len(daily) == 0:
+            return None
+        y = daily.iloc[-1]
+        return {'open': float(y['시가']), 'high': float(y['고가']), 'low': float(y['저가']), 'close': float(y['종가'])}
+
+
+# ══════════════════════════════════════════════════════════
+# 가짜 브로커 / 알림
+# ══════════════════════════════════════════════════════════
+
+class ReplayBroker:
+    """broker 모듈과 같은 함수 이름/인자를 가진 가짜 계좌 (지정가 주문은 즉시 전량 체결)"""
+
+    def __init__(self, feed, clock, ticker, cash, fee=0.0):
+        self.feed = feed
+        self.clock = clock
+        self.ticker = ticker
+        self.cash = cash
+        self.fee = fee
+        self.qty = 0
+        self.avg_price = 0.0
+        self.fills = []
+
+    def _now(self):
+        return self.clock.now()
+
+    # ── 시세 ──
+    def get_access_token(self, app_key, app_secret, url_base):
+        return "REPLAY"
+
+    def get_current_price(self, token, app_key, app_secret, url_base, stock_code):
+        return self.feed.price(self.ticker, self.clock.wall_ns)
+
+    def get_today_open(self, token, app_key, app_secret, url_base, stock_code):
+        return self.feed.today_open(self.ticker, self._now())
+
+    def get_yesterday_ohlc(self, token, app_key, app_secret, url_base, stock_code):
+        return self.feed.yesterday_ohlc(self.ticker, self._now())
+
+    # ── 계좌 ──
+    def get_balance(self, token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
+        return int(self.cash)
+
+    def get_stock_balance(self, token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
+        return self.avg_price if self.qty > 0 else 0
+
+    def get_holding_quantity(self, token, app_key, app_secret, url_base, acc_no, stock_code, mode="MOCK"):
+        return self.qty
+
+    # ── 주문 ──
+    def post_order(self, token, app_key, app_secret, url_base, acc_no, stock_code, quantity, price, mode="MOCK"):
+        cost = quantity * price * (1 + self.fee)
+        if quantity <= 0 or cost > self.cash:
+            return {"rt_cd": "1", "msg1": "주문가능금액을 초과했습니다"}
+        self.avg_price = (self.avg_price * self.qty + price * quantity) / (self.qty + quantity)
+        self.qty += quantity
+        self.cash -= cost
+        self.fills.append({'time': self._now(), 'side': '매수', 'price': price, 'qty': quantity})
+        return self._accepted()
+
+    def post_sell_order(self, token, app_key, app_secret, url_base, acc_no, stock_code, quantity, price, mode="MOCK"):
+        if quantity <= 0 or quantity > self.qty:
+            return {"rt_cd": "1", "msg1": "주문가능수량을 초과했습니다"}
+        self.qty -= quantity
+        self.cash += quantity * price * (1 - self.fee)
+        if self.qty == 0:
+            self.avg_price = 0.0
+        self.fills.append({'time': self._now(), 'side': '매도', 'price': price, 'qty': quantity})
+        return self._accepted()
+
+    def _accepted(self):
+        """주문 접수 응답 (주문번호 = 체결 목록 순번, 시장가는 즉시 전량 체결)"""
+        return {"rt_cd": "0", "msg1": "주문 전송 완료", "output": {"ODNO": f"{len(self.fills):010d}"}}
+
+    def get_order(self, token, app_key, app_secret, url_base, acc_no, order_no, mode="MOCK"):
+        index = int(order_no or 0) - 1
+        if not 0 <= index < len(self.fills):
+            return {"rt_cd": "0", "output1": []}
+        fill = self.fills[index]
+        return {"rt_cd": "0", "output1": [{
+            "odno": order_no, "ord_qty": str(fill['qty']), "tot_ccld_qty": str(fill['qty']), "rmn_qty": "0",
+            "avg_prvs": str(fill['price']), "tot_ccld_amt": str(fill['price'] * fill['qty']),
+        }]}
+
+    def KISClient(self, app_key, app_secret, url_base, acc_no=None, mode="MOCK", token=None, **kwargs):
+        """broker.KISClient 대체: 이 가짜 계좌에 묶인 클라이언트 (async_broker.AsyncKISClient로 감싸도 동작)"""
+        return ReplayKISClient(self, app_key, url_base)
+
+    client_for = KISClient  # broker.client_for 대체
+
+
+class ReplayKISClient:
+    """KISClient와 같은 메서드 이름 → ReplayBroker 함수로 위임"""
+
+    def __init__(self, broker, app_key, url_base):
+        self.broker = broker
+        self.app_key = app_key
+        self.url_base = url_base or "replay"
+
+    def get_current_price(self, stock_code):
+        return self.broker.get_current_price(None, None, None, None, stock_code)
+
+    def get_today_open(self, stock_code):
+        return self.broker.get_today_open(None, None, None, None, stock_code)
+
+    def get_yesterday_ohlc(self, stock_code):
+        return self.broker.get_yesterday_ohlc(None, None, None, None, stock_code)
+
+    def get_balance(self, stock_code):
+        return self.broker.get_balance(None, None, None, None, None, stock_code)
+
+    def get_stock_balance(self, stock_code):
+        return self.broker.get_stock_balance(None, None, None, None, None, stock_code)
+
+    def get_holding_quantity(self, stock_code):
+        return self.broker.get_holding_quantity(None, None, None, None, None, stock_code)
+
+    def post_order(self, stock_code, quantity, price=0):
+        return self.broker.post_order(None, None, None, None, None, stock_code, quantity, price)
+
+    def post_sell_order(self, stock_code, quantity, price=0):
+        return self.broker.post_sell_order(None, None, None, None, None, stock_code, quantity, price)
+
+    def get_order(self, order_no):
+        return self.broker.get_order(None, None, None, None, None, order_no)
+
+
+class _NoLatency:
+    """latency 대체: 리플레이 중에는 API 응답 시간을 DB에 저장하지 않음"""
+
+    @staticmethod
+    def start(db_path=None):
+        return None
+
+
+class RecordingNotifier:
+    """TelegramNotifier 대체: 전송 대신 메시지를 모아 둡니다."""
+    messages = None
+
+    def __init__(self, bot_token=None, chat_id=None):
+        self.messages = []
+
+    def send_message(self, text):
+        self.messages.append(text)
+
+
+class _RestStreams:
+    """price_stream 대체: WebSocket 대신 가짜 브로커 REST 조회 + 가상 시계 대기 (1초 폴링과 동일한 체결)"""
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def KISPriceStream(self, app_key, app_secret, url_base, codes, fallback=None, **kwargs):
+        return price_stream.RestPriceFeed(fallback, sleep=self.clock.sleep)
+
+
+class _NoYfinance:
+    """yfinance fallback 차단 (리플레이 중 네트워크 사용 금지)"""
+
+    @staticmethod
+    def download(*args, **kwargs):
+        return pd.DataFrame()
+
+
+# ══════════════════════════════════════════════════════════
+# 리플레이 실행
+# ══════════════════════════════════════════════════════════
+
+@contextlib.contextmanager
+def _patched(targets):
+    """[(객체, 속성, 값)]을 잠시 바꿨다가 되돌립니다. (없는 속성은 건너뜀)"""
+    saved = []
+    try:
+        for obj, name, value in targets:
+            if hasattr(obj, name):
+                saved.append((obj, name, getattr(obj, name)))
+                setattr(obj, name, value)
+        yield
+    finally:
+        for obj, name, value in reversed(saved):
+            setattr(obj, name, value)
+
+
+def replay_bot(bot, feed, day, cash=10000000, start="08:50", end="15:40", check_interval=None, quiet=True):
+    """
+    봇 모듈의 run_bot()을 day 하루 동안 리플레이합니다.
+
+    Args:
+        bot: 봇 모듈 또는 이름 ('main', 'bot_volatility', 'bot_combined')
+        feed: ReplayFeed (봇 TICKER의 1분봉 필수, bot_combined는 5분봉/^KQ11 5분봉 포함)
+        day: 'YYYY-MM-DD' 또는 date
+        check_interval: 봇 CHECK_INTERVAL 덮어쓰기 (None=봇 설정 그대로)
+        quiet: 봇 출력 숨김 (결과 dict의 'log'에 보관)
+    Returns: dict (fills, messages, sleeps, sim_seconds, wall_seconds, cash, qty, log)
+    """
+    module = importlib.import_module(bot) if isinstance(bot, str) else bot
+    day = pd.Timestamp(day).to_pydatetime().replace(hour=0, minute=0, second=0, microsecond=0)
+    begin = day.replace(hour=int(start[:2]), minute=int(start[3:]))
+    clock = SimClock(begin, day.replace(hour=int(end[:2]), minute=int(end[3:])))
+
+    broker = ReplayBroker(feed, clock, module.TICKER, cash, fee=getattr(module, 'BUY_FEE', 0.0))
+    notifiers = []
+
+    def _notifier(bot_token, chat_id):
+        notifier = RecordingNotifier(bot_token, chat_id)
+        notifiers.append(notifier)
+        return notifier
+
+    def _load_bars(ticker, interval, days, store=None):
+        return feed.bars(ticker, interval, clock.now(), days)
+
+    def _load_latest_session(ticker, interval, store=None):
+        return feed.latest_session(ticker, interval, clock.now())
+
+    log = io.StringIO()
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = [
+            (module, 'time', clock.time_module()),
+            (module, 'datetime', clock.datetime_class()),
+            (module, 'date', clock.date_class()),
+            (module, 'broker', broker),
+            (module, 'price_stream', _RestStreams(clock)),
+            (fill_tracker, 'time', clock.time_module()),
+            (module, 'TelegramNotifier', _notifier),
+            (module, 'latency', _NoLatency),
+            (module, 'load_bars', _load_bars),
+            (module, 'yf', _NoYfinance),
+            (module, 'LOG_FILE', os.path.join(tmp, 'trade_log.csv')),
+            (module, 'MODEL_FILE', os.path.join(tmp, 'model.json')),
+            (data_manager, 'load_bars', _load_bars),
+            (data_manager, 'load_latest_session', _load_latest_session),
+        ]
+        if check_interval is not None:
+            targets.append((module, 'CHECK_INTERVAL', check_interval))
+
+        t0 = _time.perf_counter()
+        output = contextlib.redirect_stdout(log) if quiet else contextlib.nullcontext()
+        with _patched(targets), output:
+            try:
+                module.run_bot()
+            except ReplayFinished:
+                pass
+        wall = _time.perf_counter() - t0
+
+    return {
+        'fills': broker.fills,
+        'messages': [m for n in notifiers for m in n.messages],
+        'sleeps': clock.sleeps,
+        'sim_seconds': (clock.now_kst - begin.replace(tzinfo=KST)).total_seconds(),
+        'wall_seconds': wall,
+        'cash': broker.cash,
+        'qty': broker.qty,
+        'log': log.getvalue(),
+    }
+
+
+def load_replay_feed(ticker, day, with_ai=False, store=None):
+    """로컬 시세 저장소에서 day 하루 리플레이용 시세를 읽습니다. (1분봉 + 일봉, with_ai면 5분봉/코스닥 5분봉 60일)"""
+    store = store or bar_store.DEFAULT_STORE
+    day = pd.Timestamp(day).date()
+    frames = {
+        (ticker, '1m'): store.load(ticker, '1m', day, day + timedelta(days=1)),
+        (ticker, '1d'): store.load(ticker, '1d', day - timedelta(days=30), day + timedelta(days=1)),
+    }
+    if with_ai:
+        for t in (ticker, '^KQ11'):
+            frames[(t, '5m')] = store.load(t, '5m', day - timedelta(days=60), day + timedelta(days=1))
+    return ReplayFeed(frames)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in BOT_MODULES:
+        print(f"사용법: python replay.py {{{'|'.join(BOT_MODULES)}}} YYYY-MM-DD")
+        sys.exit(1)
+
+    bot_name, day = sys.argv[1], sys.argv[2]
+    module = importlib.import_module(bot_name)
+    feed = load_replay_feed(module.TICKER, day, with_ai=bot_name == 'bot_combined')
+    result = replay_bot(module, feed, day)
+
+    print(f"⏪ {bot_name} {day} 리플레이: 가상 {result['sim_seconds'] / 3600:.1f}시간 → "
+          f"실제 {result['wall_seconds']:.2f}초 (sleep {result['sleeps']:,}회)")
+    for fill in result['fills']:
+        print(f"   {fill['time']:%H:%M:%S} {fill['side']} {fill['price']:,.0f}원 × {fill['qty']}주")
+    print(f"   최종 현금 {result['cash']:,.0f}원, 보유 {result['qty']}주, 알림 {len(result['messages'])}건")
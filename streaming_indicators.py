@@ -0,0 +1,307 @@
+# streaming_indicators.py
+# 실시간 5분봉 증분 지표 엔진 (bot_ai_scalper / bot_combined용)
+# ──────────────────────────────────────────────────────────
+# data_manager.add_indicators는 갱신 때마다 60일치 전체를 다시 계산합니다.
+# IndicatorState는 60일치로 한 번 시딩한 뒤, 새로 확정된 캔들만 반영하여
+# 캔들 1개당 O(1)로 FEATURES_WITH_INDEX 피처 행을 만듭니다.
+#
+# - EMA/RSI/ATR: pandas ewm 재귀식을 그대로 재현 → 전체 재계산과 같은 값
+# - SMA/표준편차/StochRSI: 고정 길이 윈도우 버퍼로 계산 (부동소수점 오차 수준 일치)
+# ──────────────────────────────────────────────────────────
+import copy
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from data_manager import BB_DDOF, FEATURES, FEATURES_WITH_INDEX
+
+NAN = float('nan')
+EPSILON = np.finfo(float).eps  # pandas_ta non_zero_range와 동일한 보정값
+
+
+# ══════════════════════════════════════════════════════════
+# 기본 증분 연산자
+# ══════════════════════════════════════════════════════════
+
+class _Ewm:
+    """pandas Series.ewm(...).mean()을 값 1개씩 재현합니다 (ignore_na=False)."""
+
+    def __init__(self, span=None, alpha=None, adjust=True, min_periods=0):
+        com = (span - 1) / 2 if span is not None else (1 - alpha) / alpha
+        alpha = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - alpha
+        self.new_wt = 1.0 if adjust else alpha
+        self.adjust = adjust
+        self.min_periods = max(int(min_periods), 1)
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, x):
+        is_obs = x == x
+        self.nobs += is_obs
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_obs:
+                if self.weighted != x:
+                    self.weighted = ((self.old_wt * self.weighted) + (self.new_wt * x)) / \
+                        (self.old_wt + self.new_wt)
+                if self.adjust:
+                    self.old_wt += self.new_wt
+                else:
+                    self.old_wt = 1.0
+        elif is_obs:
+            self.weighted = x
+        return self.weighted if self.nobs >= self.min_periods else NAN
+
+
+class _SeededEma:
+    """pandas_ta.ema (첫 length개 SMA로 시딩 후 adjust=False EMA)"""
+
+    def __init__(self, length):
+        self.length = length
+        self.seed = []
+        self.ewm = _Ewm(span=length, adjust=False)
+
+    def clone(self):
+        other = copy.copy(self)
+        other.seed = list(self.seed)
+        other.ewm = copy.copy(self.ewm)
+        return other
+
+    def update(self, x):
+        if len(self.seed) < self.length:
+            self.seed.append(x)
+            if len(self.seed) < self.length:
+                return self.ewm.update(NAN)
+            x = float(np.mean(self.seed))
+        return self.ewm.update(x)
+
+
+class _Rolling:
+    """고정 길이 윈도우 (NaN이 하나라도 있으면 NaN, pandas rolling의 min_periods=length와 동일)"""
+
+    def __init__(self, length):
+        self.length = length
+        self.buf = deque(maxlen=length)
+
+    def clone(self):
+        other = copy.copy(self)
+        other.buf = deque(self.buf, maxlen=self.length)
+        return other
+
+    def push(self, x):
+        self.buf.append(x)
+
+    def full(self):
+        return len(self.buf) == self.length and not any(v != v for v in self.buf)
+
+    def mean(self):
+        return sum(self.buf) / self.length if self.full() else NAN
+
+    def std(self, ddof):
+        if not self.full():
+            return NAN
+        mean = sum(self.buf) / self.length
+        var = sum((v - mean) ** 2 for v in self.buf) / (self.length - ddof)
+        return math.sqrt(var)
+
+    def min(self):
+        return min(self.buf) if self.full() else NAN
+
+    def max(self):
+        return max(self.buf) if self.full() else NAN
+
+
+# ══════════════════════════════════════════════════════════
+# 증분 지표 상태
+# ══════════════════════════════════════════════════════════
+
+class IndicatorState:
+    """add_indicators와 같은 피처를 캔들 1개씩 증분 계산하는 상태 객체.
+
+    사용법:
+        state = IndicatorState.from_frame(df_base)   # 60일치로 1회 시딩
+        latest = state.sync(df_base)                 # 갱신 후 새 캔들만 반영
+        _, prob = model.predict_signal(xgb_model, latest, features)
+    """
+
+    MA_WINDOW = 60  # add_indicators의 가장 긴 윈도우 (MA60 → dropna 기준)
+
+    def __init__(self):
+        self.closes = deque(maxlen=13)          # Ret_12까지
+        self.kq = deque(maxlen=7)               # KQ_Ret_6까지
+        self.ma5 = _Rolling(5)
+        self.ma20 = _Rolling(20)
+        self.ma60 = _Rolling(60)
+        self.vol6 = _Rolling(6)
+        self.vol_avg = _Rolling(20)
+        self.macd_fast = _SeededEma(12)
+        self.macd_slow = _SeededEma(26)
+        self.macd_signal = _SeededEma(9)
+        self.rsi_pos = _Ewm(alpha=1.0 / 14, min_periods=14)
+        self.rsi_neg = _Ewm(alpha=1.0 / 14, min_periods=14)
+        self.rsi_window = _Rolling(14)
+        self.stoch_k = _Rolling(3)
+        self.stoch_d = _Rolling(3)
+        self.atr = _Ewm(alpha=1.0 / 14, min_periods=14)
+        self.prev_close = None
+        self.count = 0
+        self.last_time = None
+        self.last_features = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """과거 데이터프레임으로 상태를 시딩합니다. 마지막 캔들은 진행 중일 수 있으므로 미리보기로만 계산합니다."""
+        state = cls()
+        if len(df) > 0:
+            state.sync(df)
+        return state
+
+    def update(self, bar):
+        """확정된 캔들 1개를 반영하고 피처 dict를 반환합니다.
+        bar: '시가', '고가', '저가', '종가', '거래량' (+ 'KOSDAQ_Index', '시간') 키를 가진 dict/Series
+        """
+        o, h, l, c = float(bar['시가']), float(bar['고가']), float(bar['저가']), float(bar['종가'])
+        v = float(bar['거래량'])
+        kq = bar.get('KOSDAQ_Index') if hasattr(bar, 'get') else None
+        kq = float(kq) if kq is not None else None
+
+        self.count += 1
+        if '시간' in bar:
+            self.last_time = bar['시간']
+
+        # 이동평균 / 볼린저
+        for w in (self.ma5, self.ma20, self.ma60, self.vol6):
+            w.push(c)
+        ma5, ma20 = self.ma5.mean(), self.ma20.mean()
+        bb_std = self.ma20.std(ddof=BB_DDOF)
+        bb_lower, bb_upper = ma20 - 2.0 * bb_std, ma20 + 2.0 * bb_std
+        bb_width = bb_upper - bb_lower
+        bb_pct = (c - bb_lower) / bb_width if bb_width > 0 else 0.5
+
+        # MACD
+        macd = self.macd_fast.update(c) - self.macd_slow.update(c)
+        macd_sig = self.macd_signal.update(macd) if macd == macd else NAN
+        macd_hist = macd - macd_sig
+
+        # RSI / StochRSI
+        diff = c - self.prev_close if self.prev_close is not None else NAN
+        pos_avg = self.rsi_pos.update(diff if not diff < 0 else 0.0)
+        neg_avg = self.rsi_neg.update(diff if not diff > 0 else 0.0)
+        rsi = 100 * _div(pos_avg, pos_avg + abs(neg_avg))
+        self.rsi_window.push(rsi)
+        lo, hi = self.rsi_window.min(), self.rsi_window.max()
+        rng = hi - lo
+        stoch = 100 * _div(rsi - lo, rng + EPSILON if rng == 0 else rng)
+        self.stoch_k.push(stoch)
+        stoch_k = self.stoch_k.mean()
+        self.stoch_d.push(stoch_k)
+        stoch_d = self.stoch_d.mean()
+
+        # ATR (true range, 첫 캔들은 NaN)
+        hl = h - l
+        if self.prev_close is None:
+            tr = NAN
+        else:
+            pc = self.prev_close
+            tr = max(abs(hl + EPSILON if hl == 0 else hl), abs(h - pc), abs(pc - l))
+        atr = self.atr.update(tr)
+
+        # 거래량
+        self.vol_avg.push(v)
+        vol_avg = self.vol_avg.mean()
+        vol_ratio = v / vol_avg if vol_avg > 0 else 1.0
+
+        # 모멘텀
+        self.closes.append(c)
+        rets = {k: self._ret(self.closes, k) for k in (1, 3, 6, 12)}
+
+        features = {
+            '종가': c, 'MA5': ma5, 'MA20': ma20, 'RSI': rsi,
+            'BB_Pct': bb_pct, 'MACD': macd, 'MACD_Hist': macd_hist,
+            'StochRSI_K': stoch_k, 'StochRSI_D': stoch_d, 'ATR': atr,
+            'Vol_Ratio': vol_ratio, 'Vol_Spike': int(vol_ratio > 2.0),
+            'Body_Ratio': (c - o) / hl if hl > 0 else 0,
+            'Ret_1': rets[1], 'Ret_3': rets[3], 'Ret_6': rets[6], 'Ret_12': rets[12],
+            'MA5_Dist': (c / ma5 - 1) * 100 if ma5 > 0 else 0,
+            'MA20_Dist': (c / ma20 - 1) * 100 if ma20 > 0 else 0,
+            'Intraday_Pos': (c - l) / hl if hl > 0 else 0.5,
+            'VOL': hl, 'Vol_6': self.vol6.std(ddof=1), '거래량': v,
+        }
+        if kq is not None:
+            self.kq.append(kq)
+            features['KQ_Ret_1'] = self._ret(self.kq, 1)
+            features['KQ_Ret_6'] = self._ret(self.kq, 6)
+            features['Spread'] = features['Ret_1'] - features['KQ_Ret_1']
+
+        self.prev_close = c
+        self.last_features = features
+        return features
+
+    def clone(self):
+        """상태를 복제합니다 (윈도우 버퍼만 복사하므로 O(1))."""
+        other = copy.copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, (_Rolling, _SeededEma)):
+                setattr(other, name, value.clone())
+            elif isinstance(value, _Ewm):
+                setattr(other, name, copy.copy(value))
+            elif isinstance(value, deque):
+                setattr(other, name, deque(value, maxlen=value.maxlen))
+        return other
+
+    def preview(self, bar):
+        """상태를 바꾸지 않고 진행 중인 캔들을 포함한 피처 행을 계산합니다."""
+        tentative = self.clone()
+        return tentative._as_row(tentative.update(bar))
+
+    def sync(self, df):
+        """df에서 아직 반영하지 않은 캔들을 반영하고 최신 피처 행을 반환합니다.
+        마지막 캔들은 진행 중일 수 있으므로 확정하지 않고 미리보기로 계산합니다.
+        Returns: pd.Series (FEATURES_WITH_INDEX 중 존재하는 피처) or None (데이터 부족)
+        """
+        if len(df) == 0:
+            return None
+        start = 0
+        if self.last_time is not None and '시간' in df.columns:
+            start = int(df['시간'].searchsorted(self.last_time, side='right'))
+            if start >= len(df):
+                return self._as_row(self.last_features)
+
+        # 새 구간만 컬럼 배열로 꺼내서 반영 (DataFrame 행 단위 접근 회피)
+        columns = [c for c in ('시간', '시가', '고가', '저가', '종가', '거래량', 'KOSDAQ_Index')
+                   if c in df.columns]
+        arrays = [df[c].iloc[start:].tolist() for c in columns]
+        rows = [dict(zip(columns, values)) for values in zip(*arrays)]
+        for bar in rows[:-1]:
+            self.update(bar)
+        return self.preview(rows[-1])
+
+    def is_ready(self):
+        """add_indicators의 dropna를 통과할 만큼 캔들이 쌓였는지 여부"""
+        return self.count >= self.MA_WINDOW
+
+    def _as_row(self, features):
+        if features is None or not self.is_ready():
+            return None
+        columns = FEATURES_WITH_INDEX if 'KQ_Ret_1' in features else FEATURES
+        values = [features[c] for c in columns]
+        if any(v != v for v in values):
+            return None
+        return pd.Series(values, index=columns)
+
+    @staticmethod
+    def _ret(values, periods):
+        if len(values) <= periods:
+            return NAN
+        return _div(values[-1], values[-1 - periods]) - 1
+
+
+def _div(a, b):
+    """0으로 나누면 pandas/numpy처럼 NaN/inf를 반환합니다."""
+    if b == 0:
+        return NAN if a == 0 or a != a else math.copysign(math.inf, a)
+    return a / b
@@ -0,0 +1,141 @@
+# token_cache.py
+# KIS 접근 토큰 디스크 캐시 (프로세스 간 공유 · 파일 잠금 · 만료 전 선제 갱신)
+# ──────────────────────────────────────────────────────────
+# 봇을 재시작할 때마다 토큰을 새로 발급받던 것을, 아직 유효한 토큰이 있으면
+# 파일에서 꺼내 쓰도록 바꿉니다. (KIS는 토큰 발급 횟수를 제한하므로
+# 여러 봇이 동시에 떠도 발급은 1번만 일어나야 함)
+#
+#   - 키: sha256(앱 키 + 서버 주소) 앞 16자리 (파일에 앱 키를 그대로 남기지 않음)
+#   - 잠금: <캐시 파일>.lock 에 배타 잠금 → 읽기/발급/쓰기를 한 번에 처리
+#           (다른 프로세스는 기다렸다가 방금 발급된 토큰을 재사용)
+#   - 갱신: 만료까지 refresh_margin 초 미만 남으면 새로 발급
+#
+# 파일 위치: 환경 변수 KIS_TOKEN_CACHE (기본 ~/.kis_token_cache.json, 권한 600)
+# ──────────────────────────────────────────────────────────
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_PATH = os.environ.get("KIS_TOKEN_CACHE", os.path.expanduser("~/.kis_token_cache.json"))
+REFRESH_MARGIN = 3600  # 만료 1시간 전부터 새 토큰 발급 (KIS 토큰 유효기간 24시간)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """path에 배타 잠금 (프로세스 간, bar_store에서도 사용)"""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def cache_key(app_key, url_base):
+    return hashlib.sha256(f"{app_key}|{url_base}".encode()).hexdigest()[:16]
+
+
+class TokenCache:
+    """
+    issue: () → (token, expires_at epoch 초) 또는 None — 실제 발급 함수 (KISClient._request_token)
+    clock: 현재 시각 함수 (테스트/리플레이용으로 교체 가능)
+    """
+
+    def __init__(self, path=DEFAULT_PATH, refresh_margin=REFRESH_MARGIN, clock=time.time):
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.hits = 0
+        self.refreshes = 0
+        self.refresh_seconds = []  # 발급 요청에 걸린 시간 (잠금 대기 제외)
+        self.last_refresh_at = None
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, data):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def lookup(self, app_key, url_base):
+        """잠금 없이 유효한 캐시 토큰만 조회 → (token, expires_at) 또는 None"""
+        entry = self._read().get(cache_key(app_key, url_base))
+        if entry and entry["expires_at"] - self.clock() > self.refresh_margin:
+            return entry["token"], entry["expires_at"]
+        return None
+
+    def get(self, app_key, url_base, issue, rejected=None):
+        """
+        유효한 캐시 토큰이 있으면 그대로, 없거나 곧 만료되면 issue()로 발급해 저장합니다.
+        rejected: 서버가 거부한 토큰 — 캐시에 같은 토큰이 있으면 무효로 보고 새로 발급
+        Returns: (token, expires_at) 또는 None (발급 실패)
+        """
+        cached = self.lookup(app_key, url_base)
+        if cached and cached[0] != rejected:
+            self.hits += 1
+            return cached
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with file_lock(f"{self.path}.lock"):
+            data = self._read()
+            key = cache_key(app_key, url_base)
+            entry = data.get(key)
+            # 잠금을 기다리는 동안 다른 프로세스가 새로 발급했으면 그것을 사용
+            fresh = entry and entry["expires_at"] - self.clock() > self.refresh_margin
+            if fresh and entry["token"] != rejected:
+                self.hits += 1
+                return entry["token"], entry["expires_at"]
+
+            t0 = time.perf_counter()
+            issued = issue()
+            elapsed = time.perf_counter() - t0
+            if issued is None:
+                return None
+            token, expires_at = issued
+            self.refreshes += 1
+            self.refresh_seconds.append(elapsed)
+            self.last_refresh_at = self.clock()
+
+            # 만료된 다른 키 항목은 정리
+            now = self.clock()
+            data = {k: v for k, v in data.items() if v["expires_at"] > now}
+            data[key] = {"token": token, "expires_at": expires_at, "issued_at": now}
+            self._write(data)
+            return token, expires_at
+
+    def metrics(self):
+        """캐시 적중/발급 횟수와 발급 소요 시간"""
+        times = self.refresh_seconds
+        return {
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "refresh_avg_ms": sum(times) / len(times) * 1000 if times else None,
+            "refresh_max_ms": max(times) * 1000 if times else None,
+            "last_refresh_at": self.last_refresh_at,
+        }
+
+
+DEFAULT_CACHE = TokenCache()